@@ -0,0 +1,105 @@
+import Benchmark
+import SwiftHighlight
+import Foundation
+
+// Benchmarks every file of the corpus built by tools/build-benchmark-corpus.py,
+// one benchmark per language, kind and size tier. Comparing the tiers of one
+// language shows whether its cost grows linearly with the input.
+//
+// HIGHLIGHT_CORPUS overrides the manifest path (default: Corpus/manifest.json
+// next to this package). Languages registered in Swift are used directly; the
+// others need HIGHLIGHT_BUNDLE, a bundle from tools/build-language-bundle.py.
+// CORPUS_LANGS and CORPUS_KINDS (comma-separated) narrow the run.
+
+struct CorpusManifest: Decodable {
+    struct Entry: Decodable {
+        let language: String
+        let kind: String
+        let tier: String
+        let bytes: Int
+        let path: String
+    }
+
+    let version: Int
+    let entries: [Entry]
+}
+
+let builtInLanguages: [String: @Sendable (Highlight) async -> Void] = [
+    "diff": { await $0.registerDiff() },
+    "go": { await $0.registerGo() },
+    "ini": { await $0.registerIni() },
+    "json": { await $0.registerJSON() },
+    "markdown": { await $0.registerMarkdown() },
+    "nginx": { await $0.registerNginx() },
+    "python": { await $0.registerPython() },
+    "rust": { await $0.registerRust() },
+    "swift": { await $0.registerSwift() },
+    "xml": { await $0.registerXml() },
+    "yaml": { await $0.registerYaml() },
+]
+
+func environmentList(_ name: String) -> Set<String>? {
+    guard let value = ProcessInfo.processInfo.environment[name], !value.isEmpty else { return nil }
+    return Set(value.split(separator: ",").map { $0.trimmingCharacters(in: .whitespaces) })
+}
+
+let benchmarks = {
+    let environment = ProcessInfo.processInfo.environment
+    let manifestURL = environment["HIGHLIGHT_CORPUS"].map { URL(fileURLWithPath: $0) }
+        ?? URL(fileURLWithPath: #filePath)
+            .deletingLastPathComponent()
+            .deletingLastPathComponent()
+            .appendingPathComponent("Corpus/manifest.json")
+    guard let data = try? Data(contentsOf: manifestURL),
+          let manifest = try? JSONDecoder().decode(CorpusManifest.self, from: data) else {
+        print("No corpus at \(manifestURL.path); run tools/build-benchmark-corpus.py first")
+        return
+    }
+    let bundle = environment["HIGHLIGHT_BUNDLE"].flatMap { try? LanguageBundle(contentsOf: URL(fileURLWithPath: $0)) }
+    let bundled = Set(bundle?.languageIDs ?? [])
+    let languages = environmentList("CORPUS_LANGS")
+    let kinds = environmentList("CORPUS_KINDS")
+
+    let metrics: [BenchmarkMetric] = [
+        .wallClock,
+        .mallocCountTotal,
+        .peakMemoryResident,
+    ]
+
+    for entry in manifest.entries {
+        guard languages?.contains(entry.language) ?? true,
+              kinds?.contains(entry.kind) ?? true,
+              builtInLanguages[entry.language] != nil || bundled.contains(entry.language) else {
+            continue
+        }
+        let fileURL = manifestURL.deletingLastPathComponent().appendingPathComponent(entry.path)
+
+        // Large inputs run a few times, not for the default duration
+        Benchmark(
+            "Corpus: \(entry.language) \(entry.kind) \(entry.tier)",
+            configuration: .init(
+                metrics: metrics,
+                maxDuration: .seconds(entry.bytes > 1 << 20 ? 30 : 5),
+                maxIterations: entry.bytes > 1 << 20 ? 5 : 1000
+            )
+        ) { benchmark in
+            guard let code = try? String(contentsOf: fileURL, encoding: .utf8) else {
+                fatalError("Missing corpus file \(fileURL.path)")
+            }
+            let hljs = SwiftHighlight.Highlight()
+            if let bundle {
+                await hljs.registerBundle(bundle)
+            }
+            if let register = builtInLanguages[entry.language] {
+                await register(hljs)
+            }
+            // Warm up - compile the language
+            _ = await hljs.parse("", language: entry.language)
+
+            benchmark.startMeasurement()
+            for _ in benchmark.scaledIterations {
+                blackHole(await hljs.highlight(code, language: entry.language))
+            }
+        }
+    }
+}
@@ -154,6 +154,33 @@ let benchmarks = {
         }
     }
 
+    // MARK: - Batch Scaling
+
+    // The same batch at 1, 2, 4, ... concurrent parses up to the core count;
+    // with perfect scaling the wall clock halves at each step.
+    let batch = Array(repeating: (code: complexCode, language: "python"), count: 256)
+    let cores = ProcessInfo.processInfo.activeProcessorCount
+    var widths = Array(sequence(first: 1) { $0 * 2 < cores ? $0 * 2 : nil })
+    if widths.last != cores {
+        widths.append(cores)
+    }
+    for width in widths {
+        Benchmark(
+            "SwiftHighlight: Batch of \(batch.count) - \(width) cores",
+            configuration: .init(metrics: metrics)
+        ) { benchmark in
+            let hljs = SwiftHighlight.Highlight()
+            await hljs.registerPython()
+            // Warm up the language cache
+            _ = await hljs.highlight(simpleCode, language: "python")
+
+            benchmark.startMeasurement()
+            for _ in benchmark.scaledIterations {
+                blackHole(await hljs.highlightBatch(batch, maxConcurrency: width))
+            }
+        }
+    }
+
     // MARK: - HighlightSwift Benchmarks
 
     Benchmark(
@@ -35,6 +35,17 @@ let package = Package(
                 .plugin(name: "BenchmarkPlugin", package: "package-benchmark")
             ]
         ),
+        .executableTarget(
+            name: "CorpusBenchmarks",
+            dependencies: [
+                .product(name: "Benchmark", package: "package-benchmark"),
+                .product(name: "SwiftHighlight", package: "swift-highlight"),
+            ],
+            path: "CorpusBenchmarks",
+            plugins: [
+                .plugin(name: "BenchmarkPlugin", package: "package-benchmark")
+            ]
+        ),
         .executableTarget(
             name: "MicroBenchmarks",
             dependencies: [
@@ -40,14 +40,110 @@ if __name__ == '__main__':
 // Number of iterations for profiling
 let iterations = 1000
 
+func argument(after flagName: String) -> String? {
+    let arguments = CommandLine.arguments
+    guard let flag = arguments.firstIndex(of: flagName), flag + 1 < arguments.count else {
+        return nil
+    }
+    return arguments[flag + 1]
+}
+
+/// `--profile-json <path>`: count per mode what the parse loop does and write
+/// the report there, for `tools/aggregate-profile.py`
+let profilePath = argument(after: "--profile-json")
+
+/// `--corpus <manifest.json>`: highlight every file of a corpus built by
+/// `tools/build-benchmark-corpus.py` once instead of the Python sample
+let corpusPath = argument(after: "--corpus")
+
+/// `--bundle <path>`: a language bundle for the corpus languages not
+/// registered in Swift
+let bundlePath = argument(after: "--bundle")
+
+struct CorpusManifest: Decodable {
+    struct Entry: Decodable {
+        let language: String
+        let kind: String
+        let tier: String
+        let bytes: Int
+        let path: String
+    }
+
+    let entries: [Entry]
+}
+
+func runCorpus(_ manifestPath: String, with hljs: Highlight) async {
+    let manifestURL = URL(fileURLWithPath: manifestPath)
+    let manifest: CorpusManifest
+    do {
+        manifest = try JSONDecoder().decode(CorpusManifest.self, from: Data(contentsOf: manifestURL))
+    } catch {
+        print("Could not read the corpus: \(error)")
+        return
+    }
+    if let bundlePath {
+        do {
+            try await hljs.registerBundle(contentsOf: URL(fileURLWithPath: bundlePath))
+        } catch {
+            print("Could not read the bundle: \(error)")
+        }
+    }
+    await hljs.registerDiff()
+    await hljs.registerGo()
+    await hljs.registerIni()
+    await hljs.registerJSON()
+    await hljs.registerMarkdown()
+    await hljs.registerNginx()
+    await hljs.registerPython()
+    await hljs.registerRust()
+    await hljs.registerSwift()
+    await hljs.registerXml()
+    await hljs.registerYaml()
+    let languages = Set(await hljs.listLanguages())
+
+    var totalBytes = 0
+    var totalTime = 0.0
+    for entry in manifest.entries {
+        guard languages.contains(entry.language) else {
+            print("\(entry.path): skipped, \(entry.language) is not registered")
+            continue
+        }
+        let fileURL = manifestURL.deletingLastPathComponent().appendingPathComponent(entry.path)
+        guard let code = try? String(contentsOf: fileURL, encoding: .utf8) else {
+            print("\(entry.path): missing")
+            continue
+        }
+        // Warm up - compile language
+        _ = await hljs.parse("", language: entry.language)
+
+        let start = Date()
+        let result = await hljs.highlight(code, language: entry.language)
+        let elapsed = Date().timeIntervalSince(start)
+        if result.value.isEmpty && !code.isEmpty {
+            fatalError("Unexpected empty result")
+        }
+        totalBytes += entry.bytes
+        totalTime += elapsed
+        let throughput = Double(entry.bytes) / max(elapsed, 1e-9) / 1_000_000
+        print("\(entry.language) \(entry.kind) \(entry.tier): \(String(format: "%.2f", elapsed * 1000))ms, \(String(format: "%.1f", throughput)) MB/s")
+    }
+    print("Highlighted \(totalBytes) bytes in \(String(format: "%.2f", totalTime))s")
+}
+
 @main
 struct ProfileRunner {
     static func main() async {
-        let hljs = Highlight()
+        let hljs = Highlight(options: HighlightOptions(profiling: profilePath != nil))
+        if let corpusPath {
+            await runCorpus(corpusPath, with: hljs)
+            await writeProfile(of: hljs)
+            return
+        }
         await hljs.registerPython()
 
         // Warm up - compile language
         _ = await hljs.highlight(complexCode, language: "python")
+        await hljs.resetProfile()
 
         print("Starting profiling run: \(iterations) iterations")
 
@@ -66,5 +162,18 @@ struct ProfileRunner {
 
         print("Completed \(iterations) iterations in \(String(format: "%.2f", elapsed))s")
         print("Average: \(String(format: "%.2f", elapsed / Double(iterations) * 1000))ms per iteration")
+
+        await writeProfile(of: hljs)
+    }
+
+    static func writeProfile(of hljs: Highlight) async {
+        if let profilePath, let report = await hljs.profileReport() {
+            do {
+                try report.jsonData().write(to: URL(fileURLWithPath: profilePath))
+                print("Profile of \(report.modes.count) modes written to \(profilePath)")
+            } catch {
+                print("Could not write the profile: \(error)")
+            }
+        }
     }
 }
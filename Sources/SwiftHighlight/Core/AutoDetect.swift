@@ -0,0 +1,152 @@
+import Foundation
+
+/// The keywords of the auto-detected languages, inverted so that one pass over
+/// a snippet's words scores every language at once. `highlightAuto` uses the
+/// scores to choose which languages get a full parse.
+internal struct KeywordIndex: Sendable {
+    private typealias Posting = (language: Int, relevance: Int)
+
+    /// Registered names of the indexed languages
+    let languages: [String]
+
+    /// Keywords of case-sensitive languages
+    private let exact: [String: [Posting]]
+
+    /// Keywords of case-insensitive languages, lowercased
+    private let folded: [String: [Posting]]
+
+    init(languages: [(name: String, compiled: CompiledMode)]) {
+        var exact: [String: [Posting]] = [:]
+        var folded: [String: [Posting]] = [:]
+        for (index, language) in languages.enumerated() {
+            let caseInsensitive = language.compiled.caseInsensitive
+            for (word, relevance) in Self.keywords(of: language.compiled) {
+                if caseInsensitive {
+                    folded[word.lowercased(), default: []].append((index, relevance))
+                } else {
+                    exact[word, default: []].append((index, relevance))
+                }
+            }
+        }
+        self.languages = languages.map { $0.name }
+        self.exact = exact
+        self.folded = folded
+    }
+
+    /// For each indexed language, the relevance its keywords would add when
+    /// parsing `code`: each occurrence of a keyword counts, up to `maxHits` per
+    /// keyword, as in the parse. Keyed by registered name; languages without
+    /// a keyword in the code are left out.
+    func scores(for code: String, maxHits: Int) -> [String: Int] {
+        var scores = [Int](repeating: 0, count: languages.count)
+        for (word, count) in Self.words(in: code) {
+            let hits = min(count, maxHits)
+            for posting in exact[word] ?? [] {
+                scores[posting.language] += posting.relevance * hits
+            }
+            for posting in folded[word.lowercased()] ?? [] {
+                scores[posting.language] += posting.relevance * hits
+            }
+        }
+        var result: [String: Int] = [:]
+        for (index, score) in scores.enumerated() where score > 0 {
+            result[languages[index]] = score
+        }
+        return result
+    }
+
+    /// Every keyword with positive relevance in a language's modes, with the
+    /// highest relevance it has in any of them.
+    private static func keywords(of language: CompiledMode) -> [String: Int] {
+        var keywords: [String: Int] = [:]
+        var visited = Set<ObjectIdentifier>()
+        var pending = [language]
+        while let mode = pending.popLast() {
+            guard visited.insert(ObjectIdentifier(mode)).inserted else { continue }
+            for (word, entry) in mode.keywords?.keywords ?? [:] where entry.relevance > 0 {
+                keywords[word] = max(keywords[word] ?? 0, entry.relevance)
+            }
+            pending += mode.contains
+            if let starts = mode.starts {
+                pending.append(starts)
+            }
+        }
+        return keywords
+    }
+
+    /// Occurrences of each ASCII identifier in `code`.
+    private static func words(in code: String) -> [String: Int] {
+        func isStart(_ unit: UInt16) -> Bool {
+            (unit >= 0x61 && unit <= 0x7A) || (unit >= 0x41 && unit <= 0x5A) || unit == 0x5F
+        }
+        func isPart(_ unit: UInt16) -> Bool {
+            isStart(unit) || (unit >= 0x30 && unit <= 0x39)
+        }
+
+        let units = Array(code.utf16)
+        var counts: [String: Int] = [:]
+        var position = 0
+        while position < units.count {
+            guard isStart(units[position]), position == 0 || !isPart(units[position - 1]) else {
+                position += 1
+                continue
+            }
+            var end = position + 1
+            while end < units.count && isPart(units[end]) {
+                end += 1
+            }
+            counts[String(decoding: units[position..<end], as: UTF16.self), default: 0] += 1
+            position = end
+        }
+        return counts
+    }
+}
+
+/// Names of the language the code says it is written in: the interpreter of
+/// a `#!` line, or the mode of an Emacs or Vim modeline on one of the first
+/// two lines. Versions are also tried without their number, so
+/// `#!/usr/bin/env python3` gives `python3` and `python`.
+internal func languageHints(in code: String) -> [String] {
+    let lines = code.split(separator: "\n", maxSplits: 2, omittingEmptySubsequences: false).prefix(2)
+    var names: [String] = []
+
+    if let first = lines.first, first.hasPrefix("#!") {
+        let words = first.dropFirst(2).split { $0 == " " || $0 == "\t" || $0 == "\r" }
+        var program = words.first.flatMap { $0.split(separator: "/").last }.map { String($0) }
+        if program == "env" {
+            program = words.dropFirst().first { !$0.hasPrefix("-") }.map { String($0) }
+        }
+        if let program = program {
+            names.append(program)
+        }
+    }
+
+    for line in lines {
+        if let emacs = line.range(of: "-*-"), let mode = line[emacs.upperBound...].range(of: "mode:") {
+            names.append(modelineValue(line[mode.upperBound...]))
+        }
+        if let vim = line.range(of: "vim:") ?? line.range(of: "vi:") {
+            for key in ["ft=", "filetype=", "syntax="] {
+                if let value = line[vim.upperBound...].range(of: key) {
+                    names.append(modelineValue(line[value.upperBound...]))
+                    break
+                }
+            }
+        }
+    }
+
+    var hints: [String] = []
+    for name in names where !name.isEmpty {
+        let unversioned = String(name.reversed().drop { $0.isNumber || $0 == "." }.reversed())
+        for hint in [name, unversioned] where !hint.isEmpty && !hints.contains(hint) {
+            hints.append(hint)
+        }
+    }
+    return hints
+}
+
+/// The value at the start of `text`, up to the first character that cannot
+/// be part of a language name.
+private func modelineValue(_ text: Substring) -> String {
+    String(text.drop { $0 == " " }.prefix { $0.isLetter || $0.isNumber || $0 == "-" || $0 == "+" || $0 == "_" }).lowercased()
+}
@@ -0,0 +1,261 @@
+import Foundation
+
+/// Finds a mode's keyword candidates and looks them up without running
+/// `NSRegularExpression` or materializing words as `String`s.
+///
+/// Built when the keyword pattern is one character class followed by a run of
+/// another, the shape of nearly every language's: `\w+` (the default),
+/// `[a-zA-Z_]\w*`, `[A-Za-z$_][0-9A-Za-z$_]*`, `[A-Za-z]\w+`. Only ASCII classes
+/// are modelled and only ASCII text is scanned, since ICU's `\w` and case
+/// folding reach beyond ASCII; other text goes through the regex.
+internal struct KeywordScanner {
+    /// What a keyword in `CompiledKeywords.keywords` stands for
+    struct Keyword {
+        /// The keyword's key in the table, as counted in `keywordHits`
+        let key: String
+        let scope: String
+        let relevance: Int
+    }
+
+    /// Characters a word starts with
+    private let first: ASCIISet
+
+    /// Characters the rest of a word is made of
+    private let rest: ASCIISet
+
+    /// Characters of `rest` a word needs after its first: 0 or 1
+    private let minimumRest: Int
+
+    private let caseInsensitive: Bool
+
+    /// Open-addressed hash table of indices into `keywords`, -1 where empty
+    private let slots: [Int]
+
+    private let keywords: [Keyword]
+
+    /// UTF-16 units of each keyword's key, at `keyOffsets[i]..<keyOffsets[i + 1]`
+    private let keyUnits: [UInt16]
+    private let keyOffsets: [Int]
+
+    init?(pattern: String, caseInsensitive: Bool, keywords table: [String: (scope: String, relevance: Int)]) {
+        guard let shape = Self.shape(of: pattern) else { return nil }
+        self.first = caseInsensitive ? shape.first.caseClosed : shape.first
+        self.rest = caseInsensitive ? shape.rest.caseClosed : shape.rest
+        self.minimumRest = shape.minimumRest
+        self.caseInsensitive = caseInsensitive
+
+        // Keys with other characters can never equal a scanned ASCII word
+        var keywords: [Keyword] = []
+        var keyUnits: [UInt16] = []
+        var keyOffsets = [0]
+        for (key, value) in table.sorted(by: { $0.key < $1.key }) where key.utf16.allSatisfy({ $0 < 0x80 }) {
+            keywords.append(Keyword(key: key, scope: value.scope, relevance: value.relevance))
+            keyUnits += key.utf16
+            keyOffsets.append(keyUnits.count)
+        }
+
+        var capacity = 8
+        while capacity < keywords.count * 2 {
+            capacity *= 2
+        }
+        var slots = [Int](repeating: -1, count: capacity)
+        for index in keywords.indices {
+            var slot = Self.hash(keyUnits[keyOffsets[index]..<keyOffsets[index + 1]]) & (capacity - 1)
+            while slots[slot] >= 0 {
+                slot = (slot + 1) & (capacity - 1)
+            }
+            slots[slot] = index
+        }
+
+        self.slots = slots
+        self.keywords = keywords
+        self.keyUnits = keyUnits
+        self.keyOffsets = keyOffsets
+    }
+
+    /// Whether every unit in `range` is ASCII, as scanning requires.
+    static func canScan(_ units: [UInt16], _ range: Range<Int>) -> Bool {
+        for position in range where units[position] >= 0x80 {
+            return false
+        }
+        return true
+    }
+
+    /// The first word in `start..<end`, where the keyword pattern would match
+    /// searching from `start`.
+    func nextWord(in units: [UInt16], from start: Int, to end: Int) -> Range<Int>? {
+        var position = start
+        while position < end {
+            if first.contains(units[position]) {
+                var wordEnd = position + 1
+                while wordEnd < end && rest.contains(units[wordEnd]) {
+                    wordEnd += 1
+                }
+                if wordEnd - position > minimumRest {
+                    return position..<wordEnd
+                }
+            }
+            position += 1
+        }
+        return nil
+    }
+
+    /// The keyword the word at `range` is, folded to lowercase first for
+    /// case-insensitive languages.
+    func keyword(at range: Range<Int>, in units: [UInt16]) -> Keyword? {
+        let mask = slots.count - 1
+        var slot = Self.hash(units[range], folding: caseInsensitive) & mask
+        while slots[slot] >= 0 {
+            let index = slots[slot]
+            if keyOffsets[index + 1] - keyOffsets[index] == range.count && matches(index, units[range]) {
+                return keywords[index]
+            }
+            slot = (slot + 1) & mask
+        }
+        return nil
+    }
+
+    private func matches(_ index: Int, _ word: ArraySlice<UInt16>) -> Bool {
+        var keyPosition = keyOffsets[index]
+        for unit in word {
+            if Self.fold(unit, caseInsensitive) != keyUnits[keyPosition] {
+                return false
+            }
+            keyPosition += 1
+        }
+        return true
+    }
+
+    /// FNV-1a over the units.
+    private static func hash(_ units: ArraySlice<UInt16>, folding: Bool = false) -> Int {
+        var hash: UInt32 = 2_166_136_261
+        for unit in units {
+            hash = (hash ^ UInt32(fold(unit, folding))) &* 16_777_619
+        }
+        return Int(hash)
+    }
+
+    private static func fold(_ unit: UInt16, _ folding: Bool) -> UInt16 {
+        folding && unit >= 0x41 && unit <= 0x5A ? unit + 0x20 : unit
+    }
+
+    // MARK: - Pattern Shape
+
+    /// The classes of a `X+`, `XY*` or `XY+` pattern, where `X` and `Y` are
+    /// `\w`, `\d` or a bracketed class of ASCII characters. Nil for anything else.
+    private static func shape(of pattern: String) -> (first: ASCIISet, rest: ASCIISet, minimumRest: Int)? {
+        let scalars = Array(pattern.unicodeScalars)
+        var index = 0
+        guard let head = characterClass(scalars, &index) else { return nil }
+        if index + 1 == scalars.count && scalars[index] == "+" {
+            return (head, head, 0)
+        }
+        guard let tail = characterClass(scalars, &index), index + 1 == scalars.count else { return nil }
+        switch scalars[index] {
+        case "*": return (head, tail, 0)
+        case "+": return (head, tail, 1)
+        default: return nil
+        }
+    }
+
+    private static func characterClass(_ scalars: [Unicode.Scalar], _ index: inout Int) -> ASCIISet? {
+        guard index < scalars.count else { return nil }
+        if scalars[index] == "\\" {
+            guard index + 1 < scalars.count, let set = ASCIISet(escape: scalars[index + 1]) else { return nil }
+            index += 2
+            return set
+        }
+        guard scalars[index] == "[", index + 1 < scalars.count, scalars[index + 1] != "^" else { return nil }
+        index += 1
+
+        var set = ASCIISet()
+        while index < scalars.count && scalars[index] != "]" {
+            let lower: Unicode.Scalar
+            if scalars[index] == "\\" {
+                guard index + 1 < scalars.count else { return nil }
+                let escaped = scalars[index + 1]
+                index += 2
+                if let escapeSet = ASCIISet(escape: escaped) {
+                    set = set.union(escapeSet)
+                    continue
+                }
+                guard ASCIISet.punctuation.contains(escaped) else { return nil }
+                lower = escaped
+            } else {
+                // Nested classes and set operations are left to the regex
+                guard scalars[index].isASCII, scalars[index] != "[", scalars[index] != "&" else { return nil }
+                lower = scalars[index]
+                index += 1
+            }
+
+            if index + 1 < scalars.count && scalars[index] == "-" && scalars[index + 1] != "]" {
+                let upper = scalars[index + 1]
+                guard upper.isASCII, upper != "\\", upper != "[", upper.value >= lower.value else { return nil }
+                set.insert(UInt16(lower.value)...UInt16(upper.value))
+                index += 2
+            } else {
+                set.insert(UInt16(lower.value)...UInt16(lower.value))
+            }
+        }
+        guard index < scalars.count else { return nil }
+        index += 1
+        return set
+    }
+}
+
+/// A set of ASCII code units.
+private struct ASCIISet {
+    private var low: UInt64 = 0
+    private var high: UInt64 = 0
+
+    static let punctuation = Set(##"!"#$%&'()*+,-./:;<=>?@[\]^_`{|}~"##.unicodeScalars)
+
+    init() {}
+
+    /// The set of `\w` or `\d` in ASCII.
+    init?(escape: Unicode.Scalar) {
+        switch escape {
+        case "w":
+            insert(0x30...0x39)
+            insert(0x41...0x5A)
+            insert(0x61...0x7A)
+            insert(0x5F...0x5F)
+        case "d":
+            insert(0x30...0x39)
+        default:
+            return nil
+        }
+    }
+
+    /// Adds the other case of each letter.
+    var caseClosed: ASCIISet {
+        var out = self
+        for letter in UInt16(0x41)...UInt16(0x5A) where contains(letter) || contains(letter + 0x20) {
+            out.insert(letter...letter)
+            out.insert((letter + 0x20)...(letter + 0x20))
+        }
+        return out
+    }
+
+    func contains(_ unit: UInt16) -> Bool {
+        if unit >= 0x80 { return false }
+        return unit < 64 ? low & (1 << unit) != 0 : high & (1 << (unit - 64)) != 0
+    }
+
+    mutating func insert(_ units: ClosedRange<UInt16>) {
+        for unit in units {
+            if unit < 64 {
+                low |= 1 << unit
+            } else if unit < 0x80 {
+                high |= 1 << (unit - 64)
+            }
+        }
+    }
+
+    func union(_ other: ASCIISet) -> ASCIISet {
+        var out = self
+        out.low |= other.low
+        out.high |= other.high
+        return out
+    }
+}
@@ -0,0 +1,126 @@
+import Foundation
+
+/// The languages registered with a `Highlight` at one point in time.
+///
+/// Registering replaces the actor's set with a new one, so a set a `Parser`
+/// holds never changes underneath it. Languages are compiled the first time
+/// they are used, under a lock, since parsers sharing the set may run on
+/// several threads; compiled modes are not changed after that.
+internal final class LanguageSet: @unchecked Sendable {
+    /// Registered languages
+    let languages: [String: Language]
+
+    /// Language aliases
+    let aliases: [String: String]
+
+    /// Ahead-of-time compiled languages, loaded instead of running `ModeCompiler`
+    let snapshots: [String: LanguageSnapshot]
+
+    /// Bundles holding the snapshot of a language until it is first compiled
+    let bundledLanguages: [String: LanguageBundle]
+
+    /// Distinguishes the sets one `Highlight` goes through, for keying cached results
+    let generation: Int
+
+    private let lock = NSLock()
+
+    /// Compiled language cache, guarded by `lock`
+    private var compiledLanguages: [String: CompiledMode]
+
+    /// Keywords of the auto-detected languages, guarded by `lock`
+    private var builtKeywordIndex: KeywordIndex?
+
+    init(
+        languages: [String: Language] = [:],
+        aliases: [String: String] = [:],
+        snapshots: [String: LanguageSnapshot] = [:],
+        bundledLanguages: [String: LanguageBundle] = [:],
+        compiledLanguages: [String: CompiledMode] = [:],
+        generation: Int = 0
+    ) {
+        self.languages = languages
+        self.aliases = aliases
+        self.snapshots = snapshots
+        self.bundledLanguages = bundledLanguages
+        self.compiledLanguages = compiledLanguages
+        self.generation = generation
+    }
+
+    /// The languages compiled so far, for the set replacing this one to keep
+    var compiled: [String: CompiledMode] {
+        lock.lock()
+        defer { lock.unlock() }
+        return compiledLanguages
+    }
+
+    /// The keywords of every auto-detected language, for ranking `highlightAuto`
+    /// candidates. Built the first time it is needed, which compiles those languages.
+    var keywordIndex: KeywordIndex {
+        lock.lock()
+        if let index = builtKeywordIndex {
+            lock.unlock()
+            return index
+        }
+        lock.unlock()
+
+        var indexed: [(name: String, compiled: CompiledMode)] = []
+        for (name, language) in languages.sorted(by: { $0.key < $1.key }) where !language.disableAutodetect {
+            if let compiled = try? compiledLanguage(name) {
+                indexed.append((name, compiled))
+            }
+        }
+        let index = KeywordIndex(languages: indexed)
+
+        lock.lock()
+        defer { lock.unlock() }
+        if builtKeywordIndex == nil {
+            builtKeywordIndex = index
+        }
+        return builtKeywordIndex ?? index
+    }
+
+    /// Gets a language by name or alias.
+    func getLanguage(_ name: String) -> Language? {
+        let lowercased = name.lowercased()
+        return languages[lowercased] ?? languages[aliases[lowercased] ?? ""]
+    }
+
+    /// Resolves a name or alias to the key the language is registered under.
+    func registeredName(_ name: String) -> String? {
+        if languages[name] != nil {
+            return name
+        }
+        let lowercased = name.lowercased()
+        if languages[lowercased] != nil {
+            return lowercased
+        }
+        if let target = aliases[lowercased], languages[target] != nil {
+            return target
+        }
+        return nil
+    }
+
+    func compiledLanguage(_ name: String) throws -> CompiledMode {
+        // Cache under the registered name so aliases share one compiled language.
+        guard let key = registeredName(name), let lang = languages[key] else {
+            throw HighlightError.unknownLanguage(name)
+        }
+        lock.lock()
+        defer { lock.unlock() }
+        if let cached = compiledLanguages[key] {
+            return cached
+        }
+
+        let compiled: CompiledMode
+        if let snapshot = snapshots[key] {
+            compiled = SnapshotLoader(snapshot: snapshot).load()
+        } else if let bundle = bundledLanguages[key] {
+            compiled = SnapshotLoader(snapshot: try bundle.snapshot(for: key)).load()
+        } else {
+            compiled = ModeCompiler(language: lang).compile()
+        }
+        compiled.languageName = key
+        compiledLanguages[key] = compiled
+        return compiled
+    }
+}
@@ -0,0 +1,236 @@
+import Foundation
+
+/// A DFA that finds the same matches as one mode's combined regex, built ahead
+/// of time by `tools/hljs_dfa.py` for matchers without lookarounds,
+/// backreferences or case folding.
+///
+/// Code points are first mapped to classes: ASCII through a table, the rest
+/// through the region of the patterns' explicit ranges they fall in and four
+/// Unicode properties. The table then steps one class at a time; a cell can
+/// report a rule ending before its character, and a later cell can only
+/// replace it with a match of higher priority, so the last one reported when
+/// the DFA stops is the leftmost-first match from that start.
+internal struct LexerTable: Sendable {
+    static let formatVersion: Int32 = 1
+
+    private static let contexts = 9
+    private static let propertyMasks = 16
+
+    private static let propertyWord = 1
+    private static let propertyDigit = 2
+    private static let propertySpace = 4
+    private static let propertyExtend = 8
+
+    private static let flagWord: Int16 = 1
+    private static let flagLineTerminator: Int16 = 2
+    private static let flagCarriageReturn: Int16 = 4
+    private static let flagExtend: Int16 = 8
+
+    /// Number of rules of the matcher the table was built from
+    let ruleCount: Int
+
+    private let classCount: Int
+    private let classFlags: [Int16]
+    private let asciiClasses: [Int16]
+    private let regionStarts: [UInt32]
+    private let regionClasses: [Int16]
+    private let startStates: [Int16]
+    private let transitions: [Int16]
+    private let matches: [Int16]
+
+    /// Decodes a table in the layout written by `build_lexer_table`.
+    /// Returns nil if the data is malformed or from another format version.
+    init?(encoded: String) {
+        guard let data = Data(base64Encoded: encoded) else { return nil }
+        let decoded: LexerTable? = data.withUnsafeBytes { bytes in
+            func int32(_ index: Int) -> Int32 {
+                Int32(littleEndian: bytes.loadUnaligned(fromByteOffset: index * 4, as: Int32.self))
+            }
+            guard bytes.count >= 20, int32(0) == Self.formatVersion else { return nil }
+            let ruleCount = Int(int32(1))
+            let classCount = Int(int32(2))
+            let stateCount = Int(int32(3))
+            let regionCount = Int(int32(4))
+            guard ruleCount > 0, classCount > 0, stateCount > 0, regionCount > 0 else { return nil }
+
+            let cells = stateCount * (classCount + 1)
+            let narrowStart = 20 + regionCount * 4
+            let narrowCount = classCount + 128 + regionCount * Self.propertyMasks + Self.contexts + 2 * cells
+            guard bytes.count == narrowStart + narrowCount * 2 else { return nil }
+
+            let regionStarts = (0..<regionCount).map { UInt32(bitPattern: int32(5 + $0)) }
+            var position = 0
+            func int16s(_ count: Int) -> [Int16] {
+                defer { position += count }
+                return (position..<(position + count)).map {
+                    Int16(littleEndian: bytes.loadUnaligned(fromByteOffset: narrowStart + $0 * 2, as: Int16.self))
+                }
+            }
+            let classFlags = int16s(classCount)
+            let asciiClasses = int16s(128)
+            let regionClasses = int16s(regionCount * Self.propertyMasks)
+            let startStates = int16s(Self.contexts)
+            let transitions = int16s(cells)
+            let matches = int16s(cells)
+
+            let validClasses = 0..<Int16(classCount)
+            guard regionStarts.first == 0x80,
+                  asciiClasses.allSatisfy({ validClasses.contains($0) }),
+                  regionClasses.allSatisfy({ validClasses.contains($0) }),
+                  startStates.allSatisfy({ 0 <= $0 && Int($0) < stateCount }),
+                  transitions.allSatisfy({ -1 <= $0 && Int($0) < stateCount }),
+                  matches.allSatisfy({ -1 <= $0 && Int($0) < ruleCount }) else {
+                return nil
+            }
+            return LexerTable(
+                ruleCount: ruleCount,
+                classCount: classCount,
+                classFlags: classFlags,
+                asciiClasses: asciiClasses,
+                regionStarts: regionStarts,
+                regionClasses: regionClasses,
+                startStates: startStates,
+                transitions: transitions,
+                matches: matches
+            )
+        }
+        guard let decoded = decoded else { return nil }
+        self = decoded
+    }
+
+    private init(
+        ruleCount: Int,
+        classCount: Int,
+        classFlags: [Int16],
+        asciiClasses: [Int16],
+        regionStarts: [UInt32],
+        regionClasses: [Int16],
+        startStates: [Int16],
+        transitions: [Int16],
+        matches: [Int16]
+    ) {
+        self.ruleCount = ruleCount
+        self.classCount = classCount
+        self.classFlags = classFlags
+        self.asciiClasses = asciiClasses
+        self.regionStarts = regionStarts
+        self.regionClasses = regionClasses
+        self.startStates = startStates
+        self.transitions = transitions
+        self.matches = matches
+    }
+
+    /// The first match at or after the UTF-16 offset `start`, as
+    /// `firstMatch(in:range:)` finds it with a range that starts there.
+    func firstMatch(in units: [UInt16], from start: Int) -> (location: Int, length: Int, rule: Int)? {
+        guard start >= 0, start <= units.count else { return nil }
+        var position = start
+        // The range is not transparent: before `start` is the start of the input.
+        var context = 0
+        while true {
+            if let found = match(in: units, at: position, context: context) {
+                return (position, found.end - position, found.rule)
+            }
+            guard position < units.count else { return nil }
+            let (symbol, width) = self.symbol(in: units, at: position)
+            context = Self.context(after: classFlags[symbol], from: context)
+            position += width
+        }
+    }
+
+    /// Runs the DFA from one start position.
+    private func match(in units: [UInt16], at start: Int, context: Int) -> (end: Int, rule: Int)? {
+        let columns = classCount + 1
+        var state = Int(startStates[context])
+        var position = start
+        var found: (end: Int, rule: Int)?
+        while true {
+            let atEnd = position == units.count
+            let (symbol, width) = atEnd ? (classCount, 0) : self.symbol(in: units, at: position)
+            let cell = state * columns + symbol
+            let rule = matches[cell]
+            if rule >= 0 {
+                found = (position, Int(rule))
+            }
+            let next = transitions[cell]
+            if atEnd || next < 0 {
+                return found
+            }
+            state = Int(next)
+            position += width
+        }
+    }
+
+    /// The class of the code point at `position` and its length in UTF-16 units.
+    /// Unpaired surrogates are code points of their own, as in ICU.
+    private func symbol(in units: [UInt16], at position: Int) -> (Int, Int) {
+        let unit = units[position]
+        if unit < 0x80 {
+            return (Int(asciiClasses[Int(unit)]), 1)
+        }
+        var value = UInt32(unit)
+        var width = 1
+        if UTF16.isLeadSurrogate(unit), position + 1 < units.count, UTF16.isTrailSurrogate(units[position + 1]) {
+            value = 0x10000 + ((value - 0xD800) << 10) + (UInt32(units[position + 1]) - 0xDC00)
+            width = 2
+        }
+        return (Int(regionClasses[region(of: value) * Self.propertyMasks + Self.properties(of: value)]), width)
+    }
+
+    private func region(of value: UInt32) -> Int {
+        var low = 0
+        var high = regionStarts.count - 1
+        while low < high {
+            let mid = (low + high + 1) / 2
+            if regionStarts[mid] <= value {
+                low = mid
+            } else {
+                high = mid - 1
+            }
+        }
+        return low
+    }
+
+    /// The properties ICU's `\w`, `\d`, `\s` and `\b` depend on outside ASCII.
+    private static func properties(of value: UInt32) -> Int {
+        guard let scalar = Unicode.Scalar(value) else { return 0 }
+        let properties = scalar.properties
+        let category = properties.generalCategory
+        var mask = 0
+        switch category {
+        case .nonspacingMark, .spacingMark, .enclosingMark, .decimalNumber, .connectorPunctuation:
+            mask |= propertyWord
+        default:
+            if properties.isAlphabetic || value == 0x200C || value == 0x200D {
+                mask |= propertyWord
+            }
+        }
+        if category == .decimalNumber {
+            mask |= propertyDigit
+        }
+        if properties.isWhitespace {
+            mask |= propertySpace
+        }
+        if properties.isGraphemeExtend || category == .format {
+            mask |= propertyExtend
+        }
+        return mask
+    }
+
+    /// Context 0 is the start of the search range; the others are
+    /// 1 + (line terminator << 2 | carriage return << 1 | word) for the text
+    /// before a position. `\b` looks past combining marks, so they keep the
+    /// previous word flag.
+    private static func context(after flags: Int16, from context: Int) -> Int {
+        let word: Int
+        if flags & flagExtend != 0 {
+            word = context == 0 ? 0 : (context - 1) & 1
+        } else {
+            word = flags & flagWord != 0 ? 1 : 0
+        }
+        return 1
+            + (flags & flagLineTerminator != 0 ? 4 : 0)
+            + (flags & flagCarriageReturn != 0 ? 2 : 0)
+            + word
+    }
+}
@@ -9,6 +9,8 @@ internal final class CompiledMode {
     var endRe: NSRegularExpression?
     var illegalRe: NSRegularExpression?
     var terminatorEnd: String = ""
+    /// The alternatives `terminatorEnd` joins, for children that end with this mode
+    var terminatorParts: [String] = [""]
 
     var keywords: CompiledKeywords?
     var keywordPatternRe: NSRegularExpression?
@@ -18,6 +20,8 @@ internal final class CompiledMode {
     /// Parent mode - strong reference for runtime instances created in startNewMode
     /// (The compile-time modes in ModeCompiler use this as weak via explicit handling)
     var parent: CompiledMode?
+    /// For a runtime instance created in startNewMode, the compiled mode it was started from
+    var origin: CompiledMode?
 
     var relevance: Int = 1
     var excludeBegin = false
@@ -41,6 +45,9 @@ internal final class CompiledMode {
     /// Cached case-insensitivity flag from language definition
     var caseInsensitive: Bool = false
 
+    /// For a language's root mode, the name the language is registered under
+    var languageName: String?
+
     init() {}
 }
 
@@ -58,11 +65,34 @@ internal final class ModeCompiler {
     private let caseInsensitive: Bool
     private let unicode: Bool
 
-    /// Track modes currently being compiled to detect cycles (using UUID)
-    private var compilingModes: Set<UUID> = []
+    /// Track modes currently being compiled to detect cycles
+    private var compilingModes: Set<CacheKey> = []
+
+    /// Cache of compiled modes by UUID, and by terminator for `endsWithParent` modes
+    private var modeCache: [CacheKey: CompiledMode] = [:]
+
+    /// An `endsWithParent` mode also ends on its parent's terminator, so it gets
+    /// a copy per terminator (highlight.js's `dependencyOnParent`). That is all
+    /// it takes from the parent, and it stops growing once a recursive mode's
+    /// alternatives are all listed, so nested copies end up sharing one key.
+    private struct CacheKey: Hashable {
+        let mode: UUID
+        let terminator: [String]?
+
+        init(_ mode: Mode, terminator: [String]) {
+            self.mode = mode.id
+            self.terminator = mode.endsWithParent ? terminator : nil
+        }
+    }
+
+    /// Variant expansions by (base, variant) UUID, so a mode reached again
+    /// through a cycle reuses the same merged mode instead of a fresh copy
+    private var mergedModes: [MergeKey: Mode] = [:]
 
-    /// Cache of compiled modes by UUID
-    private var modeCache: [UUID: CompiledMode] = [:]
+    private struct MergeKey: Hashable {
+        let base: UUID
+        let variant: UUID
+    }
 
     /// Maximum recursion depth to prevent stack overflow
     private let maxDepth = 50
@@ -100,6 +130,19 @@ internal final class ModeCompiler {
         langRe(RegexPattern.string(pattern), global: global)
     }
 
+    /// A mode's terminator alternatives: its own end, then for an
+    /// `endsWithParent` mode each of its parent's not listed yet
+    private func terminatorParts(end: RegexPattern?, endsWithParent: Bool, parent: CompiledMode?) -> [String] {
+        guard let parent else { return [""] }
+        var parts = end.map { [$0.source] } ?? []
+        if endsWithParent {
+            for part in parent.terminatorParts where !parts.contains(part) {
+                parts.append(part)
+            }
+        }
+        return parts
+    }
+
     private func compileMode(_ mode: Mode, parent: CompiledMode?, depth: Int, selfMode: Mode?) -> CompiledMode {
         // Recursion depth check
         guard depth < maxDepth else {
@@ -107,25 +150,34 @@ internal final class ModeCompiler {
             return CompiledMode()
         }
 
+        let effectiveEnd: RegexPattern?
+        if mode.end == nil && !mode.endsWithParent {
+            effectiveEnd = .string(#"\B|\b"#)
+        } else {
+            effectiveEnd = mode.end
+        }
+        let terminator = terminatorParts(end: effectiveEnd, endsWithParent: mode.endsWithParent, parent: parent)
+
         // Check if already compiled (reuse cached result)
-        if let cached = modeCache[mode.id] {
+        let cacheKey = CacheKey(mode, terminator: terminator)
+        if let cached = modeCache[cacheKey] {
             return cached
         }
 
         // Detect cycles - return the in-progress compiled mode if available
-        if compilingModes.contains(mode.id) {
-            return modeCache[mode.id] ?? CompiledMode()
+        if compilingModes.contains(cacheKey) {
+            return modeCache[cacheKey] ?? CompiledMode()
         }
 
         // Mark as being compiled
-        compilingModes.insert(mode.id)
-        defer { compilingModes.remove(mode.id) }
+        compilingModes.insert(cacheKey)
+        defer { compilingModes.remove(cacheKey) }
 
         let cmode = CompiledMode()
         cmode.caseInsensitive = caseInsensitive
 
         // Cache early so .self references can find it
-        modeCache[mode.id] = cmode
+        modeCache[cacheKey] = cmode
 
         if mode.scope != nil || mode.className != nil {
             cmode.scope = mode.scope ?? mode.className
@@ -153,21 +205,12 @@ internal final class ModeCompiler {
             let beginPattern = effectiveBegin ?? .string(#"\B|\b"#)
             cmode.beginRe = langRe(beginPattern)
 
-            let effectiveEnd: RegexPattern?
-            if mode.end == nil && !mode.endsWithParent {
-                effectiveEnd = .string(#"\B|\b"#)
-            } else {
-                effectiveEnd = mode.end
-            }
-
             if let end = effectiveEnd {
                 cmode.endRe = langRe(end)
             }
 
-            cmode.terminatorEnd = effectiveEnd?.source ?? ""
-            if mode.endsWithParent, let parentEnd = parent?.terminatorEnd {
-                cmode.terminatorEnd += (effectiveEnd != nil ? "|" : "") + parentEnd
-            }
+            cmode.terminatorParts = terminator
+            cmode.terminatorEnd = terminator.joined(separator: "|")
         }
 
         // Compile illegal
@@ -224,7 +267,7 @@ internal final class ModeCompiler {
         var containsModes: [ContainsEntry] = []
         if let variants = mode.variants {
             for variantBox in variants {
-                let merged = mergeMode(mode, variantBox.value)
+                let merged = mergedMode(mode, variantBox.value)
                 containsModes.append(contentsOf: expandContains(merged.contains, selfMode: merged))
             }
         } else {
@@ -315,7 +358,7 @@ internal final class ModeCompiler {
                 let m = mBox.value
                 if let variants = m.variants {
                     for variantBox in variants {
-                        result.append(ContainsEntry(mode: mergeMode(m, variantBox.value), isSelfReference: false))
+                        result.append(ContainsEntry(mode: mergedMode(m, variantBox.value), isSelfReference: false))
                     }
                 } else {
                     result.append(ContainsEntry(mode: m, isSelfReference: false))
@@ -325,6 +368,16 @@ internal final class ModeCompiler {
         return result
     }
 
+    private func mergedMode(_ base: Mode, _ variant: Mode) -> Mode {
+        let key = MergeKey(base: base.id, variant: variant.id)
+        if let cached = mergedModes[key] {
+            return cached
+        }
+        let merged = mergeMode(base, variant)
+        mergedModes[key] = merged
+        return merged
+    }
+
     private func mergeMode(_ base: Mode, _ override: Mode) -> Mode {
         Mode(
             scope: override.scope ?? base.scope,
@@ -389,7 +442,17 @@ internal final class ModeCompiler {
     }
 
     private func buildModeRegex(_ mode: CompiledMode) -> ResumableMultiRegex {
-        let mm = ResumableMultiRegex(caseInsensitive: caseInsensitive, unicode: unicode)
+        Self.buildModeRegex(mode, caseInsensitive: caseInsensitive, unicode: unicode, lexerTables: language.lexerTables)
+    }
+
+    /// Builds the matcher of a compiled mode from its children, terminator and illegal pattern.
+    static func buildModeRegex(
+        _ mode: CompiledMode,
+        caseInsensitive: Bool,
+        unicode: Bool,
+        lexerTables: LexerTables? = nil
+    ) -> ResumableMultiRegex {
+        let mm = ResumableMultiRegex(caseInsensitive: caseInsensitive, unicode: unicode, lexerTables: lexerTables)
 
         for child in mode.contains {
             if let beginRe = child.beginRe {
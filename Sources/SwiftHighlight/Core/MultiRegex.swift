@@ -10,7 +10,7 @@ internal enum MatchType {
 /// Enhanced match result with metadata
 internal struct EnhancedMatch {
     let match: NSTextCheckingResult
-    let text: String
+    let text: SourceText
     let type: MatchType
     let rule: CompiledMode?
     let position: Int
@@ -20,8 +20,11 @@ internal struct EnhancedMatch {
     var range: NSRange { match.range }
     var index: Int { match.range.location }
 
-    /// Get capture group text, adjusted for this pattern's position in the combined regex
-    subscript(_ index: Int) -> String? {
+    /// The UTF-16 range of the whole match
+    var lexeme: Range<Int> { match.range.location..<(match.range.location + match.range.length) }
+
+    /// UTF-16 range of a capture group, adjusted for this pattern's position in the combined regex
+    func range(ofGroup index: Int) -> Range<Int>? {
         // In the combined regex, each pattern is wrapped in ().
         // groupOffset is the index of that wrapper group.
         // The pattern's own groups are at groupOffset+1, groupOffset+2, etc.
@@ -30,37 +33,45 @@ internal struct EnhancedMatch {
         guard adjustedIndex < match.numberOfRanges else { return nil }
         let range = match.range(at: adjustedIndex)
         guard range.location != NSNotFound else { return nil }
-        guard range.location + range.length <= text.utf16.count else { return nil }
-        let nsText = text as NSString
-        return nsText.substring(with: range)
+        guard range.location + range.length <= text.length else { return nil }
+        return range.location..<(range.location + range.length)
+    }
+
+    /// Get capture group text, adjusted for this pattern's position in the combined regex
+    subscript(_ index: Int) -> String? {
+        range(ofGroup: index).map { text.substring($0) }
     }
 }
 
 /// A multi-pattern regex matcher
 /// Combines multiple patterns into one large alternation and tracks which one matched
 internal final class MultiRegex {
-    private var matchIndexes: [Int: (MatchType, CompiledMode?, Int)] = [:]
     private var regexes: [(pattern: String, type: MatchType, rule: CompiledMode?)] = []
     private var matchAt = 1
-    private var position = 0
+    /// Wrapper group and own capture count of each rule, in rule order
+    private var ruleGroups: [(group: Int, captures: Int)] = []
 
     private var matcherRe: NSRegularExpression?
-    var lastIndex = 0
+    private var lexer: LexerTable?
+    private var prefilter: RegexPrefilter?
 
     private let caseInsensitive: Bool
     private let unicode: Bool
+    private let lexerTables: LexerTables?
 
-    init(caseInsensitive: Bool = false, unicode: Bool = false) {
+    init(caseInsensitive: Bool = false, unicode: Bool = false, lexerTables: LexerTables? = nil) {
         self.caseInsensitive = caseInsensitive
         self.unicode = unicode
+        self.lexerTables = lexerTables
     }
 
-    func addRule(_ pattern: String, type: MatchType, rule: CompiledMode? = nil) {
-        let pos = position
-        position += 1
-        matchIndexes[matchAt] = (type, rule, pos)
+    /// Adds a rule. `captures` is the pattern's capture group count when already
+    /// known (e.g. from a `LanguageSnapshot`); otherwise it is counted here.
+    func addRule(_ pattern: String, type: MatchType, rule: CompiledMode? = nil, captures: Int? = nil) {
         regexes.append((pattern, type, rule))
-        matchAt += Regex.countMatchGroups(pattern) + 1
+        let captures = captures ?? Regex.countMatchGroups(pattern)
+        ruleGroups.append((matchAt, captures))
+        matchAt += captures + 1
     }
 
     func compile() {
@@ -71,67 +82,149 @@ internal final class MultiRegex {
 
         let patterns = regexes.map { $0.pattern }
         let combined = Regex.rewriteBackreferences(patterns, joinWith: "|")
+        matcherRe = try? NSRegularExpression(pattern: combined, options: regexOptions)
 
+        // Tables do not model case folding; the regex stays for capture groups.
+        if matcherRe != nil, !caseInsensitive, let table = lexerTables?.table(for: combined),
+           table.ruleCount == regexes.count {
+            lexer = table
+        }
+        if matcherRe != nil, lexer == nil {
+            prefilter = RegexPrefilter(patterns: patterns, caseInsensitive: caseInsensitive)
+        }
+    }
+
+    /// Compiles a combined pattern built ahead of time instead of joining the rules.
+    /// Returns false, leaving the matcher uncompiled, if the pattern's capture
+    /// groups do not line up with the rules added so far.
+    func compile(combinedPattern: String) -> Bool {
+        guard let regex = try? NSRegularExpression(pattern: combinedPattern, options: regexOptions),
+              regex.numberOfCaptureGroups == matchAt - 1 else {
+            return false
+        }
+        matcherRe = regex
+        prefilter = RegexPrefilter(patterns: regexes.map { $0.pattern }, caseInsensitive: caseInsensitive)
+        return true
+    }
+
+    private var regexOptions: NSRegularExpression.Options {
         var options: NSRegularExpression.Options = [.anchorsMatchLines]
         if caseInsensitive {
             options.insert(.caseInsensitive)
         }
-
-        matcherRe = try? NSRegularExpression(pattern: combined, options: options)
+        return options
     }
 
-    func exec(_ string: String) -> EnhancedMatch? {
+    /// Finds the first match at or after the UTF-16 offset `lastIndex`.
+    func exec(_ text: SourceText, from lastIndex: Int) -> EnhancedMatch? {
         guard let regex = matcherRe else { return nil }
 
-        let searchRange = NSRange(location: lastIndex, length: string.utf16.count - lastIndex)
-        guard let match = regex.firstMatch(in: string, options: [], range: searchRange) else {
-            return nil
-        }
-
-        // Find which group matched
-        var matchedIndex: Int?
-        for i in 1..<match.numberOfRanges {
-            if match.range(at: i).location != NSNotFound {
-                matchedIndex = i
-                break
+        let match: NSTextCheckingResult
+        let matchedRule: Int?
+        if let lexer = lexer {
+            guard let found = lexerMatch(lexer, regex: regex, in: text, from: lastIndex) else { return nil }
+            match = found.match
+            matchedRule = found.rule
+        } else {
+            var start = lastIndex
+            var options: NSRegularExpression.MatchingOptions = []
+            if let prefilter = prefilter {
+                guard let candidate = prefilter.firstCandidate(in: text.units, from: lastIndex) else {
+                    return nil
+                }
+                if candidate > lastIndex {
+                    // Nothing can match before the candidate. With transparent
+                    // bounds `^` and `\b` see the skipped text there, as they
+                    // would searching from `lastIndex`.
+                    start = candidate
+                    options = [.withTransparentBounds, .withoutAnchoringBounds]
+                }
+            }
+            let searchRange = NSRange(location: start, length: text.length - start)
+            guard let found = regex.firstMatch(in: text.string, options: options, range: searchRange) else {
+                return nil
             }
+            match = found
+            matchedRule = nil
         }
 
-        guard let idx = matchedIndex,
-              let (type, rule, pos) = matchIndexes[idx] else {
+        // Find which rule matched by its wrapper group, skipping the rules' own groups
+        guard let pos = matchedRule ?? ruleGroups.firstIndex(where: {
+            match.range(at: $0.group).location != NSNotFound
+        }) else {
             return nil
         }
+        let (type, rule) = (regexes[pos].type, regexes[pos].rule)
 
         return EnhancedMatch(
             match: match,
-            text: string,
+            text: text,
             type: type,
             rule: rule,
             position: pos,
-            groupOffset: idx  // Pass the matched group index as offset
+            groupOffset: ruleGroups[pos].group
         )
     }
+
+    /// Finds the next match with the lexer table and shapes it like a match
+    /// of the combined regex.
+    private func lexerMatch(
+        _ lexer: LexerTable,
+        regex: NSRegularExpression,
+        in text: SourceText,
+        from lastIndex: Int
+    ) -> (match: NSTextCheckingResult, rule: Int)? {
+        guard let found = lexer.firstMatch(in: text.units, from: lastIndex) else { return nil }
+        let (group, captures) = ruleGroups[found.rule]
+
+        if captures > 0 {
+            // The table does not track the rule's own groups. The regex fills
+            // them in, anchored where the table found the match, seeing the
+            // text before it as the unanchored search would.
+            var options: NSRegularExpression.MatchingOptions = [.anchored]
+            if found.location > lastIndex {
+                options.formUnion([.withTransparentBounds, .withoutAnchoringBounds])
+            }
+            let range = NSRange(location: found.location, length: text.length - found.location)
+            return regex.firstMatch(in: text.string, options: options, range: range).map { ($0, found.rule) }
+        }
+
+        var ranges = [NSRange](repeating: NSRange(location: NSNotFound, length: 0), count: matchAt)
+        ranges[0] = NSRange(location: found.location, length: found.length)
+        ranges[group] = ranges[0]
+        let match = ranges.withUnsafeMutableBufferPointer { buffer in
+            NSTextCheckingResult.regularExpressionCheckingResult(
+                ranges: buffer.baseAddress!,
+                count: buffer.count,
+                regularExpression: regex
+            )
+        }
+        return (match, found.rule)
+    }
 }
 
 /// A resumable multi-regex that can skip previously matched patterns
+///
+/// The scan position lives with the caller, so parses on different threads can
+/// share one matcher; the matchers for resuming are built on first use under a lock.
 internal final class ResumableMultiRegex {
-    private var rules: [(pattern: String, type: MatchType, rule: CompiledMode?)] = []
+    private var rules: [(pattern: String, type: MatchType, rule: CompiledMode?, captures: Int?)] = []
     private var multiRegexes: [Int: MultiRegex] = [:]
+    private let lock = NSLock()
     private var count = 0
 
-    var lastIndex = 0
-    var regexIndex = 0
-
     private let caseInsensitive: Bool
     private let unicode: Bool
+    private let lexerTables: LexerTables?
 
-    init(caseInsensitive: Bool = false, unicode: Bool = false) {
+    init(caseInsensitive: Bool = false, unicode: Bool = false, lexerTables: LexerTables? = nil) {
         self.caseInsensitive = caseInsensitive
         self.unicode = unicode
+        self.lexerTables = lexerTables
     }
 
-    func addRule(_ pattern: String, type: MatchType, rule: CompiledMode? = nil) {
-        rules.append((pattern, type, rule))
+    func addRule(_ pattern: String, type: MatchType, rule: CompiledMode? = nil, captures: Int? = nil) {
+        rules.append((pattern, type, rule, captures))
         if type == .begin {
             count += 1
         }
@@ -142,50 +235,64 @@ internal final class ResumableMultiRegex {
         _ = getMatcher(0)
     }
 
+    /// Installs the first matcher from a combined pattern built ahead of time
+    /// (see `LanguageSnapshot`). Returns false if the pattern does not fit the
+    /// rules, in which case nothing is installed.
+    func compile(combinedPattern: String) -> Bool {
+        let matcher = makeMatcher(0)
+        guard matcher.compile(combinedPattern: combinedPattern) else {
+            return false
+        }
+        lock.lock()
+        multiRegexes[0] = matcher
+        lock.unlock()
+        return true
+    }
+
     private func getMatcher(_ index: Int) -> MultiRegex {
+        lock.lock()
+        defer { lock.unlock() }
         if let existing = multiRegexes[index] {
             return existing
         }
 
-        let matcher = MultiRegex(caseInsensitive: caseInsensitive, unicode: unicode)
-        for (pattern, type, rule) in rules.dropFirst(index) {
-            matcher.addRule(pattern, type: type, rule: rule)
-        }
+        let matcher = makeMatcher(index)
         matcher.compile()
         multiRegexes[index] = matcher
         return matcher
     }
 
-    func resumingScanAtSamePosition() -> Bool {
-        regexIndex != 0
-    }
-
-    func considerAll() {
-        regexIndex = 0
+    private func makeMatcher(_ index: Int) -> MultiRegex {
+        let matcher = MultiRegex(caseInsensitive: caseInsensitive, unicode: unicode, lexerTables: lexerTables)
+        for (pattern, type, rule, captures) in rules.dropFirst(index) {
+            matcher.addRule(pattern, type: type, rule: rule, captures: captures)
+        }
+        return matcher
     }
 
-    func exec(_ string: String) -> EnhancedMatch? {
-        let m = getMatcher(regexIndex)
-        m.lastIndex = lastIndex
-        var result = m.exec(string)
+    /// Finds the next match from the UTF-16 offset `lastIndex`.
+    ///
+    /// `regexIndex` is the number of rules to skip: 0 to consider all of them,
+    /// or what the previous call left to resume at the same position after a
+    /// match was ignored. It is advanced past the rule that matched.
+    func exec(_ text: SourceText, from lastIndex: Int, regexIndex: inout Int) -> EnhancedMatch? {
+        var result = getMatcher(regexIndex).exec(text, from: lastIndex)
 
         // If resuming and we got a match at the same position, it's valid
         // Otherwise, try the full matcher from the next position
-        if resumingScanAtSamePosition() {
+        if regexIndex != 0 {
             if let r = result, r.index == lastIndex {
                 // Valid resume match - keep result as-is
             } else {
                 // Try full matcher from lastIndex + 1
-                let m2 = getMatcher(0)
-                m2.lastIndex = lastIndex + 1
-                result = m2.exec(string)
+                result = getMatcher(0).exec(text, from: lastIndex + 1)
             }
         }
 
         if let result = result {
             regexIndex += result.position + 1
             if regexIndex == count {
-                considerAll()
+                regexIndex = 0
             }
         }
 
@@ -0,0 +1,217 @@
+import Foundation
+
+/// The parse loop's state at the top of an iteration, recorded at line starts
+/// so a later parse of an edited copy of the code can resume from it.
+internal struct ParseCheckpoint {
+    /// UTF-16 offset the next match is searched from
+    let position: Int
+    /// Text collected for the current mode and not emitted yet
+    let buffer: Range<Int>
+    /// The runtime mode stack
+    let top: CompiledMode
+    /// Scopes of the emitter nodes open for the modes on the stack, outermost first
+    let scopes: [String]
+    let relevance: Int
+    let keywordHits: [String: Int]
+    let lastMatchType: MatchType?
+    let lastMatchIndex: Int?
+
+    init(
+        position: Int,
+        buffer: Range<Int>,
+        top: CompiledMode,
+        scopes: [String],
+        relevance: Int,
+        keywordHits: [String: Int],
+        lastMatchType: MatchType?,
+        lastMatchIndex: Int?
+    ) {
+        self.position = position
+        self.buffer = buffer
+        self.top = top
+        self.scopes = scopes
+        self.relevance = relevance
+        self.keywordHits = keywordHits
+        self.lastMatchType = lastMatchType
+        self.lastMatchIndex = lastMatchIndex
+    }
+
+    /// The state before the first iteration, with `top` (the language or a
+    /// continuation mode) on the stack.
+    init(start top: CompiledMode, language: CompiledMode) {
+        var scopes: [String] = []
+        var current: CompiledMode? = top
+        while let mode = current, mode !== language {
+            if let scope = mode.scope {
+                scopes.insert(scope, at: 0)
+            }
+            current = mode.parent
+        }
+        self.init(
+            position: 0,
+            buffer: 0..<0,
+            top: top,
+            scopes: scopes,
+            relevance: 0,
+            keywordHits: [:],
+            lastMatchType: nil,
+            lastMatchIndex: nil
+        )
+    }
+
+    /// The same state with every offset moved by `offset`, for code edited before it
+    func moved(by offset: Int) -> ParseCheckpoint {
+        ParseCheckpoint(
+            position: position + offset,
+            buffer: (buffer.lowerBound + offset)..<(buffer.upperBound + offset),
+            top: top,
+            scopes: scopes,
+            relevance: relevance,
+            keywordHits: keywordHits,
+            lastMatchType: lastMatchType,
+            lastMatchIndex: lastMatchIndex.map { $0 + offset }
+        )
+    }
+
+    /// The first offset whose text has not been emitted
+    var pending: Int {
+        buffer.isEmpty ? position : buffer.lowerBound
+    }
+
+    /// Whether a parse that reached `other`, `offset` UTF-16 units later in an
+    /// edited copy of the code, continues exactly as the parse that recorded this
+    /// checkpoint. Relevance and keyword hits are not compared: they only add up.
+    func converges(with other: ParseCheckpoint, offset: Int) -> Bool {
+        guard position + offset == other.position,
+              buffer.count == other.buffer.count,
+              buffer.isEmpty || buffer.lowerBound + offset == other.buffer.lowerBound,
+              guardsZeroWidthEnd == other.guardsZeroWidthEnd,
+              scopes == other.scopes else {
+            return false
+        }
+        var mine: CompiledMode? = top
+        var theirs: CompiledMode? = other.top
+        while let a = mine, let b = theirs {
+            guard (a.origin ?? a) === (b.origin ?? b) else { return false }
+            mine = a.parent
+            theirs = b.parent
+        }
+        return mine == nil && theirs == nil
+    }
+
+    /// Whether an empty end match at `position` is skipped as the end of a
+    /// zero-width begin; the only way the last match affects what follows.
+    private var guardsZeroWidthEnd: Bool {
+        lastMatchType == .begin && lastMatchIndex == position
+    }
+}
+
+/// What `Highlight.updateDocument` needs besides the document's text and lines.
+///
+/// Checkpoints hold runtime modes, which are never changed once created. They
+/// are only resumed with the compiled language they came from, which
+/// `updateDocument` checks by identity first.
+internal final class DocumentState: @unchecked Sendable {
+    /// The compiled language the checkpoints belong to
+    let language: CompiledMode
+    /// UTF-16 offsets at which lines start
+    let lineStarts: [Int]
+    /// Checkpoints in increasing order of position
+    let checkpoints: [ParseCheckpoint]
+
+    init(language: CompiledMode, lineStarts: [Int], checkpoints: [ParseCheckpoint]) {
+        self.language = language
+        self.lineStarts = lineStarts
+        self.checkpoints = checkpoints
+    }
+
+    /// Index of the last checkpoint at or before `position`
+    func lastCheckpoint(atOrBefore position: Int) -> Int? {
+        let index = partitionPoint(checkpoints.count) { checkpoints[$0].position > position }
+        return index > 0 ? index - 1 : nil
+    }
+
+    /// Index of the checkpoint at exactly `position`
+    func checkpoint(at position: Int) -> Int? {
+        let index = partitionPoint(checkpoints.count) { checkpoints[$0].position >= position }
+        return index < checkpoints.count && checkpoints[index].position == position ? index : nil
+    }
+}
+
+/// Index of the line holding the UTF-16 offset `offset`.
+internal func lineIndex(containing offset: Int, lineStarts: [Int]) -> Int {
+    max(partitionPoint(lineStarts.count) { lineStarts[$0] > offset } - 1, 0)
+}
+
+/// The first index in `0..<count` for which `isAfter` holds, given that it
+/// holds for every index after that one too.
+private func partitionPoint(_ count: Int, _ isAfter: (Int) -> Bool) -> Int {
+    var low = 0
+    var high = count
+    while low < high {
+        let mid = (low + high) / 2
+        if isAfter(mid) {
+            high = mid
+        } else {
+            low = mid + 1
+        }
+    }
+    return low
+}
+
+/// Cuts runs of text into the tokens of each line. The `\n` ending a line
+/// belongs to no token, and neighbouring runs with the same scopes are merged.
+internal struct LineTokenBuilder {
+    private let lineStarts: [Int]
+    private let length: Int
+    private(set) var lines: [HighlightedLine] = []
+    private var line: Int
+    private var tokens: [HighlightToken] = []
+
+    /// Starts collecting at line `firstLine`.
+    init(lineStarts: [Int], length: Int, firstLine: Int) {
+        self.lineStarts = lineStarts
+        self.length = length
+        self.line = firstLine
+    }
+
+    /// Adds a run; runs must come in order.
+    mutating func add(_ range: Range<Int>, scopes: [String]) {
+        var start = range.lowerBound
+        while start < range.upperBound {
+            while line + 1 < lineStarts.count && lineStarts[line + 1] <= start {
+                finishLine()
+            }
+            let lineStart = lineStarts[line]
+            let contentEnd = line + 1 < lineStarts.count ? lineStarts[line + 1] - 1 : length
+            let end = min(range.upperBound, contentEnd)
+            if start < end {
+                append(HighlightToken(range: (start - lineStart)..<(end - lineStart), scopes: scopes))
+            }
+            // Step over the line break
+            start = max(end, contentEnd + 1)
+        }
+    }
+
+    /// Finishes every line up to and including `lastLine`.
+    mutating func finish(through lastLine: Int) -> [HighlightedLine] {
+        while line <= lastLine {
+            finishLine()
+        }
+        return lines
+    }
+
+    private mutating func append(_ token: HighlightToken) {
+        if let last = tokens.last, last.scopes == token.scopes, last.range.upperBound == token.range.lowerBound {
+            tokens[tokens.count - 1] = HighlightToken(range: last.range.lowerBound..<token.range.upperBound, scopes: token.scopes)
+        } else {
+            tokens.append(token)
+        }
+    }
+
+    private mutating func finishLine() {
+        lines.append(HighlightedLine(tokens: tokens))
+        tokens = []
+        line += 1
+    }
+}
@@ -0,0 +1,1251 @@
+import Foundation
+
+/// The parse loop and the entry points built on it, apart from the `Highlight`
+/// actor so that parses can run on any thread.
+///
+/// A parser holds the registered languages as they were when it was created and
+/// keeps each parse's state in locals; compiled modes and their matchers are
+/// only read. One parser can therefore run any number of parses at once.
+internal struct Parser: Sendable {
+    /// The languages to parse with
+    let languageSet: LanguageSet
+
+    /// Configuration options
+    let options: HighlightOptions
+
+    /// Results of earlier parses, shared with the other parsers of the same `Highlight`
+    let resultCache: ResultCache?
+
+    /// Per-mode counters of the parse loop; nil unless `options.profiling` is set
+    let profiler: Profiler?
+
+    /// Maximum keyword hits before stopping relevance counting
+    private let maxKeywordHits = 7
+
+    init(languageSet: LanguageSet, options: HighlightOptions, resultCache: ResultCache? = nil, profiler: Profiler? = nil) {
+        self.languageSet = languageSet
+        self.options = options
+        self.resultCache = resultCache
+        self.profiler = profiler
+    }
+
+    /// Parses code and returns the token tree; errors end up in the result.
+    func parse(
+        _ code: String,
+        language: String,
+        ignoreIllegals: Bool = true
+    ) -> ParseResult {
+        guard let cache = resultCache else {
+            return parseUncached(code, language: language, ignoreIllegals: ignoreIllegals)
+        }
+        let key = cacheKey(code, language: language, ignoreIllegals: ignoreIllegals)
+        if let cached = cache.result(for: key) {
+            return cached
+        }
+        let result = parseUncached(code, language: language, ignoreIllegals: ignoreIllegals)
+        cache.insert(result, for: key)
+        return result
+    }
+
+    private func parseUncached(_ code: String, language: String, ignoreIllegals: Bool) -> ParseResult {
+        do {
+            return try _parse(language: language, code: code, ignoreIllegals: ignoreIllegals)
+        } catch {
+            // Return empty tree on error
+            let emptyTree = TokenTree(root: ScopeNode(), language: language)
+            return ParseResult(
+                language: language,
+                tokenTree: emptyTree,
+                relevance: 0,
+                illegal: false,
+                code: code,
+                errorRaised: error
+            )
+        }
+    }
+
+    /// Parses code into `sink`; see `Highlight.parse(_:language:ignoreIllegals:into:)`.
+    func parse<Sink: TokenSink>(
+        _ code: String,
+        language: String,
+        ignoreIllegals: Bool,
+        into sink: inout Sink
+    ) -> TokenStreamResult {
+        let stream = TokenStream(sink)
+        defer {
+            if let result = stream.sink as? Sink {
+                sink = result
+            }
+        }
+
+        let source = SourceText(code)
+        let emitter = TokenTreeEmitter(options: options, source: source, stream: stream)
+        let result: TokenStreamResult
+        do {
+            let compiled = try languageSet.compiledLanguage(language)
+            let (relevance, _) = try scan(
+                source,
+                language: compiled,
+                emitter: emitter,
+                ignoreIllegals: ignoreIllegals,
+                from: ParseCheckpoint(start: compiled, language: compiled)
+            )
+            result = TokenStreamResult(language: language, relevance: relevance, illegal: false)
+        } catch {
+            result = TokenStreamResult(language: language, relevance: 0, illegal: false, errorRaised: error)
+        }
+        emitter.finalize()
+        stream.finish()
+        return result
+    }
+
+    /// Parses and renders code.
+    func highlight<R: TokenRenderer>(
+        _ code: String,
+        language: String,
+        ignoreIllegals: Bool = true,
+        renderer: R
+    ) -> HighlightResult<R.Output> {
+        let parseResult = parse(code, language: language, ignoreIllegals: ignoreIllegals)
+
+        // The cache keeps the HTML of the default renderer next to the tree
+        guard let cache = resultCache,
+              let htmlRenderer = renderer as? HTMLRenderer,
+              htmlRenderer.theme.classPrefix == options.classPrefix else {
+            return render(parseResult, renderer: renderer)
+        }
+        let key = cacheKey(code, language: language, ignoreIllegals: ignoreIllegals)
+        if let html = cache.html(for: key), let output = html as? R.Output {
+            return HighlightResult(
+                language: parseResult.language,
+                value: output,
+                relevance: parseResult.relevance,
+                illegal: parseResult.illegal,
+                code: code,
+                tokenTree: parseResult.tokenTree,
+                errorRaised: parseResult.errorRaised
+            )
+        }
+        let result = render(parseResult, renderer: renderer)
+        if let html = result.value as? String {
+            cache.setHTML(html, for: key)
+        }
+        return result
+    }
+
+    /// Highlights code with the likeliest candidate languages and ranks the results.
+    ///
+    /// The candidates are parsed in parallel, and only the best and second-best
+    /// results are rendered.
+    func highlightAuto<R: TokenRenderer>(
+        _ code: String,
+        languageSubset: [String]?,
+        renderer: R
+    ) -> AutoHighlightResult<R.Output> {
+        let subset = languageSubset ?? options.languages ?? Array(languageSet.languages.keys)
+        let candidates = rankedCandidates(
+            subset.filter { languageSet.getLanguage($0).map { !$0.disableAutodetect } ?? false },
+            code: code
+        )
+
+        let parses = ParseSlots(count: candidates.count)
+        DispatchQueue.concurrentPerform(iterations: candidates.count) { index in
+            parses[index] = parse(code, language: candidates[index], ignoreIllegals: false)
+        }
+
+        // Plaintext first, so it wins ties, then the candidates in rank order
+        var results: [ParseResult?] = [nil]
+        results += parses.values.filter { !$0.illegal }.map { Optional($0) }
+        let ranked = results.enumerated().sorted { a, b in
+            let (first, second) = (a.element?.relevance ?? 0, b.element?.relevance ?? 0)
+            return first != second ? first > second : a.offset < b.offset
+        }.map { $0.element }
+
+        func rendered(_ result: ParseResult?) -> HighlightResult<R.Output> {
+            result.map { render($0, renderer: renderer) } ?? justTextResult(code, renderer: renderer)
+        }
+        let best = rendered(ranked[0])
+        let secondBest = ranked.count > 1 ? rendered(ranked[1]) : nil
+
+        return AutoHighlightResult(result: best, secondBest: secondBest)
+    }
+
+    /// See `Highlight.highlightDocument(_:language:)`.
+    func highlightDocument(_ code: String, language: String) throws -> HighlightDocument {
+        let compiled = try languageSet.compiledLanguage(language)
+        return try parseDocument(SourceText(code), language: language, compiled: compiled)
+    }
+
+    /// See `Highlight.updateDocument(_:replacing:with:)`.
+    func updateDocument(
+        _ document: HighlightDocument,
+        replacing range: Range<Int>,
+        with text: String
+    ) throws -> HighlightDocumentUpdate {
+        precondition(range.lowerBound >= 0 && range.upperBound <= document.source.length, "Edit range out of bounds")
+        let compiled = try languageSet.compiledLanguage(document.language)
+        let source = document.source.replacing(range, with: text)
+        let old = document.state
+
+        // Checkpoints of a language since re-registered cannot be resumed
+        guard compiled === old.language else {
+            let updated = try parseDocument(source, language: document.language, compiled: compiled)
+            return HighlightDocumentUpdate(
+                document: updated,
+                replacedLines: 0..<document.lines.count,
+                changedLines: 0..<updated.lines.count
+            )
+        }
+
+        let delta = text.utf16.count - range.count
+        let editEnd = range.upperBound + delta
+
+        // Lines start where they did before the edit, after each line break it
+        // inserts, and where they did after it, moved by the change in length
+        var lineStarts = Array(old.lineStarts.prefix { $0 <= range.lowerBound })
+        for (offset, unit) in text.utf16.enumerated() where unit == 0x0A {
+            lineStarts.append(range.lowerBound + offset + 1)
+        }
+        lineStarts += old.lineStarts.drop { $0 <= range.upperBound }.map { $0 + delta }
+
+        // Resume a line early, so matches that looked past the end of the line
+        // before the edit are tried again
+        let editLine = lineIndex(containing: range.lowerBound, lineStarts: old.lineStarts)
+        let resumeIndex = old.lastCheckpoint(atOrBefore: old.lineStarts[max(editLine - 1, 0)])
+        let start = resumeIndex.map { old.checkpoints[$0] } ?? ParseCheckpoint(start: compiled, language: compiled)
+
+        let emitter = TokenTreeEmitter(options: options, source: source)
+        var checkpoints = Array(old.checkpoints[..<(resumeIndex ?? 0)])
+        var converged: Int?
+        let (scanRelevance, stoppedAt) = try scan(
+            source,
+            language: compiled,
+            emitter: emitter,
+            ignoreIllegals: true,
+            from: start,
+            lineStarts: lineStarts
+        ) { checkpoint in
+            checkpoints.append(checkpoint)
+            guard checkpoint.pending >= editEnd,
+                  let index = old.checkpoint(at: checkpoint.position - delta),
+                  old.checkpoints[index].converges(with: checkpoint, offset: delta) else {
+                return false
+            }
+            converged = index
+            return true
+        }
+        emitter.finalize()
+
+        // Tokens before the checkpoint are kept, the parse supplies the ones after it
+        let firstLine = lineIndex(containing: start.pending, lineStarts: lineStarts)
+        let firstLineStart = lineStarts[firstLine]
+        var builder = LineTokenBuilder(lineStarts: lineStarts, length: source.length, firstLine: firstLine)
+        for token in document.lines[firstLine].tokens where firstLineStart + token.range.lowerBound < start.pending {
+            let end = min(firstLineStart + token.range.upperBound, start.pending)
+            builder.add((firstLineStart + token.range.lowerBound)..<end, scopes: token.scopes)
+        }
+        emitter.forEachRun(from: start.pending) { builder.add($0, scopes: $1) }
+
+        guard let stop = stoppedAt, let oldIndex = converged else {
+            let changed = builder.finish(through: lineStarts.count - 1)
+            let updated = HighlightDocument(
+                language: document.language,
+                lines: Array(document.lines[..<firstLine]) + changed,
+                relevance: scanRelevance,
+                source: source,
+                state: DocumentState(language: compiled, lineStarts: lineStarts, checkpoints: checkpoints)
+            )
+            return HighlightDocumentUpdate(
+                document: updated,
+                replacedLines: firstLine..<document.lines.count,
+                changedLines: firstLine..<(firstLine + changed.count)
+            )
+        }
+
+        // From where the parses converged, the previous tokens hold, moved by the edit
+        let oldStop = old.checkpoints[oldIndex]
+        let oldLine = lineIndex(containing: oldStop.pending, lineStarts: old.lineStarts)
+        let oldLineStart = old.lineStarts[oldLine]
+        for token in document.lines[oldLine].tokens where oldLineStart + token.range.upperBound > oldStop.pending {
+            let lower = max(oldLineStart + token.range.lowerBound, oldStop.pending)
+            builder.add((lower + delta)..<(oldLineStart + token.range.upperBound + delta), scopes: token.scopes)
+        }
+        let changed = builder.finish(through: lineIndex(containing: stop.pending, lineStarts: lineStarts))
+        checkpoints += old.checkpoints[(oldIndex + 1)...].map { $0.moved(by: delta) }
+
+        let updated = HighlightDocument(
+            language: document.language,
+            lines: Array(document.lines[..<firstLine]) + changed + document.lines[(oldLine + 1)...],
+            relevance: scanRelevance + document.relevance - oldStop.relevance,
+            source: source,
+            state: DocumentState(language: compiled, lineStarts: lineStarts, checkpoints: checkpoints)
+        )
+        return HighlightDocumentUpdate(
+            document: updated,
+            replacedLines: firstLine..<(oldLine + 1),
+            changedLines: firstLine..<(firstLine + changed.count)
+        )
+    }
+
+    // MARK: - Private Implementation
+
+    private func cacheKey(_ code: String, language: String, ignoreIllegals: Bool) -> ResultCache.Key {
+        ResultCache.Key(
+            code: code,
+            language: language,
+            ignoreIllegals: ignoreIllegals,
+            generation: languageSet.generation,
+            classPrefix: options.classPrefix,
+            autoDetectLanguages: options.languages,
+            autoDetectCandidates: options.autoDetectCandidates
+        )
+    }
+
+    private func render<R: TokenRenderer>(_ parseResult: ParseResult, renderer: R) -> HighlightResult<R.Output> {
+        HighlightResult(
+            language: parseResult.language,
+            value: renderer.render(parseResult.tokenTree, codeLength: parseResult.code.utf8.count),
+            relevance: parseResult.relevance,
+            illegal: parseResult.illegal,
+            code: parseResult.code,
+            tokenTree: parseResult.tokenTree,
+            errorRaised: parseResult.errorRaised
+        )
+    }
+
+    /// The candidates worth a full parse, likeliest first: languages named by a
+    /// `#!` line or modeline, then by the relevance their keywords would score,
+    /// then in the given order. All of them if `options.autoDetectCandidates` is nil.
+    private func rankedCandidates(_ candidates: [String], code: String) -> [String] {
+        guard let limit = options.autoDetectCandidates, candidates.count > limit else {
+            return candidates
+        }
+        let hinted = Set(languageHints(in: code).compactMap { languageSet.registeredName($0) })
+        let scores = languageSet.keywordIndex.scores(for: code, maxHits: maxKeywordHits)
+        let ranked = candidates.enumerated().map { offset, name in
+            let key = languageSet.registeredName(name) ?? name
+            return (name: name, hinted: hinted.contains(key), score: scores[key] ?? 0, offset: offset)
+        }.sorted { a, b in
+            if a.hinted != b.hinted {
+                return a.hinted
+            }
+            return a.score != b.score ? a.score > b.score : a.offset < b.offset
+        }
+        return ranked.prefix(max(limit, 1)).map { $0.name }
+    }
+
+    private func justTextResult<R: TokenRenderer>(_ code: String, renderer: R) -> HighlightResult<R.Output> {
+        // Create a simple token tree with just the text
+        let root = ScopeNode(children: [.text(code)])
+        let tree = TokenTree(root: root, language: "plaintext")
+        let output = renderer.render(tree, codeLength: code.utf8.count)
+
+        return HighlightResult(
+            language: "plaintext",
+            value: output,
+            relevance: 0,
+            illegal: false,
+            code: code,
+            tokenTree: tree
+        )
+    }
+
+    private func _parse(
+        language languageName: String,
+        code: String,
+        ignoreIllegals: Bool,
+        continuation: CompiledMode? = nil
+    ) throws -> ParseResult {
+        let language = try languageSet.compiledLanguage(languageName)
+        // One UTF-16 buffer for the whole parse; lexemes and gaps stay ranges of it
+        let source = SourceText(code)
+        let emitter = TokenTreeEmitter(options: options, source: source)
+        let (relevance, _) = try scan(
+            source,
+            language: language,
+            emitter: emitter,
+            ignoreIllegals: ignoreIllegals,
+            from: ParseCheckpoint(start: continuation ?? language, language: language)
+        )
+
+        emitter.finalize()
+        let tokenTree = TokenTree(tokens: emitter.tokens, language: languageName)
+
+        return ParseResult(
+            language: languageName,
+            tokenTree: tokenTree,
+            relevance: relevance,
+            illegal: false,
+            code: code
+        )
+    }
+
+    /// Parses a whole document, recording a checkpoint at each line start.
+    private func parseDocument(_ source: SourceText, language: String, compiled: CompiledMode) throws -> HighlightDocument {
+        let lineStarts = source.lineStarts()
+        let emitter = TokenTreeEmitter(options: options, source: source)
+        var checkpoints: [ParseCheckpoint] = []
+        let (relevance, _) = try scan(
+            source,
+            language: compiled,
+            emitter: emitter,
+            ignoreIllegals: true,
+            from: ParseCheckpoint(start: compiled, language: compiled),
+            lineStarts: lineStarts
+        ) { checkpoint in
+            checkpoints.append(checkpoint)
+            return false
+        }
+        emitter.finalize()
+
+        var builder = LineTokenBuilder(lineStarts: lineStarts, length: source.length, firstLine: 0)
+        emitter.forEachRun(from: 0) { builder.add($0, scopes: $1) }
+        return HighlightDocument(
+            language: language,
+            lines: builder.finish(through: lineStarts.count - 1),
+            relevance: relevance,
+            source: source,
+            state: DocumentState(language: compiled, lineStarts: lineStarts, checkpoints: checkpoints)
+        )
+    }
+
+    /// Runs the parse loop over `source` from the state in `start`, emitting into `emitter`.
+    ///
+    /// With `lineStarts`, `record` is called with the state at the first iteration
+    /// on or after each line start. Returning true stops the scan there, before the
+    /// pending buffer is emitted, and the checkpoint is returned as `stoppedAt`.
+    private func scan(
+        _ source: SourceText,
+        language: CompiledMode,
+        emitter: TokenTreeEmitter,
+        ignoreIllegals: Bool,
+        from start: ParseCheckpoint,
+        lineStarts: [Int] = [],
+        record: (ParseCheckpoint) -> Bool = { _ in false }
+    ) throws -> (relevance: Int, stoppedAt: ParseCheckpoint?) {
+        var keywordHits = start.keywordHits
+        var top = start.top
+        var modeBuffer = ModeBuffer()
+        modeBuffer.reset(to: start.buffer)
+        var relevance = start.relevance
+
+        // Use UTF-16 based indexing to match NSRegularExpression
+        var utf16Index = start.position
+        var resumeScanAtSamePosition = false
+        // Rules of the top mode's matcher to skip, when resuming after an ignored match
+        var regexIndex = 0
+        var lastMatchType = start.lastMatchType
+        var lastMatchIndex = start.lastMatchIndex
+
+        // Reopen the scopes of the modes on the stack
+        for scope in start.scopes {
+            emitter.openNode(scope)
+        }
+
+        // The line whose start the next checkpoint is taken at; a resumed scan
+        // records its starting state again
+        var nextLine = lineStarts.isEmpty ? 0 : lineIndex(containing: utf16Index, lineStarts: lineStarts)
+
+        // Main parsing loop
+        var iterations = 0
+
+        while utf16Index < source.length {
+            iterations += 1
+            if iterations > 100000 {
+                throw HighlightError.infiniteLoop
+            }
+
+            if !resumeScanAtSamePosition, nextLine < lineStarts.count, utf16Index >= lineStarts[nextLine] {
+                while nextLine < lineStarts.count && lineStarts[nextLine] <= utf16Index {
+                    nextLine += 1
+                }
+                let checkpoint = ParseCheckpoint(
+                    position: utf16Index,
+                    buffer: modeBuffer.range,
+                    top: top,
+                    scopes: emitter.openScopes,
+                    relevance: relevance,
+                    keywordHits: keywordHits,
+                    lastMatchType: lastMatchType,
+                    lastMatchIndex: lastMatchIndex
+                )
+                if record(checkpoint) {
+                    return (relevance, checkpoint)
+                }
+            }
+
+            if resumeScanAtSamePosition {
+                resumeScanAtSamePosition = false
+            } else {
+                regexIndex = 0
+            }
+
+            let found: EnhancedMatch?
+            if let profiler, let matcher = top.matcher {
+                let resumed = regexIndex != 0
+                let started = DispatchTime.now().uptimeNanoseconds
+                found = matcher.exec(source, from: utf16Index, regexIndex: &regexIndex)
+                let elapsed = DispatchTime.now().uptimeNanoseconds - started
+                profiler.recordExec(mode: top, language: language, match: found, resumed: resumed, nanoseconds: elapsed)
+            } else {
+                found = top.matcher?.exec(source, from: utf16Index, regexIndex: &regexIndex)
+            }
+            guard let match = found else {
+                // No more matches - add remaining text
+                modeBuffer.append(utf16Index..<source.length)
+                processBuffer(&modeBuffer, source: source, emitter: emitter, mode: top, keywordHits: &keywordHits, relevance: &relevance, language: language)
+                break
+            }
+
+            // Add text before match
+            if match.index > utf16Index {
+                modeBuffer.append(utf16Index..<match.index)
+            }
+
+            let lexeme = match.lexeme
+            let processedCount: Int
+
+            // Avoid infinite loops on zero-width begin/end at the same index.
+            if lastMatchType == .begin,
+               match.type == .end,
+               lastMatchIndex == match.index,
+               lexeme.isEmpty {
+                modeBuffer.append(utf16Index..<(utf16Index + 1))
+                utf16Index += 1
+                continue
+            }
+
+            lastMatchType = match.type
+            lastMatchIndex = match.index
+
+            switch match.type {
+            case .begin:
+                processedCount = try doBeginMatch(
+                    match: match,
+                    source: source,
+                    emitter: emitter,
+                    modeBuffer: &modeBuffer,
+                    top: &top,
+                    keywordHits: &keywordHits,
+                    relevance: &relevance,
+                    language: language,
+                    regexIndex: regexIndex,
+                    resumeScan: &resumeScanAtSamePosition
+                )
+
+            case .end:
+                let result = try doEndMatch(
+                    match: match,
+                    source: source,
+                    emitter: emitter,
+                    modeBuffer: &modeBuffer,
+                    top: &top,
+                    keywordHits: &keywordHits,
+                    relevance: &relevance,
+                    language: language
+                )
+                if let count = result {
+                    processedCount = count
+                } else {
+                    // No match - add lexeme to buffer
+                    modeBuffer.append(lexeme)
+                    processedCount = lexeme.count
+                }
+
+            case .illegal:
+                if !ignoreIllegals {
+                    throw HighlightError.illegalSyntax(lexeme: source.substring(lexeme), mode: top.scope)
+                }
+                // An empty illegal match does not advance; the iteration limit ends the loop.
+                modeBuffer.append(lexeme)
+                processedCount = lexeme.count
+            }
+
+            // Advance index
+            // processedCount is 0 to not advance (returnBegin/returnEnd), or the UTF-16 length consumed
+            utf16Index = match.index + processedCount
+        }
+
+        // Process any remaining buffer content (e.g., from excludeEnd)
+        if !modeBuffer.isEmpty {
+            processBuffer(&modeBuffer, source: source, emitter: emitter, mode: top, keywordHits: &keywordHits, relevance: &relevance, language: language)
+        }
+
+        return (relevance, nil)
+    }
+
+    private func processBuffer(
+        _ buffer: inout ModeBuffer,
+        source: SourceText,
+        emitter: TokenTreeEmitter,
+        mode: CompiledMode,
+        keywordHits: inout [String: Int],
+        relevance: inout Int,
+        language: CompiledMode
+    ) {
+        guard !buffer.isEmpty else { return }
+
+        if mode.subLanguage != nil {
+            profiler?.recordSubLanguage(mode: mode, language: language)
+            processSubLanguage(source.substring(buffer.range), emitter: emitter, mode: mode, relevance: &relevance)
+        } else {
+            processKeywords(buffer.range, source: source, emitter: emitter, mode: mode, keywordHits: &keywordHits, relevance: &relevance, language: language)
+        }
+        buffer.reset()
+    }
+
+    /// Checks if the current mode is within a string interpolation context (scope="subst")
+    /// by walking up the parent chain.
+    private func isInInterpolationContext(_ mode: CompiledMode) -> Bool {
+        var current: CompiledMode? = mode
+        while current != nil {
+            if current?.scope == "subst" {
+                return true
+            }
+            current = current?.parent
+        }
+        return false
+    }
+
+    private func processKeywords(
+        _ text: Range<Int>,
+        source: SourceText,
+        emitter: TokenTreeEmitter,
+        mode: CompiledMode,
+        keywordHits: inout [String: Int],
+        relevance: inout Int,
+        language: CompiledMode
+    ) {
+        guard let keywords = mode.keywords,
+              let patternRe = mode.keywordPatternRe else {
+            // No keywords defined: just emit as plain text
+            // (The main loop is responsible for matching contains modes during scanning)
+            emitter.addText(text)
+            return
+        }
+
+        let inInterpolation = isInInterpolationContext(mode)
+        var lastIndex = text.lowerBound
+        var lookups = 0
+        var keywordsFound = 0
+
+        // Process text between keywords (may contain operators, numbers, etc.)
+        // Only apply in interpolation contexts (scope="subst") to avoid breaking other languages
+        func addGap(upTo end: Int) {
+            guard end > lastIndex else { return }
+            if inInterpolation {
+                processNonKeywordText(lastIndex..<end, source: source, emitter: emitter, mode: mode, relevance: &relevance)
+            } else {
+                emitter.addText(lastIndex..<end)
+            }
+        }
+
+        func addWord(_ wordRange: Range<Int>, keyword: KeywordScanner.Keyword?) {
+            addGap(upTo: wordRange.lowerBound)
+            lookups += 1
+
+            if let keyword = keyword {
+                keywordsFound += 1
+                let hits = keywordHits[keyword.key, default: 0] + 1
+                keywordHits[keyword.key] = hits
+                if hits <= maxKeywordHits {
+                    relevance += keyword.relevance
+                }
+
+                if keyword.scope.hasPrefix("_") {
+                    // Relevance only, no highlighting
+                    emitter.addText(wordRange)
+                } else {
+                    let cssClass = language.scope.flatMap { _ in nil } ?? keyword.scope
+                    emitter.startScope(cssClass)
+                    emitter.addText(wordRange)
+                    emitter.endScope()
+                }
+            } else {
+                // Not a keyword: try to match with contains modes
+                // For single words, only apply if a pattern matches the ENTIRE word
+                // (prevents partial matches like "1" in "1e_1")
+                processWordWithContains(at: wordRange, in: text, source: source, emitter: emitter, mode: mode, relevance: &relevance)
+            }
+
+            lastIndex = wordRange.upperBound
+        }
+
+        var foundWord = false
+        if let scanner = keywords.scanner, KeywordScanner.canScan(source.units, text) {
+            // Find and look up words in place, without the regex or a String per word
+            var position = text.lowerBound
+            while let wordRange = scanner.nextWord(in: source.units, from: position, to: text.upperBound) {
+                foundWord = true
+                addWord(wordRange, keyword: scanner.keyword(at: wordRange, in: source.units))
+                position = wordRange.upperBound
+            }
+        } else {
+            // Use matches(in:range:) instead of enumerateMatches to avoid closure capture issues.
+            // The range's bounds are not transparent, so this matches as on the text alone.
+            let matches = patternRe.matches(in: source.string, options: [], range: NSRange(text))
+            foundWord = !matches.isEmpty
+
+            // Use cached case-insensitivity flag from compiled language
+            let useCaseInsensitive = language.caseInsensitive
+
+            for result in matches {
+                guard let matchRange = Range<Int>(result.range) else { continue }
+                let word = source.substring(matchRange)
+                let key = useCaseInsensitive ? word.lowercased() : word
+                let keyword = keywords.keywords[key].map {
+                    KeywordScanner.Keyword(key: key, scope: $0.scope, relevance: $0.relevance)
+                }
+                addWord(matchRange, keyword: keyword)
+            }
+        }
+
+        if lookups > 0 {
+            profiler?.recordKeywords(mode: mode, language: language, lookups: lookups, hits: keywordsFound)
+        }
+
+        // If no keyword pattern matches at all, just emit as plain text
+        // (This handles cases like "1e_1" in Python where the keyword pattern
+        // requires starting with a letter but the text starts with a digit)
+        guard foundWord else {
+            emitter.addText(text)
+            return
+        }
+
+        // Process remaining text
+        addGap(upTo: text.upperBound)
+    }
+
+    /// Processes a single word by trying to match against the mode's contains patterns.
+    /// Only highlights if a pattern matches the ENTIRE word to prevent partial matches.
+    /// Checks patterns against the original text context to support lookahead/lookbehind.
+    private func processWordWithContains(
+        at wordRange: Range<Int>,
+        in text: Range<Int>,
+        source: SourceText,
+        emitter: TokenTreeEmitter,
+        mode: CompiledMode,
+        relevance: inout Int
+    ) {
+        guard !wordRange.isEmpty else { return }
+
+        // Use parent's contains if current mode has keywords but empty contains
+        // (indicates a .self reference in a keywords + contains mode)
+        let shouldUseParentContains = mode.keywords != nil &&
+            mode.contains.isEmpty &&
+            mode.parent != nil &&
+            mode.endsWithParent
+        let effectiveContains = shouldUseParentContains
+            ? (mode.parent?.contains ?? [])
+            : mode.contains
+
+        // If no contains available, just emit as plain text
+        guard !effectiveContains.isEmpty else {
+            emitter.addText(wordRange)
+            return
+        }
+
+        // For lookbehind patterns, we need to check a bit before the word to include context:
+        // up to five characters, but not before the start of the text
+        let string = source.string
+        let textStart = String.Index(utf16Offset: text.lowerBound, in: string)
+        var searchStart = String.Index(utf16Offset: wordRange.lowerBound, in: string)
+        for _ in 0..<5 where searchStart > textStart {
+            searchStart = string.index(before: searchStart)
+        }
+        let searchRange = NSRange(max(searchStart.utf16Offset(in: string), text.lowerBound)..<text.upperBound)
+
+        // Try to find a match-only pattern that matches the ENTIRE word
+        // Check against the original text to support lookahead/lookbehind assertions
+        for child in effectiveContains {
+            guard let beginRe = child.beginRe else { continue }
+
+            // Only consider match-only modes
+            let isMatchOnlyMode = child.terminatorEnd.isEmpty ||
+                child.terminatorEnd == #"\B|\b"# ||
+                child.terminatorEnd == #"(?:\B|\b)"#
+            guard isMatchOnlyMode else { continue }
+
+            // Check if the pattern matches at the word's position in the original text
+            if let match = beginRe.firstMatch(in: string, options: [], range: searchRange) {
+                // For patterns with capture groups, check if capture group 1 matches the word
+                if match.numberOfRanges > 1, let captureRange = Range<Int>(match.range(at: 1)) {
+                    if source.units[captureRange].elementsEqual(source.units[wordRange]) {
+                        // The captured group matches the word - highlight it
+                        if let beginScope = child.beginScope, let firstScope = beginScope.scopes[1] {
+                            emitter.startScope(firstScope)
+                            emitter.addText(wordRange)
+                            emitter.endScope()
+                        } else if let scope = child.scope {
+                            emitter.startScope(scope)
+                            emitter.addText(wordRange)
+                            emitter.endScope()
+                        } else {
+                            emitter.addText(wordRange)
+                        }
+                        relevance += child.relevance
+                        return
+                    }
+                } else if match.range.location >= 0 && match.range.length == wordRange.count {
+                    // No capture groups - check if match covers exactly the word
+                    if let scope = child.scope {
+                        emitter.startScope(scope)
+                        emitter.addText(wordRange)
+                        emitter.endScope()
+                    } else {
+                        emitter.addText(wordRange)
+                    }
+                    relevance += child.relevance
+                    return
+                }
+            }
+        }
+
+        // No pattern matched the entire word - emit as plain text
+        emitter.addText(wordRange)
+    }
+
+    /// Processes text that doesn't match keywords by trying to match operators, numbers,
+    /// and other match-only patterns from the mode's contains.
+    /// This handles gaps between keyword matches (e.g., operators like "-" in "x - 2").
+    private func processNonKeywordText(
+        _ text: Range<Int>,
+        source: SourceText,
+        emitter: TokenTreeEmitter,
+        mode: CompiledMode,
+        relevance: inout Int
+    ) {
+        guard !text.isEmpty else { return }
+
+        // Use parent's contains if current mode has keywords but empty contains
+        // (indicates a .self reference in a keywords + contains mode)
+        let shouldUseParentContains = mode.keywords != nil &&
+            mode.contains.isEmpty &&
+            mode.parent != nil &&
+            mode.endsWithParent
+        let effectiveContains = shouldUseParentContains
+            ? (mode.parent?.contains ?? [])
+            : mode.contains
+
+        // If no contains available, just emit as plain text
+        guard !effectiveContains.isEmpty else {
+            emitter.addText(text)
+            return
+        }
+
+        // Collect all match-only modes
+        let matchOnlyModes = effectiveContains.filter { child in
+            guard child.beginRe != nil else { return false }
+            return child.terminatorEnd.isEmpty ||
+                child.terminatorEnd == #"\B|\b"# ||
+                child.terminatorEnd == #"(?:\B|\b)"#
+        }
+
+        guard !matchOnlyModes.isEmpty else {
+            emitter.addText(text)
+            return
+        }
+
+        // Find all matches from all patterns
+        struct Match {
+            let range: Range<Int>
+            let scope: String?
+            let relevance: Int
+        }
+
+        var matches: [Match] = []
+        let nsRange = NSRange(text)
+
+        for child in matchOnlyModes {
+            guard let beginRe = child.beginRe else { continue }
+
+            let childMatches = beginRe.matches(in: source.string, options: [], range: nsRange)
+            for match in childMatches {
+                guard let range = Range<Int>(match.range) else { continue }
+                matches.append(Match(
+                    range: range,
+                    scope: child.scope,
+                    relevance: child.relevance
+                ))
+            }
+        }
+
+        // Sort by start position
+        matches.sort { $0.range.lowerBound < $1.range.lowerBound }
+
+        // Process matches, avoiding overlaps
+        var currentIndex = text.lowerBound
+        for match in matches {
+            // Skip if this match starts before our current position (overlapping)
+            guard match.range.lowerBound >= currentIndex else { continue }
+
+            // Emit text before this match as plain text
+            if match.range.lowerBound > currentIndex {
+                emitter.addText(currentIndex..<match.range.lowerBound)
+            }
+
+            // Emit the matched text with scope
+            if let scope = match.scope {
+                emitter.startScope(scope)
+                emitter.addText(match.range)
+                emitter.endScope()
+            } else {
+                emitter.addText(match.range)
+            }
+            relevance += match.relevance
+
+            // Move past this match
+            currentIndex = match.range.upperBound
+        }
+
+        // Emit any remaining text as plain text
+        if currentIndex < text.upperBound {
+            emitter.addText(currentIndex..<text.upperBound)
+        }
+    }
+    private func processSubLanguage(
+        _ text: String,
+        emitter: TokenTreeEmitter,
+        mode: CompiledMode,
+        relevance: inout Int
+    ) {
+        guard let subLanguage = mode.subLanguage else {
+            emitter.addText(text)
+            return
+        }
+
+        switch subLanguage {
+        case .single(let langName):
+            guard languageSet.languages[langName] != nil else {
+                emitter.addText(text)
+                return
+            }
+            let result = parse(text, language: langName, ignoreIllegals: true)
+            emitter.addSublanguage(result.tokenTree, name: langName)
+            if mode.relevance > 0 {
+                relevance += result.relevance
+            }
+
+        case .multiple(let subset):
+            let result = highlightAuto(
+                text,
+                languageSubset: subset.isEmpty ? nil : subset,
+                renderer: HTMLRenderer(theme: HTMLTheme(classPrefix: options.classPrefix))
+            )
+            emitter.addText(result.value)
+            if mode.relevance > 0 {
+                relevance += result.relevance
+            }
+        }
+    }
+
+    private func doBeginMatch(
+        match: EnhancedMatch,
+        source: SourceText,
+        emitter: TokenTreeEmitter,
+        modeBuffer: inout ModeBuffer,
+        top: inout CompiledMode,
+        keywordHits: inout [String: Int],
+        relevance: inout Int,
+        language: CompiledMode,
+        regexIndex: Int,
+        resumeScan: inout Bool
+    ) throws -> Int {
+        let lexeme = match.lexeme
+        guard let newMode = match.rule else { return lexeme.count }
+
+        // Check callbacks
+        if let onBegin = newMode.onBegin {
+            let result = onBegin(match.match)
+            if result == .ignoreMatch {
+                return doIgnore(lexeme: lexeme, source: source, regexIndex: regexIndex, modeBuffer: &modeBuffer, resumeScan: &resumeScan)
+            }
+        }
+
+        if newMode.skip {
+            modeBuffer.append(lexeme)
+        } else {
+            if newMode.excludeBegin {
+                modeBuffer.append(lexeme)
+            }
+            processBuffer(&modeBuffer, source: source, emitter: emitter, mode: top, keywordHits: &keywordHits, relevance: &relevance, language: language)
+            if !newMode.returnBegin && !newMode.excludeBegin {
+                modeBuffer.reset(to: lexeme)
+            }
+        }
+
+        startNewMode(newMode, match: match, emitter: emitter, top: &top, modeBuffer: &modeBuffer, language: language)
+
+        // Debug: verify parent chain
+        // Uncomment to debug: print("  AFTER startNewMode: newTop.scope=\(top.scope ?? "nil") newTop.parent.scope=\(top.parent?.scope ?? "nil")")
+
+        return newMode.returnBegin ? 0 : lexeme.count
+    }
+
+    private func startNewMode(
+        _ mode: CompiledMode,
+        match: EnhancedMatch,
+        emitter: TokenTreeEmitter,
+        top: inout CompiledMode,
+        modeBuffer: inout ModeBuffer,
+        language: CompiledMode
+    ) {
+        if let scope = mode.scope {
+            emitter.openNode(scope)
+        }
+
+        if let beginScope = mode.beginScope {
+            if let wrap = beginScope.wrap {
+                emitter.startScope(wrap)
+                emitter.addText(modeBuffer.range)
+                emitter.endScope()
+                modeBuffer.reset()
+            } else if beginScope.multi {
+                // Multi-class begin scope
+                emitMultiClass(scope: beginScope, match: match, emitter: emitter, language: language)
+                modeBuffer.reset()
+            }
+        }
+
+        let newTop = CompiledMode()
+        // Copy essential properties
+        newTop.scope = mode.scope
+        newTop.keywords = mode.keywords
+        newTop.keywordPatternRe = mode.keywordPatternRe
+        newTop.contains = mode.contains
+        newTop.matcher = mode.matcher
+        newTop.terminatorEnd = mode.terminatorEnd
+        newTop.endRe = mode.endRe
+        newTop.relevance = mode.relevance
+        newTop.excludeEnd = mode.excludeEnd
+        newTop.returnEnd = mode.returnEnd
+        newTop.endsWithParent = mode.endsWithParent
+        newTop.endsParent = mode.endsParent
+        newTop.skip = mode.skip
+        newTop.subLanguage = mode.subLanguage
+        newTop.starts = mode.starts
+        newTop.onEnd = mode.onEnd
+        newTop.endScope = mode.endScope
+        newTop.origin = mode
+
+        // CRITICAL: Set parent to current top BEFORE reassigning top
+        newTop.parent = top
+
+        top = newTop
+    }
+
+
+    private func doEndMatch(
+        match: EnhancedMatch,
+        source: SourceText,
+        emitter: TokenTreeEmitter,
+        modeBuffer: inout ModeBuffer,
+        top: inout CompiledMode,
+        keywordHits: inout [String: Int],
+        relevance: inout Int,
+        language: CompiledMode
+    ) throws -> Int? {
+        guard let endMode = endOfMode(mode: top, match: match, source: source) else {
+            return nil
+        }
+
+        let origin = top
+        let lexeme = match.lexeme
+
+        // Check callback
+        if let onEnd = origin.onEnd {
+            let result = onEnd(match.match)
+            if result == .ignoreMatch {
+                return nil
+            }
+        }
+
+        // Handle end scope
+        if let endScope = origin.endScope, let wrap = endScope.wrap {
+            processBuffer(&modeBuffer, source: source, emitter: emitter, mode: origin, keywordHits: &keywordHits, relevance: &relevance, language: language)
+            emitter.startScope(wrap)
+            emitter.addText(lexeme)
+            emitter.endScope()
+        } else if let endScope = origin.endScope, endScope.multi {
+            processBuffer(&modeBuffer, source: source, emitter: emitter, mode: origin, keywordHits: &keywordHits, relevance: &relevance, language: language)
+            emitMultiClass(scope: endScope, match: match, emitter: emitter, language: language)
+        } else if origin.skip {
+            modeBuffer.append(lexeme)
+        } else {
+            if !origin.returnEnd && !origin.excludeEnd {
+                modeBuffer.append(lexeme)
+            }
+            processBuffer(&modeBuffer, source: source, emitter: emitter, mode: origin, keywordHits: &keywordHits, relevance: &relevance, language: language)
+            if origin.excludeEnd {
+                modeBuffer.reset(to: lexeme)
+            }
+        }
+
+        // Close modes up to and including endMode
+        var current: CompiledMode? = top
+        while current !== endMode.parent {
+            if current?.scope != nil {
+                emitter.closeNode()
+            }
+            if !(current?.skip ?? false) && current?.subLanguage == nil {
+                relevance += current?.relevance ?? 0
+            }
+            current = current?.parent
+            if current == nil { break }
+        }
+        top = endMode.parent ?? language
+
+        // Handle starts
+        if let starts = endMode.starts {
+            startNewMode(starts, match: match, emitter: emitter, top: &top, modeBuffer: &modeBuffer, language: language)
+        }
+
+        return origin.returnEnd ? 0 : lexeme.count
+    }
+
+    private func endOfMode(
+        mode: CompiledMode,
+        match: EnhancedMatch,
+        source: SourceText
+    ) -> CompiledMode? {
+        if let endRe = mode.endRe, endMatches(endRe, source: source, at: match.index) {
+            // This mode ends here
+            var current = mode
+            while current.endsParent, let parent = current.parent {
+                current = parent
+            }
+            return current
+        }
+
+        if mode.endsWithParent, let parent = mode.parent {
+            return endOfMode(mode: parent, match: match, source: source)
+        }
+
+        return nil
+    }
+
+    /// Whether `endRe` matches at `index`, seeing the code from there on as the
+    /// whole input (the same as `Regex.startsWith` on the remainder, without
+    /// copying it).
+    private func endMatches(_ endRe: NSRegularExpression, source: SourceText, at index: Int) -> Bool {
+        let range = NSRange(location: index, length: source.length - index)
+        return endRe.firstMatch(in: source.string, options: [.anchored], range: range) != nil
+    }
+
+    /// Handles a match a callback ignored: the first code unit joins the buffer
+    /// and scanning resumes after it, as in highlight.js.
+    private func doIgnore(
+        lexeme: Range<Int>,
+        source: SourceText,
+        regexIndex: Int,
+        modeBuffer: inout ModeBuffer,
+        resumeScan: inout Bool
+    ) -> Int {
+        if regexIndex == 0 {
+            let first = lexeme.lowerBound..<min(lexeme.lowerBound + 1, source.length)
+            modeBuffer.append(first)
+            return first.count
+        } else {
+            resumeScan = true
+            return 0
+        }
+    }
+
+    private func emitMultiClass(
+        scope: CompiledScope,
+        match: EnhancedMatch,
+        emitter: TokenTreeEmitter,
+        language: CompiledMode
+    ) {
+        // Get the full match range and walk through it, emitting spans for capture groups
+        guard let fullRange = match.range(ofGroup: 0) else { return }
+
+        // Collect all capture group ranges
+        var segments: [(range: Range<Int>, scope: String?)] = []
+
+        // Find all capture groups that have scopes
+        guard let maxScope = scope.scopes.keys.max() else { return }
+        for i in 1...maxScope {
+            guard scope.emit[i] == true,
+                  let scopeName = scope.scopes[i],
+                  let range = match.range(ofGroup: i) else { continue }
+            segments.append((range, scopeName))
+        }
+
+        // Sort segments by start position
+        segments.sort { $0.range.lowerBound < $1.range.lowerBound }
+
+        // Emit text with scopes
+        var pos = fullRange.lowerBound
+        for seg in segments {
+            // Emit any text before this segment
+            if seg.range.lowerBound > pos {
+                emitter.addText(pos..<seg.range.lowerBound)
+            }
+
+            // Emit the scoped segment
+            if let scopeName = seg.scope {
+                emitter.startScope(scopeName)
+                emitter.addText(seg.range)
+                emitter.endScope()
+            } else {
+                emitter.addText(seg.range)
+            }
+            pos = seg.range.upperBound
+        }
+
+        // Emit any remaining text after last segment
+        if pos < fullRange.upperBound {
+            emitter.addText(pos..<fullRange.upperBound)
+        }
+    }
+}
+
+/// Parse results written by `highlightAuto`'s parallel parses, one slot each.
+private final class ParseSlots: @unchecked Sendable {
+    private let lock = NSLock()
+    private var slots: [ParseResult?]
+
+    init(count: Int) {
+        slots = Array(repeating: nil, count: count)
+    }
+
+    subscript(index: Int) -> ParseResult? {
+        get {
+            lock.lock()
+            defer { lock.unlock() }
+            return slots[index]
+        }
+        set {
+            lock.lock()
+            slots[index] = newValue
+            lock.unlock()
+        }
+    }
+
+    /// The results, once every slot is written
+    var values: [ParseResult] {
+        lock.lock()
+        defer { lock.unlock() }
+        return slots.compactMap { $0 }
+    }
+}
+
+/// Text collected for the current mode before it is emitted. The scan only
+/// ever extends it with the text that directly follows, so it is one range
+/// of the code.
+private struct ModeBuffer {
+    private(set) var range: Range<Int> = 0..<0
+
+    var isEmpty: Bool { range.isEmpty }
+
+    mutating func append(_ text: Range<Int>) {
+        guard !text.isEmpty else { return }
+        precondition(range.isEmpty || range.upperBound == text.lowerBound, "ModeBuffer appended a range that does not follow it")
+        range = range.isEmpty ? text : range.lowerBound..<text.upperBound
+    }
+
+    mutating func reset(to text: Range<Int> = 0..<0) {
+        range = text
+    }
+}
@@ -0,0 +1,159 @@
+import Foundation
+
+/// Counts what the parse loop does per compiled mode, for `ProfileReport`.
+///
+/// Parsers hold one only when `HighlightOptions.profiling` is set, so the
+/// loop pays a nil check otherwise. Parses on several threads record into
+/// the same profiler, under its lock.
+internal final class Profiler: @unchecked Sendable {
+    private struct Entry {
+        let mode: CompiledMode
+        let language: CompiledMode
+        var execCalls = 0
+        var matches = 0
+        var nanoseconds: UInt64 = 0
+        var resumes = 0
+        var keywordLookups = 0
+        var keywordHits = 0
+        var subLanguageParses = 0
+        /// Matches of each child's begin rule, by child
+        var beginMatches: [ObjectIdentifier: (rule: CompiledMode, count: Int)] = [:]
+        var endMatches = 0
+        var illegalMatches = 0
+
+        init(mode: CompiledMode, language: CompiledMode) {
+            self.mode = mode
+            self.language = language
+        }
+    }
+
+    private let lock = NSLock()
+
+    /// Counters by compiled mode, guarded by `lock`. Entries keep their modes
+    /// alive, so identifiers are not reused by modes of a later registration.
+    private var entries: [ObjectIdentifier: Entry] = [:]
+
+    /// Records a lookup of `mode`'s matcher that took `nanoseconds`.
+    func recordExec(mode: CompiledMode, language: CompiledMode, match: EnhancedMatch?, resumed: Bool, nanoseconds: UInt64) {
+        update(mode, language: language) { entry in
+            entry.execCalls += 1
+            entry.nanoseconds += nanoseconds
+            if resumed {
+                entry.resumes += 1
+            }
+            guard let match else { return }
+            entry.matches += 1
+            switch match.type {
+            case .begin:
+                if let rule = match.rule {
+                    let key = ObjectIdentifier(rule)
+                    entry.beginMatches[key] = (rule, (entry.beginMatches[key]?.count ?? 0) + 1)
+                }
+            case .end:
+                entry.endMatches += 1
+            case .illegal:
+                entry.illegalMatches += 1
+            }
+        }
+    }
+
+    /// Records the words of one stretch of text looked up in `mode`'s keywords.
+    func recordKeywords(mode: CompiledMode, language: CompiledMode, lookups: Int, hits: Int) {
+        update(mode, language: language) { entry in
+            entry.keywordLookups += lookups
+            entry.keywordHits += hits
+        }
+    }
+
+    /// Records text of `mode` handed to a sub-language.
+    func recordSubLanguage(mode: CompiledMode, language: CompiledMode) {
+        update(mode, language: language) { entry in
+            entry.subLanguageParses += 1
+        }
+    }
+
+    /// Forgets everything recorded so far.
+    func reset() {
+        lock.lock()
+        entries.removeAll()
+        lock.unlock()
+    }
+
+    /// The counters so far, slowest mode first.
+    var report: ProfileReport {
+        lock.lock()
+        let entries = Array(self.entries.values)
+        lock.unlock()
+
+        var orders: [ObjectIdentifier: [ObjectIdentifier: Int]] = [:]
+        var modes: [ProfileReport.ModeProfile] = []
+        for entry in entries {
+            let languageKey = ObjectIdentifier(entry.language)
+            let order = orders[languageKey] ?? Self.compileOrder(entry.language)
+            orders[languageKey] = order
+
+            var rules = entry.beginMatches.values.map {
+                ProfileReport.RuleProfile(kind: "begin", mode: order[ObjectIdentifier($0.rule)], matches: $0.count)
+            }
+            if entry.endMatches > 0 {
+                rules.append(ProfileReport.RuleProfile(kind: "end", mode: nil, matches: entry.endMatches))
+            }
+            if entry.illegalMatches > 0 {
+                rules.append(ProfileReport.RuleProfile(kind: "illegal", mode: nil, matches: entry.illegalMatches))
+            }
+            rules.sort { a, b in
+                a.matches != b.matches ? a.matches > b.matches : (a.mode ?? Int.max) < (b.mode ?? Int.max)
+            }
+
+            modes.append(ProfileReport.ModeProfile(
+                language: entry.language.languageName ?? "",
+                mode: order[ObjectIdentifier(entry.mode)] ?? -1,
+                scope: entry.mode.scope,
+                begin: entry.mode.beginRe?.pattern,
+                execCalls: entry.execCalls,
+                matches: entry.matches,
+                nanoseconds: entry.nanoseconds,
+                resumes: entry.resumes,
+                keywordLookups: entry.keywordLookups,
+                keywordHits: entry.keywordHits,
+                subLanguageParses: entry.subLanguageParses,
+                rules: rules
+            ))
+        }
+        modes.sort { a, b in
+            if a.nanoseconds != b.nanoseconds {
+                return a.nanoseconds > b.nanoseconds
+            }
+            return (a.language, a.mode) < (b.language, b.mode)
+        }
+        return ProfileReport(modes: modes)
+    }
+
+    private func update(_ mode: CompiledMode, language: CompiledMode, _ body: (inout Entry) -> Void) {
+        // Parses run in copies of the compiled modes; count the originals
+        let mode = mode.origin ?? mode
+        let key = ObjectIdentifier(mode)
+        lock.lock()
+        defer { lock.unlock() }
+        var entry = entries.removeValue(forKey: key) ?? Entry(mode: mode, language: language)
+        body(&entry)
+        entries[key] = entry
+    }
+
+    /// Indices of a language's modes in the order `ModeCompiler` and
+    /// `tools/hljs_compiler.py` create them: depth first, children before `starts`.
+    private static func compileOrder(_ language: CompiledMode) -> [ObjectIdentifier: Int] {
+        var order: [ObjectIdentifier: Int] = [:]
+        var stack = [language]
+        while let mode = stack.popLast() {
+            let key = ObjectIdentifier(mode)
+            guard order[key] == nil else { continue }
+            order[key] = order.count
+            if let starts = mode.starts {
+                stack.append(starts)
+            }
+            stack.append(contentsOf: mode.contains.reversed())
+        }
+        return order
+    }
+}
@@ -0,0 +1,569 @@
+import Foundation
+
+/// Skips text where none of a matcher's rules can start.
+///
+/// Built from the rules' patterns when every rule has to consume a character
+/// (or stop before a line terminator, for `$`), so a match can only begin at a
+/// code unit from the rules' first-character sets. Rules that start with a
+/// literal of two or more characters are checked against the whole literal.
+/// Comment and string bodies, where the next delimiter can be hundreds of
+/// characters away, are then scanned here instead of by ICU.
+///
+/// The analysis is conservative: any construct it does not model disables the
+/// prefilter for that matcher.
+internal struct RegexPrefilter {
+    private enum Start {
+        case never
+        case always
+        case literals([[UInt16]])
+
+        var isAlways: Bool {
+            if case .always = self { return true }
+            return false
+        }
+    }
+
+    private let ascii: [Start]
+    private let nonASCII: Bool
+    private let atEnd: Bool
+
+    init?(patterns: [String], caseInsensitive: Bool) {
+        var ascii = [Start](repeating: .never, count: 128)
+        var nonASCII = false
+        var atEnd = false
+        for pattern in patterns {
+            guard !pattern.contains("(?<=") && !pattern.contains("(?<!") else {
+                // Searching from a later position could let a lookbehind see
+                // text before the search range.
+                return nil
+            }
+            var parser = PrefilterParser(pattern, caseInsensitive: caseInsensitive)
+            guard let node = try? parser.parse() else { return nil }
+            let start = node.start
+            guard !start.nullable else { return nil }
+
+            let literal = node.prefix.units
+            if literal.count >= 2 {
+                let first = Int(literal[0])
+                switch ascii[first] {
+                case .never: ascii[first] = .literals([literal])
+                case .literals(let literals): ascii[first] = .literals(literals + [literal])
+                case .always: break
+                }
+                continue
+            }
+            for unit in 0..<128 where start.set.contains(UInt16(unit)) {
+                ascii[unit] = .always
+            }
+            nonASCII = nonASCII || start.set.nonASCII
+            atEnd = atEnd || start.atEnd
+        }
+        if nonASCII && ascii.allSatisfy(\.isAlways) {
+            return nil
+        }
+        self.ascii = ascii
+        self.nonASCII = nonASCII
+        self.atEnd = atEnd
+    }
+
+    /// The first UTF-16 offset at or after `start` where a rule can match, or
+    /// nil if none can. Returns `start` itself unless the skipped text holds an
+    /// ASCII character: ICU's `\b` looks back past combining marks, and a
+    /// search from a later offset must not see past `start` that way.
+    func firstCandidate(in units: [UInt16], from start: Int) -> Int? {
+        guard start >= 0 else { return nil }
+        var position = start
+        var skippedASCII = false
+        while position < units.count {
+            let unit = units[position]
+            if unit < 0x80 {
+                switch ascii[Int(unit)] {
+                case .never:
+                    break
+                case .always:
+                    return skippedASCII ? position : start
+                case .literals(let literals):
+                    if literals.contains(where: { Self.units(units, at: position, startWith: $0) }) {
+                        return skippedASCII ? position : start
+                    }
+                }
+                skippedASCII = true
+            } else if nonASCII {
+                return skippedASCII ? position : start
+            }
+            position += 1
+        }
+        guard atEnd, start <= units.count else { return nil }
+        return skippedASCII ? position : start
+    }
+
+    private static func units(_ units: [UInt16], at start: Int, startWith literal: [UInt16]) -> Bool {
+        guard start + literal.count <= units.count else { return false }
+        for (offset, unit) in literal.enumerated() where units[start + offset] != unit {
+            return false
+        }
+        return true
+    }
+}
+
+// MARK: - Pattern Analysis
+
+/// A set of UTF-16 code units: exact for ASCII, a single flag for the rest.
+private struct UnitSet {
+    var low: UInt64 = 0
+    var high: UInt64 = 0
+    var nonASCII = false
+
+    static let all = UnitSet(low: .max, high: .max, nonASCII: true)
+    static let digits = UnitSet(range: 0x30...0x39)
+    static let word = UnitSet(range: 0x30...0x39)
+        .union(UnitSet(range: 0x41...0x5A))
+        .union(UnitSet(range: 0x61...0x7A))
+        .union(UnitSet(range: 0x5F...0x5F))
+    static let space = UnitSet(range: 0x09...0x0D).union(UnitSet(range: 0x20...0x20))
+    /// Where `$` can match besides the end of the input.
+    static let lineTerminators = UnitSet(range: 0x0A...0x0D).withNonASCII
+
+    init(low: UInt64 = 0, high: UInt64 = 0, nonASCII: Bool = false) {
+        self.low = low
+        self.high = high
+        self.nonASCII = nonASCII
+    }
+
+    init(range: ClosedRange<UInt32>) {
+        if range.lowerBound < 0x80 {
+            for value in range.lowerBound...min(range.upperBound, 0x7F) {
+                insert(UInt16(value))
+            }
+        }
+        nonASCII = range.upperBound >= 0x80
+    }
+
+    var withNonASCII: UnitSet {
+        UnitSet(low: low, high: high, nonASCII: true)
+    }
+
+    /// ASCII complement; every non-ASCII unit is kept.
+    var inverted: UnitSet {
+        UnitSet(low: ~low, high: ~high, nonASCII: true)
+    }
+
+    /// Adds the other case of each ASCII letter. Non-ASCII characters such as
+    /// the Kelvin sign fold to ASCII letters, so those are included too.
+    var caseClosed: UnitSet {
+        var out = self
+        for letter in UInt16(0x41)...UInt16(0x5A) where contains(letter) || contains(letter + 0x20) {
+            out.insert(letter)
+            out.insert(letter + 0x20)
+            out.nonASCII = true
+        }
+        return out
+    }
+
+    func contains(_ unit: UInt16) -> Bool {
+        if unit >= 0x80 { return nonASCII }
+        return unit < 64 ? low & (1 << unit) != 0 : high & (1 << (unit - 64)) != 0
+    }
+
+    mutating func insert(_ unit: UInt16) {
+        if unit >= 0x80 {
+            nonASCII = true
+        } else if unit < 64 {
+            low |= 1 << unit
+        } else {
+            high |= 1 << (unit - 64)
+        }
+    }
+
+    func union(_ other: UnitSet) -> UnitSet {
+        UnitSet(low: low | other.low, high: high | other.high, nonASCII: nonASCII || other.nonASCII)
+    }
+}
+
+private indirect enum PrefilterNode {
+    /// One ASCII character, matched case-sensitively
+    case literal(UInt16)
+    /// One character from a set
+    case set(UnitSet)
+    /// A zero-width assertion that does not depend on the next character
+    case assertion
+    /// `$`
+    case lineEnd
+    case sequence([PrefilterNode])
+    case alternation([PrefilterNode])
+    case repetition(PrefilterNode, min: Int)
+
+    /// Where a match can start: at a unit of `set`, at the end of the input
+    /// when `atEnd`, or anywhere when `nullable`.
+    var start: (set: UnitSet, atEnd: Bool, nullable: Bool) {
+        switch self {
+        case .literal(let unit):
+            var set = UnitSet()
+            set.insert(unit)
+            return (set, false, false)
+        case .set(let set):
+            return (set, false, false)
+        case .assertion:
+            return (UnitSet(), false, true)
+        case .lineEnd:
+            return (.lineTerminators, true, false)
+        case .sequence(let items):
+            var set = UnitSet()
+            var atEnd = false
+            for item in items {
+                let start = item.start
+                set = set.union(start.set)
+                atEnd = atEnd || start.atEnd
+                if !start.nullable {
+                    return (set, atEnd, false)
+                }
+            }
+            return (set, atEnd, true)
+        case .alternation(let branches):
+            var set = UnitSet()
+            var atEnd = false
+            var nullable = false
+            for branch in branches {
+                let start = branch.start
+                set = set.union(start.set)
+                atEnd = atEnd || start.atEnd
+                nullable = nullable || start.nullable
+            }
+            return (set, atEnd, nullable)
+        case .repetition(let child, let min):
+            let start = child.start
+            return (start.set, start.atEnd, start.nullable || min == 0)
+        }
+    }
+
+    /// The literal every match starts with; `complete` when the node is
+    /// nothing but that literal and zero-width assertions.
+    var prefix: (units: [UInt16], complete: Bool) {
+        switch self {
+        case .literal(let unit):
+            return ([unit], true)
+        case .assertion, .lineEnd:
+            return ([], true)
+        case .set:
+            return ([], false)
+        case .sequence(let items):
+            var units: [UInt16] = []
+            for item in items {
+                let prefix = item.prefix
+                units += prefix.units
+                if !prefix.complete {
+                    return (units, false)
+                }
+            }
+            return (units, true)
+        case .alternation(let branches):
+            guard branches.count == 1 else { return ([], false) }
+            return branches[0].prefix
+        case .repetition(let child, let min):
+            return min > 0 ? (child.prefix.units, false) : ([], false)
+        }
+    }
+}
+
+/// Parses the subset of ICU syntax the prefilter understands.
+private struct PrefilterParser {
+    struct Unsupported: Error {}
+
+    private let scalars: [Unicode.Scalar]
+    private var index = 0
+    private var caseInsensitive: Bool
+
+    init(_ pattern: String, caseInsensitive: Bool) {
+        self.scalars = Array(pattern.unicodeScalars)
+        self.caseInsensitive = caseInsensitive
+    }
+
+    mutating func parse() throws -> PrefilterNode {
+        let node = try alternation()
+        guard index == scalars.count else { throw Unsupported() }
+        return node
+    }
+
+    private var next: Unicode.Scalar? {
+        index < scalars.count ? scalars[index] : nil
+    }
+
+    private mutating func take() throws -> Unicode.Scalar {
+        guard let scalar = next else { throw Unsupported() }
+        index += 1
+        return scalar
+    }
+
+    private mutating func skip(_ scalar: Unicode.Scalar) -> Bool {
+        guard next == scalar else { return false }
+        index += 1
+        return true
+    }
+
+    private mutating func alternation() throws -> PrefilterNode {
+        var branches = [try sequence()]
+        while skip("|") {
+            branches.append(try sequence())
+        }
+        return .alternation(branches)
+    }
+
+    private mutating func sequence() throws -> PrefilterNode {
+        var items: [PrefilterNode] = []
+        while let scalar = next, scalar != "|", scalar != ")" {
+            items.append(try quantified(try atom()))
+        }
+        return .sequence(items)
+    }
+
+    private mutating func quantified(_ node: PrefilterNode) throws -> PrefilterNode {
+        var node = node
+        while let scalar = next {
+            let min: Int
+            switch scalar {
+            case "*", "?":
+                index += 1
+                min = 0
+            case "+":
+                index += 1
+                min = 1
+            case "{":
+                index += 1
+                min = try number()
+                if skip(",") {
+                    if next != "}" { _ = try number() }
+                }
+                guard skip("}") else { throw Unsupported() }
+            default:
+                return node
+            }
+            // Lazy and possessive forms start at the same characters.
+            if !skip("?") { _ = skip("+") }
+            node = .repetition(node, min: min)
+        }
+        return node
+    }
+
+    private mutating func number() throws -> Int {
+        var value = 0
+        var digits = 0
+        while let scalar = next, scalar.isASCII, let digit = Int(String(scalar)) {
+            value = value * 10 + digit
+            digits += 1
+            index += 1
+        }
+        guard digits > 0 else { throw Unsupported() }
+        return value
+    }
+
+    private mutating func atom() throws -> PrefilterNode {
+        let scalar = try take()
+        switch scalar {
+        case "(":
+            return try group()
+        case "[":
+            return try characterClass()
+        case "\\":
+            return try escape()
+        case ".":
+            return .set(.all)
+        case "^":
+            return .assertion
+        case "$":
+            return .lineEnd
+        case "*", "+", "?", "{":
+            throw Unsupported()
+        default:
+            return character(scalar.value)
+        }
+    }
+
+    private func character(_ value: UInt32) -> PrefilterNode {
+        guard value < 0x80 else {
+            // Non-ASCII characters can fold to ASCII letters.
+            return .set(caseInsensitive ? .all : UnitSet(nonASCII: true))
+        }
+        let unit = UInt16(value)
+        if caseInsensitive && Character(Unicode.Scalar(UInt8(unit))).isLetter {
+            var set = UnitSet()
+            set.insert(unit)
+            return .set(set.caseClosed)
+        }
+        return .literal(unit)
+    }
+
+    private mutating func group() throws -> PrefilterNode {
+        let saved = caseInsensitive
+        if skip("?") {
+            switch try take() {
+            case ":", ">":
+                break
+            case "=", "!":
+                _ = try alternation()
+                caseInsensitive = saved
+                guard skip(")") else { throw Unsupported() }
+                return .assertion
+            case "<":
+                // Lookbehinds are rejected before parsing; this is a named group.
+                while let scalar = next, scalar != ">" { index += 1 }
+                guard skip(">") else { throw Unsupported() }
+            case "#":
+                while let scalar = next, scalar != ")" { index += 1 }
+                guard skip(")") else { throw Unsupported() }
+                return .assertion
+            default:
+                index -= 1
+                var enable = true
+                while let scalar = next, scalar != ":", scalar != ")" {
+                    index += 1
+                    switch scalar {
+                    case "-": enable = false
+                    case "i": caseInsensitive = enable
+                    case "m", "s", "w": break
+                    default: throw Unsupported()
+                    }
+                }
+                if skip(")") {
+                    // `(?i)` applies to the rest of the enclosing group, which
+                    // restores the flags when it closes.
+                    return .assertion
+                }
+                index += 1
+            }
+        }
+        let node = try alternation()
+        caseInsensitive = saved
+        guard skip(")") else { throw Unsupported() }
+        return node
+    }
+
+    private mutating func escape() throws -> PrefilterNode {
+        let scalar = try take()
+        if let set = try classEscape(scalar) {
+            return .set(set)
+        }
+        switch scalar {
+        case "b", "B":
+            return .assertion
+        default:
+            return character(try escapedCharacter(scalar))
+        }
+    }
+
+    /// The set of `\d`, `\w`, `\s`, `\v`, their negations and `\p`.
+    private mutating func classEscape(_ scalar: Unicode.Scalar) throws -> UnitSet? {
+        switch scalar {
+        case "d": return UnitSet.digits.withNonASCII
+        case "D": return UnitSet.digits.inverted
+        case "w": return UnitSet.word.withNonASCII
+        case "W": return UnitSet.word.inverted
+        case "s": return UnitSet.space.withNonASCII
+        case "S": return UnitSet.space.inverted
+        case "v": return UnitSet(range: 0x0A...0x0D).withNonASCII
+        case "p", "P":
+            if skip("{") {
+                while let scalar = next, scalar != "}" { index += 1 }
+                guard skip("}") else { throw Unsupported() }
+            } else {
+                _ = try take()
+            }
+            return .all
+        default:
+            return nil
+        }
+    }
+
+    /// The code point of an escape that stands for one character.
+    private mutating func escapedCharacter(_ scalar: Unicode.Scalar) throws -> UInt32 {
+        switch scalar {
+        case "n": return 0x0A
+        case "r": return 0x0D
+        case "t": return 0x09
+        case "f": return 0x0C
+        case "a": return 0x07
+        case "e": return 0x1B
+        case "x":
+            if skip("{") {
+                let value = try hex(maxDigits: 6)
+                guard skip("}") else { throw Unsupported() }
+                return value
+            }
+            return try hex(maxDigits: 2, exactly: true)
+        case "u":
+            return try hex(maxDigits: 4, exactly: true)
+        default:
+            guard scalar.isASCII,
+                  !Character(scalar).isLetter,
+                  !Character(scalar).isNumber else {
+                throw Unsupported()
+            }
+            return scalar.value
+        }
+    }
+
+    private mutating func hex(maxDigits: Int, exactly: Bool = false) throws -> UInt32 {
+        var value: UInt32 = 0
+        var digits = 0
+        while digits < maxDigits, let scalar = next, scalar.isASCII, let digit = UInt32(String(scalar), radix: 16) {
+            value = value * 16 + digit
+            digits += 1
+            index += 1
+        }
+        guard digits > 0, !exactly || digits == maxDigits else { throw Unsupported() }
+        return value
+    }
+
+    private mutating func characterClass() throws -> PrefilterNode {
+        let negated = skip("^")
+        guard next != "]" else { throw Unsupported() }
+        var set = UnitSet()
+        var approximate = false
+        while true {
+            let scalar = try take()
+            if scalar == "]" { break }
+            if scalar == "[" || (scalar == "&" && next == "&") || (scalar == "-" && next == "-") {
+                throw Unsupported()
+            }
+            let low: UInt32
+            if scalar == "\\" {
+                let escaped = try take()
+                if escaped == "b" { throw Unsupported() }
+                if let escapedSet = try classEscape(escaped) {
+                    approximate = approximate || escaped == "p" || escaped == "P"
+                    set = set.union(escapedSet)
+                    continue
+                }
+                low = try escapedCharacter(escaped)
+            } else {
+                low = scalar.value
+            }
+            var high = low
+            if next == "-", index + 1 < scalars.count, scalars[index + 1] != "]" {
+                index += 1
+                let scalar = try take()
+                if scalar == "\\" {
+                    let escaped = try take()
+                    guard try classEscape(escaped) == nil else { throw Unsupported() }
+                    high = try escapedCharacter(escaped)
+                } else if scalar == "[" {
+                    throw Unsupported()
+                } else {
+                    high = scalar.value
+                }
+                guard low <= high else { throw Unsupported() }
+            }
+            // Under case folding non-ASCII characters can stand for ASCII letters.
+            approximate = approximate || (caseInsensitive && high >= 0x80)
+            set = set.union(UnitSet(range: low...high))
+        }
+        // Only the ASCII part of `set` is exact, and a negated class needs it
+        // to be; an approximate class can start anywhere.
+        if approximate {
+            return .set(.all)
+        }
+        if caseInsensitive {
+            set = set.caseClosed
+        }
+        return .set(negated ? set.inverted : set)
+    }
+}
@@ -0,0 +1,172 @@
+import Foundation
+
+/// Parse results of recently highlighted code, and their HTML once rendered.
+///
+/// Entries are evicted least recently used first once their estimated size
+/// passes the limit. The parsers of one `Highlight` share the cache from any
+/// thread, so every access takes a lock.
+internal final class ResultCache: @unchecked Sendable {
+    /// Everything a parse result depends on besides the language definitions,
+    /// which `generation` stands for
+    struct Key: Hashable {
+        let code: String
+        let language: String
+        let ignoreIllegals: Bool
+        /// `LanguageSet.generation` of the languages parsed with
+        let generation: Int
+        let classPrefix: String
+        let autoDetectLanguages: [String]?
+        let autoDetectCandidates: Int?
+    }
+
+    /// A cached result in the recency list, most recent first
+    private final class Entry {
+        let key: Key
+        let result: ParseResult
+        var html: String?
+        var byteCount: Int
+        var newer: Entry?
+        var older: Entry?
+
+        init(key: Key, result: ParseResult, byteCount: Int) {
+            self.key = key
+            self.result = result
+            self.byteCount = byteCount
+        }
+    }
+
+    /// Most bytes the entries may take, by `estimatedByteCount`
+    let limit: Int
+
+    private let lock = NSLock()
+    private var entries: [Key: Entry] = [:]
+    private var newest: Entry?
+    private var oldest: Entry?
+    private var byteCount = 0
+    private var hits = 0
+    private var misses = 0
+    private var evictions = 0
+
+    init(limit: Int) {
+        self.limit = limit
+    }
+
+    deinit {
+        removeAll()
+    }
+
+    var statistics: ResultCacheStatistics {
+        lock.lock()
+        defer { lock.unlock() }
+        return ResultCacheStatistics(
+            hits: hits,
+            misses: misses,
+            evictions: evictions,
+            entryCount: entries.count,
+            byteCount: byteCount
+        )
+    }
+
+    /// The cached result for `key`, which becomes the most recently used.
+    func result(for key: Key) -> ParseResult? {
+        lock.lock()
+        defer { lock.unlock() }
+        guard let entry = entries[key] else {
+            misses += 1
+            return nil
+        }
+        hits += 1
+        moveToFront(entry)
+        return entry.result
+    }
+
+    /// The HTML rendered from the cached result for `key`, if stored.
+    func html(for key: Key) -> String? {
+        lock.lock()
+        defer { lock.unlock() }
+        return entries[key]?.html
+    }
+
+    func insert(_ result: ParseResult, for key: Key) {
+        let size = Self.estimatedByteCount(of: result)
+        guard size <= limit else { return }
+        lock.lock()
+        defer { lock.unlock() }
+        if let existing = entries[key] {
+            unlink(existing)
+        }
+        let entry = Entry(key: key, result: result, byteCount: size)
+        entries[key] = entry
+        byteCount += size
+        moveToFront(entry)
+        evictOverflow()
+    }
+
+    /// Stores the HTML rendered from the cached result for `key`, if it is still cached.
+    func setHTML(_ html: String, for key: Key) {
+        lock.lock()
+        defer { lock.unlock() }
+        guard let entry = entries[key], entry.html == nil else { return }
+        entry.html = html
+        entry.byteCount += html.utf8.count
+        byteCount += html.utf8.count
+        evictOverflow()
+    }
+
+    /// Drops every entry; the counters are kept.
+    func removeAll() {
+        lock.lock()
+        defer { lock.unlock() }
+        // Unlink one by one so neighbouring entries do not keep each other alive
+        while let entry = oldest {
+            unlink(entry)
+        }
+    }
+
+    private func evictOverflow() {
+        while byteCount > limit, let entry = oldest {
+            unlink(entry)
+            evictions += 1
+        }
+    }
+
+    private func moveToFront(_ entry: Entry) {
+        guard newest !== entry else { return }
+        if entry.newer != nil || entry.older != nil || oldest === entry {
+            detach(entry)
+        }
+        entry.older = newest
+        newest?.newer = entry
+        newest = entry
+        if oldest == nil {
+            oldest = entry
+        }
+    }
+
+    /// Takes `entry` out of the list and the table.
+    private func unlink(_ entry: Entry) {
+        detach(entry)
+        entries.removeValue(forKey: entry.key)
+        byteCount -= entry.byteCount
+    }
+
+    private func detach(_ entry: Entry) {
+        if let newer = entry.newer {
+            newer.older = entry.older
+        } else if newest === entry {
+            newest = entry.older
+        }
+        if let older = entry.older {
+            older.newer = entry.newer
+        } else if oldest === entry {
+            oldest = entry.newer
+        }
+        entry.newer = nil
+        entry.older = nil
+    }
+
+    /// A rough size of a result in memory: its code in UTF-8 and its tokens.
+    static func estimatedByteCount(of result: ParseResult) -> Int {
+        128 + result.code.utf8.count + result.tokenTree.tokens.estimatedByteCount
+    }
+}
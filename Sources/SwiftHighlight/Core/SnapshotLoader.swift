@@ -0,0 +1,155 @@
+import Foundation
+
+/// Builds the compiled mode graph of a `LanguageSnapshot`.
+///
+/// The snapshot already holds everything `ModeCompiler` derives (expanded
+/// variants, terminators, keyword tables and combined matcher patterns), so
+/// loading only creates the regexes and wires modes together by index.
+internal final class SnapshotLoader {
+    private typealias Payload = LanguageSnapshot.Payload
+
+    private let payload: Payload
+    private let options: NSRegularExpression.Options
+
+    /// Compiled regexes by source; merged variants repeat the same patterns
+    private var regexes: [String: NSRegularExpression?] = [:]
+
+    init(snapshot: LanguageSnapshot) {
+        self.payload = snapshot.payload
+        var options: NSRegularExpression.Options = [.anchorsMatchLines]
+        if snapshot.payload.caseInsensitive {
+            options.insert(.caseInsensitive)
+        }
+        self.options = options
+    }
+
+    func load() -> CompiledMode {
+        let modes = payload.modes.map { _ in CompiledMode() }
+        let keywordTables = payload.keywords.map(compileKeywords)
+
+        func mode(_ index: Int?) -> CompiledMode? {
+            guard let index, modes.indices.contains(index) else { return nil }
+            return modes[index]
+        }
+
+        for (entry, cmode) in zip(payload.modes, modes) {
+            cmode.caseInsensitive = payload.caseInsensitive
+            cmode.scope = entry.scope
+            cmode.beginRe = entry.begin.flatMap(regex)
+            cmode.endRe = entry.end.flatMap(regex)
+            cmode.illegalRe = entry.illegal.flatMap(regex)
+            cmode.terminatorEnd = entry.terminatorEnd ?? ""
+
+            if let index = entry.keywords, keywordTables.indices.contains(index) {
+                cmode.keywords = keywordTables[index].keywords
+                cmode.keywordPatternRe = keywordTables[index].pattern
+            }
+
+            cmode.contains = (entry.contains ?? []).compactMap { mode($0) }
+            cmode.starts = mode(entry.starts)
+            cmode.parent = mode(entry.parent)
+
+            cmode.relevance = entry.relevance
+            cmode.excludeBegin = entry.excludeBegin ?? false
+            cmode.excludeEnd = entry.excludeEnd ?? false
+            cmode.returnBegin = entry.returnBegin ?? false
+            cmode.returnEnd = entry.returnEnd ?? false
+            cmode.endsWithParent = entry.endsWithParent ?? false
+            cmode.endsParent = entry.endsParent ?? false
+            cmode.skip = entry.skip ?? false
+
+            if let name = entry.subLanguage {
+                cmode.subLanguage = .single(name)
+            } else if let names = entry.subLanguages {
+                cmode.subLanguage = .multiple(names)
+            }
+            cmode.beginScope = entry.beginScope.map(compileScope)
+            cmode.endScope = entry.endScope.map(compileScope)
+        }
+
+        for (entry, cmode) in zip(payload.modes, modes) {
+            cmode.matcher = loadMatcher(entry.matcher, for: cmode, modes: modes)
+        }
+
+        return modes[0]
+    }
+
+    private func regex(_ source: String) -> NSRegularExpression? {
+        if let cached = regexes[source] {
+            return cached
+        }
+        let compiled = try? NSRegularExpression(pattern: source, options: options)
+        regexes[source] = compiled
+        return compiled
+    }
+
+    private func compileKeywords(
+        _ table: LanguageSnapshot.KeywordTable
+    ) -> (keywords: CompiledKeywords?, pattern: NSRegularExpression?) {
+        guard let pattern = regex(table.pattern) else {
+            return (nil, nil)
+        }
+        var words: [String: (scope: String, relevance: Int)] = [:]
+        words.reserveCapacity(table.words.count)
+        for (word, value) in table.words {
+            guard value.count == 2, table.scopes.indices.contains(value[0]) else { continue }
+            words[word] = (table.scopes[value[0]], value[1])
+        }
+        return (CompiledKeywords(pattern: pattern, keywords: words), pattern)
+    }
+
+    private func compileScope(_ entry: LanguageSnapshot.ScopeEntry) -> CompiledScope {
+        var compiled = CompiledScope()
+        if let wrap = entry.wrap {
+            compiled.wrap = wrap
+        } else if let scopes = entry.scopes {
+            compiled.multi = true
+            for (key, name) in scopes {
+                guard let index = Int(key) else { continue }
+                compiled.scopes[index] = name
+                compiled.emit[index] = true
+            }
+        }
+        return compiled
+    }
+
+    /// Uses the snapshot's combined pattern when every rule resolves to the same
+    /// regex `ModeCompiler` would add; otherwise builds the matcher the usual way.
+    private func loadMatcher(
+        _ entry: LanguageSnapshot.MatcherEntry?,
+        for cmode: CompiledMode,
+        modes: [CompiledMode]
+    ) -> ResumableMultiRegex {
+        let unicode = payload.unicodeRegex
+        if let entry, let matcher = precompiledMatcher(entry, for: cmode, modes: modes, unicode: unicode) {
+            return matcher
+        }
+        return ModeCompiler.buildModeRegex(cmode, caseInsensitive: payload.caseInsensitive, unicode: unicode)
+    }
+
+    private func precompiledMatcher(
+        _ entry: LanguageSnapshot.MatcherEntry,
+        for cmode: CompiledMode,
+        modes: [CompiledMode],
+        unicode: Bool
+    ) -> ResumableMultiRegex? {
+        let mm = ResumableMultiRegex(caseInsensitive: payload.caseInsensitive, unicode: unicode)
+        for rule in entry.rules {
+            guard rule.count == 3 else { return nil }
+            switch rule[0] {
+            case 0:
+                guard modes.indices.contains(rule[1]), let beginRe = modes[rule[1]].beginRe else { return nil }
+                mm.addRule(beginRe.pattern, type: .begin, rule: modes[rule[1]], captures: rule[2])
+            case 1:
+                guard !cmode.terminatorEnd.isEmpty else { return nil }
+                mm.addRule(cmode.terminatorEnd, type: .end, captures: rule[2])
+            case 2:
+                guard let illegalRe = cmode.illegalRe else { return nil }
+                mm.addRule(illegalRe.pattern, type: .illegal, captures: rule[2])
+            default:
+                return nil
+            }
+        }
+        return mm.compile(combinedPattern: entry.pattern) ? mm : nil
+    }
+}
@@ -0,0 +1,53 @@
+import Foundation
+
+/// The code being parsed, converted once per parse into a contiguous UTF-16
+/// buffer.
+///
+/// The parse loop passes integer UTF-16 ranges of this buffer around and
+/// leaves them in the token tree until it is frozen, so lexemes and the text
+/// between them are never copied into `String`s while scanning. `string` is
+/// backed by an `NSString` over the same units, so handing it to
+/// `NSRegularExpression` does not bridge or transcode the code again.
+internal final class SourceText: Sendable {
+    /// The code's UTF-16 code units
+    let units: [UInt16]
+
+    /// The code, for `NSRegularExpression`
+    let string: String
+
+    convenience init(_ code: String) {
+        self.init(units: Array(code.utf16))
+    }
+
+    init(units: [UInt16]) {
+        self.units = units
+        self.string = units.withUnsafeBufferPointer { buffer in
+            guard let base = buffer.baseAddress else { return "" }
+            return NSString(characters: base, length: buffer.count) as String
+        }
+    }
+
+    /// Length in UTF-16 code units
+    var length: Int { units.count }
+
+    /// Materializes a range of the code.
+    func substring(_ range: Range<Int>) -> String {
+        String(decoding: units[range], as: UTF16.self)
+    }
+
+    /// The code with the UTF-16 range `range` replaced by `text`.
+    func replacing(_ range: Range<Int>, with text: String) -> SourceText {
+        var edited = units
+        edited.replaceSubrange(range, with: text.utf16)
+        return SourceText(units: edited)
+    }
+
+    /// UTF-16 offsets at which lines start: 0, and the offset after each `\n`.
+    func lineStarts() -> [Int] {
+        var starts = [0]
+        for (offset, unit) in units.enumerated() where unit == 0x0A {
+            starts.append(offset + 1)
+        }
+        return starts
+    }
+}
@@ -0,0 +1,254 @@
+import Foundation
+
+/// The tokens of a parse as flat arrays, one entry per scope opened, scope
+/// closed or run of text, in document order.
+///
+/// Entries point back into the code rather than holding copies: a text entry
+/// is a UTF-16 range of one of the buffers the list keeps, the parsed code
+/// first among them, and scope entries hold an index into a table of the
+/// scope names used. Going through the entries in order visits the tokens of
+/// `TokenTree.root` depth first, so renderers can walk a parse without
+/// recursion or building the tree:
+///
+/// ```swift
+/// for index in 0..<tokens.count {
+///     switch tokens.kind(at: index) {
+///     case .open: print("open", tokens.scope(at: index) ?? "", "at depth", tokens.depth(at: index))
+///     case .text: print("text", tokens.text(at: index))
+///     case .close: print("close", tokens.scope(at: index) ?? "")
+///     }
+/// }
+/// ```
+public struct TokenList: Sendable, Hashable {
+    /// What an entry stands for
+    public enum Kind: UInt8, Sendable {
+        /// A scope starts; it ends at the next `.close` at the same depth
+        case open
+        /// The innermost open scope ends
+        case close
+        /// A run of text
+        case text
+    }
+
+    /// A scope and the sub-language it embeds, as interned by the list
+    struct ScopeName: Hashable, Sendable {
+        let scope: String?
+        let language: String?
+    }
+
+    /// Kind of each entry
+    private(set) var kinds: [Kind] = []
+
+    /// Scopes open around each entry, its own not counted
+    private(set) var depths: [Int32] = []
+
+    /// For a scope entry, its index in `scopeNames`; for text, in `sources`
+    private(set) var values: [Int32] = []
+
+    /// UTF-16 range of each text entry in its source; empty for scope entries
+    private(set) var starts: [Int] = []
+    private(set) var ends: [Int] = []
+
+    /// Every scope of the entries, once each
+    private(set) var scopeNames: [ScopeName] = []
+    private var scopeIDs: [ScopeName: Int32] = [:]
+
+    /// The buffers text entries point into
+    private(set) var sources: [SourceText] = []
+
+    /// The scope of the tree's root, which has no entry
+    private(set) var root = ScopeName(scope: nil, language: nil)
+
+    init(source: SourceText? = nil) {
+        if let source {
+            sources = [source]
+        }
+    }
+
+    /// The entries of a tree, with its text copied into one buffer.
+    init(_ rootNode: ScopeNode) {
+        root = ScopeName(scope: rootNode.scope, language: rootNode.language)
+        var units: [UInt16] = []
+
+        var path: [(node: ScopeNode, next: Int)] = [(rootNode, 0)]
+        while let current = path.last {
+            guard current.next < current.node.children.count else {
+                path.removeLast()
+                if !path.isEmpty {
+                    let id = intern(ScopeName(scope: current.node.scope, language: current.node.language))
+                    append(.close, value: id, depth: path.count - 1)
+                }
+                continue
+            }
+            path[path.count - 1].next += 1
+            switch current.node.children[current.next] {
+            case .text(let text):
+                let start = units.count
+                units += text.utf16
+                append(.text, value: 0, depth: path.count - 1, range: start..<units.count)
+            case .scope(let child):
+                let id = intern(ScopeName(scope: child.scope, language: child.language))
+                append(.open, value: id, depth: path.count - 1)
+                path.append((child, 0))
+            }
+        }
+
+        sources = [SourceText(units: units)]
+    }
+
+    /// Number of entries
+    public var count: Int { kinds.count }
+
+    public func kind(at index: Int) -> Kind {
+        kinds[index]
+    }
+
+    /// Number of scopes open around the entry, not counting its own.
+    public func depth(at index: Int) -> Int {
+        Int(depths[index])
+    }
+
+    /// The scope an `.open` or `.close` entry starts or ends; nil for text.
+    public func scope(at index: Int) -> String? {
+        kinds[index] == .text ? nil : scopeNames[Int(values[index])].scope
+    }
+
+    /// The sub-language an `.open` or `.close` entry's scope was parsed as, if set.
+    public func language(at index: Int) -> String? {
+        kinds[index] == .text ? nil : scopeNames[Int(values[index])].language
+    }
+
+    /// The text of a `.text` entry; empty for the others.
+    public func text(at index: Int) -> String {
+        String(decoding: textUnits(at: index), as: UTF16.self)
+    }
+
+    /// The UTF-16 code units of a `.text` entry, without copying them.
+    func textUnits(at index: Int) -> ArraySlice<UInt16> {
+        guard kinds[index] == .text else { return [] }
+        return sources[Int(values[index])].units[starts[index]..<ends[index]]
+    }
+
+    func scopeName(at index: Int) -> ScopeName {
+        scopeNames[Int(values[index])]
+    }
+
+    /// Whether a text entry points into the first source, the parsed code.
+    func isInFirstSource(_ index: Int) -> Bool {
+        values[index] == 0
+    }
+
+    /// UTF-16 range of a text entry in its source.
+    func range(at index: Int) -> Range<Int> {
+        starts[index]..<ends[index]
+    }
+
+    /// The nested tree of the entries.
+    var tree: ScopeNode {
+        var stack: [(name: ScopeName, children: [TokenNode])] = [(root, [])]
+        for index in 0..<count {
+            switch kinds[index] {
+            case .open:
+                stack.append((scopeName(at: index), []))
+            case .text:
+                stack[stack.count - 1].children.append(.text(text(at: index)))
+            case .close:
+                guard stack.count > 1 else { continue }
+                let node = stack.removeLast()
+                let scopeNode = ScopeNode(scope: node.name.scope, language: node.name.language, children: node.children)
+                stack[stack.count - 1].children.append(.scope(scopeNode))
+            }
+        }
+        return ScopeNode(scope: root.scope, language: root.language, children: stack[0].children)
+    }
+
+    /// A rough size of the list in memory: the entries, the buffers in
+    /// UTF-16 and the scope names in UTF-8.
+    var estimatedByteCount: Int {
+        var bytes = count * 33
+        for source in sources {
+            bytes += 64 + 2 * source.length
+        }
+        for name in scopeNames {
+            bytes += 32 + (name.scope?.utf8.count ?? 0) + (name.language?.utf8.count ?? 0)
+        }
+        return bytes
+    }
+
+    // MARK: - Building
+
+    /// The id of `name`, adding it to the table if new.
+    mutating func intern(_ name: ScopeName) -> Int32 {
+        if let id = scopeIDs[name] {
+            return id
+        }
+        let id = Int32(scopeNames.count)
+        scopeNames.append(name)
+        scopeIDs[name] = id
+        return id
+    }
+
+    /// Adds a buffer for text entries to point into, returning its index.
+    mutating func addSource(_ source: SourceText) -> Int32 {
+        sources.append(source)
+        return Int32(sources.count - 1)
+    }
+
+    mutating func append(_ kind: Kind, value: Int32, depth: Int, range: Range<Int> = 0..<0) {
+        kinds.append(kind)
+        values.append(value)
+        depths.append(Int32(depth))
+        starts.append(range.lowerBound)
+        ends.append(range.upperBound)
+    }
+
+    /// Adds the entries of `other` at `depth`, keeping its sources.
+    mutating func append(contentsOf other: TokenList, depth: Int) {
+        let firstSource = Int32(sources.count)
+        sources += other.sources
+        let ids = other.scopeNames.map { intern($0) }
+        for index in 0..<other.count {
+            let kind = other.kinds[index]
+            let value = kind == .text ? firstSource + other.values[index] : ids[Int(other.values[index])]
+            kinds.append(kind)
+            values.append(value)
+            depths.append(Int32(depth) + other.depths[index])
+        }
+        starts += other.starts
+        ends += other.ends
+    }
+
+    // MARK: - Hashable
+
+    /// Lists are equal when their entries are, whatever buffers their text is in.
+    public static func == (lhs: TokenList, rhs: TokenList) -> Bool {
+        guard lhs.root == rhs.root, lhs.kinds == rhs.kinds, lhs.depths == rhs.depths else {
+            return false
+        }
+        for index in 0..<lhs.count {
+            if lhs.kinds[index] == .text {
+                guard lhs.textUnits(at: index).elementsEqual(rhs.textUnits(at: index)) else { return false }
+            } else {
+                guard lhs.scopeName(at: index) == rhs.scopeName(at: index) else { return false }
+            }
+        }
+        return true
+    }
+
+    public func hash(into hasher: inout Hasher) {
+        hasher.combine(root)
+        hasher.combine(kinds)
+        hasher.combine(depths)
+        for index in 0..<count {
+            if kinds[index] == .text {
+                let units = textUnits(at: index)
+                hasher.combine(units.count)
+                for unit in units {
+                    hasher.combine(unit)
+                }
+            } else {
+                hasher.combine(scopeName(at: index))
+            }
+        }
+    }
+}
@@ -28,83 +28,171 @@ public struct ScopeNode: Sendable, Hashable {
 /// A wrapper for the token tree root with associated language.
 /// Use this for custom rendering of highlighted code.
 public struct TokenTree: Sendable, Hashable {
-    /// The root node of the token tree
-    public let root: ScopeNode
+    /// The tokens in document order as flat arrays, for walking without
+    /// recursion; see `TokenList`
+    public let tokens: TokenList
     /// The language used for highlighting
     public let language: String
 
+    private let builtRoot: BuiltRoot
+
+    /// The root node of the token tree, built from `tokens` the first time it is read
+    public var root: ScopeNode {
+        builtRoot.root { tokens.tree }
+    }
+
     public init(root: ScopeNode, language: String) {
-        self.root = root
+        self.tokens = TokenList(root)
         self.language = language
+        self.builtRoot = BuiltRoot(root)
     }
-}
 
-// MARK: - Internal Builder
+    init(tokens: TokenList, language: String) {
+        self.tokens = tokens
+        self.language = language
+        self.builtRoot = BuiltRoot(nil)
+    }
 
-/// Internal mutable node used during tree construction
-private final class MutableScopeNode {
-    var scope: String?
-    var language: String?
-    var children: [MutableTokenNode] = []
+    public static func == (lhs: TokenTree, rhs: TokenTree) -> Bool {
+        lhs.language == rhs.language && lhs.tokens == rhs.tokens
+    }
 
-    init(scope: String? = nil, language: String? = nil) {
-        self.scope = scope
-        self.language = language
+    public func hash(into hasher: inout Hasher) {
+        hasher.combine(tokens)
+        hasher.combine(language)
+    }
+}
+
+/// The nested form of a `TokenTree`, built once on first use.
+private final class BuiltRoot: @unchecked Sendable {
+    private let lock = NSLock()
+    private var node: ScopeNode?
+
+    init(_ node: ScopeNode?) {
+        self.node = node
     }
 
-    /// Converts to immutable ScopeNode
-    func freeze() -> ScopeNode {
-        ScopeNode(
-            scope: scope,
-            language: language,
-            children: children.map { $0.freeze() }
-        )
+    func root(_ build: () -> ScopeNode) -> ScopeNode {
+        lock.lock()
+        defer { lock.unlock() }
+        if let node {
+            return node
+        }
+        let built = build()
+        node = built
+        return built
     }
 }
 
-/// Internal mutable token node used during tree construction
-private enum MutableTokenNode {
-    case text(String)
-    case scope(MutableScopeNode)
-
-    func freeze() -> TokenNode {
-        switch self {
-        case .text(let s):
-            return .text(s)
-        case .scope(let node):
-            return .scope(node.freeze())
+/// Passes tokens on to a `TokenSink` as they are emitted. A scope is passed
+/// on once something is added to it, so empty scopes are dropped as the tree
+/// renderers skip them.
+internal final class TokenStream {
+    private(set) var sink: any TokenSink
+    /// Scopes opened but not passed on yet, innermost last
+    private var pending: [String] = []
+
+    init(_ sink: any TokenSink) {
+        self.sink = sink
+    }
+
+    func openScope(_ scope: String) {
+        passOnPending()
+        pending.append(scope)
+    }
+
+    func addText(_ text: String) {
+        passOnPending()
+        sink.addText(text)
+    }
+
+    func closeScope() {
+        if pending.popLast() == nil {
+            sink.closeScope()
+        }
+    }
+
+    func finish() {
+        sink.finish()
+    }
+
+    /// Passes on the tokens of a finished parse
+    func add(_ tokens: TokenList) {
+        for index in 0..<tokens.count {
+            switch tokens.kind(at: index) {
+            case .open:
+                if let scope = tokens.scope(at: index) {
+                    openScope(scope)
+                }
+            case .text:
+                addText(tokens.text(at: index))
+            case .close:
+                if tokens.scope(at: index) != nil {
+                    closeScope()
+                }
+            }
         }
     }
+
+    private func passOnPending() {
+        for scope in pending {
+            sink.openScope(scope)
+        }
+        pending.removeAll(keepingCapacity: true)
+    }
 }
 
-/// Token tree emitter - builds a tree structure during parsing
+/// Token tree emitter - records the tokens of a parse in a `TokenList`
 internal final class TokenTreeEmitter {
-    private var rootNode = MutableScopeNode()
-    private var stack: [MutableScopeNode] = []
+    /// The tokens so far; text ranges of the code point into its first source
+    private var list: TokenList
+    /// Interned ids of the open scopes, outermost first
+    private var stack: [Int32] = []
     private let options: HighlightOptions
+    /// Receives the tokens instead of the list when streaming; the stack then
+    /// only tracks which scopes are open
+    private let stream: TokenStream?
 
-    var root: ScopeNode { rootNode.freeze() }
+    /// The recorded tokens, once all scopes are closed
+    var tokens: TokenList { list }
 
-    init(options: HighlightOptions) {
+    init(options: HighlightOptions, source: SourceText? = nil, stream: TokenStream? = nil) {
         self.options = options
-        stack = [rootNode]
-    }
-
-    private var top: MutableScopeNode {
-        stack.last ?? rootNode
+        self.stream = stream
+        list = TokenList(source: source ?? SourceText(units: []))
     }
 
     /// Adds text to the current node
     func addText(_ text: String) {
         guard !text.isEmpty else { return }
-        top.children.append(.text(text))
+        if let stream {
+            stream.addText(text)
+        } else {
+            let source = SourceText(text)
+            list.append(.text, value: list.addSource(source), depth: stack.count, range: 0..<source.length)
+        }
+    }
+
+    /// Adds a UTF-16 range of the source to the current node. The text is
+    /// only copied out when it is read.
+    func addText(_ range: Range<Int>) {
+        guard !range.isEmpty else { return }
+        if let stream {
+            stream.addText(String(decoding: list.sources[0].units[range], as: UTF16.self))
+        } else {
+            list.append(.text, value: 0, depth: stack.count, range: range)
+        }
     }
 
     /// Opens a new scope
     func openNode(_ scope: String) {
-        let node = MutableScopeNode(scope: scope)
-        top.children.append(.scope(node))
-        stack.append(node)
+        let id = list.intern(TokenList.ScopeName(scope: scope, language: nil))
+        if let stream {
+            stream.openScope(scope)
+        } else {
+            list.append(.open, value: id, depth: stack.count)
+        }
+        stack.append(id)
     }
 
     /// Starts a new scope (alias for openNode)
@@ -117,59 +205,96 @@ internal final class TokenTreeEmitter {
         closeNode()
     }
 
-    /// Closes the current node (discards return value externally)
+    /// Closes the current node
     func closeNode() {
-        guard stack.count > 1 else { return }
-        _ = stack.removeLast()
-    }
-
-    /// Internal version that returns the node
-    @discardableResult
-    private func closeNodeInternal() -> MutableScopeNode? {
-        guard stack.count > 1 else { return nil }
-        return stack.removeLast()
+        guard let id = stack.popLast() else { return }
+        if let stream {
+            stream.closeScope()
+        } else {
+            list.append(.close, value: id, depth: stack.count)
+        }
     }
 
     /// Closes all open nodes
     func closeAllNodes() {
-        while stack.count > 1 {
+        while !stack.isEmpty {
             closeNode()
         }
     }
 
     /// Adds a sublanguage result
     func addSublanguage(_ emitter: TokenTreeEmitter, name: String?) {
-        let node = MutableScopeNode(scope: name.map { "language:\($0)" })
-        node.children = emitter.rootNode.children
-        top.children.append(.scope(node))
+        addSublanguage(emitter.tokens, name: name)
     }
 
     /// Adds a sublanguage token tree
     func addSublanguage(_ tree: TokenTree, name: String?) {
-        let node = MutableScopeNode(scope: name.map { "language:\($0)" })
-        node.children = tree.root.children.map { thaw($0) }
-        top.children.append(.scope(node))
+        addSublanguage(tree.tokens, name: name)
     }
 
-    /// Finalizes the tree
-    func finalize() {
-        closeAllNodes()
+    /// Adds the tokens of a sub-language parse inside a `language:` scope.
+    /// The tokens keep pointing into the sub-language's own source.
+    private func addSublanguage(_ tokens: TokenList, name: String?) {
+        let scope = name.map { "language:\($0)" }
+        if let stream {
+            if let scope {
+                stream.openScope(scope)
+            }
+            stream.add(tokens)
+            if scope != nil {
+                stream.closeScope()
+            }
+            return
+        }
+        let id = list.intern(TokenList.ScopeName(scope: scope, language: nil))
+        list.append(.open, value: id, depth: stack.count)
+        list.append(contentsOf: tokens, depth: stack.count + 1)
+        list.append(.close, value: id, depth: stack.count)
     }
 
-    private func thaw(_ node: TokenNode) -> MutableTokenNode {
-        switch node {
-        case .text(let text):
-            return .text(text)
-        case .scope(let scopeNode):
-            let child = MutableScopeNode(scope: scopeNode.scope, language: scopeNode.language)
-            child.children = scopeNode.children.map { thaw($0) }
-            return .scope(child)
+    /// Scopes of the nodes that are open, outermost first
+    var openScopes: [String] {
+        stack.compactMap { list.scopeNames[Int($0)].scope }
+    }
+
+    /// Calls `body` with each run of text in document order and the scopes
+    /// around it, outermost first. Source ranges are passed as they are; text
+    /// held elsewhere (from a sub-language) follows the previous run, or
+    /// starts at `start` if it is first.
+    func forEachRun(from start: Int, _ body: (Range<Int>, [String]) -> Void) {
+        var offset = start
+        var scopes: [String] = []
+        for index in 0..<list.count {
+            switch list.kind(at: index) {
+            case .open:
+                if let scope = list.scope(at: index) {
+                    scopes.append(scope)
+                }
+            case .close:
+                if list.scope(at: index) != nil {
+                    scopes.removeLast()
+                }
+            case .text:
+                let range = list.range(at: index)
+                if list.isInFirstSource(index) {
+                    body(range, scopes)
+                    offset = range.upperBound
+                } else {
+                    body(offset..<(offset + range.count), scopes)
+                    offset += range.count
+                }
+            }
         }
     }
 
+    /// Finalizes the tree
+    func finalize() {
+        closeAllNodes()
+    }
+
     /// Renders the tree to HTML using the public HTMLRenderer
     func toHTML() -> String {
-        let tree = TokenTree(root: rootNode.freeze(), language: "")
+        let tree = TokenTree(tokens: list, language: "")
         let renderer = HTMLRenderer(theme: HTMLTheme(classPrefix: options.classPrefix))
         return renderer.render(tree)
     }
@@ -1,6 +1,9 @@
 import Foundation
 
 public func yamlLanguage(_ hljs: Highlight) -> Language {
+    let box_m22 = ModeBox()
+    let box_m23 = ModeBox()
+
     let mode_m2 = Mode(begin: HLJS.re("[\\w*@][\\w*@ :()\\./-]*:(?=[ \\t]|$)"))
 
     let mode_m3 = Mode(begin: HLJS.re("\"[\\w*@][\\w*@ :()\\./-]*\":(?=[ \\t]|$)"))
@@ -63,11 +66,13 @@ public func yamlLanguage(_ hljs: Highlight) -> Language {
 
     let mode_m26 = Mode(className: "string", contains: [.mode(mode_m27), .mode(mode_m28)], variants: HLJS.variants([mode_m31, mode_m33, mode_m34]), relevance: 0)
 
-    let mode_m21 = Mode(begin: HLJS.re("\\{"), end: HLJS.re("\\}"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), contains: [.mode(Mode(className: "attr", variants: HLJS.variants([Mode(begin: HLJS.re("[\\w*@][\\w*@ :()\\./-]*:(?=[ \\t]|$)")), Mode(begin: HLJS.re("\"[\\w*@][\\w*@ :()\\./-]*\":(?=[ \\t]|$)")), Mode(begin: HLJS.re("'[\\w*@][\\w*@ :()\\./-]*':(?=[ \\t]|$)"))]))), .mode(Mode(className: "meta", begin: HLJS.re("^---\\s*$"), relevance: 10)), .mode(Mode(className: "string", begin: HLJS.re("[\\|>]([1-9]?[+-])?[ ]*\\n( +)[^ ][^\\n]*\\n(\\2[^\\n]+\\n?)*"))), .mode(Mode(begin: HLJS.re("<%[%=-]?"), end: HLJS.re("[%-]?%>"), relevance: 0, excludeBegin: true, excludeEnd: true, subLanguage: SubLanguage.single("ruby"))), .mode(Mode(className: "type", begin: HLJS.re("!\\w+![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!<[\\w#;/?:@&=+$,.~*'()\\[\\]]+>"))), .mode(Mode(className: "type", begin: HLJS.re("![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "meta", begin: HLJS.re("&[a-zA-Z_]\\w*$"))), .mode(Mode(className: "meta", begin: HLJS.re("\\*[a-zA-Z_]\\w*$"))), .mode(Mode(className: "bullet", begin: HLJS.re("-(?=[ ]|$)"), relevance: 0)), .mode(Mode(scope: "comment", begin: HLJS.re("#"), end: HLJS.re("$"), contains: [.mode(Mode(scope: "doctag", begin: HLJS.re("[ ]*(?=(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):)"), end: HLJS.re("(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):"), relevance: 0, excludeBegin: true)), .mode(Mode(begin: HLJS.re("[ ]+((?:I|a|is|so|us|to|at|if|in|it|on|[A-Za-z]+['](d|ve|re|ll|t|s|n)|[A-Za-z]+[-][a-z]+|[A-Za-z][a-z]{2,})[.]?[:]?([.][ ]|[ ])){3}")))])), .mode(Mode(keywords: HLJS.kw(literal: ["true", "false", "yes", "no", "null"]), beginKeywords: "true false yes no null")), .mode(Mode(className: "number", begin: HLJS.re("\\b[0-9]{4}(-[0-9][0-9]){0,2}([Tt \\t][0-9][0-9]?(:[0-9][0-9]){2})?(\\.[0-9]*)?([ \\t])*(Z|[-+][0-9][0-9]?(:[0-9][0-9])?)?\\b"))), .mode(Mode(className: "number", begin: HLJS.re("(-?)(\\b0[xX][a-fA-F0-9]+|(\\b\\d+(\\.\\d*)?|\\.\\d+)([eE][-+]?\\d+)?)\\b"), relevance: 0)), .mode(Mode(begin: HLJS.re("\\{"), end: HLJS.re("\\}"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), contains: [.mode(Mode(className: "attr", variants: HLJS.variants([Mode(begin: HLJS.re("[\\w*@][\\w*@ :()\\./-]*:(?=[ \\t]|$)")), Mode(begin: HLJS.re("\"[\\w*@][\\w*@ :()\\./-]*\":(?=[ \\t]|$)")), Mode(begin: HLJS.re("'[\\w*@][\\w*@ :()\\./-]*':(?=[ \\t]|$)"))]))), .mode(Mode(className: "meta", begin: HLJS.re("^---\\s*$"), relevance: 10)), .mode(Mode(className: "string", begin: HLJS.re("[\\|>]([1-9]?[+-])?[ ]*\\n( +)[^ ][^\\n]*\\n(\\2[^\\n]+\\n?)*"))), .mode(Mode(begin: HLJS.re("<%[%=-]?"), end: HLJS.re("[%-]?%>"), relevance: 0, excludeBegin: true, excludeEnd: true, subLanguage: SubLanguage.single("ruby"))), .mode(Mode(className: "type", begin: HLJS.re("!\\w+![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!<[\\w#;/?:@&=+$,.~*'()\\[\\]]+>"))), .mode(Mode(className: "type", begin: HLJS.re("![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "meta", begin: HLJS.re("&[a-zA-Z_]\\w*$"))), .mode(Mode(className: "meta", begin: HLJS.re("\\*[a-zA-Z_]\\w*$"))), .mode(Mode(className: "bullet", begin: HLJS.re("-(?=[ ]|$)"), relevance: 0)), .mode(Mode(scope: "comment", begin: HLJS.re("#"), end: HLJS.re("$"), contains: [.mode(Mode(scope: "doctag", begin: HLJS.re("[ ]*(?=(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):)"), end: HLJS.re("(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):"), relevance: 0, excludeBegin: true)), .mode(Mode(begin: HLJS.re("[ ]+((?:I|a|is|so|us|to|at|if|in|it|on|[A-Za-z]+['](d|ve|re|ll|t|s|n)|[A-Za-z]+[-][a-z]+|[A-Za-z][a-z]{2,})[.]?[:]?([.][ ]|[ ])){3}")))])), .mode(Mode(keywords: HLJS.kw(literal: ["true", "false", "yes", "no", "null"]), beginKeywords: "true false yes no null")), .mode(Mode(className: "number", begin: HLJS.re("\\b[0-9]{4}(-[0-9][0-9]){0,2}([Tt \\t][0-9][0-9]?(:[0-9][0-9]){2})?(\\.[0-9]*)?([ \\t])*(Z|[-+][0-9][0-9]?(:[0-9][0-9])?)?\\b"))), .mode(Mode(className: "number", begin: HLJS.re("(-?)(\\b0[xX][a-fA-F0-9]+|(\\b\\d+(\\.\\d*)?|\\.\\d+)([eE][-+]?\\d+)?)\\b"), relevance: 0)), .mode(Mode(begin: HLJS.re("\\{"), end: HLJS.re("\\}"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(begin: HLJS.re("\\["), end: HLJS.re("\\]"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(className: "string", begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(scope: "char.escape", match: HLJS.re("''"), relevance: 0))], relevance: 0)), .mode(Mode(className: "string", contains: [.mode(Mode(begin: HLJS.re("\\\\[\\s\\S]"), relevance: 0)), .mode(Mode(className: "template-variable", variants: HLJS.variants([Mode(begin: HLJS.re("\\{\\{"), end: HLJS.re("\\}\\}")), Mode(begin: HLJS.re("%\\{"), end: HLJS.re("\\}"))])))], variants: HLJS.variants([Mode(begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(begin: HLJS.re("''"), relevance: 0))]), Mode(begin: HLJS.re("\""), end: HLJS.re("\"")), Mode(begin: HLJS.re("[^\\s,{}\\[\\]]+"))]), relevance: 0))], relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(begin: HLJS.re("\\["), end: HLJS.re("\\]"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), contains: [.mode(Mode(className: "attr", variants: HLJS.variants([Mode(begin: HLJS.re("[\\w*@][\\w*@ :()\\./-]*:(?=[ \\t]|$)")), Mode(begin: HLJS.re("\"[\\w*@][\\w*@ :()\\./-]*\":(?=[ \\t]|$)")), Mode(begin: HLJS.re("'[\\w*@][\\w*@ :()\\./-]*':(?=[ \\t]|$)"))]))), .mode(Mode(className: "meta", begin: HLJS.re("^---\\s*$"), relevance: 10)), .mode(Mode(className: "string", begin: HLJS.re("[\\|>]([1-9]?[+-])?[ ]*\\n( +)[^ ][^\\n]*\\n(\\2[^\\n]+\\n?)*"))), .mode(Mode(begin: HLJS.re("<%[%=-]?"), end: HLJS.re("[%-]?%>"), relevance: 0, excludeBegin: true, excludeEnd: true, subLanguage: SubLanguage.single("ruby"))), .mode(Mode(className: "type", begin: HLJS.re("!\\w+![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!<[\\w#;/?:@&=+$,.~*'()\\[\\]]+>"))), .mode(Mode(className: "type", begin: HLJS.re("![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "meta", begin: HLJS.re("&[a-zA-Z_]\\w*$"))), .mode(Mode(className: "meta", begin: HLJS.re("\\*[a-zA-Z_]\\w*$"))), .mode(Mode(className: "bullet", begin: HLJS.re("-(?=[ ]|$)"), relevance: 0)), .mode(Mode(scope: "comment", begin: HLJS.re("#"), end: HLJS.re("$"), contains: [.mode(Mode(scope: "doctag", begin: HLJS.re("[ ]*(?=(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):)"), end: HLJS.re("(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):"), relevance: 0, excludeBegin: true)), .mode(Mode(begin: HLJS.re("[ ]+((?:I|a|is|so|us|to|at|if|in|it|on|[A-Za-z]+['](d|ve|re|ll|t|s|n)|[A-Za-z]+[-][a-z]+|[A-Za-z][a-z]{2,})[.]?[:]?([.][ ]|[ ])){3}")))])), .mode(Mode(keywords: HLJS.kw(literal: ["true", "false", "yes", "no", "null"]), beginKeywords: "true false yes no null")), .mode(Mode(className: "number", begin: HLJS.re("\\b[0-9]{4}(-[0-9][0-9]){0,2}([Tt \\t][0-9][0-9]?(:[0-9][0-9]){2})?(\\.[0-9]*)?([ \\t])*(Z|[-+][0-9][0-9]?(:[0-9][0-9])?)?\\b"))), .mode(Mode(className: "number", begin: HLJS.re("(-?)(\\b0[xX][a-fA-F0-9]+|(\\b\\d+(\\.\\d*)?|\\.\\d+)([eE][-+]?\\d+)?)\\b"), relevance: 0)), .mode(Mode(begin: HLJS.re("\\{"), end: HLJS.re("\\}"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(begin: HLJS.re("\\["), end: HLJS.re("\\]"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(className: "string", begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(scope: "char.escape", match: HLJS.re("''"), relevance: 0))], relevance: 0)), .mode(Mode(className: "string", contains: [.mode(Mode(begin: HLJS.re("\\\\[\\s\\S]"), relevance: 0)), .mode(Mode(className: "template-variable", variants: HLJS.variants([Mode(begin: HLJS.re("\\{\\{"), end: HLJS.re("\\}\\}")), Mode(begin: HLJS.re("%\\{"), end: HLJS.re("\\}"))])))], variants: HLJS.variants([Mode(begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(begin: HLJS.re("''"), relevance: 0))]), Mode(begin: HLJS.re("\""), end: HLJS.re("\"")), Mode(begin: HLJS.re("[^\\s,{}\\[\\]]+"))]), relevance: 0))], relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(className: "string", begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(scope: "char.escape", match: HLJS.re("''"), relevance: 0))], relevance: 0)), .mode(Mode(className: "string", contains: [.mode(Mode(begin: HLJS.re("\\\\[\\s\\S]"), relevance: 0)), .mode(Mode(className: "template-variable", variants: HLJS.variants([Mode(begin: HLJS.re("\\{\\{"), end: HLJS.re("\\}\\}")), Mode(begin: HLJS.re("%\\{"), end: HLJS.re("\\}"))])))], variants: HLJS.variants([Mode(begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(begin: HLJS.re("''"), relevance: 0))]), Mode(begin: HLJS.re("\""), end: HLJS.re("\"")), Mode(begin: HLJS.re("[^\\s,{}\\[\\]]+"))]), relevance: 0))], relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)
+    let mode_m21 = Mode(begin: HLJS.re("\\{"), end: HLJS.re("\\}"), illegal: HLJS.re("\\n"), contains: [.mode(box_m22)], relevance: 0)
 
-    let mode_m22 = Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), contains: [.mode(mode_m1), .mode(mode_m5), .mode(mode_m6), .mode(mode_m7), .mode(mode_m8), .mode(mode_m9), .mode(mode_m10), .mode(mode_m11), .mode(mode_m12), .mode(mode_m13), .mode(mode_m14), .mode(mode_m15), .mode(mode_m18), .mode(mode_m19), .mode(mode_m20), .mode(mode_m21), .mode(Mode(begin: HLJS.re("\\["), end: HLJS.re("\\]"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), contains: [.mode(Mode(className: "attr", variants: HLJS.variants([Mode(begin: HLJS.re("[\\w*@][\\w*@ :()\\./-]*:(?=[ \\t]|$)")), Mode(begin: HLJS.re("\"[\\w*@][\\w*@ :()\\./-]*\":(?=[ \\t]|$)")), Mode(begin: HLJS.re("'[\\w*@][\\w*@ :()\\./-]*':(?=[ \\t]|$)"))]))), .mode(Mode(className: "meta", begin: HLJS.re("^---\\s*$"), relevance: 10)), .mode(Mode(className: "string", begin: HLJS.re("[\\|>]([1-9]?[+-])?[ ]*\\n( +)[^ ][^\\n]*\\n(\\2[^\\n]+\\n?)*"))), .mode(Mode(begin: HLJS.re("<%[%=-]?"), end: HLJS.re("[%-]?%>"), relevance: 0, excludeBegin: true, excludeEnd: true, subLanguage: SubLanguage.single("ruby"))), .mode(Mode(className: "type", begin: HLJS.re("!\\w+![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!<[\\w#;/?:@&=+$,.~*'()\\[\\]]+>"))), .mode(Mode(className: "type", begin: HLJS.re("![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "meta", begin: HLJS.re("&[a-zA-Z_]\\w*$"))), .mode(Mode(className: "meta", begin: HLJS.re("\\*[a-zA-Z_]\\w*$"))), .mode(Mode(className: "bullet", begin: HLJS.re("-(?=[ ]|$)"), relevance: 0)), .mode(Mode(scope: "comment", begin: HLJS.re("#"), end: HLJS.re("$"), contains: [.mode(Mode(scope: "doctag", begin: HLJS.re("[ ]*(?=(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):)"), end: HLJS.re("(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):"), relevance: 0, excludeBegin: true)), .mode(Mode(begin: HLJS.re("[ ]+((?:I|a|is|so|us|to|at|if|in|it|on|[A-Za-z]+['](d|ve|re|ll|t|s|n)|[A-Za-z]+[-][a-z]+|[A-Za-z][a-z]{2,})[.]?[:]?([.][ ]|[ ])){3}")))])), .mode(Mode(keywords: HLJS.kw(literal: ["true", "false", "yes", "no", "null"]), beginKeywords: "true false yes no null")), .mode(Mode(className: "number", begin: HLJS.re("\\b[0-9]{4}(-[0-9][0-9]){0,2}([Tt \\t][0-9][0-9]?(:[0-9][0-9]){2})?(\\.[0-9]*)?([ \\t])*(Z|[-+][0-9][0-9]?(:[0-9][0-9])?)?\\b"))), .mode(Mode(className: "number", begin: HLJS.re("(-?)(\\b0[xX][a-fA-F0-9]+|(\\b\\d+(\\.\\d*)?|\\.\\d+)([eE][-+]?\\d+)?)\\b"), relevance: 0)), .mode(Mode(begin: HLJS.re("\\{"), end: HLJS.re("\\}"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), contains: [.mode(Mode(className: "attr", variants: HLJS.variants([Mode(begin: HLJS.re("[\\w*@][\\w*@ :()\\./-]*:(?=[ \\t]|$)")), Mode(begin: HLJS.re("\"[\\w*@][\\w*@ :()\\./-]*\":(?=[ \\t]|$)")), Mode(begin: HLJS.re("'[\\w*@][\\w*@ :()\\./-]*':(?=[ \\t]|$)"))]))), .mode(Mode(className: "meta", begin: HLJS.re("^---\\s*$"), relevance: 10)), .mode(Mode(className: "string", begin: HLJS.re("[\\|>]([1-9]?[+-])?[ ]*\\n( +)[^ ][^\\n]*\\n(\\2[^\\n]+\\n?)*"))), .mode(Mode(begin: HLJS.re("<%[%=-]?"), end: HLJS.re("[%-]?%>"), relevance: 0, excludeBegin: true, excludeEnd: true, subLanguage: SubLanguage.single("ruby"))), .mode(Mode(className: "type", begin: HLJS.re("!\\w+![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!<[\\w#;/?:@&=+$,.~*'()\\[\\]]+>"))), .mode(Mode(className: "type", begin: HLJS.re("![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "meta", begin: HLJS.re("&[a-zA-Z_]\\w*$"))), .mode(Mode(className: "meta", begin: HLJS.re("\\*[a-zA-Z_]\\w*$"))), .mode(Mode(className: "bullet", begin: HLJS.re("-(?=[ ]|$)"), relevance: 0)), .mode(Mode(scope: "comment", begin: HLJS.re("#"), end: HLJS.re("$"), contains: [.mode(Mode(scope: "doctag", begin: HLJS.re("[ ]*(?=(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):)"), end: HLJS.re("(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):"), relevance: 0, excludeBegin: true)), .mode(Mode(begin: HLJS.re("[ ]+((?:I|a|is|so|us|to|at|if|in|it|on|[A-Za-z]+['](d|ve|re|ll|t|s|n)|[A-Za-z]+[-][a-z]+|[A-Za-z][a-z]{2,})[.]?[:]?([.][ ]|[ ])){3}")))])), .mode(Mode(keywords: HLJS.kw(literal: ["true", "false", "yes", "no", "null"]), beginKeywords: "true false yes no null")), .mode(Mode(className: "number", begin: HLJS.re("\\b[0-9]{4}(-[0-9][0-9]){0,2}([Tt \\t][0-9][0-9]?(:[0-9][0-9]){2})?(\\.[0-9]*)?([ \\t])*(Z|[-+][0-9][0-9]?(:[0-9][0-9])?)?\\b"))), .mode(Mode(className: "number", begin: HLJS.re("(-?)(\\b0[xX][a-fA-F0-9]+|(\\b\\d+(\\.\\d*)?|\\.\\d+)([eE][-+]?\\d+)?)\\b"), relevance: 0)), .mode(Mode(begin: HLJS.re("\\{"), end: HLJS.re("\\}"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(begin: HLJS.re("\\["), end: HLJS.re("\\]"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(className: "string", begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(scope: "char.escape", match: HLJS.re("''"), relevance: 0))], relevance: 0)), .mode(Mode(className: "string", contains: [.mode(Mode(begin: HLJS.re("\\\\[\\s\\S]"), relevance: 0)), .mode(Mode(className: "template-variable", variants: HLJS.variants([Mode(begin: HLJS.re("\\{\\{"), end: HLJS.re("\\}\\}")), Mode(begin: HLJS.re("%\\{"), end: HLJS.re("\\}"))])))], variants: HLJS.variants([Mode(begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(begin: HLJS.re("''"), relevance: 0))]), Mode(begin: HLJS.re("\""), end: HLJS.re("\"")), Mode(begin: HLJS.re("[^\\s,{}\\[\\]]+"))]), relevance: 0))], relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(begin: HLJS.re("\\["), end: HLJS.re("\\]"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), contains: [.mode(Mode(className: "attr", variants: HLJS.variants([Mode(begin: HLJS.re("[\\w*@][\\w*@ :()\\./-]*:(?=[ \\t]|$)")), Mode(begin: HLJS.re("\"[\\w*@][\\w*@ :()\\./-]*\":(?=[ \\t]|$)")), Mode(begin: HLJS.re("'[\\w*@][\\w*@ :()\\./-]*':(?=[ \\t]|$)"))]))), .mode(Mode(className: "meta", begin: HLJS.re("^---\\s*$"), relevance: 10)), .mode(Mode(className: "string", begin: HLJS.re("[\\|>]([1-9]?[+-])?[ ]*\\n( +)[^ ][^\\n]*\\n(\\2[^\\n]+\\n?)*"))), .mode(Mode(begin: HLJS.re("<%[%=-]?"), end: HLJS.re("[%-]?%>"), relevance: 0, excludeBegin: true, excludeEnd: true, subLanguage: SubLanguage.single("ruby"))), .mode(Mode(className: "type", begin: HLJS.re("!\\w+![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!<[\\w#;/?:@&=+$,.~*'()\\[\\]]+>"))), .mode(Mode(className: "type", begin: HLJS.re("![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "type", begin: HLJS.re("!![\\w#;/?:@&=+$,.~*'()\\[\\]]+"))), .mode(Mode(className: "meta", begin: HLJS.re("&[a-zA-Z_]\\w*$"))), .mode(Mode(className: "meta", begin: HLJS.re("\\*[a-zA-Z_]\\w*$"))), .mode(Mode(className: "bullet", begin: HLJS.re("-(?=[ ]|$)"), relevance: 0)), .mode(Mode(scope: "comment", begin: HLJS.re("#"), end: HLJS.re("$"), contains: [.mode(Mode(scope: "doctag", begin: HLJS.re("[ ]*(?=(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):)"), end: HLJS.re("(TODO|FIXME|NOTE|BUG|OPTIMIZE|HACK|XXX):"), relevance: 0, excludeBegin: true)), .mode(Mode(begin: HLJS.re("[ ]+((?:I|a|is|so|us|to|at|if|in|it|on|[A-Za-z]+['](d|ve|re|ll|t|s|n)|[A-Za-z]+[-][a-z]+|[A-Za-z][a-z]{2,})[.]?[:]?([.][ ]|[ ])){3}")))])), .mode(Mode(keywords: HLJS.kw(literal: ["true", "false", "yes", "no", "null"]), beginKeywords: "true false yes no null")), .mode(Mode(className: "number", begin: HLJS.re("\\b[0-9]{4}(-[0-9][0-9]){0,2}([Tt \\t][0-9][0-9]?(:[0-9][0-9]){2})?(\\.[0-9]*)?([ \\t])*(Z|[-+][0-9][0-9]?(:[0-9][0-9])?)?\\b"))), .mode(Mode(className: "number", begin: HLJS.re("(-?)(\\b0[xX][a-fA-F0-9]+|(\\b\\d+(\\.\\d*)?|\\.\\d+)([eE][-+]?\\d+)?)\\b"), relevance: 0)), .mode(Mode(begin: HLJS.re("\\{"), end: HLJS.re("\\}"), illegal: HLJS.re("\\n"), contains: [.mode(Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(begin: HLJS.re("\\["), end: HLJS.re("\\]"), illegal: HLJS.re("\\n"), relevance: 0)), .mode(Mode(className: "string", begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(scope: "char.escape", match: HLJS.re("''"), relevance: 0))], relevance: 0)), .mode(Mode(className: "string", contains: [.mode(Mode(begin: HLJS.re("\\\\[\\s\\S]"), relevance: 0)), .mode(Mode(className: "template-variable", variants: HLJS.variants([Mode(begin: HLJS.re("\\{\\{"), end: HLJS.re("\\}\\}")), Mode(begin: HLJS.re("%\\{"), end: HLJS.re("\\}"))])))], variants: HLJS.variants([Mode(begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(begin: HLJS.re("''"), relevance: 0))]), Mode(begin: HLJS.re("\""), end: HLJS.re("\"")), Mode(begin: HLJS.re("[^\\s,{}\\[\\]]+"))]), relevance: 0))], relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(Mode(className: "string", begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(scope: "char.escape", match: HLJS.re("''"), relevance: 0))], relevance: 0)), .mode(Mode(className: "string", contains: [.mode(Mode(begin: HLJS.re("\\\\[\\s\\S]"), relevance: 0)), .mode(Mode(className: "template-variable", variants: HLJS.variants([Mode(begin: HLJS.re("\\{\\{"), end: HLJS.re("\\}\\}")), Mode(begin: HLJS.re("%\\{"), end: HLJS.re("\\}"))])))], variants: HLJS.variants([Mode(begin: HLJS.re("'"), end: HLJS.re("'"), contains: [.mode(Mode(begin: HLJS.re("''"), relevance: 0))]), Mode(begin: HLJS.re("\""), end: HLJS.re("\"")), Mode(begin: HLJS.re("[^\\s,{}\\[\\]]+"))]), relevance: 0))], relevance: 0, excludeEnd: true, endsWithParent: true))], relevance: 0)), .mode(mode_m24), .mode(mode_m26)], relevance: 0, excludeEnd: true, endsWithParent: true)
+    let mode_m22 = Mode(end: HLJS.re(","), keywords: HLJS.kw(keyword: ["true", "false", "yes", "no", "null"]), contains: [.mode(mode_m1), .mode(mode_m5), .mode(mode_m6), .mode(mode_m7), .mode(mode_m8), .mode(mode_m9), .mode(mode_m10), .mode(mode_m11), .mode(mode_m12), .mode(mode_m13), .mode(mode_m14), .mode(mode_m15), .mode(mode_m18), .mode(mode_m19), .mode(mode_m20), .mode(mode_m21), .mode(box_m23), .mode(mode_m24), .mode(mode_m26)], relevance: 0, excludeEnd: true, endsWithParent: true)
+    box_m22.bind(mode_m22)
 
     let mode_m23 = Mode(begin: HLJS.re("\\["), end: HLJS.re("\\]"), illegal: HLJS.re("\\n"), contains: [.mode(mode_m22)], relevance: 0)
+    box_m23.bind(mode_m23)
 
     let mode_m36 = Mode(begin: HLJS.re("\""), end: HLJS.re("\""))
 
@@ -156,7 +156,7 @@ public struct ANSITheme: HighlightTheme, Sendable {
 }
 
 /// Renders token trees to ANSI-colored terminal strings.
-public struct ANSIRenderer: TokenRenderer {
+public struct ANSIRenderer: TokenRenderer, Sendable {
     public typealias Output = String
     public typealias Theme = ANSITheme
 
@@ -51,46 +51,34 @@ public struct AttributedStringRenderer: TokenRenderer {
 
     public let theme: AttributedStringTheme
 
+    private let compiledTheme: CompiledTheme
+
     public init(theme: AttributedStringTheme = .dark) {
         self.theme = theme
+        self.compiledTheme = CompiledTheme(theme)
     }
 
     public func render(_ tree: TokenTree) -> AttributedString {
-        var result = AttributedString()
-        renderNode(.scope(tree.root), to: &result, scopeStack: [])
-        return result
-    }
-
-    private func renderNode(_ node: TokenNode, to result: inout AttributedString, scopeStack: [String]) {
-        switch node {
-        case .text(let text):
-            var attributed = AttributedString(text)
-
-            // Apply styles from scope stack (innermost scope takes precedence)
-            for scope in scopeStack.reversed() {
-                if let style = theme.style(for: scope) {
-                    applyStyle(style, to: &attributed)
-                    break // Use first matching style
-                }
-            }
-
-            result.append(attributed)
-
-        case .scope(let scopeNode):
-            var newStack = scopeStack
-            if let scope = scopeNode.scope {
-                newStack.append(scope)
-            }
+        let styled = compiledTheme.styledText(tree.tokens)
+        let attributes = styled.styles.map { self.attributes(for: $0) }
 
-            for child in scopeNode.children {
-                renderNode(child, to: &result, scopeStack: newStack)
+        // Adjacent tokens in the same style are appended as one run
+        var result = AttributedString()
+        for run in styled.runs {
+            let text = String(decoding: styled.units[run.range], as: UTF16.self)
+            if let style = run.style {
+                result.append(AttributedString(text, attributes: attributes[style]))
+            } else {
+                result.append(AttributedString(text))
             }
         }
+        return result
     }
 
-    private func applyStyle(_ style: ScopeStyle, to attributed: inout AttributedString) {
+    private func attributes(for style: ScopeStyle) -> AttributeContainer {
+        var attributes = AttributeContainer()
         if let color = style.foregroundColor {
-            attributed.foregroundColor = Color(
+            attributes.foregroundColor = Color(
                 red: color.red,
                 green: color.green,
                 blue: color.blue,
@@ -99,7 +87,7 @@ public struct AttributedStringRenderer: TokenRenderer {
         }
 
         if let bgColor = style.backgroundColor {
-            attributed.backgroundColor = Color(
+            attributes.backgroundColor = Color(
                 red: bgColor.red,
                 green: bgColor.green,
                 blue: bgColor.blue,
@@ -109,6 +97,7 @@ public struct AttributedStringRenderer: TokenRenderer {
 
         // Note: Bold/italic require font attributes which are more complex in SwiftUI AttributedString
         // Users needing these should use NSAttributedStringRenderer
+        return attributes
     }
 }
 
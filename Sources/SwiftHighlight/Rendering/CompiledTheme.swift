@@ -0,0 +1,100 @@
+import Foundation
+
+/// A theme's styles resolved ahead of rendering, for the renderers that apply
+/// `ScopeStyle`s.
+///
+/// Each scope name is looked up through `HighlightTheme.style(for:)`, fallback
+/// chain included, once per theme; equal styles share one index. A render then
+/// resolves each of the token list's interned scopes once and tracks the style
+/// in effect with a stack, so text is styled without any string work.
+internal final class CompiledTheme: @unchecked Sendable {
+    /// The text of a render split into runs of one style
+    struct StyledText {
+        /// UTF-16 code units of all the text
+        var units: [UInt16] = []
+        /// Consecutive ranges of `units`, each in the style at that index of
+        /// `styles` or unstyled; adjacent runs never share a style
+        var runs: [(range: Range<Int>, style: Int?)] = []
+        /// The styles `runs` refer to
+        var styles: [ScopeStyle] = []
+    }
+
+    private let style: @Sendable (String) -> ScopeStyle?
+
+    private let lock = NSLock()
+
+    /// Index in `styles` of each scope looked up so far, -1 for none; guarded by `lock`
+    private var scopeStyles: [String: Int] = [:]
+
+    /// Distinct styles of the scopes looked up so far, guarded by `lock`
+    private var styles: [ScopeStyle] = []
+    private var styleIndices: [ScopeStyle: Int] = [:]
+
+    init<Theme: HighlightTheme>(_ theme: Theme) {
+        self.style = { theme.style(for: $0) }
+    }
+
+    /// The text of `tokens` in runs of the style of their innermost scope
+    /// that has one.
+    func styledText(_ tokens: TokenList) -> StyledText {
+        let unresolved = -2
+        var styled = StyledText()
+        // Styles by the list's interned scope ids
+        var styleByID = [Int](repeating: unresolved, count: tokens.scopeNames.count)
+        // The style in effect at each open scope, the root's first
+        var stack = [tokens.root.scope.map { styleIndex(for: $0) } ?? -1]
+
+        for index in 0..<tokens.count {
+            switch tokens.kinds[index] {
+            case .open:
+                let id = Int(tokens.values[index])
+                if styleByID[id] == unresolved {
+                    styleByID[id] = tokens.scopeNames[id].scope.map { styleIndex(for: $0) } ?? -1
+                }
+                stack.append(styleByID[id] >= 0 ? styleByID[id] : stack[stack.count - 1])
+
+            case .close:
+                if stack.count > 1 {
+                    stack.removeLast()
+                }
+
+            case .text:
+                let units = tokens.textUnits(at: index)
+                guard !units.isEmpty else { continue }
+                let current = stack[stack.count - 1]
+                let style = current >= 0 ? current : nil
+                styled.units += units
+                if let last = styled.runs.last, last.style == style {
+                    styled.runs[styled.runs.count - 1].range = last.range.lowerBound..<styled.units.count
+                } else {
+                    styled.runs.append(((styled.units.count - units.count)..<styled.units.count, style))
+                }
+            }
+        }
+
+        lock.lock()
+        styled.styles = styles
+        lock.unlock()
+        return styled
+    }
+
+    private func styleIndex(for scope: String) -> Int {
+        lock.lock()
+        defer { lock.unlock() }
+        if let index = scopeStyles[scope] {
+            return index
+        }
+        var index = -1
+        if let scopeStyle = style(scope) {
+            if let existing = styleIndices[scopeStyle] {
+                index = existing
+            } else {
+                index = styles.count
+                styles.append(scopeStyle)
+                styleIndices[scopeStyle] = index
+            }
+        }
+        scopeStyles[scope] = index
+        return index
+    }
+}
@@ -0,0 +1,153 @@
+import Foundation
+
+/// Renders token trees to UTF-8 encoded HTML, the same HTML as `HTMLRenderer`
+/// without building a `String` on the way; for writing to sockets and files.
+public struct HTMLByteRenderer: TokenRenderer, Sendable {
+    public typealias Output = [UInt8]
+    public typealias Theme = HTMLTheme
+
+    public let theme: HTMLTheme
+
+    private let markup: HTMLMarkup
+
+    public init(theme: HTMLTheme = HTMLTheme()) {
+        self.theme = theme
+        self.markup = HTMLMarkup.shared(for: theme)
+    }
+
+    public func render(_ tree: TokenTree) -> [UInt8] {
+        render(tree, codeLength: 0)
+    }
+
+    public func render(_ tree: TokenTree, codeLength: Int) -> [UInt8] {
+        markup.render(tree, codeLength: codeLength)
+    }
+
+    /// Renders a token tree to HTML as `Data`.
+    public func renderData(_ tree: TokenTree, codeLength: Int = 0) -> Data {
+        Data(render(tree, codeLength: codeLength))
+    }
+}
+
+/// Writes HTML for one theme into a byte buffer. The opening tag of each scope
+/// is built once and kept, shared by every renderer with the same class prefix.
+internal final class HTMLMarkup: @unchecked Sendable {
+    let theme: HTMLTheme
+
+    private let lock = NSLock()
+
+    /// `<span class="...">` of each scope seen so far, guarded by `lock`
+    private var openingTags: [String: [UInt8]] = [:]
+
+    private static let registryLock = NSLock()
+    nonisolated(unsafe) private static var registry: [String: HTMLMarkup] = [:]
+
+    private static let closingTag = Array("</span>".utf8)
+
+    /// Entities of the characters `Utils.escapeHTML` replaces, indexed by ASCII code
+    private static let entities: [[UInt8]?] = {
+        var table = [[UInt8]?](repeating: nil, count: 128)
+        table[Int(UInt8(ascii: "&"))] = Array("&amp;".utf8)
+        table[Int(UInt8(ascii: "<"))] = Array("&lt;".utf8)
+        table[Int(UInt8(ascii: ">"))] = Array("&gt;".utf8)
+        table[Int(UInt8(ascii: "\""))] = Array("&quot;".utf8)
+        table[Int(UInt8(ascii: "'"))] = Array("&#x27;".utf8)
+        return table
+    }()
+
+    private init(theme: HTMLTheme) {
+        self.theme = theme
+    }
+
+    /// The markup writer for `theme`'s class prefix.
+    static func shared(for theme: HTMLTheme) -> HTMLMarkup {
+        registryLock.lock()
+        defer { registryLock.unlock() }
+        if let markup = registry[theme.classPrefix] {
+            return markup
+        }
+        let markup = HTMLMarkup(theme: theme)
+        registry[theme.classPrefix] = markup
+        return markup
+    }
+
+    /// Renders `tree` into a buffer sized for code of `codeLength` UTF-8 bytes.
+    func render(_ tree: TokenTree, codeLength: Int) -> [UInt8] {
+        var output: [UInt8] = []
+        // Markup roughly doubles typical highlighted code
+        output.reserveCapacity(max(codeLength * 2, 256))
+
+        lock.lock()
+        var tags = openingTags
+        lock.unlock()
+        let knownTags = tags.count
+
+        // Tags by the list's interned scope ids, so each scope is hashed once per render
+        let tokens = tree.tokens
+        var tagsByID = [[UInt8]?](repeating: nil, count: tokens.scopeNames.count)
+        var index = 0
+        while index < tokens.count {
+            switch tokens.kinds[index] {
+            case .text:
+                Self.appendEscaped(tokens.textUnits(at: index), to: &output)
+
+            case .open:
+                guard let scope = tokens.scopeName(at: index).scope else { break }
+                // Skip empty scope nodes (e.g., empty params), and their close
+                if index + 1 < tokens.count && tokens.kinds[index + 1] == .close {
+                    index += 1
+                    break
+                }
+                let id = Int(tokens.values[index])
+                if let tag = tagsByID[id] {
+                    output.append(contentsOf: tag)
+                } else {
+                    let tag = tags[scope] ?? Array("<span class=\"\(theme.cssClass(for: scope))\">".utf8)
+                    tags[scope] = tag
+                    tagsByID[id] = tag
+                    output.append(contentsOf: tag)
+                }
+
+            case .close:
+                if tokens.scopeName(at: index).scope != nil {
+                    output.append(contentsOf: Self.closingTag)
+                }
+            }
+            index += 1
+        }
+
+        if tags.count > knownTags {
+            lock.lock()
+            openingTags.merge(tags) { current, _ in current }
+            lock.unlock()
+        }
+        return output
+    }
+
+    /// Appends UTF-16 `units` as UTF-8 with HTML special characters escaped.
+    /// Runs of non-ASCII characters are transcoded whole.
+    static func appendEscaped(_ units: ArraySlice<UInt16>, to output: inout [UInt8]) {
+        var index = units.startIndex
+        while index < units.endIndex {
+            let unit = units[index]
+            if unit < 0x80 {
+                if let entity = entities[Int(unit)] {
+                    output.append(contentsOf: entity)
+                } else {
+                    output.append(UInt8(unit))
+                }
+                index += 1
+                continue
+            }
+            var end = index + 1
+            while end < units.endIndex && units[end] >= 0x80 {
+                end += 1
+            }
+            // Unpaired surrogates become U+FFFD, as when decoding the text to a String
+            _ = transcode(units[index..<end].makeIterator(), from: UTF16.self, to: UTF8.self, stoppingOnError: false) {
+                output.append($0)
+            }
+            index = end
+        }
+    }
+}
@@ -39,63 +39,24 @@ public struct HTMLTheme: HighlightTheme, Sendable {
 }
 
 /// Renders token trees to HTML strings with CSS classes for styling.
-public struct HTMLRenderer: TokenRenderer {
+public struct HTMLRenderer: TokenRenderer, Sendable {
     public typealias Output = String
     public typealias Theme = HTMLTheme
 
     public let theme: HTMLTheme
 
+    private let markup: HTMLMarkup
+
     public init(theme: HTMLTheme = HTMLTheme()) {
         self.theme = theme
+        self.markup = HTMLMarkup.shared(for: theme)
     }
 
     public func render(_ tree: TokenTree) -> String {
-        var buffer = ""
-        renderNode(.scope(tree.root), to: &buffer, isRoot: true)
-        return buffer
+        render(tree, codeLength: 0)
     }
 
-    private func renderNode(_ node: TokenNode, to buffer: inout String, isRoot: Bool = false) {
-        switch node {
-        case .text(let text):
-            buffer += escapeHTML(text)
-
-        case .scope(let scopeNode):
-            if let scope = scopeNode.scope, !isRoot {
-                // Skip empty scope nodes (e.g., empty params)
-                if scopeNode.children.isEmpty {
-                    return
-                }
-
-                let className = theme.cssClass(for: scope)
-                buffer += "<span class=\"\(className)\">"
-
-                for child in scopeNode.children {
-                    renderNode(child, to: &buffer)
-                }
-
-                buffer += "</span>"
-            } else {
-                for child in scopeNode.children {
-                    renderNode(child, to: &buffer)
-                }
-            }
-        }
-    }
-
-    private func escapeHTML(_ value: String) -> String {
-        var result = ""
-        result.reserveCapacity(value.count + value.count / 10)
-        for scalar in value.unicodeScalars {
-            switch scalar {
-            case "&": result += "&amp;"
-            case "<": result += "&lt;"
-            case ">": result += "&gt;"
-            case "\"": result += "&quot;"
-            case "'": result += "&#x27;"
-            default: result.unicodeScalars.append(scalar)
-            }
-        }
-        return result
+    public func render(_ tree: TokenTree, codeLength: Int) -> String {
+        String(decoding: markup.render(tree, codeLength: codeLength), as: UTF8.self)
     }
 }
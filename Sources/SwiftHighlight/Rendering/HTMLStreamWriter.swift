@@ -0,0 +1,51 @@
+import Foundation
+
+/// Writes HTML as tokens arrive, handing it to `write` in chunks of about
+/// `chunkSize` UTF-8 bytes. The output is the same as `HTMLRenderer`'s.
+public struct HTMLStreamWriter: TokenSink {
+    public let theme: HTMLTheme
+
+    /// Buffered UTF-8 bytes at which a chunk is written
+    public let chunkSize: Int
+
+    private let write: @Sendable (String) -> Void
+    private var buffer = ""
+
+    public init(
+        theme: HTMLTheme = HTMLTheme(),
+        chunkSize: Int = 64 * 1024,
+        write: @escaping @Sendable (String) -> Void
+    ) {
+        self.theme = theme
+        self.chunkSize = chunkSize
+        self.write = write
+    }
+
+    public mutating func openScope(_ scope: String) {
+        buffer += "<span class=\"\(theme.cssClass(for: scope))\">"
+        flushIfFull()
+    }
+
+    public mutating func addText(_ text: String) {
+        buffer += Utils.escapeHTML(text)
+        flushIfFull()
+    }
+
+    public mutating func closeScope() {
+        buffer += "</span>"
+        flushIfFull()
+    }
+
+    public mutating func finish() {
+        if !buffer.isEmpty {
+            write(buffer)
+            buffer = ""
+        }
+    }
+
+    private mutating func flushIfFull() {
+        if buffer.utf8.count >= chunkSize {
+            finish()
+        }
+    }
+}
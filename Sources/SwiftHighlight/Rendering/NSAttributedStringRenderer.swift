@@ -70,44 +70,33 @@ public struct NSAttributedStringRenderer: TokenRenderer {
 
     public let theme: NSAttributedStringTheme
 
+    private let compiledTheme: CompiledTheme
+
     public init(theme: NSAttributedStringTheme = .dark) {
         self.theme = theme
+        self.compiledTheme = CompiledTheme(theme)
     }
 
     public func render(_ tree: TokenTree) -> NSAttributedString {
-        let result = NSMutableAttributedString()
-        renderNode(.scope(tree.root), to: result, scopeStack: [])
-        return result
-    }
-
-    private func renderNode(_ node: TokenNode, to result: NSMutableAttributedString, scopeStack: [String]) {
-        switch node {
-        case .text(let text):
-            var attributes: [NSAttributedString.Key: Any] = [
-                .font: baseFont()
-            ]
-
-            // Apply styles from scope stack (innermost scope takes precedence)
-            for scope in scopeStack.reversed() {
-                if let style = theme.style(for: scope) {
-                    applyStyle(style, to: &attributes)
-                    break // Use first matching style
-                }
-            }
-
-            let attributed = NSAttributedString(string: text, attributes: attributes)
-            result.append(attributed)
-
-        case .scope(let scopeNode):
-            var newStack = scopeStack
-            if let scope = scopeNode.scope {
-                newStack.append(scope)
-            }
-
-            for child in scopeNode.children {
-                renderNode(child, to: result, scopeStack: newStack)
+        let styled = compiledTheme.styledText(tree.tokens)
+        let font = baseFont()
+
+        // The whole text in the base font, then each styled run's attributes set over it
+        let result = NSMutableAttributedString(
+            string: String(decoding: styled.units, as: UTF16.self),
+            attributes: [.font: font]
+        )
+        var styleAttributes: [Int: [NSAttributedString.Key: Any]] = [:]
+        for run in styled.runs {
+            guard let style = run.style else { continue }
+            if styleAttributes[style] == nil {
+                var attributes: [NSAttributedString.Key: Any] = [.font: font]
+                applyStyle(styled.styles[style], to: &attributes)
+                styleAttributes[style] = attributes
             }
+            result.setAttributes(styleAttributes[style], range: NSRange(run.range))
         }
+        return result
     }
 
     private func baseFont() -> PlatformFont {
@@ -61,7 +61,7 @@ public struct TextStyle: Sendable, Hashable {
 }
 
 /// A complete style for a scope (color + text style).
-public struct ScopeStyle: Sendable {
+public struct ScopeStyle: Sendable, Hashable {
     public var foregroundColor: ThemeColor?
     public var backgroundColor: ThemeColor?
     public var textStyle: TextStyle
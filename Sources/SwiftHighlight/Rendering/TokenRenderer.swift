@@ -14,6 +14,16 @@ public protocol TokenRenderer {
 
     /// Renders a token tree to the output format
     func render(_ tree: TokenTree) -> Output
+
+    /// Renders a token tree parsed from code of `codeLength` UTF-8 bytes, so
+    /// the output can be sized up front. Defaults to `render(_:)`.
+    func render(_ tree: TokenTree, codeLength: Int) -> Output
+}
+
+extension TokenRenderer {
+    public func render(_ tree: TokenTree, codeLength: Int) -> Output {
+        render(tree)
+    }
 }
 
 /// A simple theme that returns no styles (useful for renderers that don't need theming).
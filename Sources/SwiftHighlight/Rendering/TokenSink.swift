@@ -0,0 +1,25 @@
+import Foundation
+
+/// Receives tokens while code is parsed, instead of a token tree afterwards.
+/// Pass one to `Highlight.parse(_:language:ignoreIllegals:into:)`.
+///
+/// Calls arrive in document order and scopes are balanced. A scope is only
+/// opened once text or another scope is added to it, so empty scopes never
+/// arrive, the same ones the tree renderers skip.
+public protocol TokenSink: Sendable {
+    /// Opens a scope (e.g. "keyword", "title.function" or "language:css")
+    mutating func openScope(_ scope: String)
+
+    /// Adds text to the innermost open scope
+    mutating func addText(_ text: String)
+
+    /// Closes the innermost open scope
+    mutating func closeScope()
+
+    /// Called once after the last token
+    mutating func finish()
+}
+
+extension TokenSink {
+    public mutating func finish() {}
+}
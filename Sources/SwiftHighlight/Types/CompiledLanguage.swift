@@ -0,0 +1,55 @@
+import Foundation
+
+/// A compiled language taken from a `Highlight` actor with
+/// `Highlight.compiledLanguage(_:)`, for highlighting on any thread.
+///
+/// Compiled modes are only read while parsing and each call keeps its own
+/// state, so one value can be used from many tasks at once. Sub-languages
+/// resolve against the languages registered when it was taken.
+public struct CompiledLanguage: Sendable {
+    /// The name the language was requested by
+    public let name: String
+
+    let parser: Parser
+
+    init(name: String, parser: Parser) {
+        self.name = name
+        self.parser = parser
+    }
+
+    /// Parses code and returns the token tree without rendering.
+    ///
+    /// - Parameters:
+    ///   - code: The source code to parse
+    ///   - ignoreIllegals: Whether to ignore illegal syntax (default: true)
+    /// - Returns: The parse result with token tree
+    public func parse(_ code: String, ignoreIllegals: Bool = true) -> ParseResult {
+        parser.parse(code, language: name, ignoreIllegals: ignoreIllegals)
+    }
+
+    /// Highlights code using a custom renderer.
+    ///
+    /// - Parameters:
+    ///   - code: The source code to highlight
+    ///   - ignoreIllegals: Whether to ignore illegal syntax (default: true)
+    ///   - renderer: The renderer to use for output
+    /// - Returns: The highlight result with rendered output
+    public func highlight<R: TokenRenderer>(
+        _ code: String,
+        ignoreIllegals: Bool = true,
+        renderer: R
+    ) -> HighlightResult<R.Output> {
+        parser.highlight(code, language: name, ignoreIllegals: ignoreIllegals, renderer: renderer)
+    }
+
+    /// Highlights code (HTML output).
+    ///
+    /// - Parameters:
+    ///   - code: The source code to highlight
+    ///   - ignoreIllegals: Whether to ignore illegal syntax (default: true)
+    /// - Returns: The highlight result with HTML output
+    public func highlight(_ code: String, ignoreIllegals: Bool = true) -> HighlightResult<String> {
+        let htmlRenderer = HTMLRenderer(theme: HTMLTheme(classPrefix: parser.options.classPrefix))
+        return highlight(code, ignoreIllegals: ignoreIllegals, renderer: htmlRenderer)
+    }
+}
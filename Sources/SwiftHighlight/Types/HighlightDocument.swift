@@ -0,0 +1,74 @@
+import Foundation
+
+/// A run of text on one line and the scopes it is nested in.
+public struct HighlightToken: Sendable, Hashable {
+    /// UTF-16 offsets of the run, relative to the start of its line
+    public let range: Range<Int>
+
+    /// Enclosing scopes, outermost first (e.g. `["function", "title"]`).
+    /// Empty for text outside any scope.
+    public let scopes: [String]
+
+    public init(range: Range<Int>, scopes: [String]) {
+        self.range = range
+        self.scopes = scopes
+    }
+}
+
+/// The tokens of one line. The line break itself is not part of any token.
+public struct HighlightedLine: Sendable, Hashable {
+    public let tokens: [HighlightToken]
+
+    public init(tokens: [HighlightToken]) {
+        self.tokens = tokens
+    }
+}
+
+/// Highlighted code split into lines, which `Highlight.updateDocument` can
+/// re-highlight after an edit without parsing the whole code again.
+public struct HighlightDocument: Sendable {
+    /// The language used for highlighting
+    public let language: String
+
+    /// The tokens of each line; lines are separated by `\n`
+    public let lines: [HighlightedLine]
+
+    /// Relevance score
+    public let relevance: Int
+
+    let source: SourceText
+    let state: DocumentState
+
+    init(language: String, lines: [HighlightedLine], relevance: Int, source: SourceText, state: DocumentState) {
+        self.language = language
+        self.lines = lines
+        self.relevance = relevance
+        self.source = source
+        self.state = state
+    }
+
+    /// The source code
+    public var code: String { source.string }
+}
+
+/// Result of re-highlighting a document after an edit.
+public struct HighlightDocumentUpdate: Sendable {
+    /// The edited document
+    public let document: HighlightDocument
+
+    /// Lines of the previous document whose tokens were replaced
+    public let replacedLines: Range<Int>
+
+    /// Lines of the edited document that replace them; lines outside this range
+    /// are the previous document's lines, moved by the difference in line count
+    public let changedLines: Range<Int>
+
+    /// The tokens of `changedLines`
+    public var lines: ArraySlice<HighlightedLine> { document.lines[changedLines] }
+
+    public init(document: HighlightDocument, replacedLines: Range<Int>, changedLines: Range<Int>) {
+        self.document = document
+        self.replacedLines = replacedLines
+        self.changedLines = changedLines
+    }
+}
@@ -55,8 +55,16 @@ internal struct CompiledKeywords {
     /// Map from keyword to (scope, relevance)
     let keywords: [String: (scope: String, relevance: Int)]
 
+    /// Matches `pattern` and looks up `keywords` in place, when the pattern is simple enough
+    let scanner: KeywordScanner?
+
     init(pattern: NSRegularExpression, keywords: [String: (scope: String, relevance: Int)]) {
         self.pattern = pattern
         self.keywords = keywords
+        self.scanner = KeywordScanner(
+            pattern: pattern.pattern,
+            caseInsensitive: pattern.options.contains(.caseInsensitive),
+            keywords: keywords
+        )
     }
 }
@@ -32,6 +32,9 @@ public struct Language: Sendable, Hashable {
     /// Class name aliases (e.g., "built_in" -> "builtin")
     public let classNameAliases: [String: String]
 
+    /// Table-driven lexers for matchers that do not need `NSRegularExpression`
+    public let lexerTables: LexerTables?
+
     public init(
         name: String,
         aliases: [String] = [],
@@ -41,7 +44,8 @@ public struct Language: Sendable, Hashable {
         keywords: Keywords? = nil,
         illegal: RegexPattern? = nil,
         contains: [ModeReference] = [],
-        classNameAliases: [String: String] = [:]
+        classNameAliases: [String: String] = [:],
+        lexerTables: LexerTables? = nil
     ) {
         self.id = UUID()
         self.name = name
@@ -53,6 +57,7 @@ public struct Language: Sendable, Hashable {
         self.illegal = illegal
         self.contains = contains
         self.classNameAliases = classNameAliases
+        self.lexerTables = lexerTables
     }
 
     // MARK: - Hashable
@@ -0,0 +1,101 @@
+import Foundation
+
+/// Many language snapshots packed into one file by `tools/build-language-bundle.py`.
+///
+/// Opening a bundle maps the file and reads only its index. A language's
+/// snapshot is decoded the first time it is requested, so registering every
+/// bundled language with `Highlight.registerBundle(_:)` costs little more
+/// than the index itself.
+public final class LanguageBundle: Sendable {
+    /// Bundle format understood by this version of the library
+    public static let formatVersion: UInt32 = 1
+
+    static let magic = Data("HLBUNDLE".utf8)
+    private static let headerLength = 16
+
+    /// One language in the bundle index
+    struct Entry: Decodable, Sendable {
+        let language: String
+        let name: String
+        let aliases: [String]
+        let disableAutodetect: Bool
+        let caseInsensitive: Bool
+        let unicodeRegex: Bool
+        /// Payload position, relative to the end of the index
+        let offset: Int
+        let length: Int
+
+        func makeLanguage() -> Language {
+            Language(
+                name: name,
+                aliases: aliases,
+                disableAutodetect: disableAutodetect,
+                caseInsensitive: caseInsensitive,
+                unicodeRegex: unicodeRegex
+            )
+        }
+    }
+
+    private let data: Data
+    private let payloadStart: Int
+    let entries: [Entry]
+    private let entryIndex: [String: Int]
+
+    /// Language ids in the bundle, in bundle order
+    public var languageIDs: [String] { entries.map(\.language) }
+
+    /// Reads a bundle from memory. Payloads are sliced from `data` without copying.
+    public init(data: Data) throws {
+        guard data.count >= Self.headerLength, data.prefix(Self.magic.count) == Self.magic else {
+            throw HighlightError.invalidSnapshot("not a language bundle")
+        }
+        let (version, indexLength) = data.withUnsafeBytes { bytes in
+            (
+                UInt32(littleEndian: bytes.loadUnaligned(fromByteOffset: 8, as: UInt32.self)),
+                Int(UInt32(littleEndian: bytes.loadUnaligned(fromByteOffset: 12, as: UInt32.self)))
+            )
+        }
+        guard version == Self.formatVersion else {
+            throw HighlightError.invalidSnapshot(
+                "bundle format \(version) is not supported (expected \(Self.formatVersion))"
+            )
+        }
+        guard data.count - Self.headerLength >= indexLength else {
+            throw HighlightError.invalidSnapshot("bundle index is truncated")
+        }
+
+        let indexStart = data.startIndex + Self.headerLength
+        let entries: [Entry]
+        do {
+            entries = try JSONDecoder().decode([Entry].self, from: data[indexStart..<(indexStart + indexLength)])
+        } catch {
+            throw HighlightError.invalidSnapshot(error.localizedDescription)
+        }
+
+        let payloadStart = Self.headerLength + indexLength
+        let payloadLength = data.count - payloadStart
+        for entry in entries where entry.offset < 0 || entry.length < 0 || entry.offset + entry.length > payloadLength {
+            throw HighlightError.invalidSnapshot("payload of \(entry.language) is out of bounds")
+        }
+
+        self.data = data
+        self.payloadStart = payloadStart
+        self.entries = entries
+        self.entryIndex = Dictionary(entries.enumerated().map { ($1.language, $0) }, uniquingKeysWith: { first, _ in first })
+    }
+
+    /// Maps a bundle file into memory and reads its index.
+    public convenience init(contentsOf url: URL) throws {
+        try self.init(data: Data(contentsOf: url, options: .alwaysMapped))
+    }
+
+    /// Decodes the snapshot of one bundled language.
+    public func snapshot(for languageID: String) throws -> LanguageSnapshot {
+        guard let position = entryIndex[languageID] else {
+            throw HighlightError.unknownLanguage(languageID)
+        }
+        let entry = entries[position]
+        let start = data.startIndex + payloadStart + entry.offset
+        return try LanguageSnapshot(data: data[start..<(start + entry.length)])
+    }
+}
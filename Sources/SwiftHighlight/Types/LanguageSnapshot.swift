@@ -0,0 +1,125 @@
+import Foundation
+
+/// A language compiled ahead of time by `tools/compile-language-snapshot.py`.
+///
+/// A snapshot holds what `ModeCompiler` would otherwise build on the first
+/// highlight: the flattened compiled-mode table, each mode's combined matcher
+/// pattern with its rule table, and the keyword dictionaries. Register it with
+/// `Highlight.registerSnapshot(_:)`.
+public struct LanguageSnapshot: Sendable {
+    /// Snapshot format understood by this version of the library
+    public static let formatVersion = 1
+
+    let payload: Payload
+
+    /// Language id the snapshot registers under (e.g. "json")
+    public var languageID: String { payload.language }
+
+    /// Display name of the language
+    public var name: String { payload.name }
+
+    /// Alternative names/aliases for this language
+    public var aliases: [String] { payload.aliases }
+
+    /// Decodes a snapshot written by `tools/compile-language-snapshot.py`.
+    public init(data: Data) throws {
+        let payload: Payload
+        do {
+            payload = try JSONDecoder().decode(Payload.self, from: data)
+        } catch {
+            throw HighlightError.invalidSnapshot(error.localizedDescription)
+        }
+        guard payload.format == Self.formatVersion else {
+            throw HighlightError.invalidSnapshot(
+                "format \(payload.format) is not supported (expected \(Self.formatVersion))"
+            )
+        }
+        guard !payload.modes.isEmpty else {
+            throw HighlightError.invalidSnapshot("snapshot has no modes")
+        }
+        self.payload = payload
+    }
+
+    /// Reads a snapshot file.
+    public init(contentsOf url: URL) throws {
+        try self.init(data: Data(contentsOf: url))
+    }
+
+    /// The `Language` registered for the snapshot. Its modes live in the
+    /// snapshot, so `contains` is empty.
+    func makeLanguage() -> Language {
+        Language(
+            name: payload.name,
+            aliases: payload.aliases,
+            disableAutodetect: payload.disableAutodetect,
+            caseInsensitive: payload.caseInsensitive,
+            unicodeRegex: payload.unicodeRegex,
+            classNameAliases: payload.classNameAliases
+        )
+    }
+}
+
+// MARK: - Payload
+
+extension LanguageSnapshot {
+    struct Payload: Decodable, Sendable {
+        let format: Int
+        let language: String
+        let name: String
+        let aliases: [String]
+        let disableAutodetect: Bool
+        let caseInsensitive: Bool
+        let unicodeRegex: Bool
+        let classNameAliases: [String: String]
+        let keywords: [KeywordTable]
+        /// Compiled modes; index 0 is the language root
+        let modes: [ModeEntry]
+    }
+
+    struct KeywordTable: Decodable, Sendable {
+        let pattern: String
+        let scopes: [String]
+        /// Word -> [index into `scopes`, relevance]
+        let words: [String: [Int]]
+    }
+
+    struct ScopeEntry: Decodable, Sendable {
+        let wrap: String?
+        /// Capture group index (as a string key) -> scope
+        let scopes: [String: String]?
+    }
+
+    /// One `CompiledMode`. References to other modes are indexes into `modes`.
+    struct ModeEntry: Decodable, Sendable {
+        let scope: String?
+        let begin: String?
+        let end: String?
+        let illegal: String?
+        let terminatorEnd: String?
+        let keywords: Int?
+        let contains: [Int]?
+        let starts: Int?
+        let parent: Int?
+        let relevance: Int
+        let excludeBegin: Bool?
+        let excludeEnd: Bool?
+        let returnBegin: Bool?
+        let returnEnd: Bool?
+        let endsWithParent: Bool?
+        let endsParent: Bool?
+        let skip: Bool?
+        let subLanguage: String?
+        let subLanguages: [String]?
+        let beginScope: ScopeEntry?
+        let endScope: ScopeEntry?
+        let matcher: MatcherEntry?
+    }
+
+    /// The rules of a mode's `ResumableMultiRegex` and their combined alternation.
+    struct MatcherEntry: Decodable, Sendable {
+        /// [kind (0 begin, 1 end, 2 illegal), mode index or -1, capture groups]
+        let rules: [[Int]]
+        /// All rules joined by `Regex.rewriteBackreferences`
+        let pattern: String
+    }
+}
@@ -0,0 +1,20 @@
+import Foundation
+
+/// Precompiled DFAs for the regular matchers of a language, written by
+/// `tools/generate-swift-from-ir.py --lexer-tables`.
+///
+/// Entries map a mode's combined matcher pattern to its encoded table. A
+/// matcher scans with its table when one is present for exactly that pattern
+/// and falls back to `NSRegularExpression` otherwise, so stale or malformed
+/// entries only cost speed.
+public struct LexerTables: Sendable {
+    let tables: [String: LexerTable]
+
+    public init(_ encoded: [String: String]) {
+        self.tables = encoded.compactMapValues { LexerTable(encoded: $0) }
+    }
+
+    func table(for pattern: String) -> LexerTable? {
+        tables[pattern]
+    }
+}
@@ -3,22 +3,62 @@ import Foundation
 // MARK: - Box for Indirection
 
 /// A box type to enable recursive struct definitions
-/// Used to wrap Mode references that would otherwise create infinite-size types
-/// This is Sendable because it only contains an immutable Mode value.
-public final class ModeBox: Sendable, Hashable {
-    public let value: Mode
+/// Used to wrap Mode references that would otherwise create infinite-size types.
+///
+/// A box can also be created empty and bound later with `bind(_:)`. Generated
+/// languages use this to reference a mode before it is defined, which lets
+/// cyclic mode graphs share one `Mode` instead of unrolling the cycle.
+/// The stored mode never changes after binding, so the box is safe to share.
+public final class ModeBox: @unchecked Sendable, Hashable {
+    private let lock = NSLock()
+    private var storage: Mode?
+
+    /// The boxed mode. Must not be read before an empty box is bound.
+    public var value: Mode {
+        lock.lock()
+        defer { lock.unlock() }
+        guard let storage else {
+            preconditionFailure("ModeBox.value read before bind(_:)")
+        }
+        return storage
+    }
 
     public init(_ value: Mode) {
-        self.value = value
+        self.storage = value
     }
 
-    public static func == (lhs: ModeBox, rhs: ModeBox) -> Bool {
-        lhs.value.id == rhs.value.id
+    /// Creates an empty box to be bound once the referenced mode exists.
+    public init() {
+        self.storage = nil
     }
 
-    public func hash(into hasher: inout Hasher) {
-        hasher.combine(value.id)
+    /// Binds the mode of a box created with `init()`. A box can only be bound once.
+    public func bind(_ value: Mode) {
+        lock.lock()
+        defer { lock.unlock() }
+        precondition(storage == nil, "ModeBox is already bound")
+        storage = value
+    }
+
+    /// The id of the bound mode, or `nil` while the box is empty
+    private var boundID: UUID? {
+        lock.lock()
+        defer { lock.unlock() }
+        return storage?.id
     }
+
+    // Bound boxes compare by their mode's id; an empty box equals only itself.
+    public static func == (lhs: ModeBox, rhs: ModeBox) -> Bool {
+        if lhs === rhs {
+            return true
+        }
+        guard let id = lhs.boundID else { return false }
+        return id == rhs.boundID
+    }
+
+    // The hash must not change when an empty box is bound, so every box
+    // hashes the same; equal modes still compare by id.
+    public func hash(into hasher: inout Hasher) {}
 }
 
 /// A highlighting mode that defines how to match and highlight a portion of code.
@@ -9,6 +9,23 @@ public struct HighlightOptions: Sendable {
     /// If nil, all registered languages are considered.
     public var languages: [String]?
 
+    /// How many languages `highlightAuto` parses in full. Candidates are first
+    /// ranked cheaply, by any `#!` line or modeline naming a language and then by
+    /// the relevance their keywords would score, and only this many of the
+    /// best are parsed. If nil, every candidate is parsed.
+    public var autoDetectCandidates: Int?
+
+    /// Size limit in bytes of the cache of parse results (and their HTML),
+    /// evicting the least recently used first. Repeated highlights of the same
+    /// code are then answered without parsing. 0 disables the cache.
+    public var resultCacheLimit: Int
+
+    /// Whether to count, per mode, what the parse loop does: matcher lookups
+    /// and their time, matches per rule, keyword lookups and sub-language
+    /// parses. Read the counters with `Highlight.profileReport()`. Off by
+    /// default, when the parse loop does not record anything.
+    public var profiling: Bool
+
     /// Whether to throw on unescaped HTML (for security)
     public var throwUnescapedHTML: Bool
 
@@ -18,11 +35,17 @@ public struct HighlightOptions: Sendable {
     public init(
         classPrefix: String = "hljs-",
         languages: [String]? = nil,
+        autoDetectCandidates: Int? = 12,
+        resultCacheLimit: Int = 0,
+        profiling: Bool = false,
         throwUnescapedHTML: Bool = false,
         ignoreUnescapedHTML: Bool = false
     ) {
         self.classPrefix = classPrefix
         self.languages = languages
+        self.autoDetectCandidates = autoDetectCandidates
+        self.resultCacheLimit = resultCacheLimit
+        self.profiling = profiling
         self.throwUnescapedHTML = throwUnescapedHTML
         self.ignoreUnescapedHTML = ignoreUnescapedHTML
     }
@@ -0,0 +1,78 @@
+import Foundation
+
+/// What the parse loop did in each mode since profiling started, from
+/// `Highlight.profileReport()` with `HighlightOptions.profiling` set.
+///
+/// Modes are numbered per language in compile order, the order
+/// `tools/compile-language-snapshot.py` writes them in, so
+/// `tools/aggregate-profile.py` can map them back to the mode ids of the IR.
+public struct ProfileReport: Sendable, Hashable, Codable {
+    /// Counters of one compiled mode
+    public struct ModeProfile: Sendable, Hashable, Codable {
+        /// The language the mode belongs to
+        public let language: String
+
+        /// Index of the mode in its language's compile order; 0 is the language itself
+        public let mode: Int
+
+        public let scope: String?
+
+        /// The mode's begin pattern as compiled; nil for the language itself
+        public let begin: String?
+
+        /// Times the mode's matcher looked for the next match
+        public let execCalls: Int
+
+        /// Lookups that found a match
+        public let matches: Int
+
+        /// Time spent in the mode's matcher
+        public let nanoseconds: UInt64
+
+        /// Lookups resuming after a match that was ignored at the same position
+        public let resumes: Int
+
+        /// Words looked up in the mode's keyword table
+        public let keywordLookups: Int
+
+        /// Words that were keywords
+        public let keywordHits: Int
+
+        /// Text handed to a sub-language parse from this mode
+        public let subLanguageParses: Int
+
+        /// Matches by rule of the mode's matcher, most frequent first
+        public let rules: [RuleProfile]
+    }
+
+    /// Matches of one rule of a mode's matcher
+    public struct RuleProfile: Sendable, Hashable, Codable {
+        /// "begin" for a child mode's begin pattern, "end" or "illegal"
+        public let kind: String
+
+        /// For a begin rule, the index of the mode it starts
+        public let mode: Int?
+
+        public let matches: Int
+    }
+
+    /// Version of the JSON layout
+    public static let version = 1
+
+    public let version: Int
+
+    /// Every mode that was entered or matched in, slowest first
+    public let modes: [ModeProfile]
+
+    init(modes: [ModeProfile]) {
+        self.version = Self.version
+        self.modes = modes
+    }
+
+    /// The report as JSON, the input of `tools/aggregate-profile.py`.
+    public func jsonData() throws -> Data {
+        let encoder = JSONEncoder()
+        encoder.outputFormatting = [.prettyPrinted, .sortedKeys]
+        return try encoder.encode(self)
+    }
+}
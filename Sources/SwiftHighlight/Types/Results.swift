@@ -80,6 +80,28 @@ public struct ParseResult: Sendable {
     }
 }
 
+/// Result of parsing code into a `TokenSink`.
+public struct TokenStreamResult: Sendable {
+    /// The language that was used for highlighting
+    public let language: String
+
+    /// Relevance score
+    public let relevance: Int
+
+    /// Whether illegal syntax was encountered
+    public let illegal: Bool
+
+    /// Error that was raised during parsing (if any); tokens before it were passed on
+    public let errorRaised: Error?
+
+    public init(language: String, relevance: Int, illegal: Bool, errorRaised: Error? = nil) {
+        self.language = language
+        self.relevance = relevance
+        self.illegal = illegal
+        self.errorRaised = errorRaised
+    }
+}
+
 /// Result of auto-detection highlighting.
 public struct AutoHighlightResult<Output: Sendable>: Sendable {
     /// The best match result
@@ -105,3 +127,29 @@ public struct AutoHighlightResult<Output: Sendable>: Sendable {
         self.secondBest = secondBest
     }
 }
+
+/// Counters of a `Highlight` instance's result cache.
+public struct ResultCacheStatistics: Sendable, Hashable {
+    /// Parses answered from the cache
+    public let hits: Int
+
+    /// Parses that had to run
+    public let misses: Int
+
+    /// Entries dropped to stay within the size limit
+    public let evictions: Int
+
+    /// Entries in the cache
+    public let entryCount: Int
+
+    /// Estimated size of the entries in bytes
+    public let byteCount: Int
+
+    public init(hits: Int, misses: Int, evictions: Int, entryCount: Int, byteCount: Int) {
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions
+        self.entryCount = entryCount
+        self.byteCount = byteCount
+    }
+}
@@ -201,4 +201,568 @@ final class SwiftHighlightTests: XCTestCase {
         XCTAssertFalse(result.illegal)
         XCTAssertTrue(result.value.contains("hljs-class") || result.value.contains("hljs-title"), "Should contain class: \(result.value)")
     }
+
+    func testForwardDeclaredModeBoxRecursesExactly() async throws {
+        let hljs = Highlight()
+
+        // list -> tuple -> list, built the way generated languages break cycles
+        await hljs.registerLanguage("nested") { _ in
+            let listBox = ModeBox()
+            let tuple = Mode(scope: "tuple", begin: "\\(", end: "\\)", contains: [.mode(listBox)])
+            let list = Mode(scope: "list", begin: "\\[", end: "\\]", contains: [.mode(tuple)])
+            listBox.bind(list)
+            return Language(name: "Nested", contains: [.mode(list)])
+        }
+
+        let result = await hljs.highlight("[([([()])])]", language: "nested")
+
+        XCTAssertFalse(result.illegal)
+        XCTAssertEqual(result.value.components(separatedBy: "hljs-list").count - 1, 3)
+        XCTAssertEqual(result.value.components(separatedBy: "hljs-tuple").count - 1, 3)
+    }
+
+    func testModeBoxesCompareByBoundMode() {
+        let mode = Mode(scope: "list", begin: "\\[", end: "\\]")
+        let empty = ModeBox()
+        let late = ModeBox()
+
+        XCTAssertEqual(ModeBox(mode), ModeBox(mode))
+        XCTAssertEqual(empty, empty)
+        XCTAssertNotEqual(empty, late)
+
+        var boxes: Set<ModeBox> = [late]
+        late.bind(mode)
+        XCTAssertTrue(boxes.contains(late))
+        XCTAssertTrue(boxes.contains(ModeBox(mode)))
+        boxes.insert(ModeBox(mode))
+        XCTAssertEqual(boxes.count, 1)
+    }
+
+    func testYamlFlowCollectionsEndAtTheirOwnBracket() async throws {
+        let hljs = Highlight()
+        await hljs.registerYaml()
+
+        // The value mode is shared by `{...}` and `[...]` and ends with its parent,
+        // so each parent needs its own copy ending on its own bracket
+        for line in ["a: [1, 2]", "a: {x: 1, y: [2, 3]}", "a: [{x: 1}, 2]"] {
+            let combined = await hljs.highlight("\(line)\nb: c", language: "yaml")
+            let first = await hljs.highlight(line, language: "yaml")
+            let second = await hljs.highlight("b: c", language: "yaml")
+
+            XCTAssertEqual(combined.value, first.value + "\n" + second.value, line)
+            XCTAssertTrue(combined.value.contains("<span class=\"hljs-attr\">b:</span>"), combined.value)
+        }
+    }
+
+    func testSnapshotMatchesCompiledLanguage() async throws {
+        let hljs = Highlight()
+
+        let snapshot = try LanguageSnapshot(data: Data(Self.miniSnapshot.utf8))
+        await hljs.registerSnapshot(snapshot)
+        await hljs.registerLanguage("mini-source") { _ in
+            let escape = Mode(begin: "\\\\[\\s\\S]", relevance: 0)
+            let string = Mode(scope: "string", begin: "\"", end: "\"", illegal: "\\n", contains: [.mode(escape)])
+            let comment = Mode(scope: "comment", begin: "//", end: "$")
+            let number = Mode(
+                scope: "number",
+                variants: HLJS.variants([Mode(match: "\\b0x[0-9a-f]+"), Mode(match: "\\b\\d+")]),
+                relevance: 0
+            )
+            return Language(
+                name: "Mini",
+                keywords: HLJS.kw(keyword: ["if", "return"], literal: ["true"]),
+                contains: [.mode(string), .mode(comment), .mode(number)]
+            )
+        }
+
+        let code = "if true { return 0x1f + 42 + \"a\\\"b\" } // done"
+        let fromSnapshot = await hljs.highlight(code, language: "mn")
+        let fromSource = await hljs.highlight(code, language: "mini-source")
+
+        XCTAssertEqual(fromSnapshot.value, fromSource.value)
+        XCTAssertEqual(fromSnapshot.relevance, fromSource.relevance)
+        XCTAssertTrue(fromSnapshot.value.contains("<span class=\"hljs-keyword\">return</span>"))
+        XCTAssertTrue(fromSnapshot.value.contains("<span class=\"hljs-number\">0x1f</span>"))
+    }
+
+    func testSnapshotRejectsUnknownFormat() {
+        let data = Data(#"{"format": 99, "language": "x", "name": "X", "aliases": [], "disableAutodetect": false, "caseInsensitive": false, "unicodeRegex": false, "classNameAliases": {}, "keywords": [], "modes": [{"relevance": 1}]}"#.utf8)
+        XCTAssertThrowsError(try LanguageSnapshot(data: data))
+    }
+
+    func testBundleRegistersLanguagesLazily() async throws {
+        let payload = Data(Self.miniSnapshot.utf8)
+        let index = Data(#"[{"language":"mini","name":"Mini","aliases":["mn"],"disableAutodetect":false,"caseInsensitive":false,"unicodeRegex":false,"offset":0,"length":\#(payload.count)}]"#.utf8)
+        var data = LanguageBundle.magic
+        withUnsafeBytes(of: LanguageBundle.formatVersion.littleEndian) { data.append(contentsOf: $0) }
+        withUnsafeBytes(of: UInt32(index.count).littleEndian) { data.append(contentsOf: $0) }
+        data.append(index)
+        data.append(payload)
+
+        let bundle = try LanguageBundle(data: data)
+        XCTAssertEqual(bundle.languageIDs, ["mini"])
+
+        let hljs = Highlight()
+        await hljs.registerBundle(bundle)
+        let language = await hljs.getLanguage("mn")
+        XCTAssertEqual(language?.name, "Mini")
+
+        let result = await hljs.highlight("return 42", language: "mini")
+        XCTAssertEqual(result.value, "<span class=\"hljs-keyword\">return</span> <span class=\"hljs-number\">42</span>")
+    }
+
+    func testBundleRejectsTruncatedIndex() {
+        var data = LanguageBundle.magic
+        withUnsafeBytes(of: LanguageBundle.formatVersion.littleEndian) { data.append(contentsOf: $0) }
+        withUnsafeBytes(of: UInt32(1_000).littleEndian) { data.append(contentsOf: $0) }
+        XCTAssertThrowsError(try LanguageBundle(data: data))
+    }
+
+    func testLexerTablesMatchRegexMatchers() async throws {
+        let hljs = Highlight()
+
+        let variants: [(String, LexerTables?)] = [("mini-regex", nil), ("mini-lexer", LexerTables(Self.miniLexerTables))]
+        for (id, tables) in variants {
+            await hljs.registerLanguage(id) { _ in
+                let escape = Mode(begin: "\\\\[\\s\\S]", relevance: 0)
+                let string = Mode(scope: "string", begin: "\"", end: "\"", illegal: "\\n", contains: [.mode(escape)])
+                let comment = Mode(scope: "comment", begin: "//", end: "$")
+                let number = Mode(
+                    scope: "number",
+                    variants: HLJS.variants([Mode(match: "\\b0x[0-9a-f]+"), Mode(match: "\\b\\d+")]),
+                    relevance: 0
+                )
+                return Language(
+                    name: "Mini",
+                    keywords: HLJS.kw(keyword: ["if", "return"], literal: ["true"]),
+                    contains: [.mode(string), .mode(comment), .mode(number)],
+                    lexerTables: tables
+                )
+            }
+        }
+
+        XCTAssertEqual(LexerTables(Self.miniLexerTables).tables.count, Self.miniLexerTables.count)
+        let code = "if true { return 0x1f + 42 + \"a\\\"b\" } // done\r\nx9 é1 \"λ\\n\" 7 // end"
+        let fromLexer = await hljs.highlight(code, language: "mini-lexer")
+        let fromRegex = await hljs.highlight(code, language: "mini-regex")
+
+        XCTAssertEqual(fromLexer.value, fromRegex.value)
+        XCTAssertEqual(fromLexer.relevance, fromRegex.relevance)
+        XCTAssertTrue(fromLexer.value.contains("<span class=\"hljs-number\">0x1f</span>"))
+    }
+
+    func testParseKeepsTextAcrossSurrogatesAndCombiningMarks() async throws {
+        let hljs = Highlight()
+        await hljs.registerRust()
+
+        let code = "// 😀 e\u{301}\nfn f_e\u{301}x() { let s = \"👩‍👩‍👧\"; }"
+        let result = await hljs.parse(code, language: "rust")
+
+        func text(_ node: TokenNode) -> String {
+            switch node {
+            case .text(let value): return value
+            case .scope(let scope): return scope.children.map(text).joined()
+            }
+        }
+        XCTAssertEqual(result.tokenTree.root.children.map(text).joined(), code)
+
+        // Capture groups of a multi-scope begin are cut by UTF-16 offsets
+        let html = await hljs.highlight(code, language: "rust").value
+        XCTAssertTrue(html.contains("<span class=\"hljs-title function_\">f_e\u{301}x</span>"), html)
+    }
+
+    func testDocumentUpdateMatchesFullParse() async throws {
+        let hljs = Highlight()
+        await hljs.registerPython()
+
+        let code = (0..<40).map { "def f\($0)(x):\n    return x + \($0)  # note\n" }.joined()
+        var document = try await hljs.highlightDocument(code, language: "python")
+        XCTAssertEqual(document.lines.count, 81)
+        XCTAssertEqual(document.lines[0].tokens.first, HighlightToken(range: 0..<3, scopes: ["keyword"]))
+
+        // (text to replace, replacement, whether the edit stays local)
+        let edits: [(String, String, Bool)] = [
+            ("return x + 7", "return y + 7", true),
+            ("# note\ndef f12", "# no\nte = 1\ndef f12", true),
+            ("def f20", "\"\"\"def f20", false),
+            ("\"\"\"def f20", "def f20", false),
+            ("def f39(x):\n", "", true),
+        ]
+        for (target, replacement, isLocal) in edits {
+            let range = Range<Int>((document.code as NSString).range(of: target))!
+            let update = try await hljs.updateDocument(document, replacing: range, with: replacement)
+            let full = try await hljs.highlightDocument(update.document.code, language: "python")
+
+            XCTAssertEqual(update.document.lines, full.lines, target)
+            XCTAssertEqual(
+                update.document.lines.count - update.changedLines.count,
+                document.lines.count - update.replacedLines.count,
+                target
+            )
+            if isLocal {
+                XCTAssertLessThanOrEqual(update.changedLines.count, 5, target)
+            } else {
+                XCTAssertEqual(update.changedLines.upperBound, update.document.lines.count, target)
+            }
+            document = update.document
+        }
+    }
+
+    func testStreamedHTMLMatchesRenderer() async throws {
+        final class Chunks: @unchecked Sendable {
+            var values: [String] = []
+        }
+
+        let hljs = Highlight()
+        await hljs.registerPython()
+        await hljs.registerMarkdown()
+        await hljs.registerXml()
+
+        let samples = [
+            ("python", "@dec\nclass A(B):\n    def f(self, x=1):\n        return f\"{x!r} <&>\"  # done\n"),
+            ("markdown", "# Title\n\nSome <b class=\"x\">inline</b> *html* and `code`.\n"),
+        ]
+        for (language, code) in samples {
+            let chunks = Chunks()
+            var writer = HTMLStreamWriter(chunkSize: 16) { chunks.values.append($0) }
+            let result = await hljs.parse(code, language: language, into: &writer)
+            let expected = await hljs.highlight(code, language: language)
+
+            XCTAssertNil(result.errorRaised)
+            XCTAssertEqual(result.relevance, expected.relevance)
+            XCTAssertEqual(chunks.values.joined(), expected.value)
+            XCTAssertGreaterThan(chunks.values.count, 1)
+        }
+    }
+
+    func testAutoDetectParsesRankedCandidates() async throws {
+        XCTAssertEqual(languageHints(in: "#!/usr/bin/env -S python3.11 -u\nx = 1\n"), ["python3.11", "python"])
+        XCTAssertEqual(languageHints(in: "#!/bin/bash\necho hi\n"), ["bash"])
+        XCTAssertEqual(languageHints(in: "// -*- mode: go -*-\npackage main\n"), ["go"])
+        XCTAssertEqual(languageHints(in: "x = 1\n# vim: set ft=ruby:\n"), ["ruby"])
+        XCTAssertEqual(languageHints(in: "print('hi')\n"), [])
+
+        let all = Highlight(options: HighlightOptions(autoDetectCandidates: nil))
+        let pruned = Highlight(options: HighlightOptions(autoDetectCandidates: 1))
+        for hljs in [all, pruned] {
+            await hljs.registerPython()
+            await hljs.registerJSON()
+            await hljs.registerGo()
+            await hljs.registerRust()
+        }
+
+        let code = "def main():\n    for item in items:\n        if item is not None:\n            yield item\n"
+        let expected = await all.highlightAuto(code)
+        let result = await pruned.highlightAuto(code)
+        XCTAssertEqual(expected.language, "python")
+        XCTAssertEqual(result.language, "python")
+        XCTAssertEqual(result.value, expected.value)
+
+        // A `#!` line outranks keywords
+        let shebang = await pruned.highlightAuto("#!/usr/bin/env python3\nimport os\n")
+        XCTAssertEqual(shebang.language, "python")
+    }
+
+    func testResultCacheHitsEvictsAndInvalidates() async throws {
+        let first = "def f(x):\n    return x + 1\n"
+
+        let uncached = Highlight()
+        await uncached.registerPython()
+        let expected = await uncached.highlight(first, language: "python")
+        let noStatistics = await uncached.resultCacheStatistics()
+        XCTAssertNil(noStatistics)
+
+        let hljs = Highlight(options: HighlightOptions(resultCacheLimit: 1 << 20))
+        await hljs.registerPython()
+        _ = await hljs.highlight(first, language: "python")
+        let cached = await hljs.highlight(first, language: "python")
+        XCTAssertEqual(cached.value, expected.value)
+        XCTAssertEqual(cached.tokenTree, expected.tokenTree)
+        let afterRepeat = await hljs.resultCacheStatistics()
+        var statistics = try XCTUnwrap(afterRepeat)
+        XCTAssertEqual(statistics.hits, 1)
+        XCTAssertEqual(statistics.misses, 1)
+        XCTAssertEqual(statistics.entryCount, 1)
+
+        // The least recently used entry goes first
+        func entry(_ code: String) -> (ResultCache.Key, ParseResult) {
+            let key = ResultCache.Key(
+                code: code,
+                language: "python",
+                ignoreIllegals: true,
+                generation: 0,
+                classPrefix: "hljs-",
+                autoDetectLanguages: nil,
+                autoDetectCandidates: nil
+            )
+            let result = ParseResult(
+                language: "python",
+                tokenTree: TokenTree(root: ScopeNode(children: [.text(code)]), language: "python"),
+                relevance: 0,
+                illegal: false,
+                code: code
+            )
+            return (key, result)
+        }
+        let (a, b, c) = (entry("aaaa"), entry("bbbb"), entry("cccc"))
+        let cache = ResultCache(limit: 2 * ResultCache.estimatedByteCount(of: a.1))
+        cache.insert(a.1, for: a.0)
+        cache.insert(b.1, for: b.0)
+        XCTAssertNotNil(cache.result(for: a.0))
+        cache.insert(c.1, for: c.0)
+        XCTAssertNil(cache.result(for: b.0))
+        XCTAssertNotNil(cache.result(for: a.0))
+        XCTAssertNotNil(cache.result(for: c.0))
+        XCTAssertEqual(cache.statistics.evictions, 1)
+
+        await hljs.registerPython()
+        let afterRegister = await hljs.resultCacheStatistics()
+        statistics = try XCTUnwrap(afterRegister)
+        XCTAssertEqual(statistics.entryCount, 0)
+        XCTAssertEqual(statistics.byteCount, 0)
+    }
+
+    func testBatchMatchesSerialHighlight() async throws {
+        let hljs = Highlight()
+        await hljs.registerPython()
+        await hljs.registerMarkdown()
+
+        let inputs = (0..<24).map { i in
+            i % 2 == 0
+                ? (code: "def f\(i)(x):\n    return x * \(i)  # n\n", language: "python")
+                : (code: "# Heading \(i)\n\n```python\nprint(\(i))\n```\n", language: "markdown")
+        }
+        let results = await hljs.highlightBatch(inputs, maxConcurrency: 4)
+        XCTAssertEqual(results.count, inputs.count)
+        for (input, result) in zip(inputs, results) {
+            let expected = await hljs.highlight(input.code, language: input.language)
+            XCTAssertEqual(result.value, expected.value)
+            XCTAssertEqual(result.relevance, expected.relevance)
+        }
+
+        let python = try await hljs.compiledLanguage("python")
+        let detached = await Task.detached { python.highlight(inputs[0].code) }.value
+        XCTAssertEqual(detached.value, results[0].value)
+        do {
+            _ = try await hljs.compiledLanguage("nonexistent")
+            XCTFail("Expected unknownLanguage")
+        } catch HighlightError.unknownLanguage {}
+    }
+
+    func testHTMLByteRendererOutput() async {
+        let tree = TokenTree(root: ScopeNode(scope: "root", children: [
+            .scope(ScopeNode(scope: "string", children: [.text("\"<é & '😀'>\"")])),
+            .scope(ScopeNode(scope: "params")),
+            .text(" "),
+            .scope(ScopeNode(scope: "title.function.invoke", children: [.text("f")])),
+            .scope(ScopeNode(scope: "language:css", children: [
+                .scope(ScopeNode(scope: "string", children: [.text("x")])),
+            ])),
+        ]), language: "test")
+        let expected = "<span class=\"my-string\">&quot;&lt;é &amp; &#x27;😀&#x27;&gt;&quot;</span> "
+            + "<span class=\"my-title function_ invoke__\">f</span>"
+            + "<span class=\"language-css\"><span class=\"my-string\">x</span></span>"
+
+        let renderer = HTMLByteRenderer(theme: HTMLTheme(classPrefix: "my-"))
+        XCTAssertEqual(renderer.render(tree), Array(expected.utf8))
+        XCTAssertEqual(renderer.renderData(tree, codeLength: 64), Data(expected.utf8))
+        XCTAssertEqual(HTMLRenderer(theme: HTMLTheme(classPrefix: "my-")).render(tree), expected)
+        XCTAssertEqual(HTMLByteRenderer().render(tree), Array(HTMLRenderer().render(tree).utf8))
+
+        let hljs = Highlight()
+        await hljs.registerPython()
+        let code = "def f(a, b='<'):\n    return a & b  # done\n"
+        let bytes = await hljs.highlight(code, language: "python", renderer: HTMLByteRenderer())
+        let html = await hljs.highlight(code, language: "python")
+        XCTAssertEqual(String(decoding: bytes.value, as: UTF8.self), html.value)
+    }
+
+    func testTokenListWalksTreeWithoutRecursion() async {
+        let tree = TokenTree(root: ScopeNode(children: [
+            .text("a"),
+            .scope(ScopeNode(scope: "string", children: [.text("b"), .scope(ScopeNode(scope: "subst"))])),
+            .scope(ScopeNode(scope: "language:css", language: "css", children: [.text("c")])),
+        ]), language: "test")
+        let tokens = tree.tokens
+        XCTAssertEqual((0..<tokens.count).map { tokens.kind(at: $0) }, [.text, .open, .text, .open, .close, .close, .open, .text, .close])
+        XCTAssertEqual((0..<tokens.count).map { tokens.depth(at: $0) }, [0, 0, 1, 1, 1, 0, 0, 1, 0])
+        XCTAssertEqual(tokens.scope(at: 3), "subst")
+        XCTAssertEqual(tokens.language(at: 6), "css")
+        XCTAssertEqual(tokens.text(at: 7), "c")
+        XCTAssertEqual(tokens.tree, tree.root)
+
+        let hljs = Highlight()
+        await hljs.registerMarkdown()
+        await hljs.registerXml()
+        let code = "# Title\n\nSome <b class=\"x\">bold</b> *text* & `code`.\n"
+        let result = await hljs.parse(code, language: "markdown")
+        let parsed = result.tokenTree.tokens
+        var text = ""
+        var depth = 0
+        for index in 0..<parsed.count {
+            XCTAssertEqual(parsed.depth(at: index), parsed.kind(at: index) == .close ? depth - 1 : depth)
+            switch parsed.kind(at: index) {
+            case .open: depth += 1
+            case .close: depth -= 1
+            case .text: text += parsed.text(at: index)
+            }
+        }
+        XCTAssertEqual(depth, 0)
+        XCTAssertEqual(text, code)
+        XCTAssertTrue((0..<parsed.count).contains { parsed.scope(at: $0) == "language:xml" })
+        XCTAssertEqual(TokenTree(root: result.tokenTree.root, language: "markdown"), result.tokenTree)
+    }
+
+    func testCompiledThemeCoalescesStyledRuns() {
+        struct Theme: HighlightTheme {
+            let styles: [String: ScopeStyle]
+            func style(for scope: String) -> ScopeStyle? {
+                styleWithFallback(for: scope) { styles[$0] }
+            }
+        }
+        let red = ScopeStyle(foregroundColor: ThemeColor(red: 1, green: 0, blue: 0))
+        let bold = ScopeStyle(textStyle: .bold)
+        let theme = CompiledTheme(Theme(styles: ["keyword": red, "built_in": red, "title": bold]))
+
+        let tree = TokenTree(root: ScopeNode(children: [
+            .scope(ScopeNode(scope: "keyword", children: [.text("def")])),
+            .scope(ScopeNode(scope: "built_in", children: [.text("print")])),
+            .text(" "),
+            .scope(ScopeNode(scope: "function", children: [
+                .scope(ScopeNode(scope: "title.function", children: [.text("f")])),
+                .scope(ScopeNode(scope: "params", children: [.text("(x)")])),
+            ])),
+            .scope(ScopeNode(scope: "title", children: [.scope(ScopeNode(scope: "params")), .text("g")])),
+        ]), language: "test")
+
+        let styled = theme.styledText(tree.tokens)
+        XCTAssertEqual(String(decoding: styled.units, as: UTF16.self), "defprint f(x)g")
+        XCTAssertEqual(styled.runs.map { $0.range }, [0..<8, 8..<9, 9..<10, 10..<13, 13..<14])
+        XCTAssertEqual(styled.runs.map { $0.style.map { styled.styles[$0] } }, [red, nil, bold, nil, bold])
+        XCTAssertEqual(styled.styles.count, 2)
+    }
+
+    func testKeywordScannerMatchesRegex() throws {
+        let patterns = [#"\w+"#, #"[a-zA-Z_]\w*"#, #"[A-Za-z$_][0-9A-Za-z$_]*"#, #"[A-Za-z]\w+"#, #"[a-z\-]+"#]
+        let texts = ["", "1e_1 + x2", "if (a$b) { return FOO_bar; } // x-y z", "  _ __init__ 9lives a", "SELECT-x"]
+        for pattern in patterns {
+            for caseInsensitive in [false, true] {
+                let regex = try NSRegularExpression(pattern: pattern, options: caseInsensitive ? [.caseInsensitive] : [])
+                let scanner = try XCTUnwrap(KeywordScanner(pattern: pattern, caseInsensitive: caseInsensitive, keywords: [:]))
+                for text in texts {
+                    let units = Array(text.utf16)
+                    let expected = regex.matches(in: text, range: NSRange(location: 0, length: units.count))
+                        .compactMap { Range<Int>($0.range) }
+                    var words: [Range<Int>] = []
+                    var position = 0
+                    while let word = scanner.nextWord(in: units, from: position, to: units.count) {
+                        words.append(word)
+                        position = word.upperBound
+                    }
+                    XCTAssertEqual(words, expected, "\(pattern) on \(text)")
+                }
+            }
+        }
+
+        for pattern in [#"\w+|#\w+"#, #"[a-zA-Z_]\w*[!?=]?"#, #"[^\s]+"#, #"[A-Za-z_¡-￿]+"#, #"\w*"#] {
+            XCTAssertNil(KeywordScanner(pattern: pattern, caseInsensitive: false, keywords: [:]), pattern)
+        }
+        XCTAssertFalse(KeywordScanner.canScan(Array("let é = 1".utf16), 0..<9))
+
+        let keywords: [String: (scope: String, relevance: Int)] = ["select": ("keyword", 1), "null": ("literal", 0), "é": ("keyword", 1)]
+        let folded = try XCTUnwrap(KeywordScanner(pattern: #"\w+"#, caseInsensitive: true, keywords: keywords))
+        let units = Array("SeLeCt Null selects".utf16)
+        XCTAssertEqual(folded.keyword(at: 0..<6, in: units)?.key, "select")
+        XCTAssertEqual(folded.keyword(at: 7..<11, in: units)?.scope, "literal")
+        XCTAssertNil(folded.keyword(at: 12..<19, in: units))
+        let exact = try XCTUnwrap(KeywordScanner(pattern: #"\w+"#, caseInsensitive: false, keywords: keywords))
+        XCTAssertNil(exact.keyword(at: 0..<6, in: units))
+    }
+
+    func testProfileReportCountsPerMode() async throws {
+        let unprofiled = Highlight()
+        let noReport = await unprofiled.profileReport()
+        XCTAssertNil(noReport)
+
+        let hljs = Highlight(options: HighlightOptions(profiling: true))
+        await hljs.registerSnapshot(try LanguageSnapshot(data: Data(Self.miniSnapshot.utf8)))
+        let code = "if x return \"a\\\"b\" // c\n0x1f 42 true"
+        _ = await hljs.highlight(code, language: "mini")
+
+        let profiled = await hljs.profileReport()
+        let report = try XCTUnwrap(profiled)
+        XCTAssertEqual(report.version, ProfileReport.version)
+        func mode(_ index: Int) throws -> ProfileReport.ModeProfile {
+            try XCTUnwrap(report.modes.first { $0.language == "mini" && $0.mode == index })
+        }
+
+        // Modes are numbered as in the snapshot
+        let root = try mode(0)
+        XCTAssertNil(root.begin)
+        XCTAssertEqual(root.matches, 4)
+        XCTAssertGreaterThan(root.execCalls, root.matches)
+        XCTAssertEqual(root.rules.map { $0.mode }, [1, 3, 4, 5])
+        XCTAssertEqual(root.keywordLookups, 4)
+        XCTAssertEqual(root.keywordHits, 3)
+        let string = try mode(1)
+        XCTAssertEqual(string.scope, "string")
+        XCTAssertEqual(string.begin, "\"")
+        XCTAssertEqual(Set(string.rules), [
+            ProfileReport.RuleProfile(kind: "begin", mode: 2, matches: 1),
+            ProfileReport.RuleProfile(kind: "end", mode: nil, matches: 1),
+        ])
+        XCTAssertEqual(try mode(3).scope, "comment")
+        XCTAssertEqual(try mode(4).begin, "\\b0x[0-9a-f]+")
+
+        let decoded = try JSONDecoder().decode(ProfileReport.self, from: report.jsonData())
+        XCTAssertEqual(decoded, report)
+
+        await hljs.resetProfile()
+        let reset = await hljs.profileReport()
+        XCTAssertEqual(reset?.modes.count, 0)
+    }
+
+    func testPrefilterMatchesUnfilteredSearch() throws {
+        let rules = [#"\*/"#, #"@[A-Za-z]+"#, #"[ ]+(TODO|FIXME)\b"#, #"\\[\s\S]"#, #"^#+"#, #"$"#]
+        XCTAssertNotNil(RegexPrefilter(patterns: rules, caseInsensitive: false))
+        XCTAssertNil(RegexPrefilter(patterns: [#"\B|\b"#], caseInsensitive: false))
+        XCTAssertNil(RegexPrefilter(patterns: [#"(?<=x)y"#], caseInsensitive: false))
+
+        let matcher = MultiRegex()
+        for rule in rules {
+            matcher.addRule(rule, type: .begin)
+        }
+        matcher.compile()
+        let combined = try NSRegularExpression(
+            pattern: rules.map { "(\($0))" }.joined(separator: "|"),
+            options: [.anchorsMatchLines]
+        )
+
+        let code = "/* a long comment, é, with a TODO and @param x\n# heading \\n */ trailing\r\n"
+        let length = code.utf16.count
+        for start in 0...length {
+            let expected = combined.firstMatch(in: code, options: [], range: NSRange(location: start, length: length - start))
+            let group = expected.flatMap { match in
+                (1..<match.numberOfRanges).first { match.range(at: $0).location != NSNotFound }
+            }
+            let actual = matcher.exec(SourceText(code), from: start)
+            XCTAssertEqual(actual?.range, expected?.range, "from \(start)")
+            XCTAssertEqual(actual?.groupOffset, group, "from \(start)")
+        }
+    }
+
+    /// Written by tools/compile-language-snapshot.py from the IR of the "mini-source" language
+    /// in `testSnapshotMatchesCompiledLanguage`
+    private static let miniSnapshot = #"""
+    {"format":1,"language":"mini","name":"Mini","aliases":["mn"],"disableAutodetect":false,"caseInsensitive":false,"unicodeRegex":false,"classNameAliases":{},"keywords":[{"pattern":"\\w+","scopes":["keyword","literal"],"words":{"if":[0,0],"return":[0,1],"true":[1,1]}}],"modes":[{"keywords":0,"contains":[1,3,4,5],"relevance":1,"matcher":{"rules":[[0,1,0],[0,3,0],[0,4,0],[0,5,0]],"pattern":"(\")|(//)|(\\b0x[0-9a-f]+)|(\\b\\d+)"}},{"scope":"string","begin":"\"","end":"\"","illegal":"\\n","terminatorEnd":"\"","contains":[2],"parent":0,"relevance":1,"matcher":{"rules":[[0,2,0],[1,-1,0],[2,-1,0]],"pattern":"(\\\\[\\s\\S])|(\")|(\\n)"}},{"begin":"\\\\[\\s\\S]","end":"\\B|\\b","terminatorEnd":"\\B|\\b","parent":1,"relevance":0,"matcher":{"rules":[[1,-1,0]],"pattern":"(\\B|\\b)"}},{"scope":"comment","begin":"//","end":"$","terminatorEnd":"$","parent":0,"relevance":1,"matcher":{"rules":[[1,-1,0]],"pattern":"($)"}},{"scope":"number","begin":"\\b0x[0-9a-f]+","end":"\\B|\\b","terminatorEnd":"\\B|\\b","parent":0,"relevance":0,"matcher":{"rules":[[1,-1,0]],"pattern":"(\\B|\\b)"}},{"scope":"number","begin":"\\b\\d+","end":"\\B|\\b","terminatorEnd":"\\B|\\b","parent":0,"relevance":0,"matcher":{"rules":[[1,-1,0]],"pattern":"(\\B|\\b)"}}]}
+    """#
+
+    /// Written by `build_lexer_table` in tools/hljs_dfa.py for the matchers of the
+    /// languages in `testLexerTablesMatchRegexMatchers`
+    private static let miniLexerTables: [String: String] = [
+        #"(")|(//)|(\b0x[0-9a-f]+)|(\b\d+)"#: "AQAAAAQAAAAOAAAACgAAAAYAAACAAAAAhQAAAIYAAAAoIAAAKSAAACogAAAAAAAAAAABAAEAAQABAAEAAAABAAgACQAIAAkAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAABAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAIAAwAEAAQABAAEAAQABAAEAAQABAAAAAAAAAAAAAAAAAAAAAUABQAFAAUABQAFAAUABQAFAAUABQAFAAUABQAFAAUABQAFAAUABQAFAAUABQAFAAUABQAAAAAAAAAAAAUAAAAGAAYABgAGAAYABgAFAAUABQAFAAUABQAFAAUABQAFAAUABQAFAAUABQAFAAUABwAFAAUAAAAAAAAAAAAAAAAABQAIAAkAAAAFAAgACQAKAAsADAANAAoACwAMAA0AAAAFAAgACQAAAAUACAAJAAoACwAMAA0ACgALAAwADQAAAAUACAAJAAAABQAIAAkACgALAAwADQAKAAsADAANAAAABQAIAAkAAAAFAAgACQAKAAsADAANAAoACwAMAA0AAAAFAAgACQAAAAUACAAJAAoACwAMAA0ACgALAAwADQAAAAUACAAJAAAABQAIAAkACgALAAwADQAKAAsADAANAAAAAAABAAAAAQAAAAEAAAABAP//AgADAAQABQD//////////wUA////////////////AgADAP////////////8GAP////////////////////////////////////////////////////////////8HAP///////////////////////////////////////wUABQD/////CAAGAAUA/////wUABQD//////////wUABQD///////8GAAUA/////wUABQD//////////wUABQD///////8GAAUA/////wYABgD//////////////////////////////////////////////////wkACQD//wkA/////////////////////////////wkACQD//wkA/////////////////////////////////////////////////////////////////////////////////////////////////////wAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAP///////////////////////////////////////wMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAMAAwADAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAP///////////////////////////////////////wIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAA==",
+        #"(\\[\s\S])|(")|(\n)"#: "AQAAAAMAAAAEAAAABQAAAAYAAACAAAAAhQAAAIYAAAAoIAAAKSAAACogAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAQAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAgAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAADAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAD//wEAAgADAP////////////////////////////8EAAQABAAEAP////////////////////////////8CAAIAAgACAAIAAQABAAEAAQABAP////////////8AAAAAAAAAAAAA",
+        #"($)"#: "AQAAAAEAAAAEAAAABQAAAAYAAACAAAAAhQAAAIYAAAAoIAAAKSAAACogAAAAAAIAAgAGAAAAAAAAAAAAAAAAAAAAAAAAAAAAAQACAAIAAwAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAgACAAIAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAEAAQACAAIAAwADAAQABAD/////////////////////////////////////////////////////////////////////AAAAAAAAAAD//wAAAAAAAAAA/////wAAAAAAAP//AAAAAAAAAAD/////AAAAAAAA",
+        #"(\B|\b)"#: "AQAAAAEAAAAEAAAAAgAAAAYAAACAAAAAhQAAAIYAAAAoIAAAKSAAACogAAAAAAEACAAJAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAEAAQABAAEAAQABAAEAAQABAAEAAAAAAAAAAAAAAAAAAAABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAAAAAAAAAAABAAAAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAEAAQABAAAAAAAAAAAAAAAAAAEAAAABAAAAAQAAAAEAAgADAAIAAwACAAMAAgADAAAAAQAAAAEAAAABAAAAAQACAAMAAgADAAIAAwACAAMAAAABAAAAAQAAAAEAAAABAAIAAwACAAMAAgADAAIAAwAAAAEAAAABAAAAAQAAAAEAAgADAAIAAwACAAMAAgADAAAAAQAAAAEAAAABAAAAAQACAAMAAgADAAIAAwACAAMAAAABAAAAAQAAAAEAAAABAAIAAwACAAMAAgADAAIAAwAAAAAAAQAAAAEAAAABAAAAAQD//////////////////////////wAAAAAAAAAAAAAAAAAAAAAAAAAA",
+    ]
 }
@@ -9,7 +9,4 @@ if [[ ! -d "${ir_dir}" ]]; then
   exit 1
 fi
 
-for json in "${ir_dir}"/*.json; do
-  lang="$(basename "${json}" .json)"
-  python3 "${repo_root}/tools/generate-swift-from-ir.py" --lang "${lang}" --input "${json}"
-done
+python3 "${repo_root}/tools/generate-swift-from-ir.py" --dir "${ir_dir}" "$@"
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Ranks the modes of profile reports across a corpus by where parse time went.
+
+Reads the JSON written by `ProfileReport.jsonData()` (e.g. with
+`swift run -c release ProfileRunner --profile-json <path>`), one report or a
+directory of them, adds up the counters of each mode over all reports and
+prints the modes that cost the most:
+
+    time        time spent in the mode's matcher, and its share of the total
+    exec        matcher lookups
+    match%      lookups that found a match
+    resumes     lookups resuming after an ignored match
+    kw          words looked up in the mode's keyword table
+    sublang     text handed to a sub-language parse
+
+Reports number modes per language in compile order. The IR of the language
+is compiled the same way (see hljs_compiler.py) to name each mode by its IR
+id; a mode whose scope and begin pattern do not match the compiled one is
+looked up by those instead, and left without an id if that fails too (e.g.
+for languages maintained by hand in Swift).
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from hljs_compiler import LanguageCompiler, SnapshotError
+from hljs_ir import load_ir
+
+
+COUNTERS = ("execCalls", "matches", "nanoseconds", "resumes", "keywordLookups", "keywordHits", "subLanguageParses")
+
+SORT_KEYS = {
+    "time": "nanoseconds",
+    "exec": "execCalls",
+    "matches": "matches",
+    "resumes": "resumes",
+    "keywords": "keywordLookups",
+    "sublang": "subLanguageParses",
+}
+
+
+def report_paths(inputs: list[str]) -> list[Path]:
+    paths = []
+    for item in inputs:
+        path = Path(item)
+        paths.extend(sorted(path.glob("*.json")) if path.is_dir() else [path])
+    return paths
+
+
+def aggregate(reports: list[dict]) -> dict[tuple[str, int], dict]:
+    """Counters of each (language, mode) summed over `reports`."""
+    modes = {}
+    for report in reports:
+        for item in report.get("modes") or []:
+            key = (item["language"], item["mode"])
+            total = modes.get(key)
+            if total is None:
+                total = {"language": item["language"], "mode": item["mode"], "scope": item.get("scope"),
+                         "begin": item.get("begin"), "reports": 0, "rules": {}}
+                total.update({counter: 0 for counter in COUNTERS})
+                modes[key] = total
+            total["reports"] += 1
+            for counter in COUNTERS:
+                total[counter] += item.get(counter, 0)
+            for rule in item.get("rules") or []:
+                rule_key = (rule["kind"], rule.get("mode"))
+                total["rules"][rule_key] = total["rules"].get(rule_key, 0) + rule["matches"]
+    return modes
+
+
+class IRIndex:
+    """Compiled IR modes of each language, for naming report modes by IR id."""
+
+    def __init__(self, ir_dir: Path):
+        self.ir_dir = ir_dir
+        self._compiled = {}
+
+    def compiled(self, language: str) -> list | None:
+        if language not in self._compiled:
+            path = self.ir_dir / f"{language}.json"
+            try:
+                compiler = LanguageCompiler(load_ir(path))
+                compiler.compile()
+                self._compiled[language] = compiler.compiled
+            except (OSError, KeyError, SnapshotError):
+                self._compiled[language] = None
+        return self._compiled[language]
+
+    def ir_id(self, language: str, mode: int, scope: str | None, begin: str | None) -> str | None:
+        compiled = self.compiled(language)
+        if not compiled:
+            return None
+        if mode == 0:
+            return "language"
+        if 0 <= mode < len(compiled) and (compiled[mode].scope, compiled[mode].begin) == (scope, begin):
+            return compiled[mode].ir_id
+        matches = {cmode.ir_id for cmode in compiled if (cmode.scope, cmode.begin) == (scope, begin)}
+        return matches.pop() if len(matches) == 1 else None
+
+
+def rank(modes: dict, ir_index: IRIndex, sort_key: str) -> list[dict]:
+    total_time = sum(item["nanoseconds"] for item in modes.values()) or 1
+    ranked = []
+    for item in modes.values():
+        row = dict(item)
+        row["irMode"] = ir_index.ir_id(item["language"], item["mode"], item["scope"], item["begin"])
+        row["timeShare"] = item["nanoseconds"] * 100 / total_time
+        row["rules"] = [
+            {"kind": kind, "mode": mode, "matches": matches}
+            for (kind, mode), matches in sorted(item["rules"].items(), key=lambda rule: (-rule[1], str(rule[0])))
+        ]
+        ranked.append(row)
+    ranked.sort(key=lambda row: (-row[sort_key], row["language"], row["mode"]))
+    return ranked
+
+
+# MARK: - Output
+
+
+def print_table(rows: list[dict], show_rules: int) -> None:
+    print(
+        f"{'#':>3} {'language':<14} {'mode':>5} {'ir':>8} {'time ms':>9} {'time%':>6} {'exec':>9} "
+        f"{'match%':>6} {'resumes':>7} {'kw':>8} {'sublang':>7}  scope / begin"
+    )
+    for number, row in enumerate(rows, start=1):
+        match_rate = f"{row['matches'] * 100 / row['execCalls']:.0f}" if row["execCalls"] else "-"
+        begin = row["begin"] or ""
+        if len(begin) > 40:
+            begin = begin[:37] + "..."
+        label = " ".join(part for part in (row["scope"], begin) if part)
+        print(
+            f"{number:>3} {row['language']:<14} {row['mode']:>5} {row['irMode'] or '-':>8} "
+            f"{row['nanoseconds'] / 1e6:>9.2f} {row['timeShare']:>6.1f} {row['execCalls']:>9} "
+            f"{match_rate:>6} {row['resumes']:>7} {row['keywordLookups']:>8} {row['subLanguageParses']:>7}  {label}"
+        )
+        for rule in row["rules"][:show_rules]:
+            target = f"mode {rule['mode']}" if rule["mode"] is not None else ""
+            print(f"{'':>26} {rule['kind']:>7} {target:<10} {rule['matches']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("reports", nargs="+", help="profile report json files, or directories of them")
+    parser.add_argument("--ir-dir", help="directory of IR json files (default: tools/ir)")
+    parser.add_argument(
+        "--sort",
+        default="time",
+        choices=sorted(SORT_KEYS),
+        help="counter to rank the modes by, largest first (default: time)",
+    )
+    parser.add_argument("--top", type=int, default=20, help="print the first N modes (default: 20, 0 for all)")
+    parser.add_argument("--rules", type=int, default=0, help="also print the N most matched rules of each mode")
+    parser.add_argument("--json", help="write the ranked modes, with IR ids and rules, to this path")
+    args = parser.parse_args()
+
+    repo_root = Path(__file__).resolve().parents[1]
+    ir_dir = Path(args.ir_dir) if args.ir_dir else repo_root / "tools" / "ir"
+
+    reports = []
+    for path in report_paths(args.reports):
+        try:
+            reports.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, json.JSONDecodeError) as exc:
+            print(f"{path}: {type(exc).__name__}: {exc}", file=sys.stderr)
+    if not reports:
+        print("No profile reports read")
+        sys.exit(1)
+
+    rows = rank(aggregate(reports), IRIndex(ir_dir), SORT_KEYS[args.sort])
+    print_table(rows[: args.top] if args.top else rows, args.rules)
+    total_time = sum(row["nanoseconds"] for row in rows)
+    print("")
+    print(f"{len(reports)} reports, {len(rows)} modes, {total_time / 1e6:.2f} ms in matchers")
+
+    if args.json:
+        output = Path(args.json)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps({"reports": len(reports), "modes": rows}, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""Parses package-benchmark console output and gates runs against a baseline.
+
+Reads what `swift package benchmark` prints (the files in `history/`, or a
+new run piped in as `-`), skipping the build log around it, and turns every
+result table into points of a time series:
+
+    target      benchmark target, e.g. HighlightBenchmarks
+    benchmark   benchmark name, e.g. "SwiftHighlight: Complex Code"
+    metric      wallClock, mallocCountTotal, ... (the console label otherwise)
+    percentile  p0 ... p100
+    value       in base units: nanoseconds for time, a plain count otherwise
+    host        the host line of the run
+    commit      --commit, else the last commit before the run's timestamp
+
+`--series <path>` adds the runs to a JSON time series; a run already in it
+(same output, by digest) is not added again.
+
+`--baseline <path>` compares the runs given as arguments with the baseline
+runs. Several runs on either side are combined by their median. A change
+counts only when it is larger than all of:
+
+    the threshold    --time-threshold for p50 latency, --tail-threshold
+                     for p99 latency, --malloc-threshold for p50 mallocs
+    the noise        --noise-factor times the wider spread of the two
+                     sides: the interquartile range for p50, p99 - p75 for
+                     p99, and the range between runs when there are several
+    the rounding     one step of the unit the console printed, e.g. 1 ms
+                     or 1K mallocs
+
+The changes are printed ranked by size, and the exit status is 1 if any
+latency or malloc count regressed.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+SERIES_VERSION = 1
+
+# Console labels of package-benchmark metrics, by the name its API uses.
+METRICS = {
+    "Time (wall clock)": "wallClock",
+    "Time (total CPU)": "cpuTotal",
+    "Time (user CPU)": "cpuUser",
+    "Time (system CPU)": "cpuSystem",
+    "Malloc (total)": "mallocCountTotal",
+    "Malloc (large)": "mallocCountLarge",
+    "Malloc (small)": "mallocCountSmall",
+    "Memory (resident peak)": "peakMemoryResident",
+    "Memory (virtual peak)": "peakMemoryVirtual",
+    "Instructions": "instructions",
+    "Throughput (# / s)": "throughput",
+}
+
+TIME_METRICS = {"wallClock", "cpuTotal", "cpuUser", "cpuSystem"}
+MALLOC_METRICS = {"mallocCountTotal", "mallocCountLarge", "mallocCountSmall"}
+
+# Units the console scales values to, as a multiple of the base unit.
+TIME_UNITS = {"ns": 1, "μs": 1_000, "us": 1_000, "ms": 1_000_000, "s": 1_000_000_000}
+COUNT_SCALES = {"K": 1_000, "M": 1_000_000, "G": 1_000_000_000}
+
+PERCENTILES = ("p0", "p25", "p50", "p75", "p90", "p99", "p100")
+
+HOST_LINE = re.compile(r"^Host '(?P<name>[^']*)' with (?P<cpus>\d+) '(?P<arch>[^']*)' processors")
+BASELINE_LINE = re.compile(r"^Baseline '(?P<name>[^']*)'")
+FILE_TIMESTAMP = re.compile(r"(\d{4}-\d{2}-\d{2})(?:_(\d{2})-(\d{2})-(\d{2}))?")
+
+
+# MARK: - Parsing
+
+
+def split_label(label: str) -> tuple[str, int]:
+    """Metric name and the scale of its values from a console label such as
+    `Time (wall clock) (μs) *`."""
+    label = label.strip().rstrip("*").strip()
+    scale = 1
+    match = re.fullmatch(r"(.*) \(([^()]+)\)", label)
+    if match:
+        unit = match.group(2)
+        if unit in TIME_UNITS:
+            label, scale = match.group(1), TIME_UNITS[unit]
+        elif unit in COUNT_SCALES:
+            label, scale = match.group(1), COUNT_SCALES[unit]
+    # Time without a unit of its own is printed in the default unit, nanoseconds.
+    return METRICS.get(label, label), scale
+
+
+def parse_console(text: str) -> dict:
+    """Host, baseline name and result tables of one console output."""
+    run = {"host": None, "baseline": None, "results": []}
+    lines = text.splitlines()
+    target = None
+    label = None
+    columns = None
+    for index, raw in enumerate(lines):
+        line = raw.strip()
+        if not line:
+            continue
+        host = HOST_LINE.match(line)
+        if host:
+            run["host"] = host.group("name")
+            continue
+        baseline = BASELINE_LINE.match(line)
+        if baseline:
+            run["baseline"] = baseline.group("name")
+            continue
+        # A target is a name between two rules of `=` as long as the name.
+        if (
+            0 < index < len(lines) - 1
+            and set(lines[index - 1].strip()) == {"="}
+            and lines[index + 1].strip() == lines[index - 1].strip()
+            and len(lines[index - 1].strip()) == len(line)
+        ):
+            if line != "Running Benchmarks":
+                target = line
+            continue
+        if line[0] in "╒╞├╘":
+            continue
+        if line.startswith("│"):
+            cells = [cell.strip() for cell in line.strip("│").split("│")]
+            if cells[0] == "Metric":
+                columns = cells[1:]
+                continue
+            if columns is None or label is None:
+                continue
+            metric, scale = split_label(cells[0])
+            values = dict(zip(columns, cells[1:]))
+            try:
+                samples = int(values.pop("Samples", "0"))
+                percentiles = {key: int(value) * scale for key, value in values.items() if key in PERCENTILES}
+            except ValueError:
+                continue
+            run["results"].append({
+                "target": target,
+                "benchmark": label,
+                "metric": metric,
+                "scale": scale,
+                "samples": samples,
+                "percentiles": percentiles,
+            })
+            continue
+        # Any other line names the next table, until a table follows it.
+        label = line
+        columns = None
+    return run
+
+
+def file_timestamp(path: Path | None) -> str:
+    """ISO timestamp from a `_YYYY-MM-DD_HH-MM-SS` file name, else from the
+    file's modification time, else now."""
+    if path is not None:
+        match = FILE_TIMESTAMP.search(path.name)
+        if match:
+            day, hours, minutes, seconds = match.groups()
+            return f"{day}T{hours or '00'}:{minutes or '00'}:{seconds or '00'}"
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(path.stat().st_mtime))
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def commit_before(timestamp: str, repo_root: Path) -> str | None:
+    """The last commit made before `timestamp`, the one a run then most likely measured."""
+    try:
+        result = subprocess.run(
+            ["git", "log", "-1", f"--before={timestamp}", "--format=%h"],
+            cwd=repo_root,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def read_runs(inputs: list[str], commit: str | None, repo_root: Path) -> list[dict]:
+    """Runs of console files, directories of them (`*.txt`), `-` for standard
+    input and series files (`*.json`) written by --series."""
+    runs = []
+    for item in inputs:
+        if item == "-":
+            sources = [(None, sys.stdin.read())]
+        else:
+            path = Path(item)
+            paths = sorted(path.glob("*.txt")) if path.is_dir() else [path]
+            sources = []
+            for file in paths:
+                if file.suffix == ".json":
+                    runs.extend(load_series(file)["runs"])
+                    continue
+                sources.append((file, file.read_text(encoding="utf-8", errors="replace")))
+        for path, text in sources:
+            run = parse_console(text)
+            if not run["results"]:
+                print(f"{path or 'stdin'}: no benchmark results", file=sys.stderr)
+                continue
+            run["source"] = path.name if path else "stdin"
+            run["digest"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            run["timestamp"] = file_timestamp(path)
+            run["commit"] = commit or commit_before(run["timestamp"], repo_root)
+            runs.append(run)
+    return runs
+
+
+# MARK: - Series
+
+
+def points(run: dict) -> list[dict]:
+    return [
+        {
+            "timestamp": run["timestamp"],
+            "commit": run["commit"],
+            "host": run["host"],
+            "target": result["target"],
+            "benchmark": result["benchmark"],
+            "metric": result["metric"],
+            "percentile": percentile,
+            "value": value,
+            "scale": result["scale"],
+            "samples": result["samples"],
+            "source": run["source"],
+        }
+        for result in run["results"]
+        for percentile, value in result["percentiles"].items()
+    ]
+
+
+def load_series(path: Path) -> dict:
+    """Runs recorded in a series file; each run keeps its points grouped back
+    into results so it can be compared like a parsed one."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"runs": []}
+    if data.get("version") != SERIES_VERSION:
+        return {"runs": []}
+    runs = {}
+    for run in data.get("runs") or []:
+        runs[run["digest"]] = dict(run, results={})
+    for point in data.get("points") or []:
+        run = runs.get(point["run"])
+        if run is None:
+            continue
+        key = (point["target"], point["benchmark"], point["metric"])
+        result = run["results"].setdefault(key, {
+            "target": point["target"],
+            "benchmark": point["benchmark"],
+            "metric": point["metric"],
+            "scale": point["scale"],
+            "samples": point["samples"],
+            "percentiles": {},
+        })
+        result["percentiles"][point["percentile"]] = point["value"]
+    for run in runs.values():
+        run["results"] = list(run["results"].values())
+    return {"runs": list(runs.values())}
+
+
+def save_series(path: Path, runs: list[dict]) -> None:
+    """One point per line keeps the file greppable and its diffs readable."""
+    runs = sorted(runs, key=lambda run: (run["timestamp"], run["source"]))
+    lines = [f'{{"version": {SERIES_VERSION}, "runs": [']
+    for number, run in enumerate(runs):
+        header = {key: run[key] for key in ("digest", "source", "timestamp", "commit", "host", "baseline")}
+        comma = "," if number < len(runs) - 1 else ""
+        lines.append(f"  {json.dumps(header, ensure_ascii=False)}{comma}")
+    lines.append('], "points": [')
+    rows = [dict(point, run=run["digest"]) for run in runs for point in points(run)]
+    for number, row in enumerate(rows):
+        comma = "," if number < len(rows) - 1 else ""
+        lines.append(f"  {json.dumps(row, ensure_ascii=False, sort_keys=True)}{comma}")
+    lines.append("]}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+# MARK: - Comparison
+
+
+def combine(runs: list[dict]) -> dict[tuple, dict]:
+    """Results of several runs by (target, benchmark, metric): the median of
+    each percentile, and the range of the medians between runs."""
+    grouped = {}
+    for run in runs:
+        for result in run["results"]:
+            key = (result["target"], result["benchmark"], result["metric"])
+            grouped.setdefault(key, []).append(result)
+    combined = {}
+    for key, results in grouped.items():
+        percentiles = {}
+        for percentile in PERCENTILES:
+            values = [result["percentiles"][percentile] for result in results if percentile in result["percentiles"]]
+            if values:
+                percentiles[percentile] = statistics.median(values)
+        spread = {
+            percentile: max(values) - min(values)
+            for percentile in PERCENTILES
+            if (values := [result["percentiles"][percentile] for result in results if percentile in result["percentiles"]])
+        }
+        combined[key] = {
+            "percentiles": percentiles,
+            "scale": max(result["scale"] for result in results),
+            "runs": len(results),
+            "spread": spread,
+        }
+    return combined
+
+
+def noise(result: dict, percentile: str) -> float:
+    values = result["percentiles"]
+    if percentile == "p50":
+        within = values.get("p75", 0) - values.get("p25", 0)
+    else:
+        within = values.get(percentile, 0) - values.get("p75", 0)
+    return max(within, result["spread"].get(percentile, 0))
+
+
+def compare(baseline: dict, current: dict, args) -> tuple[list[dict], int]:
+    """Gated changes of every result present on both sides, and how many
+    results only one side has."""
+    checks = []
+    for key in sorted(set(baseline) & set(current), key=lambda key: tuple(part or "" for part in key)):
+        metric = key[2]
+        if metric in TIME_METRICS:
+            checks.append((key, "p50", args.time_threshold))
+            checks.append((key, "p99", args.tail_threshold))
+        elif metric in MALLOC_METRICS:
+            checks.append((key, "p50", args.malloc_threshold))
+
+    rows = []
+    for key, percentile, threshold in checks:
+        before, after = baseline[key], current[key]
+        old = before["percentiles"].get(percentile)
+        new = after["percentiles"].get(percentile)
+        if old is None or new is None:
+            continue
+        allowed = max(
+            old * threshold / 100,
+            args.noise_factor * max(noise(before, percentile), noise(after, percentile)),
+            max(before["scale"], after["scale"]),
+        )
+        delta = new - old
+        if delta > allowed:
+            status = "REGRESSION"
+        elif -delta > allowed:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({
+            "target": key[0],
+            "benchmark": key[1],
+            "metric": key[2],
+            "percentile": percentile,
+            "baseline": old,
+            "current": new,
+            "change": delta * 100 / old if old else float("inf") if delta else 0.0,
+            "allowed": allowed * 100 / old if old else 0.0,
+            "status": status,
+        })
+    rows.sort(key=lambda row: (-row["change"], row["benchmark"], row["metric"], row["percentile"]))
+    return rows, len(set(baseline) ^ set(current))
+
+
+# MARK: - Output
+
+
+def format_value(value: float, metric: str) -> str:
+    if metric in TIME_METRICS:
+        for unit, factor in (("s", 1e9), ("ms", 1e6), ("μs", 1e3)):
+            if value >= factor:
+                return f"{value / factor:.3g} {unit}"
+        return f"{value:.0f} ns"
+    return f"{value:,.0f}"
+
+
+def print_runs(runs: list[dict]) -> None:
+    print(f"{'timestamp':<20} {'commit':<10} {'host':<28} {'results':>7}  source")
+    for run in sorted(runs, key=lambda run: (run["timestamp"], run["source"])):
+        print(
+            f"{run['timestamp']:<20} {run['commit'] or '-':<10} {run['host'] or '-':<28} "
+            f"{len(run['results']):>7}  {run['source']}"
+        )
+
+
+def print_diff(rows: list[dict], show_all: bool) -> None:
+    shown = rows if show_all else [row for row in rows if row["status"] != "ok"]
+    print(
+        f"{'#':>3} {'status':<10} {'change':>8} {'allowed':>8} {'pct':>4} {'metric':<17} "
+        f"{'baseline':>10} {'current':>10}  benchmark"
+    )
+    for number, row in enumerate(shown, start=1):
+        print(
+            f"{number:>3} {row['status']:<10} {row['change']:>+7.1f}% {row['allowed']:>7.1f}% {row['percentile']:>4} "
+            f"{row['metric']:<17} {format_value(row['baseline'], row['metric']):>10} "
+            f"{format_value(row['current'], row['metric']):>10}  {row['benchmark']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "runs",
+        nargs="+",
+        help="console outputs of benchmark runs, directories of them, series files, or - for standard input",
+    )
+    parser.add_argument("--series", help="add the runs to this JSON time series")
+    parser.add_argument(
+        "--baseline",
+        action="append",
+        help="baseline run to compare against, in any form the runs take (repeatable; combined by median)",
+    )
+    parser.add_argument("--commit", help="commit the runs measured (default: the last commit before each run)")
+    parser.add_argument(
+        "--time-threshold", type=float, default=5.0, help="allowed p50 latency increase, in percent (default: 5)"
+    )
+    parser.add_argument(
+        "--tail-threshold", type=float, default=15.0, help="allowed p99 latency increase, in percent (default: 15)"
+    )
+    parser.add_argument(
+        "--malloc-threshold", type=float, default=1.0, help="allowed p50 malloc count increase, in percent (default: 1)"
+    )
+    parser.add_argument(
+        "--noise-factor",
+        type=float,
+        default=1.0,
+        help="allowed increase as a multiple of the measured spread (default: 1)",
+    )
+    parser.add_argument("--all", action="store_true", help="also print the comparisons within the thresholds")
+    parser.add_argument("--json", help="write the comparison rows to this path")
+    args = parser.parse_args()
+
+    repo_root = Path(__file__).resolve().parents[1]
+    runs = read_runs(args.runs, args.commit, repo_root)
+    if not runs:
+        print("No benchmark results read")
+        sys.exit(1)
+    print_runs(runs)
+
+    if args.series:
+        series_path = Path(args.series)
+        recorded = load_series(series_path)["runs"]
+        known = {run["digest"] for run in recorded}
+        added = [run for run in runs if run["digest"] not in known]
+        if added:
+            save_series(series_path, recorded + added)
+        print(f"Recorded {len(added)} new run(s) in {series_path} ({len(recorded) + len(added)} in total)")
+
+    if not args.baseline:
+        return
+    baseline_runs = read_runs(args.baseline, None, repo_root)
+    if not baseline_runs:
+        print("No baseline results read")
+        sys.exit(1)
+    hosts = {run["host"] for run in baseline_runs + runs}
+    if len(hosts) > 1:
+        print(f"warning: comparing runs from different hosts: {', '.join(sorted(host or '-' for host in hosts))}")
+
+    rows, unmatched = compare(combine(baseline_runs), combine(runs), args)
+    print("")
+    print_diff(rows, args.all)
+    regressions = sum(1 for row in rows if row["status"] == "REGRESSION")
+    improvements = sum(1 for row in rows if row["status"] == "improved")
+    print("")
+    print(
+        f"{len(rows)} comparison(s): {regressions} regression(s), {improvements} improvement(s), "
+        f"{len(rows) - regressions - improvements} within noise; {unmatched} result(s) on one side only"
+    )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"comparisons": rows}, indent=2) + "\n", encoding="utf-8")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
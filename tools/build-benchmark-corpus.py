@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""Builds a deterministic benchmark corpus for the IR languages.
+
+For every language in `tools/ir` with highlight.js test fixtures (the synced
+copies in Tests/SwiftHighlightTests/Fixtures first, else the highlight.js
+submodule's test/markup), the fixture inputs are tiled into files of each
+size tier, 1 KB to 10 MB by default. Every copy is mutated with a seeded
+generator, renumbering literals and renaming identifiers that are not
+keywords, so tiers are not one snippet repeated verbatim.
+
+Each language also gets adversarial inputs, built from the patterns of its
+modes in the IR:
+
+    long-string           one string literal filling the whole size
+    deep-nesting          a mode that contains itself, nested as deep as fits
+    unterminated-comment  a block comment that is opened and never closed
+
+`manifest.json` in the output directory lists every file with its language,
+kind, tier, size and digest; `Benchmarks/CorpusBenchmarks` and
+`ProfileRunner --corpus` read it. The same seed always builds the same bytes.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+from hljs_ir import keyword_lists, load_ir, pattern_source
+
+
+MANIFEST_VERSION = 1
+
+DEFAULT_TIERS = "1K,10K,100K,1M,10M"
+DEFAULT_ADVERSARIAL_TIERS = "1K,10K,100K"
+
+UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20}
+
+WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+
+# Words for the bodies of strings and comments: no quotes, escapes or brackets.
+FILLER = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do")
+
+REGEX_SYNTAX = set(".^$*+?()[]{}|")
+
+
+def parse_tiers(text: str) -> list[tuple[str, int]]:
+    tiers = []
+    for label in (item.strip().upper() for item in text.split(",")):
+        match = re.fullmatch(r"(\d+)([KM]?)", label)
+        if not match:
+            raise ValueError(f"bad size tier {label!r}, expected e.g. 10K or 1M")
+        tiers.append((label, int(match.group(1)) * UNITS[match.group(2)]))
+    return sorted(tiers, key=lambda tier: tier[1])
+
+
+def fixture_inputs(lang_id: str, fixture_dirs: list[Path]) -> list[tuple[str, str]]:
+    """(name, text) of the fixture inputs of a language, from the first directory that has any."""
+    for base in fixture_dirs:
+        directory = base / lang_id
+        paths = sorted(path for path in directory.glob("*.txt") if not path.name.endswith(".expect.txt"))
+        if paths:
+            return [(path.name, path.read_text(encoding="utf-8", errors="replace")) for path in paths]
+    return []
+
+
+def keyword_set(ir: dict) -> set[str]:
+    """Every keyword of the language and its modes, which mutation leaves alone."""
+    words = set()
+    tables = [ir["language"].get("keywords")] + [mode.get("keywords") for mode in ir.get("modes", [])]
+    for table in tables:
+        if not isinstance(table, dict):
+            continue
+        lists = keyword_lists(table)
+        for field in ("keyword", "literal", "builtIn", "type"):
+            words.update(item.split("|")[0] for item in lists[field])
+        for _, items in lists["custom"]:
+            words.update(item.split("|")[0] for item in items)
+    return words
+
+
+# MARK: - Tiling
+
+
+def mutate(text: str, rng: random.Random, keywords: set[str], copy: int) -> str:
+    """Renumbers digit runs and renames about a third of the non-keyword identifiers."""
+
+    def replace(match):
+        word = match.group(0)
+        if word[0].isdigit():
+            digits = [str(rng.randrange(10)) for _ in word]
+            if len(digits) > 1 and word[0] != "0":
+                digits[0] = str(rng.randrange(1, 10))
+            return "".join(digits)
+        if word in keywords or len(word) < 3 or rng.random() >= 0.3:
+            return word
+        return f"{word}{copy}"
+
+    return WORD_RE.sub(replace, text)
+
+
+def truncate(data: bytes, size: int) -> bytes:
+    """At most `size` bytes, cut after a line end when there is one, never inside a character."""
+    if len(data) <= size:
+        return data
+    cut = data.rfind(b"\n", 0, size)
+    if cut >= 0:
+        return data[: cut + 1]
+    cut = size
+    while cut > 0 and data[cut] & 0xC0 == 0x80:
+        cut -= 1
+    return data[:cut]
+
+
+def tiled(fixtures: list[tuple[str, str]], keywords: set[str], size: int, rng: random.Random) -> bytes:
+    """Mutated copies of the fixtures, in a shuffled order per round, up to `size` bytes."""
+    chunks = []
+    total = 0
+    copy = 0
+    while total < size:
+        order = list(range(len(fixtures)))
+        rng.shuffle(order)
+        for index in order:
+            text = mutate(fixtures[index][1], rng, keywords, copy)
+            if not text.endswith("\n"):
+                text += "\n"
+            chunk = text.encode("utf-8")
+            chunks.append(chunk)
+            total += len(chunk)
+            copy += 1
+            if total >= size:
+                break
+    return truncate(b"".join(chunks), size)
+
+
+# MARK: - Adversarial inputs
+
+
+def literal(pattern: str | None) -> str | None:
+    """The text a pattern matches if it is a plain literal, else None."""
+    if not pattern:
+        return None
+    out = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\":
+            if index + 1 >= len(pattern) or pattern[index + 1].isalnum():
+                return None
+            out.append(pattern[index + 1])
+            index += 2
+            continue
+        if char in REGEX_SYNTAX:
+            return None
+        out.append(char)
+        index += 1
+    return "".join(out) or None
+
+
+def delimited_modes(ir: dict) -> list[dict]:
+    """IR modes with literal begin and end patterns, as dicts of scope, begin, end and whether they nest."""
+    found = []
+    for mode in ir.get("modes", []):
+        begin = literal(pattern_source(mode.get("begin")) or pattern_source(mode.get("match")))
+        end_source = pattern_source(mode.get("end"))
+        end = literal(end_source)
+        if begin is None:
+            continue
+        contains = mode.get("contains") or []
+        nests = any(ref == "self" or (isinstance(ref, dict) and ref.get("ref") == mode["id"]) for ref in contains)
+        found.append({
+            "id": mode["id"],
+            "scope": mode.get("scope") or mode.get("className"),
+            "begin": begin,
+            "end": end,
+            "endsAtLine": end_source == "$",
+            "nests": nests,
+        })
+    return found
+
+
+def filler(size: int, rng: random.Random, line_length: int | None = None) -> str:
+    words = []
+    length = 0
+    line = 0
+    while length < size:
+        word = rng.choice(FILLER)
+        separator = " "
+        if line_length and line + len(word) >= line_length:
+            separator = "\n"
+            line = 0
+        words.append(word + separator)
+        length += len(word) + 1
+        line += len(word) + 1
+    return "".join(words)[: max(size, 0)]
+
+
+def adversarial(ir: dict, size: int, rng: random.Random) -> dict[str, tuple[bytes, str]]:
+    """Adversarial inputs of about `size` bytes by kind, with the IR mode each one targets."""
+    modes = delimited_modes(ir)
+    inputs = {}
+
+    strings = [mode for mode in modes if mode["scope"] == "string" and mode["end"]]
+    strings.sort(key=lambda mode: (mode["begin"] != mode["end"], len(mode["begin"]), mode["id"]))
+    if strings:
+        mode = strings[0]
+        body = filler(size - len(mode["begin"]) - len(mode["end"]) - 1, rng)
+        inputs["long-string"] = ((mode["begin"] + body + mode["end"] + "\n").encode("utf-8"), mode["id"])
+
+    nesting = [mode for mode in modes if mode["nests"] and mode["end"]]
+    nesting.sort(key=lambda mode: (len(mode["begin"]) + len(mode["end"]), mode["id"]))
+    if nesting:
+        mode = nesting[0]
+        depth = max(1, (size - 2) // (len(mode["begin"]) + len(mode["end"])))
+        text = mode["begin"] * depth + "x" + mode["end"] * depth + "\n"
+        inputs["deep-nesting"] = (text.encode("utf-8"), mode["id"])
+
+    comments = [mode for mode in modes if mode["scope"] == "comment" and mode["end"] and not mode["endsAtLine"]]
+    comments.sort(key=lambda mode: (len(mode["begin"]), mode["id"]))
+    if comments:
+        mode = comments[0]
+        body = filler(size - len(mode["begin"]), rng, line_length=72)
+        # Closing text must not appear in the body
+        body = body.replace(mode["end"], " ")
+        inputs["unterminated-comment"] = ((mode["begin"] + body).encode("utf-8"), mode["id"])
+
+    return {kind: (truncate(data, size), mode_id) for kind, (data, mode_id) in inputs.items()}
+
+
+# MARK: - Output
+
+
+def write_entry(output_dir: Path, relative: str, data: bytes) -> str:
+    path = output_dir / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", help="directory of IR json files (default: tools/ir)")
+    parser.add_argument("--langs", help="comma-separated language ids (default: every IR language)")
+    parser.add_argument(
+        "--fixtures",
+        action="append",
+        help="directory of fixtures by language, may be repeated "
+        "(default: Tests/SwiftHighlightTests/Fixtures, then highlight.js/test/markup)",
+    )
+    parser.add_argument("--output", help="output directory (default: Benchmarks/Corpus)")
+    parser.add_argument("--tiers", default=DEFAULT_TIERS, help=f"sizes of the tiled files (default: {DEFAULT_TIERS})")
+    parser.add_argument(
+        "--adversarial-tiers",
+        default=DEFAULT_ADVERSARIAL_TIERS,
+        help=f"sizes of the adversarial files, empty for none (default: {DEFAULT_ADVERSARIAL_TIERS})",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the mutations (default: 0)")
+    args = parser.parse_args()
+
+    try:
+        tiers = parse_tiers(args.tiers)
+        adversarial_tiers = parse_tiers(args.adversarial_tiers) if args.adversarial_tiers.strip() else []
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    repo_root = Path(__file__).resolve().parents[1]
+    ir_dir = Path(args.dir) if args.dir else repo_root / "tools" / "ir"
+    output_dir = Path(args.output) if args.output else repo_root / "Benchmarks" / "Corpus"
+    fixture_dirs = [Path(path) for path in args.fixtures] if args.fixtures else [
+        repo_root / "Tests" / "SwiftHighlightTests" / "Fixtures",
+        repo_root / "highlight.js" / "test" / "markup",
+    ]
+
+    paths = sorted(ir_dir.glob("*.json"))
+    if args.langs:
+        wanted = [lang.strip() for lang in args.langs.split(",") if lang.strip()]
+        available = {path.stem: path for path in paths}
+        missing = [lang for lang in wanted if lang not in available]
+        if missing:
+            parser.error(f"no IR for: {', '.join(missing)}")
+        paths = [available[lang] for lang in wanted]
+    if not paths:
+        print(f"No IR files found in {ir_dir}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    entries = []
+    without_fixtures = []
+    for path in paths:
+        lang_id = path.stem
+        ir = load_ir(path)
+        fixtures = fixture_inputs(lang_id, fixture_dirs)
+        if fixtures:
+            keywords = keyword_set(ir)
+            for label, size in tiers:
+                data = tiled(fixtures, keywords, size, random.Random(f"{args.seed}/{lang_id}/tiled/{label}"))
+                relative = f"{lang_id}/tiled-{label}.txt"
+                entries.append({
+                    "language": lang_id,
+                    "kind": "tiled",
+                    "tier": label,
+                    "bytes": len(data),
+                    "path": relative,
+                    "sha256": write_entry(output_dir, relative, data),
+                    "sources": [name for name, _ in fixtures],
+                })
+        else:
+            without_fixtures.append(lang_id)
+
+        for label, size in adversarial_tiers:
+            rng = random.Random(f"{args.seed}/{lang_id}/adversarial/{label}")
+            for kind, (data, mode_id) in sorted(adversarial(ir, size, rng).items()):
+                relative = f"{lang_id}/{kind}-{label}.txt"
+                entries.append({
+                    "language": lang_id,
+                    "kind": kind,
+                    "tier": label,
+                    "bytes": len(data),
+                    "path": relative,
+                    "sha256": write_entry(output_dir, relative, data),
+                    "irMode": mode_id,
+                })
+
+    manifest = {"version": MANIFEST_VERSION, "seed": args.seed, "entries": entries}
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+
+    elapsed = time.perf_counter() - start
+    total = sum(entry["bytes"] for entry in entries)
+    tiled_languages = len(paths) - len(without_fixtures)
+    print(
+        f"Wrote {len(entries)} files ({total / (1 << 20):.1f} MB) for {len(paths)} languages "
+        f"to {output_dir} in {elapsed:.1f}s"
+    )
+    print(f"  tiled: {tiled_languages} languages with fixtures")
+    if without_fixtures:
+        print(f"  no fixtures, adversarial inputs only: {', '.join(without_fixtures)}")
+
+
+if __name__ == "__main__":
+    main()
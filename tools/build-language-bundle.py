@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Packs compiled language snapshots into one file for `Highlight.registerBundle`.
+
+Layout (integers little-endian):
+
+    0   8 bytes  magic "HLBUNDLE"
+    8   uint32   format version
+    12  uint32   index length N
+    16  N bytes  index: UTF-8 JSON array with one entry per language
+                 (language, name, aliases, disableAutodetect, caseInsensitive,
+                 unicodeRegex, offset, length)
+    16+N         payloads: one snapshot (see compile-language-snapshot.py) per
+                 language, at `offset` bytes from the end of the index
+
+The runtime maps the file, reads only the index when the bundle is
+registered and decodes a payload the first time its language is used.
+"""
+
+import argparse
+import json
+import struct
+import sys
+import time
+from pathlib import Path
+
+from hljs_compiler import SnapshotError, compile_snapshot, encode_snapshot
+from hljs_ir import load_ir
+
+
+BUNDLE_MAGIC = b"HLBUNDLE"
+BUNDLE_FORMAT = 1
+
+
+def build_bundle(inputs: list[tuple[str, Path]]) -> tuple[bytes, list[str]]:
+    """Returns the bundle bytes and the languages that failed to compile."""
+    index = []
+    payloads = []
+    offset = 0
+    failures = []
+    for lang_id, input_path in inputs:
+        try:
+            snapshot = compile_snapshot(load_ir(input_path), lang_id)
+        except (OSError, KeyError, SnapshotError) as exc:
+            print(f"error: {lang_id}: {type(exc).__name__}: {exc}", file=sys.stderr)
+            failures.append(lang_id)
+            continue
+        payload = encode_snapshot(snapshot)
+        index.append({
+            "language": lang_id,
+            "name": snapshot["name"],
+            "aliases": snapshot["aliases"],
+            "disableAutodetect": snapshot["disableAutodetect"],
+            "caseInsensitive": snapshot["caseInsensitive"],
+            "unicodeRegex": snapshot["unicodeRegex"],
+            "offset": offset,
+            "length": len(payload),
+        })
+        payloads.append(payload)
+        offset += len(payload)
+
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header = BUNDLE_MAGIC + struct.pack("<II", BUNDLE_FORMAT, len(index_bytes))
+    return header + index_bytes + b"".join(payloads), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", help="directory of IR json files (default: tools/ir)")
+    parser.add_argument("--langs", help="comma-separated language ids to include (default: all)")
+    parser.add_argument("--output", default="Languages.hlbundle", help="bundle path (default: Languages.hlbundle)")
+    args = parser.parse_args()
+
+    repo_root = Path(__file__).resolve().parents[1]
+    ir_dir = Path(args.dir) if args.dir else repo_root / "tools" / "ir"
+    inputs = [(path.stem, path) for path in sorted(ir_dir.glob("*.json"))]
+    if args.langs:
+        wanted = [lang.strip() for lang in args.langs.split(",") if lang.strip()]
+        available = dict(inputs)
+        missing = [lang for lang in wanted if lang not in available]
+        if missing:
+            parser.error(f"no IR for: {', '.join(missing)}")
+        inputs = [(lang, available[lang]) for lang in wanted]
+    if not inputs:
+        print(f"No IR files found in {ir_dir}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    data, failures = build_bundle(inputs)
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_bytes(data)
+
+    index_length = struct.unpack_from("<I", data, 12)[0]
+    print(
+        f"Bundled {len(inputs) - len(failures)}/{len(inputs)} languages into {output_path}: "
+        f"{len(data)} bytes ({index_length} byte index) in {time.perf_counter() - start:.2f}s"
+    )
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Compiles IR languages into snapshots that `Highlight.registerSnapshot` loads.
+
+A snapshot is what `ModeCompiler` would build at runtime: the flattened
+compiled-mode table, each mode's combined matcher pattern with its rule
+table, and the keyword dictionaries. Loading one skips variant expansion,
+mode merging and matcher construction on the first highlight.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from hljs_compiler import SnapshotError, compile_snapshot, encode_snapshot
+from hljs_ir import load_ir
+
+
+def write_snapshot(input_path: Path, lang_id: str, output_path: Path) -> dict:
+    snapshot = compile_snapshot(load_ir(input_path), lang_id)
+    data = encode_snapshot(snapshot)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_bytes(data)
+    return {"modes": len(snapshot["modes"]), "keywordTables": len(snapshot["keywords"]), "bytes": len(data)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lang", help="language id, e.g. swift")
+    parser.add_argument("--input", help="path to IR json (default: tools/ir/<lang>.json)")
+    parser.add_argument("--output", help="path of the snapshot to write (default: <lang>.json in --output-dir)")
+    parser.add_argument("--all", action="store_true", help="compile every language in tools/ir")
+    parser.add_argument("--dir", help="compile every language in this directory of IR json files")
+    parser.add_argument("--output-dir", default=".", help="directory for snapshots (default: current directory)")
+    args = parser.parse_args()
+
+    repo_root = Path(__file__).resolve().parents[1]
+    output_dir = Path(args.output_dir)
+
+    if args.all or args.dir:
+        if args.lang or args.input or args.output:
+            parser.error("--all/--dir cannot be combined with --lang, --input or --output")
+        ir_dir = Path(args.dir) if args.dir else repo_root / "tools" / "ir"
+        jobs = [(path.stem, path, output_dir / f"{path.stem}.json") for path in sorted(ir_dir.glob("*.json"))]
+        if not jobs:
+            print(f"No IR files found in {ir_dir}")
+            sys.exit(1)
+    elif args.lang:
+        input_path = Path(args.input) if args.input else repo_root / "tools" / "ir" / f"{args.lang}.json"
+        output_path = Path(args.output) if args.output else output_dir / f"{args.lang}.json"
+        jobs = [(args.lang, input_path, output_path)]
+    else:
+        parser.error("--lang is required unless --all or --dir is given")
+
+    failures = 0
+    total_bytes = 0
+    start = time.perf_counter()
+    for lang_id, input_path, output_path in jobs:
+        try:
+            stats = write_snapshot(input_path, lang_id, output_path)
+        except (OSError, KeyError, SnapshotError) as exc:
+            print(f"error: {lang_id}: {type(exc).__name__}: {exc}", file=sys.stderr)
+            failures += 1
+            continue
+        total_bytes += stats["bytes"]
+        if len(jobs) == 1:
+            print(
+                f"{output_path}: {stats['modes']} compiled modes, "
+                f"{stats['keywordTables']} keyword tables, {stats['bytes']} bytes"
+            )
+
+    if len(jobs) > 1:
+        print(
+            f"Compiled {len(jobs) - failures}/{len(jobs)} snapshots into {output_dir} "
+            f"({total_bytes} bytes) in {time.perf_counter() - start:.2f}s"
+        )
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
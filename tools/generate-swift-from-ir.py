@@ -1,10 +1,21 @@
 #!/usr/bin/env python3
 import argparse
+import copy
+import hashlib
 import json
 import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import hljs_dfa
+from hljs_dfa import LexerTableBuilder
+from hljs_ir import keyword_lists, load_ir, normalize_raw_keywords, pattern_source
+from hljs_prune import ModePruner, summarize_reports
+from hljs_regex_optimize import RegexOptimizer
+
 
 SPECIAL_CASES = {
     "json": "JSON"
@@ -15,7 +26,7 @@ TEMPLATE_OVERRIDES = {
     "swift": "Swift.swift",
 }
 
-MAX_INLINE_RECURSION = 2
+MANIFEST_VERSION = 1
 
 
 def swift_string(value: str) -> str:
@@ -29,64 +40,18 @@ def swift_string(value: str) -> str:
     return f"\"{escaped}\""
 
 
-def normalize_raw_keywords(raw: str) -> list[str]:
-    tokens = []
-    for token in raw.split():
-        token = re.sub(r"\|\d+$", "", token)
-        if token:
-            tokens.append(token)
-    return tokens
-
-
-def sanitize_regex_source(source: str) -> str:
-    out = []
-    in_class = False
-    i = 0
-    while i < len(source):
-        ch = source[i]
-        if ch == "\\":
-            out.append(ch)
-            if i + 1 < len(source):
-                out.append(source[i + 1])
-                i += 2
-                continue
-        if ch == "[":
-            if in_class:
-                out.append("\\[")
-            else:
-                in_class = True
-                out.append(ch)
-            i += 1
-            continue
-        if ch == "]" and in_class:
-            in_class = False
-        out.append(ch)
-        i += 1
-    return "".join(out)
-
-
-def pattern_expr(pattern: dict | None) -> str | None:
-    if not pattern:
+def pattern_expr(pattern: dict | None, rewrite=None) -> str | None:
+    source = pattern_source(pattern, rewrite)
+    if source is None:
         return None
-    source = sanitize_regex_source(pattern["source"])
-    flags = pattern.get("flags", "")
-    if "i" in flags:
-        source = "(?i)" + source
     return f"HLJS.re({swift_string(source)})"
 
 
-def keywords_expr(keywords: dict | None) -> str | None:
+def keywords_expr(keywords: dict | None, rewrite=None) -> str | None:
     if not keywords:
         return None
 
-    keyword = list(keywords.get("keyword") or [])
-    literal = list(keywords.get("literal") or [])
-    built_in = list(keywords.get("built_in") or [])
-    type_words = list(keywords.get("type") or [])
-    custom = keywords.get("custom") or {}
-    raw = keywords.get("raw")
-    if raw:
-        keyword.extend(normalize_raw_keywords(raw))
+    lists = keyword_lists(keywords)
 
     def array_expr(items: list[str]) -> str | None:
         if not items:
@@ -95,27 +60,21 @@ def keywords_expr(keywords: dict | None) -> str | None:
         return f"[{joined}]"
 
     parts = []
-    if keyword:
-        parts.append(f"keyword: {array_expr(keyword)}")
-    if literal:
-        parts.append(f"literal: {array_expr(literal)}")
-    if built_in:
-        parts.append(f"builtIn: {array_expr(built_in)}")
-    if type_words:
-        parts.append(f"type: {array_expr(type_words)}")
-
-    if isinstance(custom, dict):
-        items = []
-        for key, words in sorted(custom.items(), key=lambda kv: kv[0]):
-            if not words:
-                continue
-            item = f"{swift_string(key)}: {array_expr(list(words))}"
-            items.append(item)
-        if items:
-            parts.append(f"custom: [{', '.join(items)}]")
+    if lists["keyword"]:
+        parts.append(f"keyword: {array_expr(lists['keyword'])}")
+    if lists["literal"]:
+        parts.append(f"literal: {array_expr(lists['literal'])}")
+    if lists["builtIn"]:
+        parts.append(f"builtIn: {array_expr(lists['builtIn'])}")
+    if lists["type"]:
+        parts.append(f"type: {array_expr(lists['type'])}")
+
+    if lists["custom"]:
+        items = [f"{swift_string(key)}: {array_expr(words)}" for key, words in lists["custom"]]
+        parts.append(f"custom: [{', '.join(items)}]")
 
     pattern = keywords.get("pattern")
-    pattern_value = pattern_expr(pattern)
+    pattern_value = pattern_expr(pattern, rewrite)
     if pattern_value:
         parts.insert(0, f"pattern: {pattern_value}")
 
@@ -157,7 +116,7 @@ def dict_expr(value) -> str | None:
     return f"[{items}]"
 
 
-def mode_expr(mode, mode_refs, *, shallow=False) -> str:
+def mode_expr(mode, mode_refs, *, shallow=False, rewrite=None) -> str:
     values = {}
 
     scope = mode.get("scope")
@@ -167,10 +126,10 @@ def mode_expr(mode, mode_refs, *, shallow=False) -> str:
     if isinstance(class_name, str) and class_name:
         values["className"] = swift_string(class_name)
 
-    values["begin"] = pattern_expr(mode.get("begin"))
-    values["end"] = pattern_expr(mode.get("end"))
-    values["match"] = pattern_expr(mode.get("match"))
-    keywords = keywords_expr(mode.get("keywords"))
+    values["begin"] = pattern_expr(mode.get("begin"), rewrite)
+    values["end"] = pattern_expr(mode.get("end"), rewrite)
+    values["match"] = pattern_expr(mode.get("match"), rewrite)
+    keywords = keywords_expr(mode.get("keywords"), rewrite)
     begin_keywords = mode.get("beginKeywords")
     if not keywords and begin_keywords and (scope == "literal" or class_name == "literal"):
         tokens = normalize_raw_keywords(begin_keywords)
@@ -178,7 +137,7 @@ def mode_expr(mode, mode_refs, *, shallow=False) -> str:
             joined = ", ".join(swift_string(token) for token in tokens)
             keywords = f"HLJS.kw(keyword: [{joined}])"
     values["keywords"] = keywords
-    values["illegal"] = pattern_expr(mode.get("illegal"))
+    values["illegal"] = pattern_expr(mode.get("illegal"), rewrite)
 
     if not shallow:
         values["contains"] = mode_refs.get("contains")
@@ -376,14 +335,270 @@ def toposort_modes(modes, edges, break_edges):
     return [id_to_mode[mid] for mid in ordered if mid in id_to_mode]
 
 
-def generate_language(ir, lang_id):
+SHARED_MODES_FILE = "SharedModes.swift"
+
+
+def mode_structural_keys(mode_list, edges):
+    """Structural identity of every acyclic mode subtree, ignoring IR ids.
+
+    Two modes share a key when all their fields and all their (transitively)
+    referenced children are identical. Modes on a cycle get no key.
+    """
+    mode_by_id = {mode["id"]: mode for mode in mode_list}
+    cyclic = set()
+    for scc in tarjan_scc([mode["id"] for mode in mode_list], edges):
+        if len(scc) > 1:
+            cyclic.update(scc)
+
+    keys = {}
+
+    def key_for(mode_id):
+        if mode_id in keys:
+            return keys[mode_id]
+        if mode_id in cyclic or mode_id not in mode_by_id:
+            keys[mode_id] = None
+            return None
+        keys[mode_id] = None
+        mode = mode_by_id[mode_id]
+
+        def ref_key(ref):
+            if ref == "self":
+                return "self"
+            if isinstance(ref, dict) and ref.get("ref"):
+                if ref["ref"] == mode_id:
+                    return "self"
+                return key_for(ref["ref"])
+            return None
+
+        fields = {k: v for k, v in mode.items() if k not in ("id", "contains", "variants", "starts")}
+        children = {}
+        for field in ("contains", "variants"):
+            refs = [ref_key(ref) for ref in (mode.get(field) or [])]
+            if any(ref is None for ref in refs):
+                return None
+            children[field] = refs
+        starts = mode.get("starts")
+        if starts:
+            children["starts"] = ref_key(starts)
+            if children["starts"] is None:
+                return None
+
+        payload = json.dumps({"fields": fields, "children": children}, sort_keys=True)
+        keys[mode_id] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return keys[mode_id]
+
+    for mode in mode_list:
+        key_for(mode["id"])
+    return keys
+
+
+def is_shareable(mode) -> bool:
+    # endsWithParent modes compile their terminator from the parent they are
+    # first reached through, so a shared instance could pick the wrong one.
+    return not mode.get("endsWithParent")
+
+
+def shared_mode_name(mode, key: str, taken: set) -> str:
+    label = mode.get("scope") or mode.get("className")
+    if not isinstance(label, str):
+        label = "mode"
+    label = re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_").lower() or "mode"
+    for length in range(8, len(key) + 1):
+        name = f"shared_{label}_{key[:length]}"
+        if name not in taken:
+            taken.add(name)
+            return name
+    raise ValueError(f"cannot name shared mode {key}")
+
+
+def collect_shared_modes(irs: dict, min_languages: int):
+    """Hash-conses structurally identical modes across languages.
+
+    Returns (definitions, per_language) where `definitions` maps a structural
+    key to (name, lang_id, mode_id) of a representative and `per_language`
+    maps each language to {mode_id: swift expression}.
+    """
+    keys_by_lang = {}
+    languages_by_key = {}
+    representative = {}
+    for lang_id, ir in sorted(irs.items()):
+        mode_list = ir.get("modes", [])
+        mode_by_id = {mode["id"]: mode for mode in mode_list}
+        keys = mode_structural_keys(mode_list, build_edges(mode_list))
+        keys_by_lang[lang_id] = keys
+        for mode_id, key in keys.items():
+            if key is None or not is_shareable(mode_by_id[mode_id]):
+                continue
+            languages_by_key.setdefault(key, set()).add(lang_id)
+            representative.setdefault(key, (lang_id, mode_id))
+
+    definitions = {}
+    taken = set()
+    for key in sorted(languages_by_key, key=lambda k: representative[k]):
+        if len(languages_by_key[key]) < min_languages:
+            continue
+        lang_id, mode_id = representative[key]
+        mode = next(m for m in irs[lang_id]["modes"] if m["id"] == mode_id)
+        definitions[key] = (shared_mode_name(mode, key, taken), lang_id, mode_id)
+
+    per_language = {}
+    for lang_id, keys in keys_by_lang.items():
+        mapping = {}
+        for mode_id, key in keys.items():
+            if key in definitions:
+                mapping[mode_id] = f"Highlight.{definitions[key][0]}"
+        per_language[lang_id] = mapping
+    return definitions, per_language
+
+
+def generate_shared_modes(irs: dict, definitions: dict) -> tuple[str, dict[str, int]]:
+    """SharedModes.swift, and the UTF-8 size of each definition's expression by name."""
+    key_to_name = {key: name for key, (name, _, _) in definitions.items()}
+
+    def render(lang_id, mode_id, keys, mode_by_id, top_level):
+        key = keys.get(mode_id)
+        if not top_level and key in key_to_name:
+            return f"Highlight.{key_to_name[key]}"
+        mode = mode_by_id[mode_id]
+
+        contains = []
+        for ref in (mode.get("contains") or []):
+            if ref == "self" or (isinstance(ref, dict) and ref.get("ref") == mode_id):
+                contains.append(".self")
+            elif isinstance(ref, dict):
+                contains.append(f".mode({render(lang_id, ref['ref'], keys, mode_by_id, False)})")
+        variants = [
+            render(lang_id, ref["ref"], keys, mode_by_id, False)
+            for ref in (mode.get("variants") or [])
+            if isinstance(ref, dict)
+        ]
+
+        mode_refs = {}
+        if contains:
+            mode_refs["contains"] = "[" + ", ".join(contains) + "]"
+        if variants:
+            mode_refs["variants"] = f"HLJS.variants([{', '.join(variants)}])"
+        starts = mode.get("starts")
+        if isinstance(starts, dict) and starts.get("ref"):
+            mode_refs["starts"] = f"ModeBox({render(lang_id, starts['ref'], keys, mode_by_id, False)})"
+        return mode_expr(mode, mode_refs)
+
+    keys_cache = {}
+    sizes = {}
+    lines = [
+        "import Foundation",
+        "",
+        "// Generated by tools/generate-swift-from-ir.py --share-modes. Do not edit.",
+        "// Modes that recur verbatim across several languages, defined once so every",
+        "// language references the same `Mode` instance.",
+        "extension Highlight {",
+    ]
+    for key, (name, lang_id, mode_id) in sorted(definitions.items(), key=lambda item: item[1][0]):
+        if lang_id not in keys_cache:
+            mode_list = irs[lang_id].get("modes", [])
+            keys_cache[lang_id] = (
+                mode_structural_keys(mode_list, build_edges(mode_list)),
+                {mode["id"]: mode for mode in mode_list},
+            )
+        keys, mode_by_id = keys_cache[lang_id]
+        expr = render(lang_id, mode_id, keys, mode_by_id, True)
+        sizes[name] = len(expr.encode("utf-8"))
+        lines.append(f"    static let {name} = {expr}")
+        lines.append("")
+    if lines[-1] == "":
+        lines.pop()
+    lines.append("}")
+    lines.append("")
+    return "\n".join(lines), sizes
+
+
+def shared_savings(ir, shared: dict, sizes: dict[str, int]) -> int:
+    """About how many bytes a language saves by referencing shared modes: the
+    `let` each of them replaces, less the longer names its references use."""
+    edges = build_edges(ir.get("modes", []))
+    hidden = modes_hidden_by_shared(ir["language"], edges, shared)
+    saved = sum(
+        len(f"    let mode_{mode_id} = \n\n") + sizes[name.removeprefix("Highlight.")]
+        for mode_id, name in shared.items()
+    )
+    targets = [target for mode_id, items in edges.items() if mode_id not in hidden for _, _, target in items]
+    targets += [ref["ref"] for ref in ir["language"].get("contains") or [] if isinstance(ref, dict)]
+    for target in targets:
+        if target in shared:
+            saved -= len(shared[target]) - len(f"mode_{target}")
+    return saved
+
+
+def modes_hidden_by_shared(language, edges, shared: dict) -> set:
+    """Modes only reachable through shared definitions; they need no local `let`."""
+    def reachable(roots, stop):
+        seen = set()
+        stack = list(roots)
+        while stack:
+            mid = stack.pop()
+            if mid in seen or mid in stop:
+                continue
+            seen.add(mid)
+            stack.extend(target for _, _, target in edges.get(mid, []))
+        return seen
+
+    roots = [ref["ref"] for ref in (language.get("contains") or []) if isinstance(ref, dict)]
+    visible = reachable(roots, set(shared))
+    below_shared = set()
+    for mid in shared:
+        below_shared |= reachable([target for _, _, target in edges.get(mid, [])], set(shared))
+    return set(shared) | (below_shared - visible)
+
+
+def regex_rewriter(language, optimizer: RegexOptimizer | None):
+    """Per-language hook for pattern_expr; ModeCompiler applies the language's
+    caseInsensitive flag to every pattern, so the optimizer must assume it."""
+    if optimizer is None:
+        return None
+    case_insensitive = bool(language.get("caseInsensitive"))
+    return lambda source, flags: optimizer.rewrite(source, case_insensitive or "i" in flags)
+
+
+def emitted_ir(ir, rewrite, unchanged: set):
+    """A copy of `ir` with the patterns spelled as the generated Swift spells
+    them; modes in `unchanged` are emitted by SharedModes.swift, unrewritten."""
+    if rewrite is None:
+        return ir
+    ir = copy.deepcopy(ir)
+
+    def apply(pattern):
+        if pattern:
+            pattern["source"] = rewrite(pattern["source"], pattern.get("flags", ""))
+
+    for mode in ir.get("modes", []):
+        if mode["id"] not in unchanged:
+            for key in ("begin", "end", "match", "illegal"):
+                apply(mode.get(key))
+    apply(ir["language"].get("illegal"))
+    return ir
+
+
+def lexer_tables_expr(tables: dict[str, str]) -> str:
+    entries = "".join(
+        f"            {swift_string(pattern)}: {swift_string(data)},\n" for pattern, data in tables.items()
+    )
+    return f"LexerTables([\n{entries}        ])"
+
+
+def generate_language(ir, lang_id, shared=None, optimizer=None, lexer_builder=None):
     language = ir["language"]
+    rewrite = regex_rewriter(language, optimizer)
     mode_list = ir.get("modes", [])
     mode_by_id = {mode["id"]: mode for mode in mode_list}
     edges = build_edges(mode_list)
     mode_order = [mode["id"] for mode in mode_list]
-    break_edges, scc_map = find_break_edges(edges, mode_order, mode_by_id)
+    break_edges, _ = find_break_edges(edges, mode_order, mode_by_id)
     modes = toposort_modes(mode_list, edges, break_edges)
+    shared = shared or {}
+    hidden = set()
+    if shared:
+        hidden = modes_hidden_by_shared(language, edges, shared)
+        modes = [mode for mode in modes if mode["id"] not in hidden]
 
     lines = []
     lines.append("import Foundation")
@@ -393,53 +608,30 @@ def generate_language(ir, lang_id):
     mode_names = {}
     for mode in modes:
         mode_names[mode["id"]] = f"mode_{mode['id']}"
+    mode_names.update(shared)
 
-    def pruned_expr(mode_id: str, blocked_set: set, stack=None, counts=None) -> str:
-        if stack is None:
-            stack = []
-        if counts is None:
-            counts = {}
-        depth = counts.get(mode_id, 0)
-        if depth >= MAX_INLINE_RECURSION:
-            target = mode_by_id[mode_id]
-            return mode_expr(target, {}, shallow=True)
-
-        counts[mode_id] = depth + 1
-        stack.append(mode_id)
-        target = mode_by_id[mode_id]
-
-        contains = []
-        for ref in (target.get("contains") or []):
-            if ref == "self":
-                contains.append(".self")
-            elif isinstance(ref, dict):
-                ref_id = ref["ref"]
-                if ref_id == mode_id:
-                    contains.append(".self")
-                else:
-                    contains.append(f".mode({pruned_expr(ref_id, blocked_set, stack, counts)})")
-
-        variants = []
-        for ref in (target.get("variants") or []):
-            if isinstance(ref, dict):
-                ref_id = ref["ref"]
-                variants.append(pruned_expr(ref_id, blocked_set, stack, counts))
-
-        mode_refs = {}
-        if contains:
-            mode_refs["contains"] = "[" + ", ".join(contains) + "]"
-        if variants:
-            mode_refs["variants"] = f"HLJS.variants([{', '.join(variants)}])"
+    # Back edges of reference cycles (and self-`starts`) point at modes that are
+    # defined later. They go through a forward-declared `ModeBox` that is bound
+    # once the target exists, so the cycle is kept exactly instead of unrolled.
+    box_targets = set()
+    for mode in modes:
+        mode_id = mode["id"]
+        for kind, idx, target in edges.get(mode_id, []):
+            if (mode_id, kind, idx) in break_edges and target not in shared:
+                box_targets.add(target)
+        starts = mode.get("starts")
+        if isinstance(starts, dict) and starts.get("ref") == mode_id:
+            box_targets.add(mode_id)
+    box_names = {mid: f"box_{mid}" for mid in box_targets}
 
-        starts = target.get("starts")
-        if isinstance(starts, dict) and starts.get("ref"):
-            ref_id = starts["ref"]
-            mode_refs["starts"] = f"ModeBox({pruned_expr(ref_id, blocked_set, stack, counts)})"
+    for mode in modes:
+        if mode["id"] in box_targets:
+            lines.append(f"    let {box_names[mode['id']]} = ModeBox()")
+    if box_targets:
+        lines.append("")
 
-        expr = mode_expr(target, mode_refs, shallow=False)
-        stack.pop()
-        counts[mode_id] = depth
-        return expr
+    def is_forward(mode_id, kind, idx, ref_id):
+        return ref_id in box_names and ((mode_id, kind, idx) in break_edges or ref_id == mode_id)
 
     for mode in modes:
         mode_id = mode["id"]
@@ -451,38 +643,42 @@ def generate_language(ir, lang_id):
                 ref_id = ref["ref"]
                 if ref_id == mode_id:
                     contains.append(".self")
-                elif (mode_id, "contains", idx) in break_edges:
-                    blocked = scc_map.get(mode_id, set())
-                    contains.append(f".mode({pruned_expr(ref_id, blocked)})")
+                elif is_forward(mode_id, "contains", idx, ref_id):
+                    contains.append(f".mode({box_names[ref_id]})")
                 else:
                     contains.append(f".mode({mode_names[ref_id]})")
         variants = []
+        boxed_variants = False
         for idx, ref in enumerate(mode.get("variants") or []):
             if isinstance(ref, dict):
                 ref_id = ref["ref"]
-                if (mode_id, "variants", idx) in break_edges:
-                    blocked = scc_map.get(mode_id, set())
-                    variants.append(pruned_expr(ref_id, blocked))
+                if is_forward(mode_id, "variants", idx, ref_id):
+                    variants.append((box_names[ref_id], True))
+                    boxed_variants = True
                 else:
-                    variants.append(mode_names[ref_id])
+                    variants.append((mode_names[ref_id], False))
 
         mode_refs = {}
         if contains:
             mode_refs["contains"] = "[" + ", ".join(contains) + "]"
-        if variants:
-            mode_refs["variants"] = f"HLJS.variants([{', '.join(variants)}])"
+        if boxed_variants:
+            items = [name if is_box else f"ModeBox({name})" for name, is_box in variants]
+            mode_refs["variants"] = f"[{', '.join(items)}]"
+        elif variants:
+            mode_refs["variants"] = f"HLJS.variants([{', '.join(name for name, _ in variants)}])"
 
         starts = mode.get("starts")
         if isinstance(starts, dict) and starts.get("ref"):
             ref_id = starts["ref"]
-            if ref_id == mode_id or (mode_id, "starts", 0) in break_edges:
-                blocked = scc_map.get(mode_id, set())
-                mode_refs["starts"] = f"ModeBox({pruned_expr(ref_id, blocked)})"
+            if is_forward(mode_id, "starts", 0, ref_id):
+                mode_refs["starts"] = box_names[ref_id]
             else:
                 mode_refs["starts"] = f"ModeBox({mode_names[ref_id]})"
 
-        expr = mode_expr(mode, mode_refs)
-        lines.append(f"    let {mode_names[mode['id']]} = {expr}")
+        expr = mode_expr(mode, mode_refs, rewrite=rewrite)
+        lines.append(f"    let {mode_names[mode_id]} = {expr}")
+        if mode_id in box_names:
+            lines.append(f"    {box_names[mode_id]}.bind({mode_names[mode_id]})")
         lines.append("")
 
     lang_contains = []
@@ -507,11 +703,11 @@ def generate_language(ir, lang_id):
     if language.get("unicodeRegex"):
         lang_args.append("unicodeRegex: true")
 
-    lang_keywords = keywords_expr(language.get("keywords"))
+    lang_keywords = keywords_expr(language.get("keywords"), rewrite)
     if lang_keywords:
         lang_args.append(f"keywords: {lang_keywords}")
 
-    lang_illegal = pattern_expr(language.get("illegal"))
+    lang_illegal = pattern_expr(language.get("illegal"), rewrite)
     if lang_illegal:
         lang_args.append(f"illegal: {lang_illegal}")
 
@@ -522,6 +718,11 @@ def generate_language(ir, lang_id):
     if class_name_aliases:
         lang_args.append(f"classNameAliases: {class_name_aliases}")
 
+    if lexer_builder:
+        tables = lexer_builder.build(emitted_ir(ir, rewrite, set(shared) | hidden), lang_id)
+        if tables:
+            lang_args.append(f"lexerTables: {lexer_tables_expr(tables)}")
+
     lines.append("    return Language(")
     for idx, arg in enumerate(lang_args):
         suffix = "," if idx < len(lang_args) - 1 else ""
@@ -540,29 +741,587 @@ def generate_language(ir, lang_id):
     return "\n".join(lines)
 
 
+def output_path_for(lang_id: str, output_dir: Path) -> Path:
+    file_base = SPECIAL_CASES.get(lang_id, lang_id.capitalize())
+    return output_dir / f"{file_base}.swift"
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: Path) -> str | None:
+    try:
+        return sha256_bytes(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+GENERATOR_MODULES = (
+    "hljs_compiler.py",
+    "hljs_dfa.py",
+    "hljs_ir.py",
+    "hljs_prune.py",
+    "hljs_regex.py",
+    "hljs_regex_optimize.py",
+)
+
+
+def generator_fingerprint() -> str:
+    tools_dir = Path(__file__).resolve().parent
+    data = Path(__file__).read_bytes()
+    for name in GENERATOR_MODULES:
+        data += (tools_dir / name).read_bytes()
+    return sha256_bytes(data)
+
+
+def template_path_for(lang_id: str, repo_root: Path) -> Path | None:
+    override = TEMPLATE_OVERRIDES.get(lang_id)
+    if not override:
+        return None
+    return repo_root / "tools" / "templates" / override
+
+
+def input_fingerprint(
+    lang_id: str,
+    input_path: Path,
+    output_path: Path,
+    repo_root: Path,
+    generator: str,
+    shared: dict | None = None,
+    optimize_regex: bool = False,
+    prune_modes: bool = False,
+    lexer_tables: bool = False,
+) -> dict:
+    """Hashes of everything that determines the generated bytes for one language."""
+    template_path = template_path_for(lang_id, repo_root)
+    if template_path:
+        return {
+            "output": str(output_path),
+            "generator": generator,
+            "template": sha256_file(template_path),
+        }
+    fingerprint = {
+        "output": str(output_path),
+        "generator": generator,
+        "ir": sha256_file(input_path),
+    }
+    if shared:
+        fingerprint["shared"] = sha256_bytes(json.dumps(shared, sort_keys=True).encode("utf-8"))
+    if optimize_regex:
+        fingerprint["optimizeRegex"] = True
+    if prune_modes:
+        fingerprint["pruneModes"] = True
+    if lexer_tables:
+        fingerprint["lexerTables"] = True
+    return fingerprint
+
+
+def load_manifest(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("languages") or {}
+
+
+def save_manifest(path: Path, entries: dict) -> None:
+    payload = {"version": MANIFEST_VERSION, "languages": dict(sorted(entries.items()))}
+    text = json.dumps(payload, indent=2, sort_keys=True) + "\n"
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+# Fingerprint entries that only exist when a generator option is enabled.
+OPTION_REASONS = {
+    "shared": "shared modes changed",
+    "optimizeRegex": "regex optimization toggled",
+    "pruneModes": "mode pruning toggled",
+    "lexerTables": "lexer tables toggled",
+}
+
+
+def rebuild_reasons(entry: dict | None, fingerprint: dict, output_path: Path, force: bool) -> list[str]:
+    """Returns why a language must be regenerated; an empty list means it is up to date."""
+    if force:
+        return ["forced"]
+    if not entry:
+        return ["no manifest entry"]
+
+    reasons = []
+    if entry.get("output") != fingerprint["output"]:
+        reasons.append("output path changed")
+    if entry.get("generator") != fingerprint["generator"]:
+        reasons.append("generator changed")
+    if "template" in fingerprint and entry.get("template") != fingerprint["template"]:
+        reasons.append("template changed")
+    if "ir" in fingerprint and entry.get("ir") != fingerprint["ir"]:
+        reasons.append("IR changed")
+    for key, reason in OPTION_REASONS.items():
+        if entry.get(key) != fingerprint.get(key):
+            reasons.append(reason)
+
+    output_hash = sha256_file(output_path)
+    if output_hash is None:
+        reasons.append("output missing")
+    elif output_hash != entry.get("outputHash"):
+        reasons.append("output modified")
+    return reasons
+
+
+def write_if_changed(path: Path, text: str) -> bool:
+    """Writes `text` only when the bytes differ so SwiftPM keeps the file's mtime."""
+    data = text.encode("utf-8")
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    path.write_bytes(data)
+    return True
+
+
+def render_file(
+    lang_id: str,
+    input_path: Path,
+    repo_root: Path,
+    shared: dict | None = None,
+    optimizer: RegexOptimizer | None = None,
+    pruner: ModePruner | None = None,
+    lexer_builder: LexerTableBuilder | None = None,
+) -> str:
+    template_path = template_path_for(lang_id, repo_root)
+    if template_path:
+        return template_path.read_text(encoding="utf-8")
+
+    ir = load_ir(input_path)
+    if pruner:
+        ir = pruner.prune(ir, lang_id)
+    return generate_language(ir, lang_id, shared, optimizer, lexer_builder)
+
+
+def generate_file(
+    lang_id: str,
+    input_path: Path,
+    output_path: Path,
+    repo_root: Path,
+    shared: dict | None = None,
+    optimizer: RegexOptimizer | None = None,
+    pruner: ModePruner | None = None,
+    lexer_builder: LexerTableBuilder | None = None,
+) -> tuple[bool, str, int, int]:
+    """Generates one language, returning whether the output was written, its hash, size
+    and number of `Mode(...)` literals."""
+    swift = render_file(lang_id, input_path, repo_root, shared, optimizer, pruner, lexer_builder)
+    written = write_if_changed(output_path, swift)
+    data = swift.encode("utf-8")
+    return written, sha256_bytes(data), len(data), count_mode_literals(swift)
+
+
+MODE_LITERAL_RE = re.compile(r"(?<![\w.])Mode\(")
+
+
+def count_mode_literals(swift: str) -> int:
+    return len(MODE_LITERAL_RE.findall(swift))
+
+
+def expansion_stats(input_path: Path, mode_literals: int, size: int) -> dict:
+    """How much bigger the generated graph is than the IR graph it came from."""
+    ir_modes = len(load_ir(input_path).get("modes", []))
+    return {
+        "irModes": ir_modes,
+        "modeLiterals": mode_literals,
+        "bytes": size,
+        "factor": mode_literals / ir_modes if ir_modes else 1.0,
+    }
+
+
+def merge_regex_stats(stats: list[dict]) -> dict:
+    merged = {}
+    for item in stats:
+        for key, value in item.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def format_prune_stats(stats: dict) -> str:
+    return (
+        f"Mode pruning: {stats['deadModes']} dead modes and {stats['shadowedRules']} shadowed contains "
+        f"entries ({stats['alternatives']} matcher alternatives) removed from {stats['languages']} languages"
+    )
+
+
+def format_prune_report(lang_id: str, report: dict) -> list[str]:
+    lines = []
+    if report["deadModes"]:
+        lines.append(f"{lang_id}: dead modes {', '.join(report['deadModes'])}")
+    for rule in report["shadowedRules"]:
+        owner = rule["mode"] or "language"
+        lines.append(
+            f"{lang_id}: {owner}.contains[{rule['index']}] -> {rule['ref']} "
+            f"shadowed by {rule['shadowedBy']} ({rule['reason']})"
+        )
+    return lines
+
+
+def write_prune_report(path: Path, reports: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(dict(sorted(reports.items())), indent=2) + "\n", encoding="utf-8")
+
+
+def format_lexer_stats(stats: dict) -> str:
+    return (
+        f"Lexer tables: {stats['tables']}/{stats['matchers']} matchers in {stats['languages']} languages "
+        f"run without NSRegularExpression"
+    )
+
+
+def format_lexer_report(lang_id: str, report: dict) -> str:
+    skipped = ", ".join(f"{reason} {count}" for reason, count in sorted(report["skipped"].items()))
+    return f"{lang_id}: {report['tables']}/{report['matchers']} matchers" + (f" (kept: {skipped})" if skipped else "")
+
+
+def format_regex_stats(stats: dict) -> str:
+    return (
+        f"Regex optimizer: {stats.get('rewritten', 0)} rewritten, "
+        f"{stats.get('rejected', 0)} rejected by self-check, "
+        f"{stats.get('unverified', 0)} unverifiable, "
+        f"{-stats.get('savedChars', 0):+d} chars of regex source"
+    )
+
+
+def _generate_job(job):
+    lang_id, input_path, output_path, repo_root, shared, optimize_regex, prune_modes, lexer_tables = job
+    start = time.perf_counter()
+    result = {
+        "lang": lang_id, "error": None, "expansion": None, "regex": None, "pruned": None, "lexer": None
+    }
+    optimizer = RegexOptimizer() if optimize_regex else None
+    pruner = ModePruner() if prune_modes else None
+    lexer_builder = LexerTableBuilder() if lexer_tables else None
+    try:
+        written, output_hash, size, mode_literals = generate_file(
+            lang_id, input_path, output_path, repo_root, shared, optimizer, pruner, lexer_builder
+        )
+        result.update(
+            written=written,
+            hash=output_hash,
+            expansion=expansion_stats(input_path, mode_literals, size),
+            regex=optimizer.stats() if optimizer else None,
+            pruned=pruner.reports.get(lang_id) if pruner else None,
+            lexer=lexer_builder.reports.get(lang_id) if lexer_builder else None,
+        )
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def share_modes(
+    ir_dir: Path,
+    repo_root: Path,
+    shared_path: Path,
+    min_languages: int,
+    prune_modes: bool = False,
+) -> tuple[dict, dict]:
+    """Writes the shared mode definitions. Returns each language's mode_id -> name
+    map, and the bytes each language saves by not defining those modes itself."""
+    pruner = ModePruner() if prune_modes else None
+    irs = {}
+    for path in sorted(ir_dir.glob("*.json")):
+        if template_path_for(path.stem, repo_root):
+            continue
+        irs[path.stem] = pruner.prune(load_ir(path), path.stem) if pruner else load_ir(path)
+
+    definitions, per_language = collect_shared_modes(irs, min_languages)
+    shared_path.parent.mkdir(parents=True, exist_ok=True)
+    text, sizes = generate_shared_modes(irs, definitions)
+    write_if_changed(shared_path, text)
+
+    saved = {
+        lang_id: shared_savings(irs[lang_id], mapping, sizes) if mapping else 0
+        for lang_id, mapping in per_language.items()
+    }
+
+    users = sum(1 for mapping in per_language.values() if mapping)
+    replaced = sum(len(mapping) for mapping in per_language.values())
+    print(
+        f"Shared {len(definitions)} modes used by {users} languages "
+        f"({replaced} local definitions replaced) -> {shared_path} ({len(text.encode('utf-8'))} bytes)"
+    )
+    return per_language, saved
+
+
+def run_batch(
+    ir_dir: Path,
+    output_dir: Path,
+    repo_root: Path,
+    jobs: int,
+    manifest_path: Path,
+    force: bool,
+    explain: bool,
+    shared_path: Path | None = None,
+    share_min_languages: int = 2,
+    optimize_regex: bool = False,
+    prune_modes: bool = False,
+    prune_report_path: Path | None = None,
+    lexer_tables: bool = False,
+) -> int:
+    inputs = sorted(ir_dir.glob("*.json"))
+    if not inputs:
+        print(f"No IR files found in {ir_dir}")
+        return 1
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    shared_by_lang = {}
+    saved_by_lang = {}
+    if shared_path:
+        shared_by_lang, saved_by_lang = share_modes(ir_dir, repo_root, shared_path, share_min_languages, prune_modes)
+
+    manifest = load_manifest(manifest_path)
+    generator = generator_fingerprint()
+    fingerprints = {}
+    work = []
+    skipped = []
+    for path in inputs:
+        lang_id = path.stem
+        output_path = output_path_for(lang_id, output_dir)
+        shared = shared_by_lang.get(lang_id) or None
+        fingerprint = input_fingerprint(
+            lang_id, path, output_path, repo_root, generator, shared, optimize_regex, prune_modes, lexer_tables
+        )
+        reasons = rebuild_reasons(manifest.get(lang_id), fingerprint, output_path, force)
+        if not reasons:
+            skipped.append(lang_id)
+            continue
+        if explain:
+            print(f"{lang_id}: {', '.join(reasons)}")
+        fingerprints[lang_id] = fingerprint
+        work.append((lang_id, path, output_path, repo_root, shared, optimize_regex, prune_modes, lexer_tables))
+
+    start = time.perf_counter()
+    if jobs <= 1 or len(work) <= 1:
+        results = [_generate_job(job) for job in work]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_generate_job, work, chunksize=4))
+    wall = time.perf_counter() - start
+
+    failures = []
+    written_count = 0
+    saved_bytes = 0
+    for result in results:
+        lang_id = result["lang"]
+        if result["error"]:
+            failures.append((lang_id, result["error"]))
+            manifest.pop(lang_id, None)
+            continue
+        written_count += 1 if result["written"] else 0
+        saved_bytes += saved_by_lang.get(lang_id, 0)
+        manifest[lang_id] = dict(fingerprints[lang_id], outputHash=result["hash"])
+    save_manifest(manifest_path, manifest)
+
+    if results:
+        timings = sorted(results, key=lambda item: item["seconds"], reverse=True)
+        print(f"{'language':<24} {'ms':>10} {'modes':>9} {'factor':>7} {'bytes':>9}  result")
+        for result in timings:
+            lang_id, seconds, expansion = result["lang"], result["seconds"], result["expansion"]
+            status = "FAILED" if result["error"] else ("written" if result["written"] else "unchanged")
+            if expansion:
+                modes = f"{expansion['modeLiterals']}/{expansion['irModes']}"
+                print(
+                    f"{lang_id:<24} {seconds * 1000:>10.1f} {modes:>9} {expansion['factor']:>7.2f} "
+                    f"{expansion['bytes']:>9}  {status}"
+                )
+            else:
+                print(f"{lang_id:<24} {seconds * 1000:>10.1f} {'-':>9} {'-':>7} {'-':>9}  {status}")
+        print("")
+
+    cpu_total = sum(item["seconds"] for item in results)
+    print(
+        f"Generated {len(results) - len(failures)}/{len(results)} stale languages with {jobs} worker(s): "
+        f"{written_count} written, {len(results) - len(failures) - written_count} unchanged, "
+        f"{len(skipped)} up to date"
+    )
+    print(f"Wall time: {wall:.2f}s, summed generation time: {cpu_total:.2f}s")
+    expansions = [item["expansion"] for item in results if item["expansion"]]
+    if expansions:
+        literals = sum(item["modeLiterals"] for item in expansions)
+        ir_modes = sum(item["irModes"] for item in expansions)
+        factor = literals / ir_modes if ir_modes else 1.0
+        print(f"Expansion: {literals} Mode literals for {ir_modes} IR modes ({factor:.2f}x)")
+    if shared_path and results:
+        print(f"Shared modes removed about {saved_bytes} bytes from regenerated language files")
+    regex_stats = [item["regex"] for item in results if item["regex"]]
+    if regex_stats:
+        print(format_regex_stats(merge_regex_stats(regex_stats)))
+    prune_reports = {item["lang"]: item["pruned"] for item in results if item["pruned"]}
+    if prune_reports:
+        print(format_prune_stats(summarize_reports(prune_reports)))
+        if explain:
+            for lang_id, report in sorted(prune_reports.items()):
+                for line in format_prune_report(lang_id, report):
+                    print(f"  {line}")
+        if prune_report_path:
+            write_prune_report(prune_report_path, prune_reports)
+    lexer_reports = {item["lang"]: item["lexer"] for item in results if item["lexer"]}
+    if lexer_reports:
+        print(format_lexer_stats(hljs_dfa.summarize_reports(lexer_reports)))
+        if explain:
+            for lang_id, report in sorted(lexer_reports.items()):
+                print(f"  {format_lexer_report(lang_id, report)}")
+
+    for lang_id, error in failures:
+        print(f"error: {lang_id}: {error}", file=sys.stderr)
+
+    return 1 if failures else 0
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--lang", required=True, help="language id, e.g. swift")
+    parser.add_argument("--lang", help="language id, e.g. swift")
     parser.add_argument("--input", help="path to IR json")
     parser.add_argument("--output", help="path to output swift file")
+    parser.add_argument("--all", action="store_true", help="generate every language in tools/ir")
+    parser.add_argument("--dir", help="generate every language in this directory of IR json files")
+    parser.add_argument("--output-dir", help="directory for generated swift files in batch mode")
+    parser.add_argument("--force", action="store_true", help="regenerate even when the manifest says up to date")
+    parser.add_argument("--explain", action="store_true", help="print why each language is regenerated")
+    parser.add_argument(
+        "--manifest",
+        help="incremental generation manifest (default: tools/.generate-manifest.json)",
+    )
+    parser.add_argument(
+        "--share-modes",
+        action="store_true",
+        help="batch mode: define modes repeated across languages once in Modes/SharedModes.swift",
+    )
+    parser.add_argument(
+        "--share-min-languages",
+        type=int,
+        default=2,
+        help="minimum number of languages a mode must appear in to be shared (default: 2)",
+    )
+    parser.add_argument(
+        "--shared-output",
+        help="path of the shared modes file (default: Sources/SwiftHighlight/Modes/SharedModes.swift)",
+    )
+    parser.add_argument(
+        "--optimize-regex",
+        action="store_true",
+        help="simplify emitted regexes (prefix factoring, possessive repeats); each rewrite is self-checked",
+    )
+    parser.add_argument(
+        "--prune-modes",
+        action="store_true",
+        help="drop modes unreachable from the language and contains entries an earlier entry always shadows",
+    )
+    parser.add_argument(
+        "--prune-report",
+        help="with --prune-modes: write what was removed, per language, to this JSON file",
+    )
+    parser.add_argument(
+        "--lexer-tables",
+        action="store_true",
+        help="emit DFA tables for matchers without lookarounds, backreferences or case folding",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="worker processes for batch mode (default: number of cores)",
+    )
     args = parser.parse_args()
+    if args.prune_report and not args.prune_modes:
+        parser.error("--prune-report requires --prune-modes")
 
     repo_root = Path(__file__).resolve().parents[1]
-    input_path = Path(args.input) if args.input else repo_root / "tools" / "ir" / f"{args.lang}.json"
-    file_base = SPECIAL_CASES.get(args.lang, args.lang.capitalize())
-    output_path = Path(args.output) if args.output else repo_root / "Sources" / "SwiftHighlight" / "Languages" / f"{file_base}.swift"
+    languages_dir = repo_root / "Sources" / "SwiftHighlight" / "Languages"
+    manifest_path = Path(args.manifest) if args.manifest else repo_root / "tools" / ".generate-manifest.json"
+
+    if args.all or args.dir:
+        if args.lang or args.input or args.output:
+            parser.error("--all/--dir cannot be combined with --lang, --input or --output")
+        ir_dir = Path(args.dir) if args.dir else repo_root / "tools" / "ir"
+        output_dir = Path(args.output_dir) if args.output_dir else languages_dir
+        shared_path = None
+        if args.share_modes:
+            shared_path = (
+                Path(args.shared_output)
+                if args.shared_output
+                else repo_root / "Sources" / "SwiftHighlight" / "Modes" / SHARED_MODES_FILE
+            )
+        sys.exit(run_batch(
+            ir_dir,
+            output_dir,
+            repo_root,
+            max(1, args.jobs),
+            manifest_path,
+            args.force,
+            args.explain,
+            shared_path,
+            max(1, args.share_min_languages),
+            args.optimize_regex,
+            args.prune_modes,
+            Path(args.prune_report) if args.prune_report else None,
+            args.lexer_tables,
+        ))
+
+    if not args.lang:
+        parser.error("--lang is required unless --all or --dir is given")
+    if args.share_modes:
+        parser.error("--share-modes needs every language and only works with --all or --dir")
 
-    override = TEMPLATE_OVERRIDES.get(args.lang)
-    if override:
-        template_path = repo_root / "tools" / "templates" / override
-        output_path.write_text(template_path.read_text(encoding="utf-8"), encoding="utf-8")
+    input_path = Path(args.input) if args.input else repo_root / "tools" / "ir" / f"{args.lang}.json"
+    output_path = Path(args.output) if args.output else output_path_for(args.lang, languages_dir)
+
+    manifest = load_manifest(manifest_path)
+    fingerprint = input_fingerprint(
+        args.lang,
+        input_path,
+        output_path,
+        repo_root,
+        generator_fingerprint(),
+        None,
+        args.optimize_regex,
+        args.prune_modes,
+        args.lexer_tables,
+    )
+    reasons = rebuild_reasons(manifest.get(args.lang), fingerprint, output_path, args.force)
+    if not reasons:
+        if args.explain:
+            print(f"{args.lang}: up to date")
         return
-
-    with open(input_path, "r", encoding="utf-8") as f:
-        ir = json.load(f)
-
-    swift = generate_language(ir, args.lang)
-    output_path.write_text(swift, encoding="utf-8")
+    if args.explain:
+        print(f"{args.lang}: {', '.join(reasons)}")
+
+    optimizer = RegexOptimizer() if args.optimize_regex else None
+    pruner = ModePruner() if args.prune_modes else None
+    lexer_builder = LexerTableBuilder() if args.lexer_tables else None
+    _, output_hash, size, mode_literals = generate_file(
+        args.lang, input_path, output_path, repo_root, None, optimizer, pruner, lexer_builder
+    )
+    manifest[args.lang] = dict(fingerprint, outputHash=output_hash)
+    save_manifest(manifest_path, manifest)
+    if optimizer:
+        print(format_regex_stats(optimizer.stats()))
+    if pruner and args.lang in pruner.reports:
+        print(format_prune_stats(pruner.stats()))
+        for line in format_prune_report(args.lang, pruner.reports[args.lang]):
+            print(f"  {line}")
+        if args.prune_report:
+            write_prune_report(Path(args.prune_report), pruner.reports)
+    if lexer_builder and args.lang in lexer_builder.reports:
+        print(format_lexer_report(args.lang, lexer_builder.reports[args.lang]))
+    if args.explain:
+        expansion = expansion_stats(input_path, mode_literals, size)
+        print(
+            f"{args.lang}: {expansion['modeLiterals']} Mode literals for {expansion['irModes']} IR modes "
+            f"({expansion['factor']:.2f}x), {expansion['bytes']} bytes"
+        )
 
 
 if __name__ == "__main__":
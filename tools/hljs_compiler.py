@@ -0,0 +1,560 @@
+"""Offline port of `ModeCompiler` for building language snapshots.
+
+`ModeCompiler.swift` turns a `Language` into a graph of `CompiledMode`s:
+it expands variants and `contains`, merges variant modes, derives begin,
+end and terminator patterns and builds one `ResumableMultiRegex` per mode.
+`LanguageCompiler` performs the same steps on an IR file, so the runtime
+can load the result (`LanguageSnapshot`) without redoing them.
+
+The port follows the Swift compiler step for step, including its quirks:
+modes are compiled once and cached by identity, except that an
+`endsWithParent` mode is compiled once per terminator (it includes the
+parent's), `.self` children get a fresh copy without children, and
+compilation stops at depth 50.
+
+The IR is read through `hljs_ir`, so patterns and keywords are the ones the
+generated Swift would contain. Languages built from `tools/templates` are
+hand-maintained in Swift and their snapshots follow the IR instead.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+
+from hljs_ir import keyword_lists, normalize_raw_keywords, pattern_source
+from hljs_regex import RegexSyntaxError, count_groups, parse
+
+
+SNAPSHOT_FORMAT = 1
+
+MATCH_NOTHING_BOUNDARY = r"\B|\b"
+COMMON_KEYWORDS = {"of", "and", "for", "in", "not", "or", "if", "then", "parent", "list", "value"}
+KEYWORD_SCOPES = (("keyword", "keyword"), ("builtIn", "built_in"), ("literal", "literal"), ("type", "type"))
+MODE_FLAGS = (
+    "excludeBegin",
+    "excludeEnd",
+    "returnBegin",
+    "returnEnd",
+    "endsWithParent",
+    "endsParent",
+    "skip",
+)
+
+RULE_BEGIN = 0
+RULE_END = 1
+RULE_ILLEGAL = 2
+
+_BACKREF_RE = re.compile(r"\[(?:[^\\\]]|\\.)*\]|\(\??|\\([1-9][0-9]*)|\\.")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class Mode:
+    """A `Mode` value. Identity matters: the compiler caches by object, like Swift's UUID."""
+
+    __slots__ = (
+        "scope",
+        "class_name",
+        "begin",
+        "end",
+        "match",
+        "keywords",
+        "illegal",
+        "contains",
+        "variants",
+        "relevance",
+        "flags",
+        "sub_language",
+        "begin_scope",
+        "end_scope",
+        "starts",
+        "begin_keywords",
+        "ir_id",
+    )
+
+    def __init__(self, **fields):
+        self.scope = None
+        self.class_name = None
+        self.begin = None
+        self.end = None
+        self.match = None
+        self.keywords = None
+        self.illegal = None
+        self.contains = []
+        self.variants = None
+        self.relevance = None
+        self.flags = {}
+        self.sub_language = None
+        self.begin_scope = None
+        self.end_scope = None
+        self.starts = None
+        self.begin_keywords = None
+        self.ir_id = None
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+
+class CompiledMode:
+    __slots__ = (
+        "index",
+        "scope",
+        "begin",
+        "end",
+        "illegal",
+        "terminator_end",
+        "terminator_parts",
+        "keywords",
+        "contains",
+        "starts",
+        "parent",
+        "relevance",
+        "flags",
+        "sub_language",
+        "begin_scope",
+        "end_scope",
+        "ir_id",
+    )
+
+    def __init__(self, index: int):
+        self.index = index
+        self.scope = None
+        self.begin = None
+        self.end = None
+        self.illegal = None
+        self.terminator_end = ""
+        self.terminator_parts = [""]
+        self.keywords = None
+        self.contains = []
+        self.starts = None
+        self.parent = None
+        self.relevance = 1
+        self.flags = {}
+        self.sub_language = None
+        self.begin_scope = None
+        self.end_scope = None
+        # Id of the IR mode compiled into this one, for mapping runtime
+        # counters back to the IR; not part of the snapshot.
+        self.ir_id = None
+
+
+# MARK: - IR to modes
+
+
+def _keywords(ir_keywords: dict | None) -> dict | None:
+    if not ir_keywords:
+        return None
+    lists = keyword_lists(ir_keywords)
+    return dict(lists, pattern=pattern_source(ir_keywords.get("pattern")))
+
+
+def _scope(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return {int(key): name for key, name in value.items()}
+    return None
+
+
+def _mode_from_ir(mode: dict) -> Mode:
+    scope = mode.get("scope")
+    class_name = mode.get("className")
+    keywords = _keywords(mode.get("keywords"))
+    begin_keywords = mode.get("beginKeywords")
+    if not keywords and begin_keywords and (scope == "literal" or class_name == "literal"):
+        tokens = normalize_raw_keywords(begin_keywords)
+        if tokens:
+            keywords = {"keyword": tokens, "literal": [], "builtIn": [], "type": [], "custom": [], "pattern": None}
+    relevance = mode.get("relevance")
+    sub_language = mode.get("subLanguage") or None
+    return Mode(
+        scope=scope if isinstance(scope, str) and scope else None,
+        class_name=class_name if isinstance(class_name, str) and class_name else None,
+        begin=pattern_source(mode.get("begin")),
+        end=pattern_source(mode.get("end")),
+        match=pattern_source(mode.get("match")),
+        keywords=keywords,
+        illegal=pattern_source(mode.get("illegal")),
+        relevance=relevance if isinstance(relevance, int) and not isinstance(relevance, bool) else None,
+        flags={key: True for key in MODE_FLAGS if mode.get(key) is True},
+        sub_language=sub_language if isinstance(sub_language, (str, list)) else None,
+        begin_scope=_scope(mode.get("beginScope")),
+        end_scope=_scope(mode.get("endScope")),
+        begin_keywords=begin_keywords or None,
+    )
+
+
+def modes_from_ir(ir: dict) -> Mode:
+    """Builds the `Mode` graph of an IR file and returns the language root mode."""
+    language = ir["language"]
+    ir_modes = {mode["id"]: mode for mode in ir.get("modes", [])}
+    modes = {mode_id: _mode_from_ir(mode) for mode_id, mode in ir_modes.items()}
+    for mode_id, mode in modes.items():
+        mode.ir_id = mode_id
+
+    def resolve(ref):
+        if not isinstance(ref, dict) or not ref.get("ref"):
+            return None
+        if ref["ref"] not in modes:
+            raise SnapshotError(f"unknown mode reference {ref['ref']!r}")
+        return modes[ref["ref"]]
+
+    for mode_id, ir_mode in ir_modes.items():
+        mode = modes[mode_id]
+        for ref in ir_mode.get("contains") or []:
+            if ref == "self" or (isinstance(ref, dict) and ref.get("ref") == mode_id):
+                mode.contains.append("self")
+            elif (target := resolve(ref)) is not None:
+                mode.contains.append(target)
+        variants = [target for ref in ir_mode.get("variants") or [] if (target := resolve(ref)) is not None]
+        mode.variants = variants or None
+        mode.starts = resolve(ir_mode.get("starts"))
+
+    contains = []
+    for ref in language.get("contains") or []:
+        if ref == "self":
+            contains.append("self")
+        elif (target := resolve(ref)) is not None:
+            contains.append(target)
+    return Mode(
+        keywords=_keywords(language.get("keywords")),
+        illegal=pattern_source(language.get("illegal")),
+        contains=contains,
+    )
+
+
+# MARK: - Compiler
+
+
+class LanguageCompiler:
+    MAX_DEPTH = 50
+
+    def __init__(self, ir: dict):
+        self.ir = ir
+        self.language = ir["language"]
+        self.case_insensitive = bool(self.language.get("caseInsensitive"))
+        self.compiled: list[CompiledMode] = []
+        self._cache: dict[tuple[int, tuple[str, ...] | None], CompiledMode] = {}
+        self._merged: dict[tuple[int, int], Mode] = {}
+        self._self_children: list[tuple[CompiledMode, CompiledMode]] = []
+        # Keep merged and copied modes alive so `id()` keys stay unique.
+        self._retained: list[Mode] = []
+
+    def compile(self) -> CompiledMode:
+        return self._compile_mode(modes_from_ir(self.ir), None, 0)
+
+    def _new_compiled(self) -> CompiledMode:
+        cmode = CompiledMode(len(self.compiled))
+        self.compiled.append(cmode)
+        return cmode
+
+    def _compile_mode(self, mode: Mode, parent: CompiledMode | None, depth: int) -> CompiledMode:
+        if depth >= self.MAX_DEPTH:
+            return self._new_compiled()
+        if parent is not None and mode.end is None and not mode.flags.get("endsWithParent"):
+            effective_end = MATCH_NOTHING_BOUNDARY
+        else:
+            effective_end = mode.end
+        terminator_parts = self._terminator_parts(mode, effective_end, parent)
+        key = self._cache_key(mode, terminator_parts)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        cmode = self._new_compiled()
+        self._cache[key] = cmode
+        self._retained.append(mode)
+        cmode.scope = mode.scope or mode.class_name
+        cmode.ir_id = mode.ir_id
+
+        begin_keyword_words = None
+        if parent is not None and mode.begin_keywords:
+            begin_keyword_words = [word for word in mode.begin_keywords.split(" ") if word]
+
+        if mode.match is not None:
+            effective_begin = mode.match
+        elif begin_keyword_words is not None:
+            effective_begin = r"\b(" + "|".join(begin_keyword_words) + r")(?!\.)(?=\b|\s)"
+        else:
+            effective_begin = mode.begin
+
+        if parent is not None:
+            cmode.begin = effective_begin if effective_begin is not None else MATCH_NOTHING_BOUNDARY
+            cmode.end = effective_end
+            cmode.terminator_parts = terminator_parts
+            cmode.terminator_end = "|".join(terminator_parts)
+
+        cmode.illegal = mode.illegal
+        if mode.relevance is not None:
+            cmode.relevance = mode.relevance
+        else:
+            cmode.relevance = 0 if begin_keyword_words is not None else 1
+        cmode.flags = dict(mode.flags)
+        cmode.sub_language = mode.sub_language
+        cmode.begin_scope = mode.begin_scope
+        cmode.end_scope = mode.end_scope
+
+        keywords = mode.keywords
+        if keywords is None and begin_keyword_words is not None:
+            keywords = {"keyword": begin_keyword_words, "literal": [], "builtIn": [], "type": [], "custom": [], "pattern": None}
+        if keywords is not None:
+            cmode.keywords = self._compile_keywords(keywords)
+
+        entries = []
+        if mode.variants:
+            for variant in mode.variants:
+                merged = self._merged_mode(mode, variant)
+                entries.extend(self._expand_contains(merged.contains, merged))
+        else:
+            entries = self._expand_contains(mode.contains, mode)
+
+        for child_mode, is_self in entries:
+            child = self._compile_mode(child_mode, cmode, depth + 1)
+            child.parent = cmode
+            cmode.contains.append(child)
+            if is_self:
+                self._self_children.append((child, cmode))
+
+        if mode.starts is not None:
+            cmode.starts = self._compile_mode(mode.starts, parent, depth + 1)
+
+        return cmode
+
+    @staticmethod
+    def _terminator_parts(mode: Mode, effective_end: str | None, parent: CompiledMode | None) -> list[str]:
+        """The mode's own end, then for an `endsWithParent` mode each of the
+        parent's alternatives not listed yet."""
+        if parent is None:
+            return [""]
+        parts = [effective_end] if effective_end is not None else []
+        if mode.flags.get("endsWithParent"):
+            parts.extend(part for part in parent.terminator_parts if part not in parts)
+        return parts
+
+    @staticmethod
+    def _cache_key(mode: Mode, terminator_parts: list[str]) -> tuple[int, tuple[str, ...] | None]:
+        """An `endsWithParent` mode ends on its parent's terminator too, so
+        each terminator gets its own copy, like highlight.js's
+        `dependencyOnParent`. Recursive copies stop adding alternatives, so
+        they share a key instead of nesting to the depth limit."""
+        if mode.flags.get("endsWithParent"):
+            return id(mode), tuple(terminator_parts)
+        return id(mode), None
+
+    def _expand_contains(self, contains: list, self_mode: Mode) -> list[tuple[Mode, bool]]:
+        result = []
+        for ref in contains:
+            if ref == "self":
+                copy = Mode(
+                    scope=self_mode.scope,
+                    class_name=self_mode.class_name,
+                    begin=self_mode.begin,
+                    end=self_mode.end,
+                    match=self_mode.match,
+                    keywords=self_mode.keywords,
+                    illegal=self_mode.illegal,
+                    relevance=self_mode.relevance,
+                    flags=dict(self_mode.flags),
+                    sub_language=self_mode.sub_language,
+                    begin_scope=self_mode.begin_scope,
+                    end_scope=self_mode.end_scope,
+                    begin_keywords=self_mode.begin_keywords,
+                    ir_id=self_mode.ir_id,
+                )
+                self._retained.append(copy)
+                result.append((copy, True))
+            elif ref.variants:
+                result.extend((self._merged_mode(ref, variant), False) for variant in ref.variants)
+            else:
+                result.append((ref, False))
+        return result
+
+    def _merged_mode(self, base: Mode, override: Mode) -> Mode:
+        key = (id(base), id(override))
+        merged = self._merged.get(key)
+        if merged is None:
+            merged = Mode(
+                scope=_first(override.scope, base.scope),
+                class_name=_first(override.class_name, base.class_name),
+                begin=_first(override.begin, base.begin),
+                end=_first(override.end, base.end),
+                match=_first(override.match, base.match),
+                keywords=_first(override.keywords, base.keywords),
+                illegal=_first(override.illegal, base.illegal),
+                contains=override.contains or base.contains,
+                relevance=_first(override.relevance, base.relevance),
+                flags={key: True for key in MODE_FLAGS if override.flags.get(key) or base.flags.get(key)},
+                sub_language=_first(override.sub_language, base.sub_language),
+                begin_scope=_first(override.begin_scope, base.begin_scope),
+                end_scope=_first(override.end_scope, base.end_scope),
+                starts=_first(override.starts, base.starts),
+                begin_keywords=_first(override.begin_keywords, base.begin_keywords),
+                ir_id=_first(override.ir_id, base.ir_id),
+            )
+            self._merged[key] = merged
+            self._retained.append(merged)
+        return merged
+
+    def _compile_keywords(self, keywords: dict) -> dict:
+        words = {}
+
+        def add(items, scope):
+            for item in items:
+                parts = [part for part in item.split("|") if part]
+                if not parts:
+                    continue
+                keyword = parts[0]
+                if len(parts) > 1:
+                    relevance = int(parts[1]) if re.fullmatch(r"[+-]?\d+", parts[1]) else 1
+                else:
+                    relevance = 0 if keyword.lower() in COMMON_KEYWORDS else 1
+                words[keyword.lower() if self.case_insensitive else keyword] = (scope, relevance)
+
+        for field, scope in KEYWORD_SCOPES:
+            add(keywords[field], scope)
+        for scope, items in keywords["custom"]:
+            add(items, scope)
+        return {"pattern": keywords["pattern"] or r"\w+", "words": words}
+
+    def snapshot(self, lang_id: str) -> dict:
+        """Compiles the language and returns its snapshot as a JSON-ready dict."""
+        self.compile()
+        for child, parent in self._self_children:
+            child.contains = parent.contains
+
+        keyword_tables = []
+        table_index = {}
+        modes = []
+        for cmode in self.compiled:
+            modes.append(self._mode_entry(cmode, keyword_tables, table_index))
+
+        language = self.language
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "language": lang_id,
+            "name": language.get("name") or lang_id,
+            "aliases": list(language.get("aliases") or []),
+            "disableAutodetect": bool(language.get("disableAutodetect")),
+            "caseInsensitive": self.case_insensitive,
+            "unicodeRegex": bool(language.get("unicodeRegex")),
+            "classNameAliases": dict(language.get("classNameAliases") or {}),
+            "keywords": keyword_tables,
+            "modes": modes,
+        }
+
+    def _mode_entry(self, cmode: CompiledMode, keyword_tables: list, table_index: dict) -> dict:
+        entry = {}
+        if cmode.scope is not None:
+            entry["scope"] = cmode.scope
+        for key, value in (("begin", cmode.begin), ("end", cmode.end), ("illegal", cmode.illegal)):
+            if value is not None:
+                entry[key] = value
+        if cmode.terminator_end:
+            entry["terminatorEnd"] = cmode.terminator_end
+        if cmode.keywords is not None:
+            entry["keywords"] = _intern_keywords(cmode.keywords, keyword_tables, table_index)
+        if cmode.contains:
+            entry["contains"] = [child.index for child in cmode.contains]
+        if cmode.starts is not None:
+            entry["starts"] = cmode.starts.index
+        if cmode.parent is not None:
+            entry["parent"] = cmode.parent.index
+        entry["relevance"] = cmode.relevance
+        entry.update(cmode.flags)
+        if isinstance(cmode.sub_language, str):
+            entry["subLanguage"] = cmode.sub_language
+        elif cmode.sub_language:
+            entry["subLanguages"] = list(cmode.sub_language)
+        for key, scope in (("beginScope", cmode.begin_scope), ("endScope", cmode.end_scope)):
+            if isinstance(scope, str):
+                entry[key] = {"wrap": scope}
+            elif scope:
+                entry[key] = {"scopes": {str(index): name for index, name in sorted(scope.items())}}
+        matcher = self._matcher(cmode)
+        if matcher is not None:
+            entry["matcher"] = matcher
+        return entry
+
+    def matcher_rules(self, cmode: CompiledMode) -> list[tuple[int, int, str]]:
+        """Mirrors `buildModeRegex`: (kind, mode index, pattern) for each rule, in order."""
+        rules = []
+        for child in cmode.contains:
+            if child.begin is not None:
+                rules.append((RULE_BEGIN, child.index, child.begin))
+        if cmode.terminator_end:
+            rules.append((RULE_END, -1, cmode.terminator_end))
+        if cmode.illegal is not None:
+            rules.append((RULE_ILLEGAL, -1, cmode.illegal))
+        return rules
+
+    def _matcher(self, cmode: CompiledMode) -> dict | None:
+        """The rules plus the combined first alternation."""
+        rules = self.matcher_rules(cmode)
+        patterns = []
+        if not rules:
+            return None
+
+        entries = []
+        for kind, mode_index, pattern in rules:
+            try:
+                captures = count_groups(parse(pattern))
+            except RegexSyntaxError:
+                # Leave the matcher to the runtime, which counts groups with ICU.
+                return None
+            entries.append([kind, mode_index, captures])
+            patterns.append(pattern)
+        return {"rules": entries, "pattern": rewrite_backreferences(patterns)}
+
+
+def _first(value, fallback):
+    return value if value is not None else fallback
+
+
+def _intern_keywords(table: dict, keyword_tables: list, table_index: dict) -> int:
+    scopes = sorted({scope for scope, _ in table["words"].values()})
+    scope_index = {scope: idx for idx, scope in enumerate(scopes)}
+    entry = {
+        "pattern": table["pattern"],
+        "scopes": scopes,
+        "words": {word: [scope_index[scope], relevance] for word, (scope, relevance) in sorted(table["words"].items())},
+    }
+    key = json.dumps(entry, sort_keys=True)
+    if key not in table_index:
+        table_index[key] = len(keyword_tables)
+        keyword_tables.append(entry)
+    return table_index[key]
+
+
+def rewrite_backreferences(patterns: list[str], separator: str = "|") -> str:
+    """Port of `Regex.rewriteBackreferences`."""
+    num_captures = 0
+    results = []
+    for pattern in patterns:
+        num_captures += 1
+        offset = num_captures
+        output = []
+        position = 0
+        for match in _BACKREF_RE.finditer(pattern):
+            output.append(pattern[position:match.start()])
+            position = match.end()
+            text = match.group(0)
+            if text.startswith("\\") and match.group(1):
+                output.append(f"\\{int(match.group(1)) + offset}")
+            else:
+                output.append(text)
+                if text == "(":
+                    num_captures += 1
+        output.append(pattern[position:])
+        results.append("(" + "".join(output) + ")")
+    return separator.join(results)
+
+
+def compile_snapshot(ir: dict, lang_id: str) -> dict:
+    return LanguageCompiler(ir).snapshot(lang_id)
+
+
+def encode_snapshot(snapshot: dict) -> bytes:
+    """The on-disk form of a snapshot, as `LanguageSnapshot(data:)` reads it."""
+    return json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
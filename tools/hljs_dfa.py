@@ -0,0 +1,567 @@
+"""Table-driven lexers for mode matchers that are regular.
+
+Every compiled mode scans with one `MultiRegex`: its rules joined into a
+single alternation and handed to ICU. When every rule of a matcher is a
+regular expression in the strict sense (no backreferences, lookarounds,
+atomic groups, possessive repeats or inline flags), the matcher can run as
+a DFA instead. `build_lexer_tables` compiles those matchers into transition
+tables that `LexerTable.swift` executes, keyed by the combined pattern so the
+runtime picks them up for exactly the matcher they were built from.
+
+The DFA reproduces ICU's leftmost-first semantics for a fixed start
+position: NFA threads are kept in priority order, and once a thread reaches
+a rule's end the lower-priority ones are dropped, so a later step can only
+replace the match with a higher-priority one. The runtime tries start
+positions from `lastIndex` onwards, which makes the first match it finds the
+one `firstMatch(in:range:)` would return.
+
+ICU details the tables follow:
+
+* `^` and `$` match at line terminators (`\\n`, `\\v`, `\\f`, `\\r`, U+0085,
+  U+2028, U+2029) as with `.anchorsMatchLines`, `$` not between `\\r` and
+  `\\n`, and `^` at the start of the search range but not at the end of the
+  input after a terminator;
+* `\\b` compares the word-ness of the next character with the previous one,
+  skipping combining marks and format characters, and is false before a
+  combining mark. The search range is not transparent, so the character
+  before `lastIndex` counts as a non-word character;
+* `\\w`, `\\d` and `\\s` are Unicode-aware. Outside ASCII the tables split code
+  points by the explicit ranges of the patterns and by four properties the
+  runtime computes (word, decimal digit, white space, grapheme extend or
+  format), so their data comes from the runtime's Unicode tables rather than
+  ICU's.
+
+Case-insensitive matching is not modelled (ICU folds full case, `ss` matches
+`ß`), and neither is any escape whose ICU meaning differs from JavaScript's;
+such matchers keep using `NSRegularExpression`.
+"""
+
+from __future__ import annotations
+
+import base64
+import struct
+
+from hljs_compiler import LanguageCompiler, rewrite_backreferences
+from hljs_regex import (
+    Alternation,
+    Anchor,
+    CharClass,
+    Concat,
+    Group,
+    Literal,
+    RegexSyntaxError,
+    Repeat,
+    parse,
+)
+
+
+LEXER_FORMAT = 1
+MAX_PROGRAM = 4000
+MAX_CELLS = 16384
+MAX_CODE_POINT = 0x10FFFF
+
+# Property bits the runtime computes for a non-ASCII scalar.
+PROP_WORD = 1
+PROP_DIGIT = 2
+PROP_SPACE = 4
+PROP_EXTEND = 8
+PROPERTY_MASKS = 16
+
+# Class flags stored in the tables, used to track the context of `^`, `$` and `\b`.
+FLAG_WORD = 1
+FLAG_LINE_TERMINATOR = 2
+FLAG_CARRIAGE_RETURN = 4
+FLAG_EXTEND = 8
+
+# Runtime contexts: 0 is the start of the search range, 1 + (lt << 2 | cr << 1 | word) the rest.
+CONTEXTS = 9
+
+LINE_TERMINATORS = frozenset((0x0A, 0x0B, 0x0C, 0x0D, 0x85, 0x2028, 0x2029))
+ASCII_WORD = frozenset([*range(0x30, 0x3A), *range(0x41, 0x5B), 0x5F, *range(0x61, 0x7B)])
+ASCII_DIGIT = frozenset(range(0x30, 0x3A))
+ASCII_SPACE = frozenset((0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x20))
+PREDICATES = {
+    "w": (ASCII_WORD, PROP_WORD),
+    "d": (ASCII_DIGIT, PROP_DIGIT),
+    "s": (ASCII_SPACE, PROP_SPACE),
+}
+CONTROL_ESCAPES = {"n": 0x0A, "r": 0x0D, "t": 0x09, "f": 0x0C}
+HEX_DIGITS = set("0123456789abcdefABCDEF")
+PLAIN_GROUPS = {"capture", "named", "noncapture"}
+
+
+class Unsupported(Exception):
+    """The matcher uses something the tables cannot reproduce exactly."""
+
+
+# MARK: - Character sets
+
+
+class _Set:
+    """A character set as ICU evaluates it: items over code points and
+    Unicode predicates, optionally negated."""
+
+    __slots__ = ("items", "negated")
+
+    def __init__(self, items, negated=False):
+        self.items = tuple(items)
+        self.negated = negated
+
+    def key(self):
+        return (self.items, self.negated)
+
+    def ranges(self):
+        return [(item[1], item[2]) for item in self.items if item[0] == "range"]
+
+    def contains(self, probe) -> bool:
+        return any(_item_contains(item, probe) for item in self.items) != self.negated
+
+
+def _item_contains(item, probe) -> bool:
+    kind = item[0]
+    if probe[0] == "ascii":
+        cp = probe[1]
+        if kind == "range":
+            return item[1] <= cp <= item[2]
+        if kind == "dot":
+            return cp not in LINE_TERMINATORS
+        return (cp in PREDICATES[item[1]][0]) != item[2]
+    _, lo, hi, mask = probe
+    if kind == "range":
+        return item[1] <= lo and hi <= item[2]
+    if kind == "dot":
+        return lo not in LINE_TERMINATORS
+    return bool(mask & PREDICATES[item[1]][1]) != item[2]
+
+
+def _class_escape(raw: str, pos: int):
+    """Reads the escape at `raw[pos] == '\\'`; returns (item or code point, next pos)."""
+    esc = raw[pos + 1] if pos + 1 < len(raw) else ""
+    if esc and esc in "dDwWsS":
+        return ("pred", esc.lower(), esc.isupper()), pos + 2
+    if esc in CONTROL_ESCAPES:
+        return CONTROL_ESCAPES[esc], pos + 2
+    if esc == "0" and not raw[pos + 2:pos + 3].isdigit():
+        return 0, pos + 2
+    if esc == "x" and len(raw) >= pos + 4 and set(raw[pos + 2:pos + 4]) <= HEX_DIGITS:
+        return int(raw[pos + 2:pos + 4], 16), pos + 4
+    if esc == "u" and len(raw) >= pos + 6 and set(raw[pos + 2:pos + 6]) <= HEX_DIGITS:
+        return int(raw[pos + 2:pos + 6], 16), pos + 6
+    if esc and not esc.isalnum():
+        return ord(esc), pos + 2
+    # `\b`, `\v`, `\h`, `\p{...}`, `\x{...}` and friends differ between ICU and JavaScript.
+    raise Unsupported(f"escape \\{esc}")
+
+
+def _bracket_set(raw: str) -> _Set:
+    if "&&" in raw or "--" in raw:
+        raise Unsupported("set operator")
+    pos = 1
+    negated = raw.startswith("[^")
+    if negated:
+        pos = 2
+    if raw[pos] == "]":
+        raise Unsupported("empty class")
+    items = []
+    while raw[pos] != "]":
+        atom, pos = _bracket_atom(raw, pos)
+        if isinstance(atom, int) and raw[pos] == "-" and raw[pos + 1] != "]":
+            hi, pos = _bracket_atom(raw, pos + 1)
+            if not isinstance(hi, int):
+                raise Unsupported("range to a class escape")
+            items.append(("range", atom, hi))
+        elif isinstance(atom, int):
+            items.append(("range", atom, atom))
+        else:
+            items.append(atom)
+    return _Set(items, negated)
+
+
+def _bracket_atom(raw: str, pos: int):
+    ch = raw[pos]
+    if ch == "\\":
+        return _class_escape(raw, pos)
+    if ch == "[":
+        raise Unsupported("nested set")
+    return ord(ch), pos + 1
+
+
+def _char_class_set(node: CharClass) -> _Set:
+    raw = node.raw
+    if raw == ".":
+        return _Set([("dot",)])
+    if raw.startswith("["):
+        return _bracket_set(raw)
+    item, end = _class_escape(raw, 0)
+    if end != len(raw) or isinstance(item, int):
+        raise Unsupported(f"class {raw}")
+    return _Set([item])
+
+
+def _literal_set(node: Literal) -> _Set:
+    raw = node.raw or node.char
+    if raw.startswith("\\"):
+        cp, end = _class_escape(raw, 0)
+        if end != len(raw) or not isinstance(cp, int):
+            raise Unsupported(f"literal {raw}")
+    elif raw in ("{", "}"):
+        raise Unsupported("literal brace")
+    else:
+        cp = ord(node.char)
+    return _Set([("range", cp, cp)])
+
+
+# MARK: - NFA
+
+
+class _Program:
+    """A Thompson NFA whose split instructions are ordered by priority.
+
+    Instructions: ("char", set, next), ("split", first, second),
+    ("assert", kind, next) and ("match", rule).
+    """
+
+    def __init__(self):
+        self.ops: list = []
+        self.sets: list[_Set] = []
+        self._set_index: dict = {}
+        self.uses_line = False
+        self.uses_word = False
+
+    def emit(self, op) -> int:
+        if len(self.ops) >= MAX_PROGRAM:
+            raise Unsupported("program too large")
+        self.ops.append(op)
+        return len(self.ops) - 1
+
+    def set_id(self, char_set: _Set) -> int:
+        key = char_set.key()
+        if key not in self._set_index:
+            self._set_index[key] = len(self.sets)
+            self.sets.append(char_set)
+        return self._set_index[key]
+
+    def compile(self, node, next_pc: int) -> int:
+        """Emits `node` followed by `next_pc` and returns its entry."""
+        if isinstance(node, Literal):
+            return self.emit(("char", self.set_id(_literal_set(node)), next_pc))
+        if isinstance(node, CharClass):
+            return self.emit(("char", self.set_id(_char_class_set(node)), next_pc))
+        if isinstance(node, Concat):
+            for item in reversed(node.items):
+                next_pc = self.compile(item, next_pc)
+            return next_pc
+        if isinstance(node, Alternation):
+            entries = [self.compile(branch, next_pc) for branch in node.branches]
+            pc = entries[-1]
+            for entry in reversed(entries[:-1]):
+                pc = self.emit(("split", entry, pc))
+            return pc
+        if isinstance(node, Group) and node.kind in PLAIN_GROUPS:
+            return self.compile(node.child, next_pc)
+        if isinstance(node, Anchor) and node.kind in ("^", "$"):
+            self.uses_line = True
+            return self.emit(("assert", node.kind, next_pc))
+        if isinstance(node, Anchor) and node.kind in ("\\b", "\\B"):
+            self.uses_word = True
+            return self.emit(("assert", node.kind, next_pc))
+        if isinstance(node, Repeat) and not node.possessive:
+            return self._repeat(node, next_pc)
+        raise Unsupported(node.kind if isinstance(node, Group) else type(node).__name__.lower())
+
+    def _repeat(self, node: Repeat, next_pc: int) -> int:
+        if node.max is None:
+            loop = self.emit(None)
+            body = self.compile(node.child, loop)
+            self.ops[loop] = ("split", body, next_pc) if node.greedy else ("split", next_pc, body)
+            pc = loop
+        else:
+            # x{0,2} is (?:x(?:x)?)? - each optional copy skips straight to the end.
+            pc = next_pc
+            for _ in range(node.max - node.min):
+                body = self.compile(node.child, pc)
+                pc = self.emit(("split", body, next_pc) if node.greedy else ("split", next_pc, body))
+        for _ in range(node.min):
+            pc = self.compile(node.child, pc)
+        return pc
+
+
+def build_program(patterns: list[str]) -> tuple[_Program, int]:
+    """The NFA of `(p0)|(p1)|...`; rule `i` ends in ("match", i)."""
+    program = _Program()
+    entries = []
+    for rule, source in enumerate(patterns):
+        try:
+            node = parse(source)
+        except RegexSyntaxError as exc:
+            raise Unsupported(str(exc)) from exc
+        entries.append(program.compile(node, program.emit(("match", rule))))
+    pc = entries[-1]
+    for entry in reversed(entries[:-1]):
+        pc = program.emit(("split", entry, pc))
+    return program, pc
+
+
+# MARK: - Alphabet
+
+
+class _Symbol:
+    __slots__ = ("members", "word", "line", "cr", "lf", "extend")
+
+    def __init__(self, members, word, line, cr, lf, extend):
+        self.members = members
+        self.word = word
+        self.line = line
+        self.cr = cr
+        self.lf = lf
+        self.extend = extend
+
+    def key(self):
+        return (self.members, self.word, self.line, self.cr, self.lf, self.extend)
+
+    def flags(self) -> int:
+        return (
+            (FLAG_WORD if self.word else 0)
+            | (FLAG_LINE_TERMINATOR if self.line else 0)
+            | (FLAG_CARRIAGE_RETURN if self.cr else 0)
+            | (FLAG_EXTEND if self.extend else 0)
+        )
+
+
+def build_alphabet(program: _Program):
+    """Splits code points into classes that neither the sets of the program
+    nor its assertions tell apart.
+
+    Returns (symbols, ASCII class per code point, non-ASCII region starts,
+    class per region and property mask)."""
+    sets = program.sets
+    symbols: list[_Symbol] = []
+    index: dict = {}
+
+    def intern(symbol: _Symbol) -> int:
+        if not program.uses_line:
+            symbol.line = symbol.cr = symbol.lf = False
+        if not program.uses_word:
+            symbol.word = symbol.extend = False
+        key = symbol.key()
+        if key not in index:
+            index[key] = len(symbols)
+            symbols.append(symbol)
+        return index[key]
+
+    ascii_classes = []
+    for cp in range(0x80):
+        probe = ("ascii", cp)
+        members = tuple(char_set.contains(probe) for char_set in sets)
+        ascii_classes.append(intern(_Symbol(
+            members, cp in ASCII_WORD, cp in LINE_TERMINATORS, cp == 0x0D, cp == 0x0A, False
+        )))
+
+    bounds = {0x80}
+    for char_set in sets:
+        for lo, hi in char_set.ranges():
+            for bound in (lo, hi + 1):
+                if 0x80 < bound <= MAX_CODE_POINT:
+                    bounds.add(bound)
+    for cp in LINE_TERMINATORS:
+        if cp >= 0x80:
+            bounds.update((cp, cp + 1))
+    starts = sorted(bounds)
+    region_classes = []
+    for position, lo in enumerate(starts):
+        hi = starts[position + 1] - 1 if position + 1 < len(starts) else MAX_CODE_POINT
+        for mask in range(PROPERTY_MASKS):
+            probe = ("region", lo, hi, mask)
+            members = tuple(char_set.contains(probe) for char_set in sets)
+            region_classes.append(intern(_Symbol(
+                members, bool(mask & PROP_WORD), lo in LINE_TERMINATORS, False, False, bool(mask & PROP_EXTEND)
+            )))
+    return symbols, ascii_classes, starts, region_classes
+
+
+# MARK: - DFA
+
+
+class _Context:
+    """What `^`, `$` and `\\b` need to know about the text before a position."""
+
+    @staticmethod
+    def normalize(program: _Program, start: bool, line: bool, cr: bool, word: bool) -> tuple:
+        if not program.uses_line:
+            start = line = cr = False
+        if not program.uses_word:
+            word = False
+        return (start, line, cr, word)
+
+    @staticmethod
+    def runtime(program: _Program, context: int) -> tuple:
+        if context == 0:
+            return _Context.normalize(program, True, False, False, False)
+        value = context - 1
+        return _Context.normalize(program, False, bool(value & 4), bool(value & 2), bool(value & 1))
+
+
+def _assertion(kind: str, context: tuple, symbol: _Symbol | None) -> bool:
+    start, line, cr, word = context
+    if kind == "^":
+        return start or (line and symbol is not None)
+    if kind == "$":
+        return symbol is None or (symbol.line and not (symbol.lf and cr))
+    boundary = False if symbol is not None and symbol.extend else word != (symbol is not None and symbol.word)
+    return boundary if kind == "\\b" else not boundary
+
+
+def _closure(program: _Program, pcs: tuple, context: tuple, symbol: _Symbol | None):
+    """Follows splits and assertions in priority order. Returns the `char`
+    instructions reached before the first `match`, and that match's rule."""
+    ops = program.ops
+    out = []
+    seen = set()
+    stack = list(reversed(pcs))
+    while stack:
+        pc = stack.pop()
+        if pc in seen:
+            continue
+        seen.add(pc)
+        op = ops[pc]
+        kind = op[0]
+        if kind == "char":
+            out.append(pc)
+        elif kind == "split":
+            stack.append(op[2])
+            stack.append(op[1])
+        elif kind == "assert":
+            if _assertion(op[1], context, symbol):
+                stack.append(op[2])
+        else:
+            return out, op[1]
+    return out, -1
+
+
+def build_dfa(program: _Program, entry: int, symbols: list[_Symbol]):
+    """Subset construction over priority-ordered thread lists.
+
+    Returns (start state per runtime context, next-state table, match table);
+    both tables have one row per state and one column per symbol plus a
+    final column for the end of the input."""
+    states: dict = {}
+    queue = []
+
+    def state_id(pcs: tuple, context: tuple) -> int:
+        key = (pcs, context)
+        if key not in states:
+            if (len(states) + 1) * (len(symbols) + 1) > MAX_CELLS:
+                raise Unsupported("table too large")
+            states[key] = len(states)
+            queue.append(key)
+        return states[key]
+
+    starts = [state_id((entry,), _Context.runtime(program, context)) for context in range(CONTEXTS)]
+    transitions = []
+    matches = []
+    position = 0
+    while position < len(queue):
+        pcs, context = queue[position]
+        position += 1
+        for symbol_index, symbol in enumerate(symbols):
+            threads, rule = _closure(program, pcs, context, symbol)
+            following = []
+            for pc in threads:
+                _, set_index, next_pc = program.ops[pc]
+                if symbol.members[set_index] and next_pc not in following:
+                    following.append(next_pc)
+            if following:
+                word = context[3] if symbol.extend else symbol.word
+                next_context = _Context.normalize(program, False, symbol.line, symbol.cr, word)
+                transitions.append(state_id(tuple(following), next_context))
+            else:
+                transitions.append(-1)
+            matches.append(rule)
+        _, rule = _closure(program, pcs, context, None)
+        transitions.append(-1)
+        matches.append(rule)
+    return starts, transitions, matches
+
+
+# MARK: - Tables
+
+
+def build_lexer_table(patterns: list[str]) -> str:
+    """Encodes the DFA of one matcher for `LexerTable(encoded:)`; raises Unsupported.
+
+    Layout, little-endian and base64 encoded: five int32 (format, rule count,
+    class count, state count, region count) and the int32 start code point
+    of each non-ASCII region, then int16 values: the flags of each class,
+    the class of each ASCII code point, the class of each region and
+    property mask, the start state of each context, and the next state and
+    matched rule (-1 for none) row by row, with one column per class plus
+    one for the end of the input."""
+    program, entry = build_program(patterns)
+    symbols, ascii_classes, region_starts, region_classes = build_alphabet(program)
+    starts, transitions, matches = build_dfa(program, entry, symbols)
+    if max(len(patterns), len(symbols)) > 0x7FFF:
+        raise Unsupported("table too large")
+    header = [LEXER_FORMAT, len(patterns), len(symbols), len(transitions) // (len(symbols) + 1), len(region_starts)]
+    wide = header + region_starts
+    narrow = [
+        *(symbol.flags() for symbol in symbols),
+        *ascii_classes,
+        *region_classes,
+        *starts,
+        *transitions,
+        *matches,
+    ]
+    data = struct.pack(f"<{len(wide)}i{len(narrow)}h", *wide, *narrow)
+    return base64.b64encode(data).decode("ascii")
+
+
+def build_lexer_tables(ir: dict, lang_id: str) -> tuple[dict[str, str], dict]:
+    """Lexer tables for every regular matcher of a language, keyed by the
+    combined pattern, and a report of the matchers left to ICU."""
+    compiler = LanguageCompiler(ir)
+    compiler.snapshot(lang_id)
+    tables: dict[str, str] = {}
+    skipped: dict[str, str] = {}
+    for cmode in compiler.compiled:
+        patterns = [pattern for _, _, pattern in compiler.matcher_rules(cmode)]
+        if not patterns:
+            continue
+        combined = rewrite_backreferences(patterns)
+        if combined in tables or combined in skipped:
+            continue
+        if compiler.case_insensitive:
+            skipped[combined] = "case-insensitive"
+            continue
+        try:
+            tables[combined] = build_lexer_table(patterns)
+        except Unsupported as exc:
+            skipped[combined] = str(exc)
+    reasons: dict[str, int] = {}
+    for reason in skipped.values():
+        reasons[reason] = reasons.get(reason, 0) + 1
+    return tables, {"matchers": len(tables) + len(skipped), "tables": len(tables), "skipped": reasons}
+
+
+class LexerTableBuilder:
+    """Applies `build_lexer_tables` for the generator and keeps each language's report."""
+
+    def __init__(self):
+        self.reports: dict[str, dict] = {}
+
+    def build(self, ir: dict, lang_id: str) -> dict[str, str]:
+        tables, report = build_lexer_tables(ir, lang_id)
+        self.reports[lang_id] = report
+        return tables
+
+    def stats(self) -> dict:
+        return summarize_reports(self.reports)
+
+
+def summarize_reports(reports: dict) -> dict:
+    """Totals over per-language reports."""
+    reports = reports.values()
+    return {
+        "languages": sum(1 for report in reports if report["tables"]),
+        "matchers": sum(report["matchers"] for report in reports),
+        "tables": sum(report["tables"] for report in reports),
+    }
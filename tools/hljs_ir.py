@@ -0,0 +1,94 @@
+"""Helpers for reading the highlight.js IR in `tools/ir`.
+
+The Swift generator and the snapshot compiler must agree on exactly which
+pattern strings and keyword lists a language ends up with, so both read
+patterns and keywords through these functions.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from pathlib import Path
+
+
+def load_ir(input_path: Path) -> dict:
+    with input_path.open("r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def normalize_raw_keywords(raw: str) -> list[str]:
+    tokens = []
+    for token in raw.split():
+        token = re.sub(r"\|\d+$", "", token)
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+def sanitize_regex_source(source: str) -> str:
+    """Escapes `[` inside character classes, which ICU reads as a nested set."""
+    out = []
+    in_class = False
+    i = 0
+    while i < len(source):
+        ch = source[i]
+        if ch == "\\":
+            out.append(ch)
+            if i + 1 < len(source):
+                out.append(source[i + 1])
+                i += 2
+                continue
+        if ch == "[":
+            if in_class:
+                out.append("\\[")
+            else:
+                in_class = True
+                out.append(ch)
+            i += 1
+            continue
+        if ch == "]" and in_class:
+            in_class = False
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def pattern_source(pattern: dict | None, rewrite=None) -> str | None:
+    """The ICU source of an IR pattern, as it appears in generated Swift."""
+    if not pattern:
+        return None
+    flags = pattern.get("flags", "")
+    source = pattern["source"]
+    if rewrite:
+        source = rewrite(source, flags)
+    source = sanitize_regex_source(source)
+    if "i" in flags:
+        source = "(?i)" + source
+    return source
+
+
+def keyword_lists(keywords: dict) -> dict:
+    """Keyword words by `Keywords` field: keyword, literal, builtIn, type and custom.
+
+    `raw` keyword strings are folded into `keyword`, and `custom` becomes a list
+    of `(scope, words)` pairs sorted by scope with empty groups dropped.
+    """
+    keyword = list(keywords.get("keyword") or [])
+    raw = keywords.get("raw")
+    if raw:
+        keyword.extend(normalize_raw_keywords(raw))
+
+    custom = []
+    if isinstance(keywords.get("custom"), dict):
+        for key, words in sorted(keywords["custom"].items(), key=lambda kv: kv[0]):
+            if words:
+                custom.append((key, list(words)))
+
+    return {
+        "keyword": keyword,
+        "literal": list(keywords.get("literal") or []),
+        "builtIn": list(keywords.get("built_in") or []),
+        "type": list(keywords.get("type") or []),
+        "custom": custom,
+    }
@@ -0,0 +1,334 @@
+"""Dead-mode and shadowed-rule elimination for IR languages.
+
+Two kinds of IR content never change what the highlighter produces:
+
+* modes that cannot be reached from `language.contains` through `contains`,
+  `variants` and `starts`;
+* `contains` entries that can never win their parent's combined matcher.
+  `MultiRegex` takes the leftmost match and, at one position, the first
+  alternative that matches, so an entry is dead when an earlier entry of the
+  same list matches at every position where it does.
+
+The shadowing test is deliberately narrow. An entry is shadowed when an
+earlier entry has the same effective begin pattern, or when the entry cannot
+match the empty string and every character it can start with is one at
+which the earlier entry is guaranteed to match (its first atom is an exact
+character class and the rest of it can always match empty). Entries with
+variants are only removed when every variant is shadowed, and `self`
+entries are never touched.
+
+Besides the combined matcher, keyword modes scan their match-only children
+(no `end`) to highlight single words and gaps between keywords. A
+match-only entry is therefore only removed as an exact duplicate, with the
+same scope and relevance, of an earlier match-only entry. An entry is also
+kept when an `endsWithParent` mode below it stays reachable elsewhere:
+`ModeCompiler` computes that mode's terminator from the parent it is first
+compiled under, and removing one path could change which parent that is.
+"""
+
+from __future__ import annotations
+
+import copy
+import re
+
+from hljs_ir import pattern_source
+from hljs_regex import (
+    Alternation,
+    CharClass,
+    CharSet,
+    Concat,
+    Group,
+    InlineFlags,
+    Literal,
+    RegexSyntaxError,
+    Repeat,
+    first_set,
+    nullable,
+    parse,
+)
+
+
+MATCH_NOTHING_BOUNDARY = r"\B|\b"
+MATCH_ONLY_ENDS = {MATCH_NOTHING_BOUNDARY, r"(?:\B|\b)"}
+PLAIN_GROUPS = {"capture", "named", "noncapture", "atomic", "flags"}
+CLASS_ESCAPE_RE = re.compile(r"\\[wWdDsSpP]")
+
+
+def _ref_id(ref) -> str | None:
+    return ref.get("ref") if isinstance(ref, dict) else None
+
+
+def _targets(mode: dict) -> list[str]:
+    targets = [_ref_id(ref) for ref in (mode.get("contains") or []) + (mode.get("variants") or [])]
+    targets.append(_ref_id(mode.get("starts")))
+    return [target for target in targets if target]
+
+
+def reachable_modes(language: dict, mode_by_id: dict, removed: set = frozenset()) -> set[str]:
+    """Mode ids reachable from `language.contains`, ignoring the `(owner, index)`
+    contains entries in `removed` (the language itself is owner `None`)."""
+    seen = set()
+    stack = [
+        target
+        for idx, ref in enumerate(language.get("contains") or [])
+        if (target := _ref_id(ref)) and (None, idx) not in removed
+    ]
+    while stack:
+        mode_id = stack.pop()
+        if mode_id in seen or mode_id not in mode_by_id:
+            continue
+        seen.add(mode_id)
+        mode = mode_by_id[mode_id]
+        for idx, ref in enumerate(mode.get("contains") or []):
+            if (target := _ref_id(ref)) and (mode_id, idx) not in removed:
+                stack.append(target)
+        stack.extend(_ref_id(ref) for ref in mode.get("variants") or [] if _ref_id(ref))
+        if target := _ref_id(mode.get("starts")):
+            stack.append(target)
+    return seen
+
+
+def _subtree(mode_id: str, mode_by_id: dict) -> set[str]:
+    seen = set()
+    stack = [mode_id]
+    while stack:
+        current = stack.pop()
+        if current in seen or current not in mode_by_id:
+            continue
+        seen.add(current)
+        stack.extend(_targets(mode_by_id[current]))
+    return seen
+
+
+# MARK: - Rules
+
+
+class _Rule:
+    """One alternative a contains entry adds to its parent's matcher."""
+
+    __slots__ = ("begin", "match_only", "signature")
+
+    def __init__(self, begin: str, match_only: bool, signature: tuple):
+        self.begin = begin
+        self.match_only = match_only
+        self.signature = signature
+
+
+def _field(name: str, *modes: dict):
+    """The first non-empty value of `name`, as `ModeCompiler` merges variants."""
+    for mode in modes:
+        value = mode.get(name)
+        if value is not None and value != "":
+            return value
+    return None
+
+
+def _rule(*modes: dict) -> _Rule:
+    begin_keywords = _field("beginKeywords", *modes)
+    words = [word for word in begin_keywords.split(" ") if word] if begin_keywords else None
+    match = pattern_source(_field("match", *modes))
+    begin = pattern_source(_field("begin", *modes))
+    if match is not None:
+        effective = match
+    elif words is not None:
+        effective = r"\b(" + "|".join(words) + r")(?!\.)(?=\b|\s)"
+    else:
+        effective = begin if begin is not None else MATCH_NOTHING_BOUNDARY
+
+    end = pattern_source(_field("end", *modes))
+    relevance = _field("relevance", *modes)
+    if not isinstance(relevance, int) or isinstance(relevance, bool):
+        relevance = 0 if words is not None else 1
+    scope = _field("scope", *modes) or _field("className", *modes)
+    begin_scope = _field("beginScope", *modes)
+    signature = (repr(scope), relevance, repr(begin_scope))
+    return _Rule(effective, end is None or end in MATCH_ONLY_ENDS, signature)
+
+
+def _entry_rules(mode: dict, mode_by_id: dict) -> list[_Rule]:
+    variants = [mode_by_id[target] for ref in mode.get("variants") or [] if (target := _ref_id(ref)) in mode_by_id]
+    if not variants:
+        return [_rule(mode)]
+    return [_rule(variant, mode) for variant in variants]
+
+
+# MARK: - Shadowing
+
+
+def _guaranteed_start(node, case_insensitive: bool) -> CharSet:
+    """Characters at which `node` is certain to match, whatever follows."""
+    if isinstance(node, Literal):
+        return CharSet.of(node.char)
+    if isinstance(node, CharClass):
+        raw = node.raw
+        if node.approximate or raw in (".", "[]", "[^]") or CLASS_ESCAPE_RE.search(raw):
+            return CharSet()
+        # ICU folds case before negating, so `[^a]` rejects "A" as well.
+        if case_insensitive and raw.startswith("[^"):
+            return CharSet()
+        return node.chars
+    if isinstance(node, Group) and node.kind in PLAIN_GROUPS:
+        return _guaranteed_start(node.child, case_insensitive)
+    if isinstance(node, Alternation):
+        out = CharSet()
+        for branch in node.branches:
+            out = out.union(_guaranteed_start(branch, case_insensitive))
+        return out
+    if isinstance(node, Repeat) and node.min == 1:
+        return _guaranteed_start(node.child, case_insensitive)
+    if isinstance(node, Concat):
+        items = [item for item in node.items if not isinstance(item, InlineFlags)]
+        if items and all(_always_matches(item) for item in items[1:]):
+            return _guaranteed_start(items[0], case_insensitive)
+    return CharSet()
+
+
+def _always_matches(node) -> bool:
+    """Whether `node` matches (possibly empty) at any position of any text."""
+    if isinstance(node, InlineFlags):
+        return True
+    if isinstance(node, Repeat):
+        return node.min == 0 or _always_matches(node.child)
+    if isinstance(node, Group) and node.kind in PLAIN_GROUPS:
+        return _always_matches(node.child)
+    if isinstance(node, Concat):
+        return all(_always_matches(item) for item in node.items)
+    if isinstance(node, Alternation):
+        return any(_always_matches(branch) for branch in node.branches)
+    return False
+
+
+class _Patterns:
+    """Parses each begin pattern once per language."""
+
+    def __init__(self, case_insensitive: bool):
+        self.case_insensitive = case_insensitive
+        self._starts: dict[str, CharSet] = {}
+        self._firsts: dict[str, CharSet | None] = {}
+
+    def _ignores_case(self, source: str) -> bool:
+        return self.case_insensitive or "(?i" in source
+
+    def guaranteed_start(self, source: str) -> CharSet:
+        if source not in self._starts:
+            try:
+                self._starts[source] = _guaranteed_start(parse(source), self._ignores_case(source))
+            except RegexSyntaxError:
+                self._starts[source] = CharSet()
+        return self._starts[source]
+
+    def first(self, source: str) -> CharSet | None:
+        """Superset of a match's first character; None when the pattern can match empty."""
+        if source not in self._firsts:
+            try:
+                node = parse(source)
+                self._firsts[source] = None if nullable(node) else first_set(node, self._ignores_case(source))
+            except RegexSyntaxError:
+                self._firsts[source] = None
+        return self._firsts[source]
+
+
+def _shadow_reason(earlier: _Rule, rule: _Rule, patterns: _Patterns) -> str | None:
+    if earlier.begin == rule.begin:
+        if not rule.match_only or (earlier.match_only and earlier.signature == rule.signature):
+            return "duplicate"
+        return None
+    if rule.match_only:
+        return None
+    start = patterns.guaranteed_start(earlier.begin)
+    if not start:
+        return None
+    first = patterns.first(rule.begin)
+    if first is not None and first.issubset(start):
+        return "superset"
+    return None
+
+
+# MARK: - Pruning
+
+
+def prune_ir(ir: dict) -> tuple[dict, dict]:
+    """Returns a copy of `ir` without dead modes and shadowed contains entries,
+    and a report of what was removed."""
+    ir = copy.deepcopy(ir)
+    language = ir["language"]
+    mode_by_id = {mode["id"]: mode for mode in ir.get("modes", [])}
+    patterns = _Patterns(bool(language.get("caseInsensitive")))
+    live = reachable_modes(language, mode_by_id)
+
+    removed: set[tuple[str | None, int]] = set()
+    shadowed = []
+    owners = [(None, language)] + [(mode_id, mode_by_id[mode_id]) for mode_id in mode_by_id if mode_id in live]
+    for owner_id, owner in owners:
+        kept: list[tuple[_Rule, str]] = []
+        for idx, ref in enumerate(owner.get("contains") or []):
+            ref_id = _ref_id(ref)
+            if ref_id is None or ref_id == owner_id or ref_id not in mode_by_id:
+                continue
+            rules = _entry_rules(mode_by_id[ref_id], mode_by_id)
+            found = []
+            for rule in rules:
+                match = next(
+                    ((earlier_id, reason) for earlier, earlier_id in kept
+                     if (reason := _shadow_reason(earlier, rule, patterns))),
+                    None,
+                )
+                if match is None:
+                    break
+                found.append(match)
+            if len(found) == len(rules) and _can_remove(language, mode_by_id, removed, owner_id, idx, ref_id):
+                removed.add((owner_id, idx))
+                shadowed.append({
+                    "mode": owner_id,
+                    "index": idx,
+                    "ref": ref_id,
+                    "shadowedBy": found[0][0],
+                    "reason": found[0][1],
+                    "alternatives": len(rules),
+                })
+                continue
+            kept.extend((rule, ref_id) for rule in rules)
+
+    for owner_id, owner in owners:
+        if "contains" in owner and any(key == owner_id for key, _ in removed):
+            owner["contains"] = [
+                ref for idx, ref in enumerate(owner["contains"]) if (owner_id, idx) not in removed
+            ]
+    live = reachable_modes(language, mode_by_id)
+    dead = [mode["id"] for mode in ir.get("modes", []) if mode["id"] not in live]
+    ir["modes"] = [mode for mode in ir.get("modes", []) if mode["id"] in live]
+    return ir, {"deadModes": dead, "shadowedRules": shadowed}
+
+
+def _can_remove(language, mode_by_id, removed, owner_id, idx, ref_id) -> bool:
+    subtree = _subtree(ref_id, mode_by_id)
+    if not any(mode_by_id[mode_id].get("endsWithParent") is True for mode_id in subtree):
+        return True
+    still_live = reachable_modes(language, mode_by_id, removed | {(owner_id, idx)})
+    return not (subtree & still_live)
+
+
+class ModePruner:
+    """Applies `prune_ir` for the generator and keeps each language's report."""
+
+    def __init__(self):
+        self.reports: dict[str, dict] = {}
+
+    def prune(self, ir: dict, lang_id: str) -> dict:
+        pruned, report = prune_ir(ir)
+        self.reports[lang_id] = report
+        return pruned
+
+    def stats(self) -> dict:
+        return summarize_reports(self.reports)
+
+
+def summarize_reports(reports: dict) -> dict:
+    """Totals over per-language reports."""
+    reports = reports.values()
+    return {
+        "languages": sum(1 for report in reports if report["deadModes"] or report["shadowedRules"]),
+        "deadModes": sum(len(report["deadModes"]) for report in reports),
+        "shadowedRules": sum(len(report["shadowedRules"]) for report in reports),
+        "alternatives": sum(rule["alternatives"] for report in reports for rule in report["shadowedRules"]),
+    }
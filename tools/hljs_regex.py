@@ -0,0 +1,890 @@
+"""Parser and helpers for the regex sources stored in the IR.
+
+highlight.js patterns are JavaScript regexes that SwiftHighlight hands to ICU
+(`NSRegularExpression`). This module parses the subset of syntax the two
+engines share into a small AST, can print it back (parsed nodes keep their
+original spelling, so `to_source(parse(s)) == s`), and answers the structural
+questions the tools need: nullability, first-character sets, width bounds and
+capture-group counts.
+
+Character sets are approximations over code points. ICU gives `\\w`, `\\d`
+and `\\b` Unicode semantics where JavaScript is ASCII-only, so by default
+class escapes treat every non-ASCII code point as a possible member; tools
+that must match what runs (the optimizer, DFA tables, pruning) rely on this.
+`parse(source, ascii_classes=True)` reads them with JavaScript's ASCII
+tables instead, as the patterns were written; the backtracking-risk
+analyzer in validate-ir.py uses that. Wherever an exact answer is unknown
+(Unicode properties, backreferences) the helpers return a superset, which
+keeps every analysis built on them conservative.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+
+MAX_CODE_POINT = 0x10FFFF
+INFINITY = None
+
+
+class RegexSyntaxError(ValueError):
+    pass
+
+
+# MARK: - Character sets
+
+
+class CharSet:
+    """Immutable set of code points stored as sorted, disjoint inclusive ranges."""
+
+    __slots__ = ("ranges",)
+
+    def __init__(self, ranges=()):
+        self.ranges = _normalize(ranges)
+
+    @classmethod
+    def of(cls, *chars: str) -> "CharSet":
+        return cls((ord(c), ord(c)) for c in chars)
+
+    @classmethod
+    def any(cls) -> "CharSet":
+        return cls([(0, MAX_CODE_POINT)])
+
+    def __bool__(self) -> bool:
+        return bool(self.ranges)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CharSet) and self.ranges == other.ranges
+
+    def __hash__(self) -> int:
+        return hash(self.ranges)
+
+    def __repr__(self) -> str:
+        return f"CharSet({list(self.ranges)!r})"
+
+    def __contains__(self, char) -> bool:
+        cp = ord(char) if isinstance(char, str) else char
+        return any(lo <= cp <= hi for lo, hi in self.ranges)
+
+    def union(self, other: "CharSet") -> "CharSet":
+        return CharSet(self.ranges + other.ranges)
+
+    def intersects(self, other: "CharSet") -> bool:
+        i = j = 0
+        a, b = self.ranges, other.ranges
+        while i < len(a) and j < len(b):
+            if a[i][1] < b[j][0]:
+                i += 1
+            elif b[j][1] < a[i][0]:
+                j += 1
+            else:
+                return True
+        return False
+
+    def intersection(self, other: "CharSet") -> "CharSet":
+        out = []
+        for lo, hi in self.ranges:
+            for olo, ohi in other.ranges:
+                if olo <= hi and lo <= ohi:
+                    out.append((max(lo, olo), min(hi, ohi)))
+        return CharSet(out)
+
+    def complement(self) -> "CharSet":
+        out = []
+        start = 0
+        for lo, hi in self.ranges:
+            if lo > start:
+                out.append((start, lo - 1))
+            start = hi + 1
+        if start <= MAX_CODE_POINT:
+            out.append((start, MAX_CODE_POINT))
+        return CharSet(out)
+
+    def issubset(self, other: "CharSet") -> bool:
+        return self.intersection(other) == self
+
+    def size(self) -> int:
+        return sum(hi - lo + 1 for lo, hi in self.ranges)
+
+    def is_ascii(self) -> bool:
+        return not self.ranges or self.ranges[-1][1] < 0x80
+
+    def case_folded(self) -> "CharSet":
+        """Adds the other case of ASCII letters, plus the two non-ASCII code
+        points (KELVIN SIGN, LONG S) that fold to ASCII letters."""
+        extra = []
+        for lo, hi in self.ranges:
+            for a, b, delta in ((0x41, 0x5A, 0x20), (0x61, 0x7A, -0x20)):
+                if lo <= b and a <= hi:
+                    extra.append((max(lo, a) + delta, min(hi, b) + delta))
+        for ascii_chars, other in (("kK", 0x212A), ("sS", 0x17F)):
+            if any(c in self for c in ascii_chars) or other in self:
+                extra.extend((ord(c), ord(c)) for c in ascii_chars)
+                extra.append((other, other))
+        return CharSet(self.ranges + tuple(extra))
+
+
+def _normalize(ranges):
+    items = sorted((int(lo), int(hi)) for lo, hi in ranges if lo <= hi)
+    merged = []
+    for lo, hi in items:
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return tuple(merged)
+
+
+NON_ASCII = CharSet([(0x80, MAX_CODE_POINT)])
+ASCII_DIGIT = CharSet([(0x30, 0x39)])
+ASCII_WORD = CharSet([(0x30, 0x39), (0x41, 0x5A), (0x5F, 0x5F), (0x61, 0x7A)])
+DIGIT = ASCII_DIGIT.union(NON_ASCII)
+WORD = ASCII_WORD.union(NON_ASCII)
+SPACE = CharSet([
+    (0x09, 0x0D), (0x20, 0x20), (0x85, 0x85), (0xA0, 0xA0), (0x1680, 0x1680), (0x2000, 0x200A),
+    (0x2028, 0x2029), (0x202F, 0x202F), (0x205F, 0x205F), (0x3000, 0x3000), (0xFEFF, 0xFEFF),
+])
+LINE_TERMINATORS = CharSet([(0x0A, 0x0A), (0x0D, 0x0D), (0x2028, 0x2029)])
+DOT = LINE_TERMINATORS.complement()
+ANY = CharSet.any()
+
+# Negated escapes keep all of non-ASCII too, so every entry is a superset.
+CLASS_ESCAPES = {
+    "d": DIGIT,
+    "D": ASCII_DIGIT.complement(),
+    "w": WORD,
+    "W": ASCII_WORD.complement(),
+    "s": SPACE,
+    "S": SPACE.complement(),
+}
+
+# JavaScript's tables, for reading patterns as highlight.js wrote them.
+JS_SPACE = SPACE.intersection(CharSet.of("\x85").complement())
+JS_CLASS_ESCAPES = {
+    "d": ASCII_DIGIT,
+    "D": ASCII_DIGIT.complement(),
+    "w": ASCII_WORD,
+    "W": ASCII_WORD.complement(),
+    "s": JS_SPACE,
+    "S": JS_SPACE.complement(),
+}
+
+CONTROL_ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "f": "\f", "v": "\v", "0": "\0"}
+
+
+# MARK: - AST
+
+
+@dataclass
+class Node:
+    pass
+
+
+@dataclass
+class Literal(Node):
+    char: str
+    raw: str | None = None
+
+
+@dataclass
+class CharClass(Node):
+    """A bracket expression, a class escape like `\\w` or `.`."""
+
+    chars: CharSet
+    raw: str
+    # True when `chars` is only a superset (e.g. `\\p{L}`).
+    approximate: bool = False
+
+
+@dataclass
+class Anchor(Node):
+    kind: str  # "^", "$", "\\b", "\\B"
+
+
+@dataclass
+class Backref(Node):
+    ref: int | str
+    raw: str
+
+
+@dataclass
+class Group(Node):
+    # "capture", "named", "noncapture", "atomic", "lookahead", "neglookahead",
+    # "lookbehind", "neglookbehind" or "flags" (a scoped `(?i:...)`).
+    kind: str
+    child: Node
+    name: str | None = None
+    flags: str = ""
+
+
+@dataclass
+class InlineFlags(Node):
+    flags: str  # e.g. "i" or "-i" from `(?i)`
+
+
+@dataclass
+class Concat(Node):
+    items: list = field(default_factory=list)
+
+
+@dataclass
+class Alternation(Node):
+    branches: list = field(default_factory=list)
+
+
+@dataclass
+class Repeat(Node):
+    child: Node
+    min: int
+    max: int | None
+    greedy: bool = True
+    possessive: bool = False
+    raw: str | None = None
+
+
+LOOKAROUNDS = {"lookahead", "neglookahead", "lookbehind", "neglookbehind"}
+
+
+# MARK: - Parser
+
+
+class _Parser:
+    def __init__(self, source: str, ascii_classes: bool = False):
+        self.source = source
+        self.pos = 0
+        self.group_count = 0
+        self.ascii_classes = ascii_classes
+        self.class_escapes = JS_CLASS_ESCAPES if ascii_classes else CLASS_ESCAPES
+
+    def error(self, message: str):
+        raise RegexSyntaxError(f"{message} at offset {self.pos} in {self.source!r}")
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.source[index] if index < len(self.source) else None
+
+    def startswith(self, text: str) -> bool:
+        return self.source.startswith(text, self.pos)
+
+    def parse(self) -> Node:
+        node = self.parse_alternation()
+        if self.pos < len(self.source):
+            self.error("unbalanced ')'")
+        return node
+
+    def parse_alternation(self) -> Node:
+        branches = [self.parse_concat()]
+        while self.peek() == "|":
+            self.pos += 1
+            branches.append(self.parse_concat())
+        return branches[0] if len(branches) == 1 else Alternation(branches)
+
+    def parse_concat(self) -> Node:
+        items = []
+        while self.pos < len(self.source) and self.peek() not in "|)":
+            atom = self.parse_atom()
+            if isinstance(atom, (Anchor, InlineFlags)) or (
+                isinstance(atom, Group) and atom.kind in LOOKAROUNDS
+            ):
+                # JS forbids quantified assertions; leave any quantifier to the
+                # next iteration where it will be rejected as dangling.
+                items.append(atom)
+                continue
+            items.append(self.parse_quantifier(atom))
+        return items[0] if len(items) == 1 else Concat(items)
+
+    def parse_quantifier(self, atom: Node) -> Node:
+        start = self.pos
+        ch = self.peek()
+        if ch == "*":
+            lo, hi = 0, INFINITY
+            self.pos += 1
+        elif ch == "+":
+            lo, hi = 1, INFINITY
+            self.pos += 1
+        elif ch == "?":
+            lo, hi = 0, 1
+            self.pos += 1
+        elif ch == "{":
+            bounds = self.parse_braces()
+            if bounds is None:
+                return atom
+            lo, hi = bounds
+        else:
+            return atom
+        greedy, possessive = True, False
+        if self.peek() == "?":
+            greedy = False
+            self.pos += 1
+        elif self.peek() == "+":
+            possessive = True
+            self.pos += 1
+        node = Repeat(atom, lo, hi, greedy, possessive, raw=self.source[start:self.pos])
+        if self.peek() in ("*", "+", "?") or (self.peek() == "{" and self.braces_ahead()):
+            self.error("nothing to repeat")
+        return node
+
+    def braces_ahead(self):
+        saved = self.pos
+        try:
+            return self.parse_braces() is not None
+        finally:
+            self.pos = saved
+
+    def parse_braces(self):
+        end = self.source.find("}", self.pos)
+        if end < 0:
+            return None
+        body = self.source[self.pos + 1:end]
+        parts = body.split(",")
+        if not body or len(parts) > 2 or not parts[0].isdigit():
+            return None
+        if len(parts) == 2 and parts[1] and not parts[1].isdigit():
+            return None
+        lo = int(parts[0])
+        if len(parts) == 1:
+            hi = lo
+        else:
+            hi = int(parts[1]) if parts[1] else INFINITY
+        if hi is not None and hi < lo:
+            self.error("numbers out of order in {} quantifier")
+        self.pos = end + 1
+        return lo, hi
+
+    def parse_atom(self) -> Node:
+        ch = self.peek()
+        if ch == "(":
+            return self.parse_group()
+        if ch == "[":
+            return self.parse_class()
+        if ch == ".":
+            self.pos += 1
+            return CharClass(DOT, ".")
+        if ch in ("^", "$"):
+            self.pos += 1
+            return Anchor(ch)
+        if ch == "\\":
+            return self.parse_escape()
+        if ch in ("*", "+", "?"):
+            self.error("nothing to repeat")
+        if ch == "{" and self.braces_ahead():
+            self.error("nothing to repeat")
+        self.pos += 1
+        return Literal(ch, ch)
+
+    def parse_group(self) -> Node:
+        start = self.pos
+        self.pos += 1
+        kind, name, flags = "capture", None, ""
+        if self.startswith("?:"):
+            kind = "noncapture"
+            self.pos += 2
+        elif self.startswith("?="):
+            kind = "lookahead"
+            self.pos += 2
+        elif self.startswith("?!"):
+            kind = "neglookahead"
+            self.pos += 2
+        elif self.startswith("?<="):
+            kind = "lookbehind"
+            self.pos += 3
+        elif self.startswith("?<!"):
+            kind = "neglookbehind"
+            self.pos += 3
+        elif self.startswith("?>"):
+            kind = "atomic"
+            self.pos += 2
+        elif self.startswith("?<") or self.startswith("?P<"):
+            self.pos += 2 if self.startswith("?<") else 3
+            end = self.source.find(">", self.pos)
+            if end < 0:
+                self.error("unterminated group name")
+            name = self.source[self.pos:end]
+            self.pos = end + 1
+            kind = "named"
+        elif self.startswith("?"):
+            end = self.pos + 1
+            while end < len(self.source) and (self.source[end].isalpha() or self.source[end] == "-"):
+                end += 1
+            flags = self.source[self.pos + 1:end]
+            if not flags or end >= len(self.source) or self.source[end] not in ":)":
+                self.error("unknown group syntax")
+            self.pos = end + 1
+            if self.source[end] == ")":
+                return InlineFlags(flags)
+            kind = "flags"
+        if kind in ("capture", "named"):
+            self.group_count += 1
+        child = self.parse_alternation()
+        if self.peek() != ")":
+            self.pos = start
+            self.error("missing ')'")
+        self.pos += 1
+        return Group(kind, child, name, flags)
+
+    def parse_escape(self) -> Node:
+        start = self.pos
+        self.pos += 1
+        ch = self.peek()
+        if ch is None:
+            self.error("trailing backslash")
+        if ch in ("b", "B"):
+            self.pos += 1
+            return Anchor("\\" + ch)
+        if ch in ("A", "z", "Z", "G"):
+            self.pos += 1
+            return Anchor("\\" + ch)
+        if ch in self.class_escapes:
+            self.pos += 1
+            return CharClass(self.class_escapes[ch], "\\" + ch)
+        if ch in ("p", "P") and self.peek(1) == "{":
+            end = self.source.find("}", self.pos)
+            if end < 0:
+                self.error("unterminated property escape")
+            self.pos = end + 1
+            chars = ANY
+            return CharClass(chars, self.source[start:self.pos], approximate=True)
+        if ch.isdigit() and ch != "0":
+            end = self.pos
+            while end < len(self.source) and self.source[end].isdigit():
+                end += 1
+            number = int(self.source[self.pos:end])
+            self.pos = end
+            return Backref(number, self.source[start:self.pos])
+        if ch == "k" and self.peek(1) == "<":
+            end = self.source.find(">", self.pos)
+            if end < 0:
+                self.error("unterminated backreference name")
+            name = self.source[self.pos + 2:end]
+            self.pos = end + 1
+            return Backref(name, self.source[start:self.pos])
+        char = self.parse_char_escape()
+        return Literal(char, self.source[start:self.pos])
+
+    def parse_char_escape(self) -> str:
+        """Parses the character escape after a backslash (position is past the `\\`)."""
+        ch = self.peek()
+        if ch in CONTROL_ESCAPES and not (ch == "0" and (self.peek(1) or "").isdigit()):
+            self.pos += 1
+            return CONTROL_ESCAPES[ch]
+        if ch == "x" and _is_hex(self.source[self.pos + 1:self.pos + 3], 2):
+            value = int(self.source[self.pos + 1:self.pos + 3], 16)
+            self.pos += 3
+            return chr(value)
+        if ch == "x" and self.peek(1) == "{":
+            end = self.source.find("}", self.pos)
+            if end > 0 and _is_hex(self.source[self.pos + 2:end]):
+                value = int(self.source[self.pos + 2:end], 16)
+                self.pos = end + 1
+                return chr(value)
+        if ch == "u" and self.peek(1) == "{":
+            end = self.source.find("}", self.pos)
+            if end > 0 and _is_hex(self.source[self.pos + 2:end]):
+                value = int(self.source[self.pos + 2:end], 16)
+                self.pos = end + 1
+                return chr(value)
+        if ch == "u" and _is_hex(self.source[self.pos + 1:self.pos + 5], 4):
+            value = int(self.source[self.pos + 1:self.pos + 5], 16)
+            self.pos += 5
+            return chr(value)
+        if ch == "c" and (self.peek(1) or "").isalpha():
+            value = ord(self.peek(1)) % 32
+            self.pos += 2
+            return chr(value)
+        if ch == "0":
+            # Legacy octal escape such as \012.
+            end = self.pos
+            while end < len(self.source) and end - self.pos < 3 and self.source[end] in "01234567":
+                end += 1
+            value = int(self.source[self.pos:end], 8)
+            self.pos = end
+            return chr(value)
+        self.pos += 1
+        return ch
+
+    def parse_class(self) -> Node:
+        start = self.pos
+        self.pos += 1
+        negated = False
+        if self.peek() == "^":
+            negated = True
+            self.pos += 1
+        chars = CharSet()
+        approximate = False
+        unicode_escapes = False
+        first = True
+        while True:
+            ch = self.peek()
+            if ch is None:
+                self.pos = start
+                self.error("unterminated character class")
+            if ch == "]" and not first:
+                self.pos += 1
+                break
+            if ch == "]" and first:
+                # JS: `[]` matches nothing and `[^]` matches anything.
+                self.pos += 1
+                break
+            first = False
+            item_start = self.pos
+            lo_set, lo_char, item_approx = self.parse_class_atom()
+            approximate = approximate or item_approx
+            if not self.ascii_classes and self.source[item_start:item_start + 2] in ("\\d", "\\w", "\\D", "\\W"):
+                unicode_escapes = True
+            if (
+                lo_char is not None
+                and self.peek() == "-"
+                and self.peek(1) not in (None, "]")
+            ):
+                saved = self.pos
+                self.pos += 1
+                hi_set, hi_char, _ = self.parse_class_atom()
+                if hi_char is None:
+                    # `[a-\d]` is a literal '-' in JS.
+                    chars = chars.union(lo_set).union(CharSet.of("-")).union(hi_set)
+                    continue
+                if ord(hi_char) < ord(lo_char):
+                    self.pos = saved
+                    self.error("range out of order in character class")
+                chars = chars.union(CharSet([(ord(lo_char), ord(hi_char))]))
+                continue
+            chars = chars.union(lo_set)
+        if negated:
+            chars = chars.complement()
+            # A negated superset is not a superset any more.
+            if approximate:
+                chars = ANY
+            elif unicode_escapes:
+                chars = chars.union(NON_ASCII)
+        return CharClass(chars, self.source[start:self.pos], approximate)
+
+    def parse_class_atom(self):
+        """Returns (set, single char or None, approximate)."""
+        ch = self.peek()
+        if ch == "\\":
+            self.pos += 1
+            esc = self.peek()
+            if esc is None:
+                self.error("trailing backslash")
+            if esc in self.class_escapes:
+                self.pos += 1
+                return self.class_escapes[esc], None, False
+            if esc in ("p", "P") and self.peek(1) == "{":
+                end = self.source.find("}", self.pos)
+                if end < 0:
+                    self.error("unterminated property escape")
+                self.pos = end + 1
+                return ANY, None, True
+            if esc == "b":
+                self.pos += 1
+                return CharSet.of("\b"), "\b", False
+            if esc == "-":
+                self.pos += 1
+                return CharSet.of("-"), "-", False
+            char = self.parse_char_escape()
+            return CharSet.of(char), char, False
+        if ch == "[" and self.peek(1) == ":":
+            # POSIX-style [:alpha:] is not JS syntax; treat '[' as a literal.
+            pass
+        self.pos += 1
+        return CharSet.of(ch), ch, False
+
+
+def _is_hex(text: str, length: int | None = None) -> bool:
+    if not text or (length is not None and len(text) != length):
+        return False
+    return all(c in "0123456789abcdefABCDEF" for c in text)
+
+
+def parse(source: str, ascii_classes: bool = False) -> Node:
+    """Parses a JS/ICU regex source into an AST. Raises RegexSyntaxError.
+
+    `ascii_classes` reads `\\d`, `\\w` and `\\s` with JavaScript's tables
+    instead of ICU's."""
+    return _Parser(source, ascii_classes).parse()
+
+
+# MARK: - Printing
+
+SPECIAL = set("\\^$.|?*+()[]{}")
+PRINT_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\f": "\\f", "\v": "\\v", "\0": "\\0"}
+
+
+def escape_literal(char: str) -> str:
+    if char in SPECIAL or char == "/":
+        return "\\" + char
+    if char in PRINT_ESCAPES:
+        return PRINT_ESCAPES[char]
+    if ord(char) < 0x20 or ord(char) == 0x7F:
+        return f"\\x{ord(char):02x}"
+    return char
+
+
+def escape_class_char(char: str) -> str:
+    if char in "\\]^-[":
+        return "\\" + char
+    if char in PRINT_ESCAPES:
+        return PRINT_ESCAPES[char]
+    if ord(char) < 0x20 or ord(char) == 0x7F:
+        return f"\\x{ord(char):02x}"
+    return char
+
+
+GROUP_OPENERS = {
+    "capture": "(",
+    "noncapture": "(?:",
+    "atomic": "(?>",
+    "lookahead": "(?=",
+    "neglookahead": "(?!",
+    "lookbehind": "(?<=",
+    "neglookbehind": "(?<!",
+}
+
+
+def quantifier_source(node: Repeat) -> str:
+    if node.raw is not None:
+        return node.raw
+    lo, hi = node.min, node.max
+    if (lo, hi) == (0, None):
+        text = "*"
+    elif (lo, hi) == (1, None):
+        text = "+"
+    elif (lo, hi) == (0, 1):
+        text = "?"
+    elif hi is None:
+        text = f"{{{lo},}}"
+    elif lo == hi:
+        text = f"{{{lo}}}"
+    else:
+        text = f"{{{lo},{hi}}}"
+    if node.possessive:
+        return text + "+"
+    if not node.greedy:
+        return text + "?"
+    return text
+
+
+def to_source(node: Node) -> str:
+    if isinstance(node, Literal):
+        return node.raw if node.raw is not None else escape_literal(node.char)
+    if isinstance(node, CharClass):
+        return node.raw
+    if isinstance(node, Anchor):
+        return node.kind
+    if isinstance(node, Backref):
+        return node.raw
+    if isinstance(node, InlineFlags):
+        return f"(?{node.flags})"
+    if isinstance(node, Group):
+        if node.kind == "named":
+            opener = f"(?<{node.name}>"
+        elif node.kind == "flags":
+            opener = f"(?{node.flags}:"
+        else:
+            opener = GROUP_OPENERS[node.kind]
+        return opener + to_source(node.child) + ")"
+    if isinstance(node, Concat):
+        return "".join(
+            f"(?:{to_source(item)})" if isinstance(item, Alternation) else to_source(item)
+            for item in node.items
+        )
+    if isinstance(node, Alternation):
+        return "|".join(to_source(branch) for branch in node.branches)
+    if isinstance(node, Repeat):
+        child = node.child
+        if isinstance(child, (Concat, Alternation, Repeat)):
+            body = f"(?:{to_source(child)})"
+        else:
+            body = to_source(child)
+        return body + quantifier_source(node)
+    raise TypeError(f"unknown node {node!r}")
+
+
+# MARK: - Structural queries
+
+
+def children(node: Node) -> list:
+    if isinstance(node, (Group, Repeat)):
+        return [node.child]
+    if isinstance(node, Concat):
+        return list(node.items)
+    if isinstance(node, Alternation):
+        return list(node.branches)
+    return []
+
+
+def walk(node: Node):
+    """Yields every node, parents before children."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(children(current)))
+
+
+def count_groups(node: Node) -> int:
+    return sum(1 for n in walk(node) if isinstance(n, Group) and n.kind in ("capture", "named"))
+
+
+def has_backreference(node: Node) -> bool:
+    return any(isinstance(n, Backref) for n in walk(node))
+
+
+def is_zero_width(node: Node) -> bool:
+    return isinstance(node, (Anchor, InlineFlags)) or (
+        isinstance(node, Group) and node.kind in LOOKAROUNDS
+    )
+
+
+def nullable(node: Node) -> bool:
+    """Whether the node can match the empty string."""
+    if isinstance(node, (Literal, CharClass)):
+        return False
+    if is_zero_width(node) or isinstance(node, Backref):
+        return True
+    if isinstance(node, Group):
+        return nullable(node.child)
+    if isinstance(node, Concat):
+        return all(nullable(item) for item in node.items)
+    if isinstance(node, Alternation):
+        return any(nullable(branch) for branch in node.branches)
+    if isinstance(node, Repeat):
+        return node.min == 0 or nullable(node.child)
+    return True
+
+
+def first_set(node: Node, case_insensitive: bool = False) -> CharSet:
+    """Superset of the characters a non-empty match of `node` can start with."""
+    chars = _first(node)
+    return chars.case_folded() if case_insensitive else chars
+
+
+def _first(node: Node) -> CharSet:
+    if isinstance(node, Literal):
+        return CharSet.of(node.char)
+    if isinstance(node, CharClass):
+        return node.chars
+    if isinstance(node, Backref):
+        return ANY
+    if is_zero_width(node):
+        return CharSet()
+    if isinstance(node, Group):
+        return _first(node.child)
+    if isinstance(node, Concat):
+        out = CharSet()
+        for item in node.items:
+            out = out.union(_first(item))
+            if not nullable(item):
+                break
+        return out
+    if isinstance(node, Alternation):
+        out = CharSet()
+        for branch in node.branches:
+            out = out.union(_first(branch))
+        return out
+    if isinstance(node, Repeat):
+        return _first(node.child) if node.max != 0 else CharSet()
+    return ANY
+
+
+def width(node: Node) -> tuple[int, int | None]:
+    """(min, max) match length in characters; max is None when unbounded."""
+    if isinstance(node, (Literal, CharClass)):
+        return 1, 1
+    if isinstance(node, Backref):
+        return 0, None
+    if is_zero_width(node):
+        return 0, 0
+    if isinstance(node, Group):
+        return width(node.child)
+    if isinstance(node, Concat):
+        lo, hi = 0, 0
+        for item in node.items:
+            ilo, ihi = width(item)
+            lo += ilo
+            hi = None if hi is None or ihi is None else hi + ihi
+        return lo, hi
+    if isinstance(node, Alternation):
+        widths = [width(branch) for branch in node.branches]
+        lo = min(w[0] for w in widths)
+        hi = None if any(w[1] is None for w in widths) else max(w[1] for w in widths)
+        return lo, hi
+    if isinstance(node, Repeat):
+        clo, chi = width(node.child)
+        lo = clo * node.min
+        if node.max is None:
+            hi = None if chi != 0 else 0
+        else:
+            hi = None if chi is None else chi * node.max
+        return lo, hi
+    return 0, None
+
+
+def is_unbounded(node: Node) -> bool:
+    return isinstance(node, Repeat) and node.max is None and width(node.child)[1] != 0
+
+
+def single_char_set(node: Node) -> CharSet | None:
+    """The character set when `node` always matches exactly one character."""
+    if isinstance(node, Literal):
+        return CharSet.of(node.char)
+    if isinstance(node, CharClass):
+        return node.chars
+    if isinstance(node, Group) and node.kind in ("capture", "named", "noncapture", "atomic"):
+        return single_char_set(node.child)
+    if isinstance(node, Alternation):
+        out = CharSet()
+        for branch in node.branches:
+            chars = single_char_set(branch)
+            if chars is None:
+                return None
+            out = out.union(chars)
+        return out
+    return None
+
+
+def chars_used(node: Node) -> CharSet:
+    """Superset of every character a match of `node` can consume."""
+    out = CharSet()
+    for n in walk(node):
+        if isinstance(n, Group) and n.kind in LOOKAROUNDS:
+            continue
+        if isinstance(n, Literal):
+            out = out.union(CharSet.of(n.char))
+        elif isinstance(n, CharClass):
+            out = out.union(n.chars)
+        elif isinstance(n, Backref):
+            return ANY
+    return out
+
+
+def literal_prefix(node: Node) -> str:
+    """The literal text every match of `node` starts with (case-sensitive)."""
+    out = []
+
+    def visit(n) -> bool:
+        # Returns True while the prefix can keep growing past `n`.
+        if isinstance(n, Literal):
+            out.append(n.char)
+            return True
+        if isinstance(n, InlineFlags):
+            return False
+        if isinstance(n, Anchor):
+            return True
+        if isinstance(n, Group) and n.kind in ("capture", "named", "noncapture", "atomic"):
+            return visit(n.child)
+        if isinstance(n, Concat):
+            for item in n.items:
+                if not visit(item):
+                    return False
+            return True
+        if isinstance(n, Repeat) and n.min >= 1 and n.max == n.min:
+            for _ in range(n.min):
+                if not visit(n.child):
+                    return False
+            return True
+        return False
+
+    visit(node)
+    return "".join(out)
@@ -0,0 +1,402 @@
+"""Semantics-preserving rewrites of IR regex sources for the Swift generator.
+
+Every rewrite keeps the leftmost-first (backtracking) match and the capture
+group numbering of the original pattern:
+
+- alternation branches that start with the same literal are factored into a
+  prefix trie; a branch only moves past branches that cannot match at the
+  same position, so priority between overlapping branches is unchanged
+- a deterministic prefix (literal, single-character class or anchor) shared
+  by consecutive branches, and a capture-free suffix shared by all branches,
+  is hoisted out of the alternation
+- non-capturing groups that do not affect precedence are dropped
+- a greedy single-character repeat becomes possessive when the next item must
+  start with a character the repeat cannot consume, so giving characters back
+  could never let the rest of the pattern match
+
+Each rewritten pattern is compared against the original with Python's `re` on
+a corpus derived from the pattern. Patterns that Python cannot compile (for
+example `\\p{...}`), or that disagree on any position of the corpus, are kept
+verbatim.
+"""
+
+from __future__ import annotations
+
+import random
+import re
+import warnings
+
+import hljs_regex as rx
+
+
+BASE_CORPUS = [
+    "",
+    " ",
+    "a",
+    "A",
+    "_",
+    "0",
+    "x1",
+    "if else",
+    "If ELSE",
+    "foo(bar, baz);",
+    "  x = 1 + 2.5e10 // c",
+    '"str\\"ing"',
+    "'c'",
+    "<tag attr='v'>text</tag>",
+    "#include <stdio.h>",
+    "\tindent\n  next line\r\n",
+    "héllo wörld λ",
+    "0x1F 0b101 1_000 3.14",
+    "!@#$%^&*()[]{}|\\/?~`",
+    "-- comment\n/* block */",
+    "a.b->c::d",
+    "key: value",
+    "$var @attr %mod",
+]
+MAX_CORPUS_TEXT = 24
+
+
+class RegexOptimizer:
+    """Rewrites pattern sources and keeps counts for the generator's report."""
+
+    def __init__(self, verify: bool = True):
+        self.verify = verify
+        self.rewritten = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.unverified = 0
+        self.saved_chars = 0
+        self._cache = {}
+
+    def stats(self) -> dict:
+        return {
+            "rewritten": self.rewritten,
+            "unchanged": self.unchanged,
+            "rejected": self.rejected,
+            "unverified": self.unverified,
+            "savedChars": self.saved_chars,
+        }
+
+    def rewrite(self, source: str, case_insensitive: bool) -> str:
+        key = (source, case_insensitive)
+        if key in self._cache:
+            return self._cache[key]
+        result = self._rewrite(source, case_insensitive)
+        self._cache[key] = result
+        return result
+
+    def _rewrite(self, source: str, case_insensitive: bool) -> str:
+        try:
+            tree = rx.parse(source)
+        except rx.RegexSyntaxError:
+            self.unchanged += 1
+            return source
+        if case_insensitive and not _ascii_letters_only(tree):
+            # Case folding outside ASCII is not modelled by CharSet.
+            self.unchanged += 1
+            return source
+
+        candidate = rx.to_source(optimize(tree, case_insensitive))
+        if candidate == source:
+            self.unchanged += 1
+            return source
+        if self.verify:
+            verdict = equivalent(source, candidate, case_insensitive)
+            if verdict is None:
+                self.unverified += 1
+                return source
+            if not verdict:
+                self.rejected += 1
+                return source
+        self.rewritten += 1
+        self.saved_chars += len(source) - len(candidate)
+        return candidate
+
+
+def _ascii_letters_only(tree) -> bool:
+    for node in rx.walk(tree):
+        if isinstance(node, rx.Literal) and ord(node.char) > 0x7F and node.char.lower() != node.char.upper():
+            return False
+        if isinstance(node, rx.CharClass) and (node.approximate or not _fold_closed(node.chars)):
+            return False
+    return True
+
+
+def _fold_closed(chars: rx.CharSet) -> bool:
+    """Whether the non-ASCII part of a class is empty or (nearly) everything,
+    so that ICU's Unicode case folding cannot add members CharSet misses."""
+    non_ascii = chars.intersection(rx.NON_ASCII)
+    return not non_ascii or non_ascii.size() >= rx.NON_ASCII.size() - 16
+
+
+# MARK: - Rewrites
+
+
+def optimize(node, ci: bool):
+    """Returns an equivalent tree; `ci` is whether the pattern runs case-insensitively."""
+    node = _optimize(node, ci)
+    while isinstance(node, rx.Group) and node.kind == "noncapture":
+        node = node.child
+    return node
+
+
+def _optimize(node, ci):
+    if isinstance(node, rx.Group):
+        return rx.Group(node.kind, _optimize(node.child, ci), node.name, node.flags)
+    if isinstance(node, rx.Repeat):
+        child = _optimize(node.child, ci)
+        if isinstance(child, rx.Group) and child.kind == "noncapture" and _is_atom(child.child):
+            child = child.child
+        return rx.Repeat(child, node.min, node.max, node.greedy, node.possessive, node.raw)
+    if isinstance(node, rx.Concat):
+        items = _flatten_concat([_optimize(item, ci) for item in node.items])
+        return _make_concat(_possessify(items, ci))
+    if isinstance(node, rx.Alternation):
+        branches = []
+        for branch in node.branches:
+            branch = _optimize(branch, ci)
+            while isinstance(branch, rx.Group) and branch.kind == "noncapture":
+                branch = branch.child
+            if isinstance(branch, rx.Alternation):
+                branches.extend(branch.branches)
+            else:
+                branches.append(branch)
+        return _factor(branches, ci)
+    return node
+
+
+def _is_atom(node) -> bool:
+    return isinstance(node, (rx.Literal, rx.CharClass, rx.Backref)) or (
+        isinstance(node, rx.Group) and node.kind != "flags"
+    )
+
+
+def _flatten_concat(items):
+    out = []
+    for item in items:
+        if isinstance(item, rx.Group) and item.kind == "noncapture" and not isinstance(item.child, rx.Alternation):
+            item = item.child
+        if isinstance(item, rx.Concat):
+            out.extend(item.items)
+        else:
+            out.append(item)
+    return out
+
+
+def _make_concat(items):
+    if len(items) == 1:
+        return items[0]
+    return rx.Concat(items)
+
+
+def _items(branch):
+    if isinstance(branch, rx.Concat):
+        return list(branch.items)
+    return [branch]
+
+
+def _fold(char: str, ci: bool) -> str:
+    return char.lower() if ci and char.isascii() else char
+
+
+def _prefix_key(item, ci):
+    """Hashable key for a hoistable first item, or None when it is not deterministic."""
+    if isinstance(item, rx.Literal):
+        return ("literal", _fold(item.char, ci))
+    if isinstance(item, rx.CharClass):
+        return ("class", item.raw)
+    if isinstance(item, rx.Anchor) and item.kind in ("^", "$", "\\b", "\\B"):
+        return ("anchor", item.kind)
+    return None
+
+
+def _first_chars(node, ci) -> rx.CharSet:
+    return rx.first_set(node, case_insensitive=ci)
+
+
+def _factor(branches, ci):
+    """Factors common prefixes and suffixes out of an ordered list of branches."""
+    branches = _hoist_suffix(_factor_prefixes(branches, ci))
+    return branches[0] if len(branches) == 1 else rx.Alternation(branches)
+
+
+def _factor_prefixes(branches, ci):
+    remaining = list(branches)
+    out = []
+    while remaining:
+        head = remaining.pop(0)
+        head_items = _items(head)
+        key = _prefix_key(head_items[0], ci) if head_items else None
+        if key is None:
+            out.append(head)
+            continue
+
+        group = [head]
+        index = 0
+        skipped_captures = False
+        while index < len(remaining):
+            candidate = remaining[index]
+            candidate_items = _items(candidate)
+            if candidate_items and _prefix_key(candidate_items[0], ci) == key:
+                if skipped_captures and _has_capture(candidate):
+                    # Moving it would renumber its groups.
+                    break
+                group.append(remaining.pop(index))
+                continue
+            # Only a literal prefix lets later branches move past this one, and
+            # only when this one can never match where they do.
+            if key[0] != "literal" or rx.nullable(candidate):
+                break
+            if key[1] in _first_chars(candidate, ci):
+                break
+            skipped_captures = skipped_captures or _has_capture(candidate)
+            index += 1
+
+        if len(group) == 1:
+            out.append(head)
+            continue
+        tails = [_make_concat(_items(branch)[1:]) if len(_items(branch)) > 1 else rx.Concat([]) for branch in group]
+        rest = _factor_prefixes(tails, ci)
+        out.append(_make_concat(_flatten_concat([head_items[0], _join_branches(rest)])))
+    return out
+
+
+def _is_empty(node) -> bool:
+    return isinstance(node, rx.Concat) and not node.items
+
+
+def _join_branches(branches):
+    if len(branches) == 1:
+        return branches[0]
+    # `X|` is `X?` and `|X` is `X??`; assertions cannot be quantified.
+    if len(branches) == 2 and _is_empty(branches[1]) and not rx.nullable(branches[0]):
+        return rx.Repeat(branches[0], 0, 1)
+    if len(branches) == 2 and _is_empty(branches[0]) and not rx.nullable(branches[1]):
+        return rx.Repeat(branches[1], 0, 1, greedy=False)
+    return rx.Alternation(branches)
+
+
+def _has_capture(node) -> bool:
+    return any(isinstance(n, rx.Group) and n.kind in ("capture", "named") for n in rx.walk(node))
+
+
+def _hoist_suffix(branches):
+    """`X1 S|X2 S` -> `(?:X1|X2) S`; backtracking visits the same states in the same order."""
+    item_lists = [_items(branch) for branch in branches]
+    if len(item_lists) < 2 or any(_is_empty(branch) for branch in branches):
+        return branches
+    suffix = []
+    while all(item_lists) and all(items for items in item_lists):
+        last = item_lists[0][-1]
+        source = rx.to_source(last)
+        if _has_capture(last) or any(rx.to_source(items[-1]) != source for items in item_lists[1:]):
+            break
+        suffix.insert(0, last)
+        for items in item_lists:
+            items.pop()
+    if not suffix:
+        return branches
+    rest = [_make_concat(items) if items else rx.Concat([]) for items in item_lists]
+    head = _join_branches(rest) if not all(_is_empty(b) for b in rest) else None
+    items = ([head] if head is not None else []) + suffix
+    return [_make_concat(items)]
+
+
+def _possessify(items, ci):
+    """Makes `X*` possessive when the next item can never start with an X."""
+    out = list(items)
+    for index, item in enumerate(out[:-1]):
+        if not isinstance(item, rx.Repeat) or not item.greedy or item.possessive:
+            continue
+        chars = rx.single_char_set(item.child)
+        if chars is None or (item.max is not None and item.max == item.min):
+            continue
+        follower = out[index + 1]
+        if rx.is_zero_width(follower) or rx.nullable(follower):
+            continue
+        if ci:
+            chars = chars.case_folded()
+        if _first_chars(follower, ci).intersects(chars):
+            continue
+        out[index] = rx.Repeat(item.child, item.min, item.max, greedy=True, possessive=True)
+    return out
+
+
+# MARK: - Equivalence check
+
+
+def _python_pattern(source: str, ci: bool):
+    flags = re.MULTILINE | (re.IGNORECASE if ci else 0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            return re.compile(source, flags)
+        except (re.error, OverflowError, RecursionError):
+            return None
+
+
+def corpus_for(source: str) -> list[str]:
+    """Strings exercising the literals and characters of `source`."""
+    texts = list(BASE_CORPUS)
+    try:
+        tree = rx.parse(source)
+    except rx.RegexSyntaxError:
+        return texts
+
+    words = set()
+    alphabet = set(" _a1(\n")
+    for node in rx.walk(tree):
+        if isinstance(node, rx.Literal):
+            alphabet.add(node.char)
+        elif isinstance(node, rx.CharClass) and node.chars.size() < 64:
+            for lo, hi in node.chars.ranges:
+                alphabet.add(chr(lo))
+                alphabet.add(chr(hi))
+        elif isinstance(node, rx.Alternation):
+            for branch in node.branches:
+                prefix = rx.literal_prefix(branch)
+                if prefix:
+                    words.add(prefix[:MAX_CORPUS_TEXT])
+
+    for word in sorted(words):
+        texts.extend([
+            word,
+            f" {word} ",
+            f"{word}_",
+            f"({word})",
+            word + word,
+            word[:-1],
+            word.upper(),
+            f"{word}x",
+            f"x{word}",
+        ])
+
+    rng = random.Random(source)
+    letters = sorted(alphabet)
+    for _ in range(40):
+        length = rng.randint(1, 12)
+        texts.append("".join(rng.choice(letters) for _ in range(length)))
+    return [text[:MAX_CORPUS_TEXT] for text in texts]
+
+
+def _spans(match, groups: int):
+    if match is None:
+        return None
+    return tuple(match.span(i) for i in range(groups + 1))
+
+
+def equivalent(original: str, candidate: str, ci: bool) -> bool | None:
+    """Whether both patterns give the same match and groups at every corpus
+    position, or None when Python cannot compile the original."""
+    left = _python_pattern(original, ci)
+    if left is None:
+        return None
+    right = _python_pattern(candidate, ci)
+    if right is None or left.groups != right.groups:
+        return False
+    for text in corpus_for(original):
+        for pos in range(len(text) + 1):
+            if _spans(left.match(text, pos), left.groups) != _spans(right.match(text, pos), right.groups):
+                return False
+    return True
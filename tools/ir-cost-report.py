@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""Static runtime-cost metrics for every IR language.
+
+Each language is compiled the way `ModeCompiler` does (see hljs_compiler.py)
+and every compiled mode is measured on what the highlighter will do with it:
+
+    alternatives    rules in the mode's combined matcher (children, end, illegal)
+    captures        capture groups in the combined matcher; `MultiRegex.exec`
+                    only checks each rule's wrapper group, so this measures
+                    the size of the pattern ICU runs
+    depth           shortest mode-stack depth at which the mode is entered
+    keywords        words in the mode's keyword table
+    backreferences  backreferences in the combined matcher
+    lookarounds     lookahead and lookbehind groups in the combined matcher
+    subLanguages    languages a `subLanguage` mode may hand text to
+
+The per-language summary adds the largest and total matcher sizes, the
+deepest acyclic mode stack (`recursive` when a mode can contain itself, so
+the stack grows with the input) and the distinct sub-languages referenced.
+
+`--history <path>` records the summaries whenever the IR or the tools that
+measure it (this script, hljs_compiler.py, hljs_ir.py, hljs_regex.py)
+change, and reports which languages got heavier since the previous
+recording, so a highlight.js upgrade that inflates a grammar shows up before
+any Swift benchmark runs. When only the tools changed, the summaries are
+recorded as a new baseline without a comparison.
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+from hljs_compiler import RULE_BEGIN, SnapshotError, compile_snapshot
+from hljs_ir import load_ir
+from hljs_regex import Backref, Group, LOOKAROUNDS, RegexSyntaxError, parse, walk
+
+
+HISTORY_VERSION = 1
+
+# Modules whose changes can change the metrics, besides this script.
+METRIC_MODULES = ("hljs_compiler.py", "hljs_ir.py", "hljs_regex.py")
+
+# Summary columns, in table order, with their headers.
+COLUMNS = (
+    ("modes", "modes"),
+    ("maxAlternatives", "alts"),
+    ("alternatives", "alts tot"),
+    ("maxCaptures", "caps"),
+    ("captures", "caps tot"),
+    ("maxDepth", "depth"),
+    ("keywords", "kw"),
+    ("backreferences", "backref"),
+    ("lookarounds", "lookar"),
+    ("subLanguages", "sublang"),
+)
+
+# Summary metrics compared across history entries; a higher value is heavier.
+TRACKED = ("alternatives", "captures", "maxDepth", "keywords", "backreferences", "lookarounds", "subLanguages")
+
+
+def sub_languages(entry: dict) -> list[str]:
+    if "subLanguage" in entry:
+        return [entry["subLanguage"]]
+    return list(entry.get("subLanguages") or [])
+
+
+def pattern_features(pattern: str) -> tuple[int, int] | None:
+    """(backreferences, lookarounds) in a combined matcher, or None if it does not parse."""
+    try:
+        node = parse(pattern)
+    except RegexSyntaxError:
+        return None
+    backreferences = lookarounds = 0
+    for item in walk(node):
+        if isinstance(item, Backref):
+            backreferences += 1
+        elif isinstance(item, Group) and item.kind in LOOKAROUNDS:
+            lookarounds += 1
+    return backreferences, lookarounds
+
+
+def mode_metrics(index: int, entry: dict, keyword_tables: list, depth: int | None) -> dict:
+    matcher = entry.get("matcher")
+    if matcher:
+        rules = matcher["rules"]
+        alternatives = len(rules)
+        begin_rules = sum(1 for kind, _, _ in rules if kind == RULE_BEGIN)
+        # Every rule is wrapped in one group of its own.
+        captures = sum(count for _, _, count in rules) + len(rules)
+        features = pattern_features(matcher["pattern"])
+    else:
+        # No matcher means no rules, or a rule the port cannot parse; ICU builds it at runtime.
+        begin_rules = len(entry.get("contains") or [])
+        alternatives = begin_rules + (1 if entry.get("terminatorEnd") else 0) + (1 if "illegal" in entry else 0)
+        captures = 0 if not alternatives else None
+        features = (0, 0) if not alternatives else None
+    table = entry.get("keywords")
+    return {
+        "mode": index,
+        "scope": entry.get("scope"),
+        "alternatives": alternatives,
+        "beginRules": begin_rules,
+        "captures": captures,
+        "depth": depth,
+        "keywords": len(keyword_tables[table]["words"]) if table is not None else 0,
+        "backreferences": features[0] if features else None,
+        "lookarounds": features[1] if features else None,
+        "subLanguages": len(sub_languages(entry)),
+    }
+
+
+def stack_edges(modes: list[dict]) -> dict[int, list[tuple[int, int]]]:
+    """Mode-stack edges: a child is pushed one level deeper, `starts` replaces
+    the ended mode at the same level."""
+    edges = {}
+    for index, entry in enumerate(modes):
+        edges[index] = [(child, 1) for child in entry.get("contains") or []]
+        if "starts" in entry:
+            edges[index].append((entry["starts"], 0))
+    return edges
+
+
+def strongly_connected(nodes: list[int], edges: dict) -> dict[int, int]:
+    """Kosaraju's algorithm, iterative; returns node -> component id."""
+    order = []
+    seen = set()
+    for root in nodes:
+        if root in seen:
+            continue
+        seen.add(root)
+        stack = [(root, iter(edges[root]))]
+        while stack:
+            node, targets = stack[-1]
+            for target, _ in targets:
+                if target not in seen:
+                    seen.add(target)
+                    stack.append((target, iter(edges[target])))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+
+    reverse = {node: [] for node in nodes}
+    for node in nodes:
+        for target, _ in edges[node]:
+            reverse[target].append(node)
+    component = {}
+    for root in reversed(order):
+        if root in component:
+            continue
+        component[root] = root
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for source in reverse[node]:
+                if source not in component:
+                    component[source] = root
+                    stack.append(source)
+    return component
+
+
+def stack_depths(modes: list[dict]) -> tuple[dict[int, int], int, bool]:
+    """Shortest entry depth per reachable mode, the deepest acyclic stack and
+    whether some mode can be nested in itself."""
+    edges = stack_edges(modes)
+    nodes = list(edges)
+
+    shortest = {0: 0}
+    queue = [0]
+    for node in queue:
+        for target, weight in edges[node]:
+            if target not in shortest or shortest[node] + weight < shortest[target]:
+                shortest[target] = shortest[node] + weight
+                queue.append(target)
+
+    component = strongly_connected(nodes, edges)
+    members = {}
+    for node, comp in component.items():
+        members.setdefault(comp, []).append(node)
+    recursive = any(
+        weight and component[target] == component[node]
+        for node in shortest
+        for target, weight in edges[node]
+    )
+
+    # Longest path over the condensation; edges inside a component add nothing.
+    longest = {}
+    for comp in _topological(members, edges, component):
+        best = 0
+        for node in members[comp]:
+            for target, weight in edges[node]:
+                if component[target] != comp:
+                    best = max(best, weight + longest[component[target]])
+        longest[comp] = best
+    return shortest, longest[component[0]], recursive
+
+
+def _topological(members: dict, edges: dict, component: dict) -> list[int]:
+    """Components ordered so that every successor comes first."""
+    successors = {
+        comp: {component[target] for node in nodes for target, _ in edges[node]} - {comp}
+        for comp, nodes in members.items()
+    }
+    ordered = []
+    done = set()
+    for root in members:
+        if root in done:
+            continue
+        stack = [(root, iter(successors[root]))]
+        done.add(root)
+        while stack:
+            comp, targets = stack[-1]
+            for target in targets:
+                if target not in done:
+                    done.add(target)
+                    stack.append((target, iter(successors[target])))
+                    break
+            else:
+                stack.pop()
+                ordered.append(comp)
+    return ordered
+
+
+def language_report(ir: dict, lang_id: str) -> dict:
+    snapshot = compile_snapshot(ir, lang_id)
+    modes = snapshot["modes"]
+    depths, max_depth, recursive = stack_depths(modes)
+    metrics = [
+        mode_metrics(index, entry, snapshot["keywords"], depths.get(index))
+        for index, entry in enumerate(modes)
+    ]
+
+    def total(key):
+        return sum(item[key] or 0 for item in metrics)
+
+    def largest(key):
+        return max((item[key] or 0 for item in metrics), default=0)
+
+    summary = {
+        "modes": len(modes),
+        "maxAlternatives": largest("alternatives"),
+        "alternatives": total("alternatives"),
+        "maxCaptures": largest("captures"),
+        "captures": total("captures"),
+        "maxDepth": max_depth,
+        "recursive": recursive,
+        "keywords": sum(len(table["words"]) for table in snapshot["keywords"]),
+        "backreferences": total("backreferences"),
+        "lookarounds": total("lookarounds"),
+        "subLanguages": len({name for entry in modes for name in sub_languages(entry)}),
+        "unparsedMatchers": sum(1 for item in metrics if item["captures"] is None),
+    }
+    return {"summary": summary, "modes": metrics}
+
+
+# MARK: - History
+
+
+def ir_fingerprint(paths: list[Path]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def tools_fingerprint() -> str:
+    tools_dir = Path(__file__).resolve().parent
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    for name in METRIC_MODULES:
+        digest.update((tools_dir / name).read_bytes())
+    return digest.hexdigest()
+
+
+def load_history(path: Path) -> list[dict]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+    if data.get("version") != HISTORY_VERSION:
+        return []
+    return data.get("entries") or []
+
+
+def save_history(path: Path, entries: list[dict]) -> None:
+    """One language per line keeps the file small and its diffs readable."""
+    lines = [f'{{"version": {HISTORY_VERSION}, "entries": [']
+    for number, entry in enumerate(entries):
+        lines.append(
+            f'  {{"ir": {json.dumps(entry["ir"])}, "tools": {json.dumps(entry.get("tools"))}, '
+            f'"recordedAt": {json.dumps(entry["recordedAt"])}, "languages": {{'
+        )
+        items = sorted(entry["languages"].items())
+        for position, (lang_id, summary) in enumerate(items):
+            comma = "," if position < len(items) - 1 else ""
+            lines.append(f"    {json.dumps(lang_id)}: {json.dumps(summary, sort_keys=True)}{comma}")
+        lines.append("  }}" + ("," if number < len(entries) - 1 else ""))
+    lines.append("]}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def growth(previous: dict, current: dict) -> list[tuple[str, str, int, int, float | None]]:
+    """Tracked metrics that increased: (language, metric, before, after, percent)."""
+    changes = []
+    for lang_id, summary in sorted(current.items()):
+        before = previous.get(lang_id)
+        if before is None:
+            continue
+        for key in TRACKED:
+            old, new = before.get(key, 0), summary[key]
+            if new > old:
+                changes.append((lang_id, key, old, new, (new - old) * 100 / old if old else None))
+    return changes
+
+
+# MARK: - Output
+
+
+def print_table(summaries: dict, sort_key: str, top: int | None) -> None:
+    ordered = sorted(summaries.items(), key=lambda item: (-item[1][sort_key], item[0]))
+    if top:
+        ordered = ordered[:top]
+    header = f"{'language':<24}" + "".join(f" {title:>9}" for _, title in COLUMNS)
+    print(header)
+    for lang_id, summary in ordered:
+        cells = []
+        for key, _ in COLUMNS:
+            value = str(summary[key])
+            if key == "maxDepth" and summary["recursive"]:
+                value += "+"
+            cells.append(f" {value:>9}")
+        print(f"{lang_id:<24}" + "".join(cells))
+
+
+def print_modes(lang_id: str, report: dict) -> None:
+    print(f"{lang_id}:")
+    print(f"  {'mode':>5} {'alts':>5} {'caps':>5} {'depth':>5} {'kw':>5} {'backref':>7} {'lookar':>6} {'sublang':>7}  scope")
+    for item in sorted(report["modes"], key=lambda item: (-item["alternatives"], item["mode"])):
+        if not item["alternatives"] and not item["keywords"] and not item["subLanguages"]:
+            continue
+        cells = [
+            item["mode"], item["alternatives"], item["captures"], item["depth"], item["keywords"],
+        ]
+        cells = [("-" if value is None else value) for value in cells]
+        backref = "-" if item["backreferences"] is None else item["backreferences"]
+        lookar = "-" if item["lookarounds"] is None else item["lookarounds"]
+        print(
+            f"  {cells[0]:>5} {cells[1]:>5} {cells[2]:>5} {cells[3]:>5} {cells[4]:>5} "
+            f"{backref:>7} {lookar:>6} {item['subLanguages']:>7}  {item['scope'] or ''}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", help="directory of IR json files (default: tools/ir)")
+    parser.add_argument("--langs", help="comma-separated language ids to report (default: all)")
+    parser.add_argument("--json", help="write the full report, per language and per mode, to this path")
+    parser.add_argument(
+        "--sort",
+        default="captures",
+        choices=[key for key, _ in COLUMNS],
+        help="summary column to sort the table by, largest first (default: captures)",
+    )
+    parser.add_argument("--top", type=int, help="only print the first N languages of the table")
+    parser.add_argument("--modes", action="store_true", help="also print the per-mode table of each language")
+    parser.add_argument(
+        "--history",
+        help="history file: record the summaries when the IR changed and report growth since the last record",
+    )
+    parser.add_argument(
+        "--max-growth",
+        type=float,
+        help="with --history: fail when a tracked metric of a language grew by more than this percentage",
+    )
+    args = parser.parse_args()
+    if args.max_growth is not None and not args.history:
+        parser.error("--max-growth requires --history")
+    if args.history and args.langs:
+        parser.error("--history records every language and cannot be combined with --langs")
+
+    repo_root = Path(__file__).resolve().parents[1]
+    ir_dir = Path(args.dir) if args.dir else repo_root / "tools" / "ir"
+    paths = sorted(ir_dir.glob("*.json"))
+    if args.langs:
+        wanted = [lang.strip() for lang in args.langs.split(",") if lang.strip()]
+        available = {path.stem: path for path in paths}
+        missing = [lang for lang in wanted if lang not in available]
+        if missing:
+            parser.error(f"no IR for: {', '.join(missing)}")
+        paths = [available[lang] for lang in wanted]
+    if not paths:
+        print(f"No IR files found in {ir_dir}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    reports = {}
+    failures = []
+    for path in paths:
+        try:
+            reports[path.stem] = language_report(load_ir(path), path.stem)
+        except (OSError, KeyError, SnapshotError) as exc:
+            failures.append(f"{path.stem}: {type(exc).__name__}: {exc}")
+    summaries = {lang_id: report["summary"] for lang_id, report in reports.items()}
+
+    print_table(summaries, args.sort, args.top)
+    if args.modes:
+        for lang_id, report in reports.items():
+            print("")
+            print_modes(lang_id, report)
+    print("")
+    recursive = sum(1 for summary in summaries.values() if summary["recursive"])
+    print(
+        f"Measured {len(reports)} language(s) in {time.perf_counter() - start:.2f}s; "
+        f"{recursive} recursive (depth shown with +)"
+    )
+
+    if args.json:
+        payload = {"version": HISTORY_VERSION, "languages": reports}
+        Path(args.json).write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    exit_code = 1 if failures else 0
+    if args.history:
+        history_path = Path(args.history)
+        entries = load_history(history_path)
+        fingerprint = ir_fingerprint(paths)
+        tools = tools_fingerprint()
+        previous = entries[-1] if entries else None
+        same_ir = previous is not None and previous["ir"] == fingerprint
+        unchanged = same_ir and previous.get("tools") == tools
+        grew = False
+        if unchanged:
+            print(f"IR and metric tools unchanged since the last record in {history_path}")
+        elif same_ir:
+            # The numbers moved because the measurement did, not the grammars.
+            print(f"Metric tools changed since the last record ({previous['recordedAt']}); recording a new baseline")
+        elif previous:
+            changes = growth(previous["languages"], summaries)
+            print(f"Since the last record ({previous['recordedAt']}): {len(changes)} metric increase(s)")
+            for lang_id, key, old, new, percent in changes:
+                change = f"+{percent:.1f}%" if percent is not None else "from 0"
+                print(f"  {lang_id}: {key} {old} -> {new} ({change})")
+                if args.max_growth is not None and (percent is None or percent > args.max_growth):
+                    grew = True
+            added = sorted(set(summaries) - set(previous["languages"]))
+            if added:
+                print(f"  new languages: {', '.join(added)}")
+
+        if grew:
+            print(f"Growth above {args.max_growth:g}%; not recorded (rerun without --max-growth to accept it)")
+            exit_code = 1
+        elif failures:
+            print(f"{len(failures)} language(s) failed; not recorded")
+        elif not unchanged:
+            entries.append({
+                "ir": fingerprint,
+                "tools": tools,
+                "recordedAt": time.strftime("%Y-%m-%d"),
+                "languages": summaries,
+            })
+            save_history(history_path, entries)
+            print(f"Recorded {len(summaries)} language(s) in {history_path}")
+
+    for failure in failures:
+        print(f"error: {failure}", file=sys.stderr)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
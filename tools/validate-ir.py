@@ -4,10 +4,19 @@ import json
 import sys
 from pathlib import Path
 
+import hljs_regex as rx
+
 
 ALLOWED_PATTERN_TYPES = {"regex", "string"}
 ALLOWED_FLAGS = {"i", "u"}
 
+RISK_LEVELS = ["none", "low", "medium", "high"]
+PATTERN_FIELDS = ("begin", "end", "match", "illegal")
+# A leading repeat over this many code points rescans most of the line from
+# every start position when the rest of the rule fails.
+BROAD_CLASS_SIZE = 1000
+WIDE_ALTERNATION_RULES = 40
+
 
 def validate_pattern(pattern, path, errors):
     if pattern is None:
@@ -103,10 +112,285 @@ def validate_ir(path: Path) -> list[str]:
     return errors
 
 
+# MARK: - Backtracking risk
+
+
+def risk_value(level: str) -> int:
+    return RISK_LEVELS.index(level)
+
+
+def finding(kind: str, severity: str, detail: str) -> dict:
+    return {"kind": kind, "severity": severity, "detail": detail}
+
+
+def max_risk(findings) -> str:
+    return max((f["severity"] for f in findings), key=risk_value, default="none")
+
+
+def sibling_items(body, target):
+    """Items matched in sequence with `target` inside `body` on target's path."""
+    if body is target:
+        return []
+    if isinstance(body, rx.Concat):
+        for index, item in enumerate(body.items):
+            if any(n is target for n in rx.walk(item)):
+                return body.items[:index] + body.items[index + 1:] + sibling_items(item, target)
+        return []
+    if isinstance(body, rx.Alternation):
+        for branch in body.branches:
+            if any(n is target for n in rx.walk(branch)):
+                return sibling_items(branch, target)
+        return []
+    if isinstance(body, (rx.Group, rx.Repeat)):
+        return sibling_items(body.child, target)
+    return []
+
+
+def consuming_nodes(node):
+    """Walks `node` without descending into lookarounds."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, rx.Group) and current.kind in rx.LOOKAROUNDS:
+            continue
+        yield current
+        stack.extend(rx.children(current))
+
+
+def unwrap_groups(node):
+    while isinstance(node, rx.Group) and node.kind in ("capture", "named", "noncapture"):
+        node = node.child
+    return node
+
+
+def analyze_pattern(source: str) -> list[dict]:
+    """Flags constructs that make a backtracking engine like ICU go super-linear."""
+    try:
+        tree = rx.parse(source, ascii_classes=True)
+    except rx.RegexSyntaxError as exc:
+        return [finding("unparsed", "low", str(exc))]
+
+    findings = []
+    for node in rx.walk(tree):
+        if isinstance(node, rx.Group) and node.kind in rx.LOOKAROUNDS:
+            _, hi = rx.width(node.child)
+            if hi is None and node.kind in ("lookbehind", "neglookbehind"):
+                findings.append(finding(
+                    "unbounded-lookaround", "high",
+                    f"{rx.to_source(node)}: ICU rejects lookbehind without a bounded length",
+                ))
+            elif hi is None:
+                findings.append(finding(
+                    "unbounded-lookaround", "medium",
+                    f"{rx.to_source(node)}: rescans an unbounded span at every attempt",
+                ))
+            continue
+
+        if not rx.is_unbounded(node) or node.possessive:
+            continue
+        body = node.child
+
+        for inner in consuming_nodes(body):
+            if inner is body and not isinstance(body, rx.Repeat):
+                continue
+            if not rx.is_unbounded(inner) or inner.possessive:
+                continue
+            siblings = sibling_items(body, inner)
+            if all(rx.nullable(item) for item in siblings):
+                findings.append(finding(
+                    "nested-quantifier", "high",
+                    f"{rx.to_source(node)}: {rx.to_source(inner)} can match each iteration on its own",
+                ))
+            else:
+                separator = rx.CharSet()
+                for item in siblings:
+                    separator = separator.union(rx.chars_used(item))
+                if separator.intersects(rx.chars_used(inner.child)):
+                    findings.append(finding(
+                        "nested-quantifier", "medium",
+                        f"{rx.to_source(node)}: {rx.to_source(inner)} overlaps its separator",
+                    ))
+
+        alternation = unwrap_groups(body)
+        if isinstance(alternation, rx.Alternation):
+            branches = alternation.branches
+            worst = None
+            for i, left in enumerate(branches):
+                for right in branches[i + 1:]:
+                    if not rx.first_set(left).intersects(rx.first_set(right)):
+                        continue
+                    single_left = rx.single_char_set(left)
+                    single_right = rx.single_char_set(right)
+                    if single_left is not None and single_right is not None:
+                        worst = "high"
+                    elif worst is None:
+                        worst = "medium"
+            if worst:
+                findings.append(finding(
+                    "overlapping-alternation", worst,
+                    f"{rx.to_source(node)}: branches can start with the same character",
+                ))
+
+    for node in rx.walk(tree):
+        if not isinstance(node, rx.Concat):
+            continue
+        previous = None
+        for item in node.items:
+            if rx.is_unbounded(item) and not item.possessive:
+                if previous is not None and rx.chars_used(previous.child).intersects(rx.chars_used(item.child)):
+                    findings.append(finding(
+                        "adjacent-quantifiers", "low",
+                        f"{rx.to_source(previous)}{rx.to_source(item)}: split point is ambiguous",
+                    ))
+                previous = item
+            elif not rx.nullable(item):
+                previous = None
+
+    return findings
+
+
+def leading_repeat(node):
+    """The unbounded repeat a match starts with, skipping zero-width items."""
+    node = unwrap_groups(node)
+    if isinstance(node, rx.Concat):
+        for item in node.items:
+            if rx.is_zero_width(item):
+                if isinstance(item, rx.Anchor) and item.kind in ("^", "\\A", "\\G"):
+                    return None
+                continue
+            return leading_repeat(item)
+        return None
+    if rx.is_unbounded(node):
+        return node
+    return None
+
+
+def analyze_combined(rules: list[tuple[str, str]]) -> list[dict]:
+    """Findings for the alternation MultiRegex builds from one mode's rules."""
+    findings = []
+    if len(rules) > WIDE_ALTERNATION_RULES:
+        findings.append(finding(
+            "wide-alternation", "low",
+            f"{len(rules)} rules are tried at every position",
+        ))
+    for label, source in rules:
+        try:
+            tree = rx.parse(source, ascii_classes=True)
+        except rx.RegexSyntaxError:
+            continue
+        lead = leading_repeat(tree)
+        if lead is not None and not lead.possessive and rx.chars_used(lead.child).size() >= BROAD_CLASS_SIZE:
+            findings.append(finding(
+                "quadratic-scan", "medium",
+                f"{label} starts with {rx.to_source(lead)}; a failed match rescans from every position",
+            ))
+        if label.startswith("begin") and rx.nullable(tree) and source not in (r"\B|\b",):
+            findings.append(finding(
+                "nullable-rule", "low",
+                f"{label} can match the empty string",
+            ))
+    return findings
+
+
+def pattern_source(pattern) -> str | None:
+    if isinstance(pattern, dict) and isinstance(pattern.get("source"), str):
+        return pattern["source"]
+    return None
+
+
+def begin_sources(mode, base=None) -> list[str]:
+    """Begin patterns a mode contributes to its parent's matcher, like ModeCompiler."""
+    merged = dict(base or {})
+    merged.update({k: v for k, v in mode.items() if v is not None})
+    source = pattern_source(merged.get("match")) or None
+    if source is None and merged.get("beginKeywords"):
+        words = merged["beginKeywords"].split()
+        source = "\\b(" + "|".join(words) + ")(?!\\.)(?=\\b|\\s)"
+    if source is None:
+        source = pattern_source(merged.get("begin"))
+    return [source or r"\B|\b"]
+
+
+def combined_rules(mode, mode_by_id) -> list[tuple[str, str]]:
+    rules = []
+    for ref in mode.get("contains") or []:
+        child = mode if ref == "self" else mode_by_id.get(ref.get("ref")) if isinstance(ref, dict) else None
+        if child is None:
+            continue
+        variants = [mode_by_id.get(v.get("ref")) for v in child.get("variants") or [] if isinstance(v, dict)]
+        variants = [v for v in variants if v is not None]
+        child_id = child.get("id", "language")
+        if variants:
+            for variant in variants:
+                for source in begin_sources(variant, child):
+                    rules.append((f"begin of {variant.get('id')} (variant of {child_id})", source))
+        else:
+            for source in begin_sources(child):
+                rules.append((f"begin of {child_id}", source))
+    end = pattern_source(mode.get("end"))
+    if end is None and "id" in mode and not mode.get("endsWithParent"):
+        end = r"\B|\b"
+    if end:
+        rules.append(("end", end))
+    illegal = pattern_source(mode.get("illegal"))
+    if illegal:
+        rules.append(("illegal", illegal))
+    return rules
+
+
+def risk_report(path: Path) -> dict:
+    """Per-pattern and per-matcher backtracking risk for one IR file."""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    language = data.get("language") or {}
+    modes = [mode for mode in data.get("modes") or [] if isinstance(mode, dict)]
+    mode_by_id = {mode.get("id"): mode for mode in modes}
+
+    patterns = []
+    combined = []
+    owners = [("language", language)] + [(mode.get("id"), mode) for mode in modes]
+    for owner_id, owner in owners:
+        for key in PATTERN_FIELDS:
+            source = pattern_source(owner.get(key))
+            if source is None:
+                continue
+            findings = analyze_pattern(source)
+            if findings:
+                patterns.append({
+                    "mode": owner_id,
+                    "field": key,
+                    "source": source,
+                    "risk": max_risk(findings),
+                    "findings": findings,
+                })
+
+        if owner.get("contains") or owner_id == "language":
+            rules = combined_rules(owner, mode_by_id)
+            findings = analyze_combined(rules)
+            if findings:
+                combined.append({
+                    "mode": owner_id,
+                    "rules": len(rules),
+                    "risk": max_risk(findings),
+                    "findings": findings,
+                })
+
+    return {
+        "risk": max_risk([{"severity": item["risk"]} for item in patterns + combined]),
+        "patterns": patterns,
+        "combined": combined,
+    }
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", help="IR json file to validate")
     parser.add_argument("--dir", help="Directory of IR json files")
+    parser.add_argument("--risk-report", help="write the regex backtracking risk report as JSON to this path")
+    parser.add_argument(
+        "--max-risk",
+        choices=RISK_LEVELS,
+        help="fail when any pattern or mode matcher is riskier than this level",
+    )
     args = parser.parse_args()
 
     if not args.input and not args.dir:
@@ -124,6 +408,30 @@ def main():
     for path in paths:
         all_errors.extend(validate_ir(path))
 
+    if args.risk_report or args.max_risk:
+        reports = {}
+        for path in paths:
+            try:
+                reports[path.stem] = risk_report(path)
+            except json.JSONDecodeError:
+                continue
+        if args.risk_report:
+            payload = {"version": 1, "languages": reports}
+            Path(args.risk_report).write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+        counts = {level: 0 for level in RISK_LEVELS[1:]}
+        for lang_id, report in reports.items():
+            for item in report["patterns"] + report["combined"]:
+                counts[item["risk"]] += 1
+                if args.max_risk and risk_value(item["risk"]) > risk_value(args.max_risk):
+                    where = f"{item['field']}" if "field" in item else "matcher"
+                    details = "; ".join(f"{f['kind']}: {f['detail']}" for f in item["findings"])
+                    all_errors.append(f"{lang_id}: mode {item['mode']}.{where}: {item['risk']} risk ({details})")
+        print(
+            f"Regex risk: {counts['high']} high, {counts['medium']} medium, {counts['low']} low "
+            f"across {len(reports)} language(s)"
+        )
+
     if all_errors:
         for err in all_errors:
             print(err)